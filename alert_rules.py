@@ -0,0 +1,574 @@
+"""
+Motor de Reglas de Alerta
+Reglas declarativas (métrica, ventana, agregación, comparador, duración mínima)
+evaluadas de forma incremental sobre los almacenes de series temporales: cada
+regla guarda sus buckets de la ventana con sumas y extremos acumulados y en
+cada evaluación solo lee los buckets nuevos. Las alertas tienen histéresis
+(umbral de recuperación) y se resuelven solas, se notifican agrupadas, pueden
+inhibirse entre sí y quedan en un historial acotado.
+
+La evaluación corre una vez por cluster, en el líder del programador, que
+publica el estado de las alertas en shared_state. Los demás procesos lo leen
+desde ahí, y las resoluciones manuales que reciben se guardan como pedidos
+que el líder aplica en la evaluación siguiente.
+"""
+
+import logging
+import operator
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics_registry import metrics_registry
+from timeseries_store import TimeSeriesStore
+
+logger = logging.getLogger(__name__)
+
+# Configuración del motor de alertas
+ALERT_CONFIG = {
+    'evaluate_seconds': 15,
+    'history_size': 500,        # Transiciones (disparo / resolución) guardadas
+    'event_ttl': 900,           # Alertas por evento sin repetirse en este tiempo se resuelven solas
+    'default_store': 'system',
+    'shared_key': 'alerts.state',           # Estado publicado por el líder
+    'resolve_prefix': 'alerts.resolve.',    # Pedidos de resolución desde otros procesos
+    'published_history': 100                # Transiciones incluidas en el estado publicado
+}
+
+SEVERITIES = ('info', 'warning', 'critical', 'emergency')
+COMPARATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+AGGREGATIONS = ('last', 'mean', 'min', 'max', 'sum', 'count', 'rate')
+
+ALERTS_FIRING = metrics_registry.gauge('portal_alerts_firing', 'Alertas activas por grupo y severidad',
+                                       ['group', 'severity'], mode='max')
+ALERT_TRANSITIONS = metrics_registry.counter('portal_alert_transitions', 'Alertas disparadas y resueltas',
+                                             ['rule', 'state'])
+
+
+@dataclass
+class AlertRule:
+    """Regla declarativa: agregación de la métrica en la ventana comparada contra el umbral"""
+    name: str
+    metric: str
+    threshold: float
+    comparator: str = '>'
+    aggregation: str = 'last'
+    window: float = 300                 # segundos
+    for_seconds: float = 0              # Tiempo que la condición debe sostenerse antes de disparar
+    clear: Optional[float] = None       # Umbral de recuperación (histéresis); por defecto el mismo umbral
+    severity: str = 'warning'
+    group: str = 'system'
+    store: str = 'system'
+    source: str = 'alert_rules'
+    title: str = ''
+    message: str = '{metric} = {value:.2f} (umbral: {threshold})'
+    inhibited_by: Tuple[str, ...] = ()  # Alertas que, activas, silencian a esta
+
+    def __post_init__(self):
+        if self.comparator not in COMPARATORS:
+            raise ValueError(f'Comparador no soportado: {self.comparator}')
+        if self.aggregation not in AGGREGATIONS:
+            raise ValueError(f'Agregación no soportada: {self.aggregation}')
+        if self.severity not in SEVERITIES:
+            raise ValueError(f'Severidad no soportada: {self.severity}')
+        if self.window <= 0:
+            raise ValueError('La ventana debe ser positiva')
+        if self.clear is None:
+            self.clear = self.threshold
+        self.inhibited_by = tuple(self.inhibited_by)
+
+    def breached(self, value: float) -> bool:
+        return COMPARATORS[self.comparator](value, self.threshold)
+
+    def recovered(self, value: Optional[float]) -> bool:
+        """Del lado sano del umbral de recuperación (sin datos en la ventana también cuenta)"""
+        return value is None or not COMPARATORS[self.comparator](value, self.clear)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name, 'metric': self.metric, 'store': self.store, 'aggregation': self.aggregation,
+            'window': self.window, 'comparator': self.comparator, 'threshold': self.threshold,
+            'clear': self.clear, 'for_seconds': self.for_seconds, 'severity': self.severity,
+            'group': self.group, 'inhibited_by': list(self.inhibited_by)
+        }
+
+
+class RuleWindow:
+    """Agregados de la ventana de una regla mantenidos de forma incremental"""
+
+    def __init__(self, window: float):
+        self.window = window
+        self.buckets: deque = deque()   # (inicio, suma, cantidad)
+        self.maxima: deque = deque()    # (inicio, máximo) decrecientes
+        self.minima: deque = deque()    # (inicio, mínimo) crecientes
+        self.total = 0.0
+        self.samples = 0.0
+        self.cursor = None              # Inicio del último bucket leído (puede seguir acumulando)
+
+    def update(self, rows: List[Tuple[float, ...]], now: float):
+        for start, total, samples, minimum, maximum in rows:
+            if self.buckets and self.buckets[-1][0] == start:
+                _, old_total, old_samples = self.buckets.pop()
+                self.total -= old_total
+                self.samples -= old_samples
+                if self.maxima and self.maxima[-1][0] == start:
+                    self.maxima.pop()
+                if self.minima and self.minima[-1][0] == start:
+                    self.minima.pop()
+            elif self.buckets and start < self.buckets[-1][0]:
+                continue
+            self.buckets.append((start, total, samples))
+            self.total += total
+            self.samples += samples
+            while self.maxima and self.maxima[-1][1] <= maximum:
+                self.maxima.pop()
+            self.maxima.append((start, maximum))
+            while self.minima and self.minima[-1][1] >= minimum:
+                self.minima.pop()
+            self.minima.append((start, minimum))
+            self.cursor = start
+
+        cutoff = now - self.window
+        while self.buckets and self.buckets[0][0] <= cutoff:
+            _, old_total, old_samples = self.buckets.popleft()
+            self.total -= old_total
+            self.samples -= old_samples
+        while self.maxima and self.maxima[0][0] <= cutoff:
+            self.maxima.popleft()
+        while self.minima and self.minima[0][0] <= cutoff:
+            self.minima.popleft()
+
+    def value(self, aggregation: str) -> Optional[float]:
+        if not self.buckets:
+            return 0.0 if aggregation in ('count', 'sum', 'rate') else None
+        if aggregation == 'last':
+            _, total, samples = self.buckets[-1]
+            return total / samples
+        if aggregation == 'mean':
+            return self.total / self.samples
+        if aggregation == 'max':
+            return self.maxima[0][1]
+        if aggregation == 'min':
+            return self.minima[0][1]
+        if aggregation == 'sum':
+            return self.total
+        if aggregation == 'count':
+            return self.samples
+        return self.total / self.window
+
+
+@dataclass
+class ActiveAlert:
+    """Alerta disparada (por regla o por evento)"""
+    id: str
+    title: str
+    message: str
+    severity: str
+    group: str
+    source: str
+    started_at: float
+    last_seen: float
+    value: Optional[float] = None
+    data: Dict = field(default_factory=dict)
+    inhibited: bool = False
+    silenced: bool = False          # Resuelta a mano: no vuelve a disparar hasta recuperarse
+    resolved_at: Optional[float] = None
+    ttl: Optional[float] = None     # Solo alertas por evento
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id, 'title': self.title, 'message': self.message, 'severity': self.severity,
+            'group': self.group, 'source': self.source, 'value': self.value, 'data': self.data,
+            'started_at': self.started_at, 'last_seen': self.last_seen, 'inhibited': self.inhibited,
+            'resolved': self.resolved_at is not None, 'resolved_at': self.resolved_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ActiveAlert':
+        names = {item.name for item in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+
+class _RuleState:
+    __slots__ = ('rule', 'window', 'pending_since', 'value')
+
+    def __init__(self, rule: AlertRule):
+        self.rule = rule
+        self.window = RuleWindow(rule.window)
+        self.pending_since = None
+        self.value = None
+
+
+class AlertRuleEngine:
+    """Evaluación de reglas, estado de alertas, notificación agrupada e historial"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.stores: Dict[str, TimeSeriesStore] = {ALERT_CONFIG['default_store']: TimeSeriesStore()}
+        self.states: Dict[str, _RuleState] = {}
+        self.alerts: Dict[str, ActiveAlert] = {}
+        self.history: deque = deque(maxlen=ALERT_CONFIG['history_size'])
+        self.subscribers: List[Callable[[str, List[Dict[str, Any]]], None]] = []
+        self.last_evaluation = None
+        self.published_at = None        # Última publicación de este proceso (None: evalúa otro)
+        self._gauge_groups = set()
+
+    # Configuración
+
+    @property
+    def store(self) -> TimeSeriesStore:
+        return self.stores[ALERT_CONFIG['default_store']]
+
+    def attach_store(self, name: str, store: TimeSeriesStore):
+        """Evaluar reglas contra un almacén existente (por ejemplo el del monitoreo inteligente)"""
+        with self.lock:
+            self.stores[name] = store
+
+    def record(self, metric: str, value: float, timestamp: float = None, unit: str = '', category: str = ''):
+        """Registrar una muestra en el almacén propio del motor"""
+        self.store.record(metric, value, timestamp, unit=unit, category=category)
+
+    def add_rule(self, rule: AlertRule) -> AlertRule:
+        """Agregar o reemplazar una regla (el reemplazo reinicia su ventana)"""
+        with self.lock:
+            self.states[rule.name] = _RuleState(rule)
+        return rule
+
+    def add_rules(self, rules: List[AlertRule]):
+        for rule in rules:
+            self.add_rule(rule)
+
+    def remove_rule(self, name: str):
+        with self.lock:
+            self.states.pop(name, None)
+            alert = self.alerts.get(name)
+            if alert is not None and alert.ttl is None:
+                self._resolve(alert, time.time(), [])
+
+    def rules(self) -> List[AlertRule]:
+        with self.lock:
+            return [state.rule for state in self.states.values()]
+
+    def subscribe(self, callback: Callable[[str, List[Dict[str, Any]]], None]):
+        """callback(grupo, transiciones): una llamada por grupo y evaluación con todos sus cambios"""
+        self.subscribers.append(callback)
+
+    # Evaluación
+
+    def evaluate(self, now: float = None) -> List[Dict[str, Any]]:
+        """Evaluar todas las reglas leyendo solo los buckets nuevos de cada una"""
+        now = time.time() if now is None else now
+        transitions = []
+        with self.lock:
+            for state in list(self.states.values()):
+                try:
+                    self._evaluate_rule(state, now, transitions)
+                except Exception as e:
+                    logger.error(f'Error evaluando la regla {state.rule.name}: {e}')
+
+            for alert in list(self.alerts.values()):
+                if alert.ttl is not None and now - alert.last_seen > alert.ttl:
+                    self._resolve(alert, now, transitions)
+
+            self._apply_inhibition()
+            self._update_gauges()
+            self.last_evaluation = now
+        self._notify(transitions)
+        return transitions
+
+    def _evaluate_rule(self, state: _RuleState, now: float, transitions: List[Dict[str, Any]]):
+        rule = state.rule
+        store = self.stores.get(rule.store)
+        if store is None:
+            return
+        window = state.window
+        since = window.cursor if window.cursor is not None else now - rule.window
+        _, rows = store.buckets_since(rule.metric, rule.window, since)
+        window.update(rows, now)
+        value = state.value = window.value(rule.aggregation)
+        alert = self.alerts.get(rule.name)
+
+        if alert is not None:
+            alert.value = value
+            if rule.recovered(value):
+                if alert.silenced:
+                    del self.alerts[rule.name]
+                else:
+                    self._resolve(alert, now, transitions)
+                state.pending_since = None
+            else:
+                alert.last_seen = now
+            return
+
+        if value is None or not rule.breached(value):
+            state.pending_since = None
+            return
+        if state.pending_since is None:
+            state.pending_since = now
+        if now - state.pending_since >= rule.for_seconds:
+            self._fire(ActiveAlert(
+                id=rule.name,
+                title=rule.title or rule.name,
+                message=rule.message.format(metric=rule.metric, value=value, threshold=rule.threshold),
+                severity=rule.severity, group=rule.group, source=rule.source,
+                started_at=now, last_seen=now, value=value,
+                data={'metric': rule.metric, 'aggregation': rule.aggregation, 'window': rule.window}
+            ), transitions)
+
+    def _fire(self, alert: ActiveAlert, transitions: List[Dict[str, Any]]):
+        self.alerts[alert.id] = alert
+        self._transition(alert, 'firing', alert.started_at, transitions)
+
+    def _resolve(self, alert: ActiveAlert, now: float, transitions: List[Dict[str, Any]]):
+        alert.resolved_at = now
+        self.alerts.pop(alert.id, None)
+        self._transition(alert, 'resolved', now, transitions)
+
+    def _transition(self, alert: ActiveAlert, state: str, now: float, transitions: List[Dict[str, Any]]):
+        entry = dict(alert.to_dict(), state=state, at=now)
+        self.history.append(entry)
+        transitions.append(entry)
+        ALERT_TRANSITIONS.inc(rule=alert.id, state=state)
+
+    def _apply_inhibition(self):
+        for state in self.states.values():
+            alert = self.alerts.get(state.rule.name)
+            if alert is not None:
+                alert.inhibited = any(name in self.alerts and not self.alerts[name].inhibited
+                                      and not self.alerts[name].silenced for name in state.rule.inhibited_by)
+
+    def _update_gauges(self):
+        self._gauge_groups.update(alert.group for alert in self.alerts.values())
+        counts = {(group, severity): 0 for group in self._gauge_groups for severity in SEVERITIES}
+        for alert in self.alerts.values():
+            if not alert.inhibited and not alert.silenced:
+                counts[(alert.group, alert.severity)] += 1
+        for (group, severity), count in counts.items():
+            ALERTS_FIRING.set(count, group=group, severity=severity)
+
+    def _notify(self, transitions: List[Dict[str, Any]]):
+        """Una notificación por grupo; las alertas inhibidas no se notifican"""
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in transitions:
+            alert = self.alerts.get(entry['id'])
+            if entry['state'] == 'firing' and alert is not None and alert.inhibited:
+                continue
+            grouped.setdefault(entry['group'], []).append(entry)
+
+        for group, entries in grouped.items():
+            fired = [entry['id'] for entry in entries if entry['state'] == 'firing']
+            resolved = [entry['id'] for entry in entries if entry['state'] == 'resolved']
+            if fired:
+                logger.warning(f"🚨 [{group}] Alertas disparadas: {', '.join(fired)}")
+            if resolved:
+                logger.info(f"✅ [{group}] Alertas resueltas: {', '.join(resolved)}")
+            for callback in list(self.subscribers):
+                try:
+                    callback(group, entries)
+                except Exception as e:
+                    logger.error(f'Error notificando alertas del grupo {group}: {e}')
+
+    # Estado compartido entre procesos
+
+    def evaluate_and_publish(self, now: float = None) -> List[Dict[str, Any]]:
+        """Tarea programada del líder: aplicar resoluciones pedidas, evaluar y publicar el estado"""
+        self.apply_requested_resolutions()
+        transitions = self.evaluate(now)
+        self.publish()
+        return transitions
+
+    def publish(self):
+        from shared_state import shared_state
+
+        with self.lock:
+            state = {
+                'alerts': [dict(alert.to_dict(), silenced=alert.silenced, ttl=alert.ttl)
+                           for alert in self.alerts.values()],
+                'history': list(self.history)[-ALERT_CONFIG['published_history']:],
+                'status': self.status(local=True),
+                'rules': self.rule_values(local=True)
+            }
+        shared_state.publish(ALERT_CONFIG['shared_key'], state)
+        self.published_at = time.time()
+
+    def _remote_state(self) -> Optional[Dict[str, Any]]:
+        """Estado publicado por el líder; None si este proceso es quien evalúa o no hay publicación"""
+        if self.published_at is not None and time.time() - self.published_at < 3 * ALERT_CONFIG['evaluate_seconds']:
+            return None
+        from shared_state import shared_state
+        return shared_state.read(ALERT_CONFIG['shared_key'])
+
+    def _requested_resolutions(self) -> Dict[str, float]:
+        from shared_state import shared_state
+        prefix = ALERT_CONFIG['resolve_prefix']
+        return {key[len(prefix):]: request['at'] for key, request in shared_state.read_prefix(prefix).items()}
+
+    def apply_requested_resolutions(self) -> int:
+        """Resolver las alertas pedidas desde otros procesos y borrar los pedidos"""
+        from shared_state import shared_state
+
+        shared_state.invalidate(ALERT_CONFIG['resolve_prefix'])
+        requested = self._requested_resolutions()
+        for alert_id, at in requested.items():
+            self._resolve_local(alert_id, at)
+            shared_state.delete(ALERT_CONFIG['resolve_prefix'] + alert_id)
+        return len(requested)
+
+    # Alertas por evento y gestión manual
+
+    def trigger(self, alert_id: str, title: str, message: str, severity: str = 'warning', group: str = 'system',
+                source: str = 'alert_rules', data: Dict = None, ttl: float = None, now: float = None) -> ActiveAlert:
+        """Disparar una alerta que no proviene de una regla (predicciones, anomalías); repetirla la
+        mantiene activa y se resuelve sola si no se repite durante `ttl` segundos"""
+        if severity not in SEVERITIES:
+            raise ValueError(f'Severidad no soportada: {severity}')
+        now = time.time() if now is None else now
+        transitions = []
+        with self.lock:
+            alert = self.alerts.get(alert_id)
+            if alert is not None:
+                alert.last_seen = now
+                alert.message = message
+                return alert
+            alert = ActiveAlert(id=alert_id, title=title, message=message, severity=severity, group=group,
+                                source=source, started_at=now, last_seen=now, data=data or {},
+                                ttl=ALERT_CONFIG['event_ttl'] if ttl is None else ttl)
+            self._fire(alert, transitions)
+            self._update_gauges()
+        self._notify(transitions)
+        return alert
+
+    def resolve(self, alert_id: str, now: float = None) -> bool:
+        """Resolver a mano: una alerta de regla no vuelve a disparar hasta que la condición se recupere.
+        Fuera del líder se guarda el pedido y el líder lo aplica en la evaluación siguiente"""
+        now = time.time() if now is None else now
+        if self._remote_state() is not None:
+            if not any(alert.id == alert_id for alert in self.active()):
+                return False
+            from shared_state import shared_state
+            shared_state.publish(ALERT_CONFIG['resolve_prefix'] + alert_id, {'at': now})
+            return True
+        if not self._resolve_local(alert_id, now):
+            return False
+        if self.published_at is not None:
+            self.publish()
+        return True
+
+    def _resolve_local(self, alert_id: str, now: float) -> bool:
+        with self.lock:
+            alert = self.alerts.get(alert_id)
+            if alert is None or alert.silenced:
+                return False
+            if alert.ttl is None and alert_id in self.states:
+                alert.silenced = True
+                alert.resolved_at = now
+                self._transition(alert, 'resolved', now, [])
+            else:
+                self._resolve(alert, now, [])
+            self._update_gauges()
+        return True
+
+    # Consultas
+
+    def active(self, group: str = None, source: str = None, severity: str = None,
+               include_inhibited: bool = True) -> List[ActiveAlert]:
+        remote = self._remote_state()
+        if remote is not None:
+            requested = self._requested_resolutions()
+            alerts = [ActiveAlert.from_dict(data) for data in remote['alerts']
+                      if not data['silenced'] and data['id'] not in requested]
+        else:
+            with self.lock:
+                alerts = [alert for alert in self.alerts.values() if not alert.silenced]
+        return sorted((alert for alert in alerts
+                       if (group is None or alert.group == group)
+                       and (source is None or alert.source == source)
+                       and (severity is None or alert.severity == severity)
+                       and (include_inhibited or not alert.inhibited)),
+                      key=lambda alert: (-SEVERITIES.index(alert.severity), -alert.started_at))
+
+    def groups(self) -> Dict[str, List[Dict[str, Any]]]:
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for alert in self.active():
+            grouped.setdefault(alert.group, []).append(alert.to_dict())
+        return grouped
+
+    def recent_history(self, limit: int = 50, source: str = None) -> List[Dict[str, Any]]:
+        remote = self._remote_state()
+        with self.lock:
+            history = remote['history'] if remote is not None else list(self.history)
+        entries = [entry for entry in reversed(history) if source is None or entry['source'] == source]
+        return entries[:limit]
+
+    def status(self, local: bool = False) -> Dict[str, Any]:
+        remote = None if local else self._remote_state()
+        if remote is not None:
+            return remote['status']
+        with self.lock:
+            return {
+                'rules': len(self.states),
+                'active': sum(1 for alert in self.alerts.values() if not alert.silenced),
+                'inhibited': sum(1 for alert in self.alerts.values() if alert.inhibited),
+                'history': len(self.history),
+                'stores': sorted(self.stores),
+                'last_evaluation': self.last_evaluation
+            }
+
+    def rule_values(self, local: bool = False) -> List[Dict[str, Any]]:
+        """Reglas con el último valor evaluado y su estado"""
+        remote = None if local else self._remote_state()
+        if remote is not None:
+            return remote['rules']
+        with self.lock:
+            return [dict(state.rule.to_dict(), value=state.value,
+                         state='firing' if state.rule.name in self.alerts
+                         else 'pending' if state.pending_since is not None else 'inactive')
+                    for state in self.states.values()]
+
+
+# Instancia global
+alert_engine = AlertRuleEngine()
+
+
+def init_alert_rules(app):
+    """Programar la evaluación de reglas en el líder y registrar la vista de administración"""
+    from flask import jsonify, request
+    from flask_login import login_required, current_user
+    from cluster_scheduler import cluster_scheduler
+
+    # Una vez por cluster: las series se registran en el líder y los demás procesos leen el estado publicado
+    cluster_scheduler.interval('alerts.evaluate', ALERT_CONFIG['evaluate_seconds'], alert_engine.evaluate_and_publish,
+                               timeout=ALERT_CONFIG['evaluate_seconds'])
+
+    def admin_required():
+        if not current_user.can_access_admin():
+            return jsonify({'success': False, 'error': 'Permisos insuficientes'}), 403
+        return None
+
+    @app.route('/api/v1/alerts', methods=['GET'])
+    @login_required
+    def get_alerts():
+        """Alertas activas agrupadas, reglas y transiciones recientes (las que publica el líder)"""
+        denied = admin_required()
+        if denied:
+            return denied
+        return jsonify({'success': True, 'data': {
+            'status': alert_engine.status(),
+            'groups': alert_engine.groups(),
+            'rules': alert_engine.rule_values(),
+            'history': alert_engine.recent_history(request.args.get('limit', 50, type=int))
+        }})
+
+    @app.route('/api/v1/alerts/<alert_id>/resolve', methods=['POST'])
+    @login_required
+    def resolve_alert(alert_id):
+        denied = admin_required()
+        if denied:
+            return denied
+        if not alert_engine.resolve(alert_id):
+            return jsonify({'success': False, 'error': 'Alerta no encontrada'}), 404
+        return jsonify({'success': True})
+
+    print("✅ Motor de reglas de alerta inicializado")
@@ -5,16 +5,19 @@ Sistema avanzado de análisis de datos y business intelligence
 
 import json
 import sqlite3
+import time
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from typing import Dict, List, Optional, Any, Tuple
 from collections import defaultdict, Counter
+from flask import request
+from flask_login import current_user, login_required
 # Importar numpy de forma segura
 from optional_dependencies import get_numpy, NUMPY_AVAILABLE
 np = get_numpy()
 from enum import Enum
-import threading
-import time
+from timeseries_store import TimeSeriesStore
+from alert_rules import AlertRule, alert_engine
 
 # Configuración de analytics
 ANALYTICS_CONFIG = {
@@ -22,7 +25,8 @@ ANALYTICS_CONFIG = {
     'real_time_update_interval': 30,  # segundos
     'prediction_horizon_days': 30,
     'anomaly_detection_threshold': 2.0,
-    'user_segment_threshold': 10
+    'user_segment_threshold': 10,
+    'real_time_key': 'analytics.real_time'   # Clave del resumen publicado en shared_state
 }
 
 class MetricType(Enum):
@@ -93,55 +97,71 @@ class RealTimeAnalytics:
     def __init__(self):
         self.metrics_cache = {}
         self.active_sessions = 0
-        self.real_time_data = defaultdict(list)
+        self.real_time_data = TimeSeriesStore()
         self.alert_thresholds = {
             'user_activity': 100,
             'security_incidents': 5,
             'maintenance_requests': 20,
             'financial_anomalies': 1000
         }
+        self._register_alert_rules()
         self._start_real_time_monitoring()
     
+    def _register_alert_rules(self):
+        """Reglas sobre las series en tiempo real (último valor de dos intervalos de actualización)"""
+        alert_engine.attach_store('analytics', self.real_time_data)
+        threshold = self.alert_thresholds['user_activity']
+        alert_engine.add_rule(AlertRule(
+            'analytics.high_activity', 'activity', threshold, clear=threshold * 0.8,
+            window=2 * ANALYTICS_CONFIG['real_time_update_interval'], store='analytics', group='analytics',
+            source='analytics', title='Actividad alta', message='Actividad alta detectada: {value:.0f} eventos'
+        ))
+    
     def _start_real_time_monitoring(self):
-        """Inicia el monitoreo en tiempo real"""
-        def monitor():
-            while True:
-                try:
-                    self._update_real_time_metrics()
-                    time.sleep(ANALYTICS_CONFIG['real_time_update_interval'])
-                except Exception as e:
-                    print(f"Error en monitoreo en tiempo real: {e}")
-        
-        thread = threading.Thread(target=monitor, daemon=True)
-        thread.start()
+        """Inicia el monitoreo en tiempo real (una vez por cluster; los demás procesos leen lo publicado)"""
+        from cluster_scheduler import cluster_scheduler
+        cluster_scheduler.interval('analytics.real_time', ANALYTICS_CONFIG['real_time_update_interval'],
+                                   self._update_real_time_metrics, delay=0,
+                                   timeout=ANALYTICS_CONFIG['real_time_update_interval'])
     
     def _update_real_time_metrics(self):
-        """Actualiza métricas en tiempo real"""
+        """Actualiza métricas en tiempo real y publica el resumen en shared_state"""
+        from shared_state import shared_state
+        
         # Usuarios activos
         self.active_sessions = self._get_active_sessions()
         
-        # Actividad reciente
-        recent_activity = self._get_recent_activity()
-        self.real_time_data['activity'].append({
-            'timestamp': datetime.now(),
-            'value': recent_activity
-        })
+        # Actividad reciente (los niveles de retención descartan lo antiguo)
+        self.real_time_data.record('activity', self._get_recent_activity(), unit='events', category='user_activity')
+        self.real_time_data.record('active_sessions', self.active_sessions, unit='users', category='user_activity')
         
-        # Limpiar datos antiguos
-        cutoff_time = datetime.now() - timedelta(hours=24)
-        self.real_time_data['activity'] = [
-            data for data in self.real_time_data['activity']
-            if data['timestamp'] > cutoff_time
-        ]
+        shared_state.publish(ANALYTICS_CONFIG['real_time_key'], self._local_snapshot())
+    
+    def _local_snapshot(self) -> Dict[str, Any]:
+        """Resumen de las series de este proceso"""
+        activity = self.real_time_data.last_values('activity', 1)
+        return {
+            'active_sessions': self.active_sessions,
+            'recent_activity': activity[-1] if activity else 0,
+            'activity_trend': self._calculate_activity_trend(),
+            'activity_window': {
+                'last_hour': self.real_time_data.stats('activity', 3600),
+                'last_day': self.real_time_data.stats('activity', 86400)
+            },
+            'updated_at': datetime.now().isoformat()
+        }
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Último resumen publicado por el líder (o el de este proceso si todavía no hay uno)"""
+        from shared_state import shared_state
+        return shared_state.read(ANALYTICS_CONFIG['real_time_key']) or self._local_snapshot()
     
     def _get_active_sessions(self) -> int:
         """Obtiene número de sesiones activas"""
         try:
-            from models import User
-            from flask_login import current_user
-            # Simulación - en producción usar Redis para sesiones
-            return len([u for u in User.query.all() if u.last_seen and 
-                       (datetime.now() - u.last_seen).seconds < 300])
+            from presence_tracker import presence_tracker
+            # Usuarios con actividad en los últimos 5 minutos (Redis compartido o memoria del worker)
+            return presence_tracker.count_active(300)
         except:
             return 0
     
@@ -162,22 +182,25 @@ class RealTimeAnalytics:
             return 0
     
     def get_real_time_dashboard(self) -> Dict[str, Any]:
-        """Obtiene dashboard en tiempo real"""
+        """Obtiene dashboard en tiempo real (sin consultas: lee el resumen publicado)"""
+        snapshot = self.snapshot()
         return {
-            'active_sessions': self.active_sessions,
-            'recent_activity': self._get_recent_activity(),
-            'activity_trend': self._calculate_activity_trend(),
+            'active_sessions': snapshot['active_sessions'],
+            'recent_activity': snapshot['recent_activity'],
+            'activity_trend': snapshot['activity_trend'],
             'alerts': self._check_alerts(),
-            'performance_metrics': self._get_performance_metrics()
+            'performance_metrics': self._get_performance_metrics(snapshot['active_sessions']),
+            'activity_window': snapshot['activity_window'],
+            'updated_at': snapshot['updated_at']
         }
     
     def _calculate_activity_trend(self) -> str:
         """Calcula tendencia de actividad"""
-        if len(self.real_time_data['activity']) < 2:
+        values = self.real_time_data.last_values('activity', 2)
+        if len(values) < 2:
             return "stable"
         
-        recent = self.real_time_data['activity'][-1]['value']
-        previous = self.real_time_data['activity'][-2]['value']
+        previous, recent = values
         
         if recent > previous * 1.1:
             return "up"
@@ -186,26 +209,26 @@ class RealTimeAnalytics:
         return "stable"
     
     def _check_alerts(self) -> List[Dict[str, Any]]:
-        """Verifica alertas basadas en umbrales"""
-        alerts = []
-        current_activity = self._get_recent_activity()
-        
-        if current_activity > self.alert_thresholds['user_activity']:
-            alerts.append({
-                'type': 'high_activity',
-                'message': f'Actividad alta detectada: {current_activity} eventos',
-                'severity': 'warning'
-            })
+        """Alertas activas de las reglas de analytics"""
+        return [{
+            'type': alert.id.split('.', 1)[-1],
+            'message': alert.message,
+            'severity': alert.severity
+        } for alert in alert_engine.active(source='analytics')]
+    
+    def _get_performance_metrics(self, active_sessions: int) -> Dict[str, float]:
+        """Obtiene métricas de rendimiento (requests de todos los workers)"""
+        from request_metrics import request_metrics
         
-        return alerts
-    
-    def _get_performance_metrics(self) -> Dict[str, float]:
-        """Obtiene métricas de rendimiento"""
+        requests = request_metrics.summary()
         return {
-            'response_time_avg': 0.15,  # segundos
-            'error_rate': 0.02,  # 2%
-            'uptime': 99.8,  # porcentaje
-            'concurrent_users': self.active_sessions
+            'response_time_avg': requests['latency_avg'],  # segundos
+            'response_time_p95': requests['latency_p95'],
+            'error_rate': requests['error_rate'],  # respuestas 5xx / total
+            'success_rate': round(100 * (1 - requests['error_rate']), 2),  # porcentaje de respuestas sin error 5xx
+            'uptime_seconds': round(time.time() - request_metrics.started_at, 1),  # desde el inicio del proceso
+            'requests_in_flight': requests['in_flight'],
+            'concurrent_users': active_sessions
         }
 
 class PredictiveAnalytics:
@@ -219,19 +242,20 @@ class PredictiveAnalytics:
     def analyze_user_behavior(self) -> Dict[str, Any]:
         """Analiza comportamiento de usuarios"""
         try:
-            from models import User, Visit, Reservation
-            
             # Patrones de uso
             usage_patterns = self._analyze_usage_patterns()
             
+            # Características por usuario compartidas por segmentación, retención y engagement
+            features = self._user_features()
+            
             # Segmentación de usuarios
-            user_segments = self._segment_users()
+            user_segments = self._segment_users(features)
             
             # Predicción de retención
-            retention_prediction = self._predict_user_retention()
+            retention_prediction = self._predict_user_retention(features)
             
             # Análisis de engagement
-            engagement_analysis = self._analyze_engagement()
+            engagement_analysis = self._analyze_engagement(features)
             
             return {
                 'usage_patterns': usage_patterns,
@@ -246,163 +270,87 @@ class PredictiveAnalytics:
         """Analiza patrones de uso"""
         try:
             from models import Visit, Reservation
-            from datetime import datetime, timedelta
+            from services.temporal_aggregation import weekday_hour_heatmap, heatmap_summary
             
             # Últimos 30 días
-            end_date = datetime.now()
+            end_date = datetime.utcnow()
             start_date = end_date - timedelta(days=30)
             
-            # Visitas por día de la semana
-            visits_by_day = defaultdict(int)
-            reservations_by_day = defaultdict(int)
-            
-            visits = Visit.query.filter(
-                Visit.created_at >= start_date,
-                Visit.created_at <= end_date
-            ).all()
-            
-            for visit in visits:
-                day = visit.created_at.strftime('%A')
-                visits_by_day[day] += 1
-            
-            # Horas pico
-            visits_by_hour = defaultdict(int)
-            for visit in visits:
-                hour = visit.created_at.hour
-                visits_by_hour[hour] += 1
+            # Mapas de calor día de la semana × hora agrupados en la base de datos
+            visits_heatmap = weekday_hour_heatmap(Visit.created_at, start_date, end_date)
+            reservations_heatmap = weekday_hour_heatmap(Reservation.start_time, start_date, end_date)
             
-            peak_hours = sorted(visits_by_hour.items(), key=lambda x: x[1], reverse=True)[:3]
+            visits = heatmap_summary(visits_heatmap)
+            reservations = heatmap_summary(reservations_heatmap)
             
             return {
-                'visits_by_day': dict(visits_by_day),
-                'peak_hours': [{'hour': h, 'count': c} for h, c in peak_hours],
-                'total_visits': len(visits),
-                'avg_visits_per_day': len(visits) / 30
+                'visits_by_day': visits['by_day'],
+                'reservations_by_day': reservations['by_day'],
+                'peak_hours': visits['peak_hours'],
+                'visits_heatmap': [[int(count) for count in row] for row in visits_heatmap],
+                'total_visits': int(visits['total']),
+                'avg_visits_per_day': visits['total'] / 30
             }
         except:
             return {}
     
-    def _segment_users(self) -> List[UserSegment]:
-        """Segmenta usuarios por comportamiento"""
+    def _user_features(self):
+        """Características por usuario (una consulta agrupada por métrica)"""
+        from services.user_segmentation import load_user_features
+        return load_user_features()
+    
+    def _segment_users(self, features=None) -> List[UserSegment]:
+        """Segmenta usuarios por recencia, frecuencia, gasto y carga de mantenimiento"""
         try:
-            from models import User, Visit, Reservation
-            
-            users = User.query.all()
-            segments = []
-            
-            # Usuarios activos (últimos 7 días)
-            active_users = []
-            inactive_users = []
-            
-            for user in users:
-                recent_visits = Visit.query.filter(
-                    Visit.user_id == user.id,
-                    Visit.created_at >= datetime.now() - timedelta(days=7)
-                ).count()
-                
-                if recent_visits > 0:
-                    active_users.append(user)
-                else:
-                    inactive_users.append(user)
-            
-            # Crear segmentos
-            if active_users:
-                segments.append(UserSegment(
-                    name="Usuarios Activos",
-                    criteria={'activity_days': 'last_7_days'},
-                    user_count=len(active_users),
-                    percentage=len(active_users) / len(users) * 100,
-                    avg_activity=sum(1 for u in active_users) / len(active_users),
-                    avg_spending=0,  # Implementar cálculo de gastos
-                    engagement_score=0.8
-                ))
+            from services.user_segmentation import summarize_segments
             
-            if inactive_users:
-                segments.append(UserSegment(
-                    name="Usuarios Inactivos",
-                    criteria={'activity_days': 'no_activity_7_days'},
-                    user_count=len(inactive_users),
-                    percentage=len(inactive_users) / len(users) * 100,
-                    avg_activity=0,
-                    avg_spending=0,
-                    engagement_score=0.2
-                ))
-            
-            return segments
+            return [UserSegment(**segment) for segment in summarize_segments(features if features is not None else self._user_features())]
         except:
             return []
     
-    def _predict_user_retention(self) -> Dict[str, float]:
-        """Predice retención de usuarios"""
+    def _predict_user_retention(self, features=None) -> Dict[str, float]:
+        """Predice retención de usuarios a partir de la matriz de cohortes"""
         try:
-            from models import User, Visit
-            from datetime import datetime, timedelta
+            from services.cohort_engine import cohort_engine
             
-            # Análisis de cohortes
-            cohorts = {}
-            current_date = datetime.now()
+            # Retención al primer mes de cada cohorte completa (de la más antigua a la más reciente)
+            cohorts = list(cohort_engine.period_retention(1).values())
             
-            for i in range(4):  # Últimos 4 meses
-                cohort_date = current_date - timedelta(days=30*i)
-                cohort_users = User.query.filter(
-                    User.created_at >= cohort_date - timedelta(days=30),
-                    User.created_at < cohort_date
-                ).all()
-                
-                retention_rates = []
-                for user in cohort_users:
-                    # Verificar si el usuario sigue activo
-                    recent_activity = Visit.query.filter(
-                        Visit.user_id == user.id,
-                        Visit.created_at >= current_date - timedelta(days=30)
-                    ).count()
-                    
-                    retention_rates.append(1 if recent_activity > 0 else 0)
-                
-                if retention_rates:
-                    cohorts[f'month_{i+1}'] = sum(retention_rates) / len(retention_rates)
-            
-            # Predicción simple basada en tendencia
+            # Predicción simple basada en tendencia entre cohortes
             if len(cohorts) >= 2:
-                recent_retention = list(cohorts.values())[0]
-                trend = (list(cohorts.values())[0] - list(cohorts.values())[1]) / 30
-                predicted_retention = recent_retention + (trend * 30)
+                trend = cohorts[-1] - cohorts[-2]
+                predicted_retention = cohorts[-1] + trend
             else:
                 predicted_retention = 0.7  # Valor por defecto
             
+            current_retention = cohorts[-1] if cohorts else 0.7
             return {
-                'current_retention': list(cohorts.values())[0] if cohorts else 0.7,
+                'current_retention': current_retention,
                 'predicted_retention_30_days': max(0, min(1, predicted_retention)),
-                'retention_trend': 'stable'
+                'retention_trend': 'up' if predicted_retention > current_retention else
+                                   'down' if predicted_retention < current_retention else 'stable'
             }
         except:
             return {'current_retention': 0.7, 'predicted_retention_30_days': 0.65, 'retention_trend': 'stable'}
     
-    def _analyze_engagement(self) -> Dict[str, Any]:
+    def _analyze_engagement(self, features=None) -> Dict[str, Any]:
         """Analiza engagement de usuarios"""
         try:
-            from models import User, Visit, Reservation, SecurityReport
-            
-            # Métricas de engagement
-            total_users = User.query.count()
-            active_users_7d = Visit.query.filter(
-                Visit.created_at >= datetime.now() - timedelta(days=7)
-            ).distinct(Visit.user_id).count()
+            from services.user_segmentation import activity_summary
             
-            active_users_30d = Visit.query.filter(
-                Visit.created_at >= datetime.now() - timedelta(days=30)
-            ).distinct(Visit.user_id).count()
+            summary = activity_summary(features if features is not None else self._user_features())
+            total_users = summary['total_users']
             
             # Engagement score
-            engagement_score = (active_users_7d / total_users) * 100 if total_users > 0 else 0
+            engagement_score = (summary['active_users_7d'] / total_users) * 100 if total_users > 0 else 0
             
             # Actividades por usuario
-            avg_activities_per_user = Visit.query.count() / total_users if total_users > 0 else 0
+            avg_activities_per_user = summary['total_visits'] / total_users if total_users > 0 else 0
             
             return {
                 'engagement_score': engagement_score,
-                'active_users_7d': active_users_7d,
-                'active_users_30d': active_users_30d,
+                'active_users_7d': summary['active_users_7d'],
+                'active_users_30d': summary['active_users_30d'],
                 'avg_activities_per_user': avg_activities_per_user,
                 'engagement_level': 'high' if engagement_score > 50 else 'medium' if engagement_score > 25 else 'low'
             }
@@ -416,29 +364,42 @@ class PredictiveAnalytics:
             }
     
     def predict_maintenance_needs(self) -> List[PredictiveInsight]:
-        """Predice necesidades de mantenimiento"""
+        """Predice necesidades de mantenimiento (total y por categoría)"""
         try:
             from models import Maintenance
+            from services.forecasting import monthly_forecasts, forecast_confidence, top_movers
             
-            # Análisis de patrones de mantenimiento
-            maintenance_records = Maintenance.query.all()
+            # Series mensuales del total y de cada categoría pronosticadas en una pasada
+            forecasts = monthly_forecasts('maintenance_by_category', Maintenance.created_at, key=Maintenance.category)
+            total = forecasts['total']
             
             insights = []
             
-            # Predicción basada en frecuencia histórica
-            if maintenance_records:
-                avg_frequency = len(maintenance_records) / 12  # por mes
-                predicted_next_month = avg_frequency * 1.1  # 10% de crecimiento
+            if total and total['average'] > 0:
+                factors = ["Crecimiento de usuarios", "Envejecimiento de infraestructura"]
+                if total['anomaly']:
+                    factors.append("Volumen del último mes fuera de lo habitual")
                 
                 insights.append(PredictiveInsight(
                     metric="Mantenimientos Mensuales",
-                    current_value=len([m for m in maintenance_records 
-                                     if m.created_at >= datetime.now() - timedelta(days=30)]),
-                    predicted_value=predicted_next_month,
-                    confidence=0.75,
-                    trend="up",
-                    factors=["Crecimiento de usuarios", "Envejecimiento de infraestructura"],
-                    recommendation="Aumentar capacidad de mantenimiento en 15%"
+                    current_value=total['current'],
+                    predicted_value=total['forecast'][0],
+                    confidence=forecast_confidence(total),
+                    trend=total['trend'],
+                    factors=factors,
+                    recommendation="Aumentar capacidad de mantenimiento en 15%" if total['trend'] == 'up'
+                    else "Mantener la capacidad de mantenimiento actual"
+                ))
+            
+            for category, forecast in top_movers(forecasts['by_key']):
+                insights.append(PredictiveInsight(
+                    metric=f"Mantenimientos: {category or 'Sin categoría'}",
+                    current_value=forecast['current'],
+                    predicted_value=forecast['forecast'][0],
+                    confidence=forecast_confidence(forecast),
+                    trend=forecast['trend'],
+                    factors=["Valor del último mes fuera de la banda esperada"] if forecast['anomaly'] else ["Tendencia creciente"],
+                    recommendation=f"Planificar recursos para {category or 'solicitudes sin categoría'}"
                 ))
             
             return insights
@@ -449,36 +410,59 @@ class PredictiveAnalytics:
         """Predice tendencias financieras"""
         try:
             from models import Expense
+            from services.forecasting import monthly_forecasts, forecast_confidence
             
-            # Análisis de gastos
-            expenses = Expense.query.all()
+            # Gastos por mes (SUM agrupado en la base de datos) y por estado de pago
+            forecasts = monthly_forecasts('expenses_by_status', Expense.created_at, key=Expense.status,
+                                          value=Expense.amount, agg='sum')
+            total = forecasts['total']
             
             insights = []
             
-            if expenses:
-                # Análisis de gastos por categoría
-                expenses_by_category = defaultdict(float)
-                for expense in expenses:
-                    if expense.category:
-                        expenses_by_category[expense.category] += expense.amount
-                
-                # Predicción de gastos futuros
-                avg_monthly_expense = sum(expenses_by_category.values()) / 12
-                predicted_next_month = avg_monthly_expense * 1.05  # 5% de crecimiento
+            if total and total['average'] > 0:
+                factors = ["Inflación", "Crecimiento de servicios"]
+                overdue = forecasts['by_key'].get('overdue')
+                if overdue and overdue['trend'] == 'up':
+                    factors.append("Aumento de gastos vencidos")
+                if total['anomaly']:
+                    factors.append("Gasto del último mes fuera de lo habitual")
                 
                 insights.append(PredictiveInsight(
                     metric="Gastos Mensuales",
-                    current_value=avg_monthly_expense,
-                    predicted_value=predicted_next_month,
-                    confidence=0.8,
-                    trend="up",
-                    factors=["Inflación", "Crecimiento de servicios"],
+                    current_value=total['average'],
+                    predicted_value=total['forecast'][0],
+                    confidence=forecast_confidence(total),
+                    trend=total['trend'],
+                    factors=factors,
                     recommendation="Revisar presupuesto y optimizar gastos operativos"
                 ))
             
             return insights
         except:
             return []
+    
+    def predict_reservation_demand(self) -> List[PredictiveInsight]:
+        """Predice la demanda mensual de cada espacio común"""
+        try:
+            from models import Reservation
+            from services.forecasting import monthly_forecasts, forecast_confidence
+            
+            forecasts = monthly_forecasts('reservations_by_space', Reservation.start_time, key=Reservation.space_type)
+            
+            return [
+                PredictiveInsight(
+                    metric=f"Reservas: {space}",
+                    current_value=forecast['current'],
+                    predicted_value=forecast['forecast'][0],
+                    confidence=forecast_confidence(forecast),
+                    trend=forecast['trend'],
+                    factors=["Estacionalidad"] + (["Demanda del último mes fuera de lo habitual"] if forecast['anomaly'] else []),
+                    recommendation="Ampliar horarios disponibles" if forecast['trend'] == 'up' else "Sin cambios de disponibilidad"
+                )
+                for space, forecast in forecasts['by_key'].items() if forecast['average'] > 0
+            ]
+        except:
+            return []
 
 class BusinessIntelligence:
     """Sistema de Business Intelligence"""
@@ -535,73 +519,26 @@ class BusinessIntelligence:
         }
     
     def update_kpis(self):
-        """Actualiza todos los KPIs"""
+        """Actualiza todos los KPIs desde el motor incremental (sin consultar la base de datos)"""
         try:
-            from models import User, SecurityReport, Maintenance, Expense
-            
-            # KPI: Crecimiento de usuarios
-            total_users = User.query.count()
-            new_users_this_month = User.query.filter(
-                User.created_at >= datetime.now() - timedelta(days=30)
-            ).count()
-            
-            self.kpis['user_growth'].current_value = total_users
-            self.kpis['user_growth'].progress_percentage = min(100, (total_users / 100) * 100)
-            self.kpis['user_growth'].status = "on_track" if total_users >= 80 else "at_risk"
-            
-            # KPI: Engagement de usuarios
-            active_users = Visit.query.filter(
-                Visit.created_at >= datetime.now() - timedelta(days=7)
-            ).distinct(Visit.user_id).count()
-            
-            engagement_rate = (active_users / total_users * 100) if total_users > 0 else 0
-            self.kpis['user_engagement'].current_value = engagement_rate
-            self.kpis['user_engagement'].progress_percentage = min(100, (engagement_rate / 70) * 100)
-            self.kpis['user_engagement'].status = "on_track" if engagement_rate >= 50 else "at_risk"
-            
-            # KPI: Incidentes de seguridad
-            security_incidents = SecurityReport.query.filter(
-                SecurityReport.created_at >= datetime.now() - timedelta(days=30)
-            ).count()
-            
-            self.kpis['security_incidents'].current_value = security_incidents
-            self.kpis['security_incidents'].progress_percentage = max(0, 100 - (security_incidents / 5) * 100)
-            self.kpis['security_incidents'].status = "on_track" if security_incidents <= 3 else "at_risk"
-            
-            # KPI: Eficiencia de mantenimiento
-            completed_maintenance = Maintenance.query.filter(
-                Maintenance.status == 'completed',
-                Maintenance.created_at >= datetime.now() - timedelta(days=30)
-            ).count()
-            
-            total_maintenance = Maintenance.query.filter(
-                Maintenance.created_at >= datetime.now() - timedelta(days=30)
-            ).count()
-            
-            efficiency_rate = (completed_maintenance / total_maintenance * 100) if total_maintenance > 0 else 100
-            self.kpis['maintenance_efficiency'].current_value = efficiency_rate
-            self.kpis['maintenance_efficiency'].progress_percentage = min(100, (efficiency_rate / 90) * 100)
-            self.kpis['maintenance_efficiency'].status = "on_track" if efficiency_rate >= 80 else "at_risk"
-            
-            # KPI: Salud financiera
-            total_expenses = sum(expense.amount for expense in Expense.query.all())
-            # Simulación de ingresos (en producción calcular real)
-            estimated_income = total_users * 50  # $50 por usuario
-            financial_health = ((estimated_income - total_expenses) / estimated_income * 100) if estimated_income > 0 else 0
-            
-            self.kpis['financial_health'].current_value = financial_health
-            self.kpis['financial_health'].progress_percentage = min(100, (financial_health / 85) * 100)
-            self.kpis['financial_health'].status = "on_track" if financial_health >= 70 else "at_risk"
-            
-            # Actualizar timestamps
-            for kpi in self.kpis.values():
-                kpi.last_updated = datetime.now()
+            from services.kpi_engine import kpi_engine
+            
+            for name, values in kpi_engine.values().items():
+                kpi = self.kpis.get(name)
+                if kpi is None:
+                    continue
+                kpi.current_value = values['current_value']
+                kpi.progress_percentage = values['progress_percentage']
+                kpi.status = values['status']
+                kpi.last_updated = values['last_updated'] or datetime.now()
                 
         except Exception as e:
             print(f"Error actualizando KPIs: {e}")
     
     def generate_executive_report(self) -> Dict[str, Any]:
         """Genera reporte ejecutivo"""
+        from services.kpi_engine import kpi_engine
+        
         self.update_kpis()
         
         return {
@@ -613,6 +550,7 @@ class BusinessIntelligence:
                 'financial_health': self.kpis['financial_health'].current_value
             },
             'kpis': {name: asdict(kpi) for name, kpi in self.kpis.items()},
+            'history': kpi_engine.get_history(),
             'trends': self._analyze_trends(),
             'recommendations': self._generate_recommendations(),
             'generated_at': datetime.now().isoformat()
@@ -662,17 +600,6 @@ class AnalyticsManager:
         self.real_time_analytics = RealTimeAnalytics()
         self.predictive_analytics = PredictiveAnalytics()
         self.business_intelligence = BusinessIntelligence()
-        self.data_exporters = {}
-        self._initialize_exporters()
-    
-    def _initialize_exporters(self):
-        """Inicializa exportadores de datos"""
-        self.data_exporters = {
-            'csv': self._export_to_csv,
-            'json': self._export_to_json,
-            'excel': self._export_to_excel,
-            'pdf': self._export_to_pdf
-        }
     
     def get_comprehensive_dashboard(self) -> Dict[str, Any]:
         """Obtiene dashboard completo de analytics"""
@@ -681,7 +608,8 @@ class AnalyticsManager:
             'user_behavior': self.predictive_analytics.analyze_user_behavior(),
             'predictive_insights': {
                 'maintenance': self.predictive_analytics.predict_maintenance_needs(),
-                'financial': self.predictive_analytics.predict_financial_trends()
+                'financial': self.predictive_analytics.predict_financial_trends(),
+                'reservations': self.predictive_analytics.predict_reservation_demand()
             },
             'business_intelligence': self.business_intelligence.generate_executive_report(),
             'performance_metrics': self._get_performance_metrics()
@@ -689,48 +617,61 @@ class AnalyticsManager:
     
     def _get_performance_metrics(self) -> Dict[str, Any]:
         """Obtiene métricas de rendimiento del sistema"""
+        from request_metrics import request_metrics
+        from services.result_cache import result_cache
+        
+        requests = request_metrics.summary()
+        lookups = result_cache.stats['hits'] + result_cache.stats['misses']
         return {
-            'system_uptime': 99.8,
-            'avg_response_time': 0.15,
-            'error_rate': 0.02,
-            'database_performance': 'excellent',
-            'cache_hit_rate': 0.85,
-            'active_connections': self.real_time_analytics.active_sessions
+            'success_rate': round(100 * (1 - requests['error_rate']), 2),
+            'uptime_seconds': round(time.time() - request_metrics.started_at, 1),
+            'avg_response_time': requests['latency_avg'],
+            'p95_response_time': requests['latency_p95'],
+            'error_rate': requests['error_rate'],
+            'total_requests': requests['requests'],
+            'cache_hit_rate': result_cache.stats['hits'] / lookups if lookups else 0.0,
+            'active_connections': self.real_time_analytics.snapshot()['active_sessions']
         }
     
-    def export_data(self, data_type: str, format: str, filters: Dict[str, Any] = None) -> str:
-        """Exporta datos en diferentes formatos"""
-        try:
-            if format in self.data_exporters:
-                return self.data_exporters[format](data_type, filters)
-            else:
-                return f"Formato {format} no soportado"
-        except Exception as e:
-            return f"Error exportando datos: {e}"
-    
-    def _export_to_csv(self, data_type: str, filters: Dict[str, Any] = None) -> str:
-        """Exporta datos a CSV"""
-        filename = f"analytics_{data_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        # Implementar exportación real
-        return f"Archivo CSV generado: {filename}"
-    
-    def _export_to_json(self, data_type: str, filters: Dict[str, Any] = None) -> str:
-        """Exporta datos a JSON"""
-        filename = f"analytics_{data_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        # Implementar exportación real
-        return f"Archivo JSON generado: {filename}"
-    
-    def _export_to_excel(self, data_type: str, filters: Dict[str, Any] = None) -> str:
-        """Exporta datos a Excel"""
-        filename = f"analytics_{data_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        # Implementar exportación real
-        return f"Archivo Excel generado: {filename}"
-    
-    def _export_to_pdf(self, data_type: str, filters: Dict[str, Any] = None) -> str:
-        """Exporta datos a PDF"""
-        filename = f"analytics_{data_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        # Implementar exportación real
-        return f"Archivo PDF generado: {filename}"
+    def export_data(self, data_type: str, format: str, filters: Dict[str, Any] = None,
+                    compress: bool = False, requested_by: int = None, force_async: bool = False):
+        """
+        Exporta datos en streaming mediante el motor de exportación.
+        data_type es un conjunto de export_engine.EXPORT_DATASETS; format: csv, json/ndjson o excel/xlsx.
+        """
+        from export_engine import export_engine
+        return export_engine.export(data_type, format, filters, compress=compress,
+                                    requested_by=requested_by, force_async=force_async)
+
+    def monthly_report(self, table_name: str, group_by: str = None, months: List[str] = None,
+                       source: str = 'live') -> Dict[str, Any]:
+        """
+        Filas por mes (y por columna) de una tabla de actividad.
+        group_by debe ser una de las columnas de analytics_snapshots.REPORT_GROUP_COLUMNS de la tabla.
+        source='snapshot' lee los archivos Parquet de analytics_snapshots en lugar de la base transaccional.
+        """
+        from analytics_snapshots import SNAPSHOT_TABLES, snapshot_manager, validate_group_by
+        
+        if table_name not in SNAPSHOT_TABLES:
+            raise ValueError(f'Tabla no soportada: {table_name}')
+        validate_group_by(table_name, group_by)
+        
+        if source == 'snapshot':
+            rows = snapshot_manager.monthly_counts(table_name, group_by, months)
+        else:
+            from services.temporal_aggregation import aggregate, parse_bucket
+            
+            model, date_column, _ = SNAPSHOT_TABLES[table_name]
+            keys = [model.__table__.columns[group_by]] if group_by else []
+            rows = []
+            for row in aggregate(getattr(model, date_column), ['month'], keys=keys):
+                month = parse_bucket(row[0]).strftime('%Y-%m')
+                if months and month not in months:
+                    continue
+                rows.append({'month': month, **({group_by: row[1]} if group_by else {}), 'count': int(row[-1])})
+            rows.sort(key=lambda item: (item['month'], str(item.get(group_by))))
+        
+        return {'table': table_name, 'group_by': group_by, 'source': source, 'rows': rows}
 
 # Instancia global
 analytics_manager = AnalyticsManager()
@@ -743,7 +684,25 @@ def init_analytics_engine(app):
         print("⚠️ numpy no disponible - motor de analytics deshabilitado")
         return
     
+    # Recalculo completo programado de los KPIs incrementales
+    from services.kpi_engine import kpi_engine
+    kpi_engine.start_scheduler(app)
+    
+    from services.cohort_engine import cohort_engine
+    cohort_engine.start_scheduler(app)
+    
+    # Resultados por intervalo de 5 minutos, precalculados antes de cada cambio de intervalo
+    from services.result_cache import cached_endpoint, result_cache, RESULT_CACHE_CONFIG
+    RESULT_CACHE_CONFIG['bucket_seconds'] = app.config.get('ANALYTICS_CACHE_SECONDS', RESULT_CACHE_CONFIG['bucket_seconds'])
+    result_cache.start_precompute(app)
+    
+    def admin_required():
+        if not current_user.can_access_admin():
+            return {'success': False, 'error': 'Permisos insuficientes'}, 403
+        return None
+    
     @app.route('/api/v1/analytics/dashboard', methods=['GET'])
+    @cached_endpoint('analytics_dashboard')
     def get_analytics_dashboard():
         """Obtiene dashboard completo de analytics"""
         try:
@@ -762,6 +721,7 @@ def init_analytics_engine(app):
             return {'success': False, 'error': str(e)}, 500
     
     @app.route('/api/v1/analytics/user-behavior', methods=['GET'])
+    @cached_endpoint('analytics_user_behavior')
     def get_user_behavior_analytics():
         """Obtiene análisis de comportamiento de usuarios"""
         try:
@@ -771,18 +731,21 @@ def init_analytics_engine(app):
             return {'success': False, 'error': str(e)}, 500
     
     @app.route('/api/v1/analytics/predictive', methods=['GET'])
+    @cached_endpoint('analytics_predictive')
     def get_predictive_analytics():
         """Obtiene insights predictivos"""
         try:
             predictive_data = {
                 'maintenance': analytics_manager.predictive_analytics.predict_maintenance_needs(),
-                'financial': analytics_manager.predictive_analytics.predict_financial_trends()
+                'financial': analytics_manager.predictive_analytics.predict_financial_trends(),
+                'reservations': analytics_manager.predictive_analytics.predict_reservation_demand()
             }
             return {'success': True, 'data': predictive_data}
         except Exception as e:
             return {'success': False, 'error': str(e)}, 500
     
     @app.route('/api/v1/analytics/business-intelligence', methods=['GET'])
+    @cached_endpoint('analytics_business_intelligence')
     def get_business_intelligence():
         """Obtiene reporte de business intelligence"""
         try:
@@ -795,17 +758,25 @@ def init_analytics_engine(app):
     def export_analytics_data():
         """Exporta datos de analytics"""
         try:
-            data = request.get_json()
-            data_type = data.get('data_type', 'dashboard')
-            export_format = data.get('format', 'json')
-            filters = data.get('filters', {})
-            
-            result = analytics_manager.export_data(data_type, export_format, filters)
-            return {'success': True, 'data': result}
+            if not current_user.is_authenticated or not current_user.can_access_admin():
+                return {'success': False, 'error': 'Permisos insuficientes'}, 403
+            
+            from export_engine import export_request_options
+            data = request.get_json(silent=True) or {}
+            options = export_request_options()
+            data_type = data.get('data_type', 'users')
+            
+            return analytics_manager.export_data(data_type, options['fmt'], options['filters'],
+                                                 compress=options['compress'],
+                                                 requested_by=current_user.id,
+                                                 force_async=options['force_async'])
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}, 400
         except Exception as e:
             return {'success': False, 'error': str(e)}, 500
     
     @app.route('/api/v1/analytics/kpis', methods=['GET'])
+    @cached_endpoint('analytics_kpis')
     def get_kpis():
         """Obtiene KPIs actualizados"""
         try:
@@ -815,7 +786,56 @@ def init_analytics_engine(app):
         except Exception as e:
             return {'success': False, 'error': str(e)}, 500
     
+    @app.route('/api/v1/analytics/kpis/history', methods=['GET'])
+    @login_required
+    def get_kpi_history():
+        """Obtiene el historial de valores de los KPIs"""
+        denied = admin_required()
+        if denied:
+            return denied
+        try:
+            kpi_engine.ensure_loaded()
+            return {'success': True, 'data': kpi_engine.get_history(request.args.get('kpi'))}
+        except KeyError:
+            return {'success': False, 'error': 'KPI no encontrado'}, 404
+        except Exception as e:
+            return {'success': False, 'error': str(e)}, 500
+    
+    @app.route('/api/v1/analytics/cohorts', methods=['GET'])
+    @login_required
+    def get_cohort_heatmap():
+        """Obtiene el mapa de calor de retención por cohorte mensual"""
+        denied = admin_required()
+        if denied:
+            return denied
+        try:
+            months = min(max(request.args.get('months', 12, type=int), 1), 36)
+            return {'success': True, 'data': cohort_engine.heatmap(months)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}, 500
+    
+    @app.route('/api/v1/analytics/reports/<table_name>', methods=['GET'])
+    @login_required
+    def get_monthly_report(table_name):
+        """Reporte mensual desde la base o desde los snapshots Parquet (?source=snapshot)"""
+        denied = admin_required()
+        if denied:
+            return denied
+        try:
+            source = request.args.get('source', app.config.get('ANALYTICS_REPORT_SOURCE', 'live'))
+            months = request.args.get('months')
+            report = analytics_manager.monthly_report(table_name, request.args.get('group_by'),
+                                                      months.split(',') if months else None, source)
+            return {'success': True, 'data': report}
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}, 400
+        except LookupError as e:
+            return {'success': False, 'error': str(e)}, 404
+        except Exception as e:
+            return {'success': False, 'error': str(e)}, 500
+    
     @app.route('/api/v1/analytics/segments', methods=['GET'])
+    @cached_endpoint('analytics_segments')
     def get_user_segments():
         """Obtiene segmentos de usuarios"""
         try:
@@ -833,4 +853,7 @@ def init_analytics_engine(app):
     print("   - GET /api/v1/analytics/business-intelligence")
     print("   - POST /api/v1/analytics/export")
     print("   - GET /api/v1/analytics/kpis")
+    print("   - GET /api/v1/analytics/kpis/history")
+    print("   - GET /api/v1/analytics/cohorts")
+    print("   - GET /api/v1/analytics/reports/<table>")
     print("   - GET /api/v1/analytics/segments")
@@ -0,0 +1,339 @@
+"""
+Snapshots Analíticos
+Copia nocturna (o a pedido) de las tablas de actividad a archivos Parquet
+particionados por mes (<directorio>/<tabla>/month=YYYY-MM/part-0.parquet). Las
+filas se leen por bloques con yield_per y cada ejecución agrega solo las
+particiones de meses completos que aún no existen. Los reportes pesados pueden
+leer estos archivos con pyarrow (o DuckDB si está instalado) sin tocar la base
+transaccional.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, date
+from typing import Any, Dict, List
+
+from flask import jsonify, request
+from flask_login import login_required, current_user
+from sqlalchemy import select
+
+from models import db, Visit, Reservation, Maintenance, Expense, SecurityReport, Notification
+from optional_dependencies import safe_import
+
+logger = logging.getLogger(__name__)
+
+# Configuración de snapshots
+SNAPSHOT_CONFIG = {
+    'directory': os.path.join('instance', 'analytics_snapshots'),
+    'chunk_size': 5000,
+    'compression': 'snappy',
+    'run_at': '02:30',        # Antes de la retención diaria, que archiva filas antiguas
+    'partition_column': 'month'
+}
+
+# Tablas incluidas: nombre → (modelo, columna de fecha de partición, columnas excluidas)
+SNAPSHOT_TABLES = {
+    'visits': (Visit, 'created_at', ('qr_code',)),
+    'reservations': (Reservation, 'created_at', ()),
+    'maintenance': (Maintenance, 'created_at', ('photo_paths', 'ai_classification', 'ai_suggestions')),
+    'expenses': (Expense, 'created_at', ()),
+    'security_reports': (SecurityReport, 'created_at', ()),
+    'notifications': (Notification, 'created_at', ())
+}
+
+# Columnas por las que se pueden agrupar los reportes mensuales: solo categorías de baja cardinalidad,
+# nunca datos personales (nombres, documentos, teléfonos, patentes, códigos QR)
+REPORT_GROUP_COLUMNS = {
+    'visits': ('status', 'notify_security', 'security_notified'),
+    'reservations': ('status', 'space_type'),
+    'maintenance': ('status', 'category', 'priority', 'assigned_area', 'urgent_access'),
+    'expenses': ('status', 'payment_method', 'notification_sent', 'notification_method'),
+    'security_reports': ('status', 'incident_type', 'severity', 'anonymous'),
+    'notifications': ('type', 'category', 'is_read', 'is_sent')
+}
+
+
+def validate_group_by(table_name: str, key: str = None):
+    """ValueError si la columna no está habilitada para agrupar reportes de la tabla"""
+    if key is not None and key not in REPORT_GROUP_COLUMNS.get(table_name, ()):
+        raise ValueError(f'Columna no disponible para agrupar {table_name}: {key}')
+
+
+def get_pyarrow():
+    """Módulos de pyarrow necesarios o None si no está instalado"""
+    pyarrow = safe_import('pyarrow')
+    if pyarrow is None:
+        return None
+    import pyarrow.parquet
+    import pyarrow.dataset
+    return pyarrow
+
+
+def _arrow_type(pa, column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return pa.string()
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is datetime:
+        return pa.timestamp('us')
+    if python_type is date:
+        return pa.date32()
+    return pa.string()
+
+
+class SnapshotManager:
+    """Escritura de particiones mensuales y lectura columnar"""
+
+    def __init__(self):
+        self.app = None
+        self.lock = threading.Lock()
+        self.is_running = False
+        self.last_run = None
+
+    def init_app(self, app):
+        """Inicializar con la aplicación Flask"""
+        self.app = app
+        directory = app.config.get('ANALYTICS_SNAPSHOT_DIR')
+        if directory is None and not os.path.isabs(SNAPSHOT_CONFIG['directory']):
+            directory = os.path.join(app.instance_path, 'analytics_snapshots')
+        SNAPSHOT_CONFIG['directory'] = directory or SNAPSHOT_CONFIG['directory']
+        for key in ('chunk_size', 'run_at'):
+            SNAPSHOT_CONFIG[key] = app.config.get(f'ANALYTICS_SNAPSHOT_{key.upper()}', SNAPSHOT_CONFIG[key])
+
+    @property
+    def available(self) -> bool:
+        return get_pyarrow() is not None
+
+    # Particiones
+
+    def table_path(self, table_name: str) -> str:
+        return os.path.join(SNAPSHOT_CONFIG['directory'], table_name)
+
+    def partition_path(self, table_name: str, month: str) -> str:
+        return os.path.join(self.table_path(table_name), f"{SNAPSHOT_CONFIG['partition_column']}={month}")
+
+    def existing_partitions(self, table_name: str) -> List[str]:
+        """Meses ya escritos (los directorios temporales empiezan con punto y se ignoran)"""
+        path = self.table_path(table_name)
+        prefix = f"{SNAPSHOT_CONFIG['partition_column']}="
+        if not os.path.isdir(path):
+            return []
+        return sorted(name[len(prefix):] for name in os.listdir(path) if name.startswith(prefix))
+
+    def pending_partitions(self, table_name: str, now: datetime = None) -> Dict[str, int]:
+        """Meses completos con filas y sin partición: {YYYY-MM: filas}"""
+        from services.temporal_aggregation import aggregate, parse_bucket, truncate
+
+        model, date_column, _ = SNAPSHOT_TABLES[table_name]
+        current_month = truncate(now or datetime.utcnow(), 'month')
+        existing = set(self.existing_partitions(table_name))
+        months = {parse_bucket(bucket).strftime('%Y-%m'): int(count)
+                  for bucket, count in aggregate(getattr(model, date_column), ['month'], end=current_month)}
+        return {month: count for month, count in sorted(months.items()) if month not in existing}
+
+    def _columns(self, table_name: str):
+        model, _, excluded = SNAPSHOT_TABLES[table_name]
+        return [column for column in model.__table__.columns if column.name not in excluded]
+
+    def schema(self, table_name: str):
+        pa = get_pyarrow()
+        return pa.schema([pa.field(column.name, _arrow_type(pa, column)) for column in self._columns(table_name)])
+
+    def write_partition(self, table_name: str, month: str, on_rows=None) -> int:
+        """Escribir un mes por bloques en un directorio temporal y publicarlo con un renombrado atómico"""
+        pa = get_pyarrow()
+        model, date_column, _ = SNAPSHOT_TABLES[table_name]
+        columns = self._columns(table_name)
+        schema = self.schema(table_name)
+        moment = getattr(model, date_column)
+        start = datetime.strptime(month, '%Y-%m')
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+
+        final_path = self.partition_path(table_name, month)
+        temp_path = os.path.join(self.table_path(table_name), f'.{os.path.basename(final_path)}.tmp')
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+
+        statement = (select(*columns).where(moment >= start, moment < end).order_by(moment)
+                     .execution_options(yield_per=SNAPSHOT_CONFIG['chunk_size']))
+        written = 0
+        writer = pa.parquet.ParquetWriter(os.path.join(temp_path, 'part-0.parquet'), schema,
+                                          compression=SNAPSHOT_CONFIG['compression'])
+        try:
+            for chunk in db.session.execute(statement).partitions():
+                data = {column.name: [row[index] for row in chunk] for index, column in enumerate(columns)}
+                for field in schema:
+                    if pa.types.is_string(field.type):
+                        data[field.name] = [None if value is None else str(value) for value in data[field.name]]
+                writer.write_table(pa.Table.from_pydict(data, schema=schema))
+                written += len(chunk)
+                if on_rows is not None:
+                    on_rows(len(chunk))
+        finally:
+            writer.close()
+
+        shutil.rmtree(final_path, ignore_errors=True)
+        os.replace(temp_path, final_path)
+        return written
+
+    def run(self, job=None, tables: List[str] = None, now: datetime = None) -> Dict[str, Any]:
+        """Agregar las particiones nuevas de cada tabla"""
+        if not self.available:
+            raise RuntimeError('Snapshots no disponibles (pyarrow no instalado)')
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError('Ya hay una ejecución de snapshots en curso')
+
+        try:
+            names = [name for name in (tables or SNAPSHOT_TABLES) if name in SNAPSHOT_TABLES]
+            pending = {name: self.pending_partitions(name, now) for name in names}
+            processed = 0
+            if job is not None:
+                job.update_progress(0, sum(sum(months.values()) for months in pending.values()))
+
+            def on_rows(count):
+                nonlocal processed
+                processed += count
+                if job is not None:
+                    job.update_progress(processed)
+
+            results = {}
+            for name, months in pending.items():
+                started = time.time()
+                os.makedirs(self.table_path(name), exist_ok=True)
+                rows = sum(self.write_partition(name, month, on_rows) for month in months)
+                db.session.expire_all()
+                results[name] = {
+                    'partitions_added': list(months),
+                    'rows': rows,
+                    'duration_seconds': round(time.time() - started, 2)
+                }
+
+            self.last_run = {'finished_at': datetime.utcnow().isoformat(), 'results': results}
+            logger.info(f'Snapshots analíticos: {sum(len(r["partitions_added"]) for r in results.values())} particiones nuevas')
+            return results
+        finally:
+            self.lock.release()
+
+    # Lectura
+
+    def dataset(self, table_name: str):
+        pa = get_pyarrow()
+        if pa is None:
+            raise RuntimeError('Snapshots no disponibles (pyarrow no instalado)')
+        path = self.table_path(table_name)
+        if table_name not in SNAPSHOT_TABLES or not self.existing_partitions(table_name):
+            raise LookupError(f'Sin snapshots para {table_name}')
+        partitioning = pa.dataset.partitioning(pa.schema([(SNAPSHOT_CONFIG['partition_column'], pa.string())]),
+                                               flavor='hive')
+        return pa.dataset.dataset(path, format='parquet', partitioning=partitioning)
+
+    def scan(self, table_name: str, columns: List[str] = None, months: List[str] = None, filter_expression=None):
+        """Tabla Arrow con las columnas pedidas; los meses se filtran por partición (sin leer el resto)"""
+        pa = get_pyarrow()
+        expression = filter_expression
+        if months:
+            month_filter = pa.dataset.field(SNAPSHOT_CONFIG['partition_column']).isin(months)
+            expression = month_filter if expression is None else expression & month_filter
+        return self.dataset(table_name).to_table(columns=columns, filter=expression)
+
+    def monthly_counts(self, table_name: str, key: str = None, months: List[str] = None) -> List[Dict[str, Any]]:
+        """Filas por mes (y por clave) calculadas sobre los archivos"""
+        month = SNAPSHOT_CONFIG['partition_column']
+        validate_group_by(table_name, key)
+        if key is not None and key not in {column.name for column in self._columns(table_name)}:
+            raise ValueError(f'Columna no disponible en el snapshot: {key}')
+        duckdb = safe_import('duckdb')
+        if duckdb is not None:
+            # DuckDB lee solo las particiones y columnas necesarias
+            keys = f'{month}, "{key}"' if key else month
+            where = f"WHERE {month} IN ({', '.join('?' for _ in months)})" if months else ''
+            pattern = os.path.join(self.table_path(table_name), '*', '*.parquet')
+            rows = duckdb.connect().execute(
+                f"SELECT {keys}, COUNT(*) FROM read_parquet(?, hive_partitioning = true) {where} "
+                f"GROUP BY {keys} ORDER BY {keys}", [pattern, *(months or [])]
+            ).fetchall()
+            return [dict(zip(['month', key, 'count'] if key else ['month', 'count'], row)) for row in rows]
+
+        columns = [month, key] if key else [month]
+        table = self.scan(table_name, columns=columns + ['id'], months=months)
+        grouped = table.group_by(columns).aggregate([('id', 'count')]).sort_by([(name, 'ascending') for name in columns])
+        return [{'month': row[month], **({key: row[key]} if key else {}), 'count': row['id_count']}
+                for row in grouped.to_pylist()]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'available': self.available,
+            'directory': SNAPSHOT_CONFIG['directory'],
+            'tables': {name: self.existing_partitions(name) for name in SNAPSHOT_TABLES},
+            'last_run': self.last_run
+        }
+
+    # Programación
+
+    def start_scheduler(self):
+        """Programar la ejecución nocturna, una vez por cluster"""
+        if self.is_running:
+            return
+        from cluster_scheduler import cluster_scheduler, daily_at
+
+        cluster_scheduler.register('analytics_snapshots.run', self.run, daily_at(SNAPSHOT_CONFIG['run_at']), timeout=3 * 3600)
+        self.is_running = True
+
+
+# Instancia global
+snapshot_manager = SnapshotManager()
+
+
+def init_analytics_snapshots(app):
+    """Inicializar snapshots analíticos en la aplicación Flask"""
+    snapshot_manager.init_app(app)
+
+    def admin_required():
+        if not current_user.can_access_admin():
+            return jsonify({'success': False, 'error': 'Permisos insuficientes'}), 403
+        return None
+
+    @app.route('/api/v1/analytics/snapshots', methods=['GET'])
+    @login_required
+    def get_analytics_snapshots():
+        """Particiones disponibles por tabla"""
+        denied = admin_required()
+        if denied:
+            return denied
+        return jsonify({'success': True, 'data': snapshot_manager.summary()})
+
+    @app.route('/api/v1/analytics/snapshots/run', methods=['POST'])
+    @login_required
+    def run_analytics_snapshots():
+        """Agregar particiones nuevas en segundo plano"""
+        denied = admin_required()
+        if denied:
+            return denied
+        if not snapshot_manager.available:
+            return jsonify({'success': False, 'error': 'pyarrow no instalado'}), 503
+
+        from background_jobs import job_manager
+        from flask import url_for
+
+        data = request.get_json(silent=True) or {}
+        job = job_manager.submit('analytics_snapshots', snapshot_manager.run,
+                                 tables=data.get('tables'), owner_id=current_user.id)
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': url_for('get_background_job', job_id=job.id)
+        }), 202
+
+    if snapshot_manager.available and app.config.get('ANALYTICS_SNAPSHOT_SCHEDULE_ENABLED', True):
+        snapshot_manager.start_scheduler()
+
+    print(f"✅ Snapshots analíticos inicializados ({'pyarrow' if snapshot_manager.available else 'sin pyarrow'})")
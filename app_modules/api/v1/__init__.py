@@ -40,16 +40,13 @@ def api_info():
 
 @api_v1.route('/health')
 def health_check():
-    """Health check de la API"""
-    try:
-        from models import db
-        from sqlalchemy import text
-        
-        # Test database connection
-        db.session.execute(text('SELECT 1'))
-        db_status = 'healthy'
-    except Exception as e:
-        db_status = f'unhealthy: {str(e)}'
+    """Health check de la API (verificaciones compartidas, en paralelo y cacheadas)"""
+    from app_modules.core.monitoring_service import monitoring_service
+    
+    monitoring_service.ensure_health_checks()
+    status = monitoring_service.health_checker.readiness()
+    database = status['checks'].get('database')
+    db_status = 'healthy' if database is None or database['status'] == 'healthy' else f"unhealthy: {database['message']}"
     
     return jsonify({
         'status': 'healthy' if db_status == 'healthy' else 'unhealthy',
@@ -8,9 +8,6 @@ import shutil
 import sqlite3
 import zipfile
 import json
-import schedule
-import time
-import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 from flask import current_app
@@ -22,10 +19,11 @@ from typing import Dict, List, Optional
 class BackupService:
     """Servicio de backup automatizado"""
     
+    BACKUP_JOBS = ('backup.full', 'backup.incremental', 'backup.configuration', 'backup.cleanup')
+    
     def __init__(self, app=None):
         self.app = app
         self.backup_dir = None
-        self.scheduler_thread = None
         self.is_running = False
         self.backup_history = []
         
@@ -49,42 +47,39 @@ class BackupService:
         print("✅ Servicio de backup inicializado")
     
     def setup_backup_schedule(self):
-        """Configurar programación de backups"""
+        """Configurar programación de backups (una ejecución por cluster)"""
+        from cluster_scheduler import cluster_scheduler
+        
         # Backup diario a las 2:00 AM
-        schedule.every().day.at("02:00").do(self.create_full_backup)
+        cluster_scheduler.cron('backup.full', '0 2 * * *', self.create_full_backup, timeout=3 * 3600)
         
         # Backup incremental cada 6 horas
-        schedule.every(6).hours.do(self.create_incremental_backup)
+        cluster_scheduler.interval('backup.incremental', 6 * 3600, self.create_incremental_backup, jitter=300)
         
         # Backup de configuración cada hora
-        schedule.every().hour.do(self.backup_configuration)
+        cluster_scheduler.interval('backup.configuration', 3600, self.backup_configuration, jitter=120)
         
         # Limpieza de backups antiguos cada domingo
-        schedule.every().sunday.at("03:00").do(self.cleanup_old_backups)
+        cluster_scheduler.cron('backup.cleanup', '0 3 * * 0', self.cleanup_old_backups)
         
         print("✅ Programación de backups configurada")
     
     def start_scheduler(self):
-        """Iniciar scheduler en background"""
+        """Iniciar el programador de tareas del cluster"""
         if not self.is_running:
+            from cluster_scheduler import cluster_scheduler
             self.is_running = True
-            self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
-            self.scheduler_thread.start()
+            cluster_scheduler.start()
             print("✅ Scheduler de backups iniciado")
     
     def stop_scheduler(self):
-        """Detener scheduler"""
+        """Detener scheduler (quita las tareas de backup del programador)"""
+        from cluster_scheduler import cluster_scheduler
         self.is_running = False
-        if self.scheduler_thread:
-            self.scheduler_thread.join()
+        for name in self.BACKUP_JOBS:
+            cluster_scheduler.unregister(name)
         print("✅ Scheduler de backups detenido")
     
-    def _run_scheduler(self):
-        """Ejecutar scheduler en loop"""
-        while self.is_running:
-            schedule.run_pending()
-            time.sleep(60)  # Verificar cada minuto
-    
     def create_full_backup(self) -> Dict:
         """Crear backup completo del sistema"""
         try:
@@ -3,25 +3,40 @@ Sistema de logging avanzado
 Proporciona logging estructurado, contextual y configurable
 """
 
+import atexit
+import copy
 import logging
 import logging.handlers
 import json
 import os
+import queue
 import sys
 from datetime import datetime
-from flask import request, g, current_app
+from flask import request, g, current_app, has_app_context
 from flask_login import current_user
 import traceback
 import uuid
 from functools import wraps
 
+from metrics_registry import metrics_registry
+
+# Configuración de la cola de logging (se puede sobrescribir con LOG_QUEUE_SIZE / LOG_BATCH_SIZE)
+LOG_QUEUE_CONFIG = {
+    'queue_size': 10000,   # Registros en espera antes de descartar los más antiguos
+    'batch_size': 256      # Registros escritos por lote antes de hacer flush
+}
+
+LOG_RECORDS_DROPPED = metrics_registry.counter('portal_log_records_dropped',
+                                               'Registros de log descartados por cola llena')
+
 class StructuredFormatter(logging.Formatter):
     """Formateador para logs estructurados en JSON"""
     
     def format(self, record):
         """Formatear registro de log como JSON estructurado"""
         log_data = {
-            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            # Momento en que se emitió el registro, no cuando el listener lo escribe
+            'timestamp': datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
             'level': record.levelname,
             'logger': record.name,
             'message': record.getMessage(),
@@ -68,6 +83,9 @@ class StructuredFormatter(logging.Formatter):
                 'message': str(record.exc_info[1]),
                 'traceback': traceback.format_exception(*record.exc_info)
             }
+        elif hasattr(record, 'exception'):
+            # Excepción ya serializada al encolar el registro
+            log_data['exception'] = record.exception
         
         return json.dumps(log_data, ensure_ascii=False)
 
@@ -76,10 +94,11 @@ class ContextFilter(logging.Filter):
     
     def filter(self, record):
         """Agregar información de contexto al registro"""
-        # Agregar ID de request único
-        if not hasattr(g, 'request_id'):
-            g.request_id = str(uuid.uuid4())
-        record.request_id = g.request_id
+        # Agregar ID de request único (los hilos de fondo no tienen contexto)
+        if has_app_context():
+            if not hasattr(g, 'request_id'):
+                g.request_id = str(uuid.uuid4())
+            record.request_id = g.request_id
         
         # Agregar información del usuario si está autenticado
         try:
@@ -105,11 +124,133 @@ class ContextFilter(logging.Filter):
         
         return True
 
+class DropOldestQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler sobre una cola acotada que descarta el registro más antiguo cuando está llena"""
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record):
+        """Copiar el registro sin formatearlo: el JSON se arma en el hilo del listener"""
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        
+        # extra_data puede seguir modificándose después de loguear
+        if isinstance(getattr(record, 'extra_data', None), dict):
+            record.extra_data = dict(record.extra_data)
+        
+        # El traceback no se puede conservar en la cola: se serializa ahora
+        if record.exc_info:
+            record.exception = {
+                'type': record.exc_info[0].__name__,
+                'message': str(record.exc_info[1]),
+                'traceback': traceback.format_exception(*record.exc_info)
+            }
+            if not record.exc_text:
+                record.exc_text = ''.join(record.exception['traceback']).rstrip('\n')
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record):
+        """Encolar sin bloquear; con la cola llena se descarta el registro más antiguo"""
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                pass
+            try:
+                oldest = self.queue.get_nowait()
+            except queue.Empty:
+                continue
+            if oldest is BatchingQueueListener._sentinel:
+                # El listener se está deteniendo: se conserva la señal y se pierde el nuevo registro
+                self.queue.put_nowait(oldest)
+                oldest = record
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+            if oldest is record:
+                return
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """QueueListener que escribe por lotes y hace un único flush por handler al final de cada lote"""
+    
+    def __init__(self, log_queue, *handlers, batch_size=None):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size or LOG_QUEUE_CONFIG['batch_size']
+        self.stats = {'batches': 0, 'records': 0}
+    
+    def _next_batch(self):
+        """Esperar un registro y sumar los que ya estén en la cola"""
+        batch = [self.dequeue(True)]
+        while len(batch) < self.batch_size and batch[-1] is not self._sentinel:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _monitor(self):
+        has_task_done = hasattr(self.queue, 'task_done')
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is self._sentinel
+            records = batch[:-1] if stop else batch
+            
+            for handler in self.handlers:
+                handler.deferred_flush = True
+            try:
+                for record in records:
+                    self.handle(record)
+            finally:
+                for handler in self.handlers:
+                    handler.deferred_flush = False
+                    if records:
+                        handler.flush()
+            
+            if records:
+                self.stats['batches'] += 1
+                self.stats['records'] += len(records)
+            if has_task_done:
+                for _ in batch:
+                    self.queue.task_done()
+            if stop:
+                break
+    
+    def enqueue_sentinel(self):
+        # La cola es acotada: la señal de parada espera lugar en lugar de fallar
+        self.queue.put(self._sentinel)
+
+
+class BatchFlushMixin:
+    """Posterga el flush de cada emit mientras el listener procesa un lote"""
+    
+    deferred_flush = False
+    
+    def flush(self):
+        if not self.deferred_flush:
+            super().flush()
+
+
+class BatchedStreamHandler(BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class BatchedRotatingFileHandler(BatchFlushMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
 class LoggingService:
     """Servicio centralizado de logging"""
     
     def __init__(self, app=None):
         self.app = app
+        self.listener = None
+        self.queue_handler = None
         if app is not None:
             self.init_app(app)
     
@@ -129,41 +270,72 @@ class LoggingService:
         logger = logging.getLogger()
         logger.setLevel(getattr(logging, log_level.upper()))
         
-        # Limpiar handlers existentes
+        # Limpiar handlers existentes (y detener el listener de una inicialización previa)
         logger.handlers.clear()
+        self.shutdown()
         
-        # Configurar handler para archivo
-        self._setup_file_handler(logger, log_dir, log_format)
+        # Los handlers de destino solo se usan desde el hilo del listener
+        handlers = [
+            self._setup_file_handler(log_dir, log_format),
+            self._setup_console_handler(log_format),
+            self._setup_error_handler(log_dir, log_format)
+        ]
         
-        # Configurar handler para consola
-        self._setup_console_handler(logger, log_format)
+        # La request solo encola: disco y stdout quedan fuera de la latencia
+        log_queue = queue.Queue(maxsize=app.config.get('LOG_QUEUE_SIZE', LOG_QUEUE_CONFIG['queue_size']))
+        self.queue_handler = DropOldestQueueHandler(log_queue)
         
-        # Configurar handler para errores críticos
-        self._setup_error_handler(logger, log_dir, log_format)
+        # El contexto (request, usuario) se captura en el hilo que loguea, antes de encolar
+        self.queue_handler.addFilter(ContextFilter())
+        logger.addHandler(self.queue_handler)
         
-        # Configurar filtros de contexto
-        context_filter = ContextFilter()
-        for handler in logger.handlers:
-            handler.addFilter(context_filter)
+        self.listener = BatchingQueueListener(log_queue, *handlers,
+                                              batch_size=app.config.get('LOG_BATCH_SIZE'))
+        self.listener.start()
+        atexit.register(self.shutdown)
         
-        # Configurar logging para Flask
+        # Configurar logging para Flask (sin propagar: cada registro se encola una sola vez)
         app.logger.handlers = logger.handlers
         app.logger.setLevel(logger.level)
+        app.logger.propagate = False
         
         # Configurar logging para Werkzeug (servidor de desarrollo)
         werkzeug_logger = logging.getLogger('werkzeug')
         werkzeug_logger.handlers = logger.handlers
         werkzeug_logger.setLevel(logging.WARNING)
+        werkzeug_logger.propagate = False
         
         # Registrar middleware para logging de requests
         app.before_request(self._before_request)
         app.after_request(self._after_request)
         
-        print(f"✅ Logging configurado - Nivel: {log_level}, Formato: {log_format}")
+        print(f"✅ Logging configurado - Nivel: {log_level}, Formato: {log_format}, "
+              f"Cola: {log_queue.maxsize} registros")
+    
+    def shutdown(self):
+        """Detener el listener escribiendo los registros que queden en la cola"""
+        listener, self.listener = self.listener, None
+        if listener is not None and listener._thread is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+    
+    def queue_stats(self):
+        """Estado de la cola de logging"""
+        if self.listener is None:
+            return {'enabled': False}
+        return {
+            'enabled': True,
+            'depth': self.listener.queue.qsize(),
+            'capacity': self.listener.queue.maxsize,
+            'dropped': self.queue_handler.dropped,
+            'batches': self.listener.stats['batches'],
+            'records': self.listener.stats['records']
+        }
     
-    def _setup_file_handler(self, logger, log_dir, log_format):
+    def _setup_file_handler(self, log_dir, log_format):
         """Configurar handler para archivo con rotación"""
-        file_handler = logging.handlers.RotatingFileHandler(
+        file_handler = BatchedRotatingFileHandler(
             filename=os.path.join(log_dir, 'app.log'),
             maxBytes=10 * 1024 * 1024,  # 10MB
             backupCount=10,
@@ -178,11 +350,11 @@ class LoggingService:
             ))
         
         file_handler.setLevel(logging.DEBUG)
-        logger.addHandler(file_handler)
+        return file_handler
     
-    def _setup_console_handler(self, logger, log_format):
+    def _setup_console_handler(self, log_format):
         """Configurar handler para consola"""
-        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler = BatchedStreamHandler(sys.stdout)
         
         if log_format == 'structured':
             console_handler.setFormatter(StructuredFormatter())
@@ -192,11 +364,11 @@ class LoggingService:
             ))
         
         console_handler.setLevel(logging.INFO)
-        logger.addHandler(console_handler)
+        return console_handler
     
-    def _setup_error_handler(self, logger, log_dir, log_format):
+    def _setup_error_handler(self, log_dir, log_format):
         """Configurar handler específico para errores"""
-        error_handler = logging.handlers.RotatingFileHandler(
+        error_handler = BatchedRotatingFileHandler(
             filename=os.path.join(log_dir, 'errors.log'),
             maxBytes=5 * 1024 * 1024,  # 5MB
             backupCount=5,
@@ -211,7 +383,7 @@ class LoggingService:
             ))
         
         error_handler.setLevel(logging.ERROR)
-        logger.addHandler(error_handler)
+        return error_handler
     
     def _before_request(self):
         """Middleware ejecutado antes de cada request"""
@@ -3,26 +3,188 @@ Sistema de monitoreo y métricas
 Proporciona recolección de métricas, monitoreo de salud y alertas
 """
 
+import math
 import time
 import psutil
 import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from datetime import datetime, timedelta
-from collections import defaultdict, deque
-from flask import request, g, current_app
+from collections import defaultdict
+from flask import request, g, current_app, has_app_context, jsonify
 from flask_login import current_user
 import json
 import os
 from functools import wraps
 
+from alert_rules import AlertRule, alert_engine
+from metrics_registry import metrics_registry
+from sampling_profiler import sampling_profiler
+
+# Configuración de histogramas
+HISTOGRAM_CONFIG = {
+    'relative_accuracy': 0.01,   # Error relativo máximo de los percentiles
+    'slice_seconds': 30,         # Duración de cada tramo de la ventana
+    'window_slices': 10,         # Tramos retenidos (ventana de 5 minutos)
+    'shards': 16                 # Shards con lock propio para el registro
+}
+
+# Configuración de verificaciones de salud
+HEALTH_CONFIG = {
+    'workers': 4,        # Hilos del pool de verificaciones
+    'timeout': 2.0,      # Límite por verificación (segundos) salvo que se indique otro
+    'cache_ttl': 5.0     # Las sondas dentro de este tiempo reutilizan la última ronda
+}
+
+_PROCESS_START = time.monotonic()
+
+# Métricas compartidas entre workers (expuestas en /metrics)
+COLLECTOR_EVENTS = metrics_registry.counter('portal_collector_events', 'Contadores del MetricsCollector', ['metric', 'tags'])
+COLLECTOR_GAUGES = metrics_registry.gauge('portal_collector_gauge', 'Gauges del MetricsCollector', ['metric', 'tags'], mode='max')
+COLLECTOR_OBSERVATIONS = metrics_registry.histogram(
+    'portal_collector_observations', 'Histogramas del MetricsCollector (tiempos en ms)', ['metric', 'tags'],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000))
+FUNCTION_DURATION = metrics_registry.histogram('portal_function_duration_seconds',
+                                               'Duración de funciones con @monitor_performance', ['function', 'status'])
+FUNCTION_CALLS = metrics_registry.counter('portal_function_calls', 'Llamadas a funciones monitoreadas', ['function', 'status'])
+
+
+class StreamingHistogram:
+    """Histograma log-lineal (estilo DDSketch): registro O(1), percentiles con error relativo acotado y combinable"""
+    
+    def __init__(self, relative_accuracy=None):
+        self.relative_accuracy = relative_accuracy or HISTOGRAM_CONFIG['relative_accuracy']
+        self.gamma = (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = defaultdict(int)
+        self.negative = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+    
+    def _index(self, magnitude):
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+    
+    def _value(self, index):
+        # Punto del bucket (gamma^(i-1), gamma^i] con error relativo mínimo
+        return 2 * self.gamma ** index / (self.gamma + 1)
+    
+    def record(self, value):
+        """Registrar un valor"""
+        if value > 0:
+            self.positive[self._index(value)] += 1
+        elif value < 0:
+            self.negative[self._index(-value)] += 1
+        else:
+            self.zero_count += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+    
+    def merge(self, other):
+        """Sumar otro histograma con la misma precisión"""
+        if other.gamma != self.gamma:
+            raise ValueError('Solo se pueden combinar histogramas con la misma precisión')
+        for index, count in other.positive.items():
+            self.positive[index] += count
+        for index, count in other.negative.items():
+            self.negative[index] += count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+    
+    def copy(self):
+        return StreamingHistogram(self.relative_accuracy).merge(self)
+    
+    def percentile(self, percentile):
+        """Percentil estimado (0 si no hay valores)"""
+        if not self.count:
+            return 0
+        rank = percentile / 100 * (self.count - 1)
+        cumulative = 0
+        # Orden ascendente: negativos de mayor a menor magnitud, cero y positivos
+        for index in sorted(self.negative, reverse=True):
+            cumulative += self.negative[index]
+            if cumulative > rank:
+                return max(-self._value(index), self.min)
+        cumulative += self.zero_count
+        if cumulative > rank:
+            return 0
+        for index in sorted(self.positive):
+            cumulative += self.positive[index]
+            if cumulative > rank:
+                return min(self._value(index), self.max)
+        return self.max
+    
+    def summary(self):
+        """Resumen con el formato de get_metrics_summary"""
+        return {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'avg': self.total / self.count,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99)
+        }
+
+
+class WindowedHistogram:
+    """Ventana deslizante de histogramas por tramo de tiempo (anillo de tramos)"""
+    
+    def __init__(self, slice_seconds=None, slices=None, relative_accuracy=None):
+        self.slice_seconds = slice_seconds or HISTOGRAM_CONFIG['slice_seconds']
+        self.slices = slices or HISTOGRAM_CONFIG['window_slices']
+        self.relative_accuracy = relative_accuracy
+        self._ring = [None] * self.slices   # (número de tramo, histograma)
+    
+    def record(self, value, now=None):
+        slice_id = int((time.time() if now is None else now) // self.slice_seconds)
+        position = slice_id % self.slices
+        entry = self._ring[position]
+        if entry is None or entry[0] != slice_id:
+            # El tramo anterior en esta posición ya salió de la ventana
+            entry = self._ring[position] = (slice_id, StreamingHistogram(self.relative_accuracy))
+        entry[1].record(value)
+    
+    def merge_into(self, target, now=None):
+        """Sumar a `target` los tramos dentro de la ventana; devuelve la cantidad de valores sumados"""
+        current = int((time.time() if now is None else now) // self.slice_seconds)
+        merged = 0
+        for entry in self._ring:
+            if entry is not None and current - self.slices < entry[0] <= current:
+                target.merge(entry[1])
+                merged += entry[1].count
+        return merged
+
+
+class _HistogramShard:
+    """Histogramas de un grupo de hilos con su propio lock"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = defaultdict(WindowedHistogram)
+
+
 class MetricsCollector:
     """Recolector de métricas del sistema"""
     
-    def __init__(self):
+    def __init__(self, shards=None):
         self.metrics = defaultdict(list)
         self.counters = defaultdict(int)
         self.gauges = defaultdict(float)
-        self.histograms = defaultdict(lambda: deque(maxlen=1000))
         self.lock = threading.Lock()
+        # Cada hilo registra en su shard: el registro nunca espera al cálculo del resumen
+        self._shards = [_HistogramShard() for _ in range(shards or HISTOGRAM_CONFIG['shards'])]
+        self._next_shard = 0
+        self._local = threading.local()
         self.start_time = datetime.utcnow()
     
     def increment_counter(self, name, value=1, tags=None):
@@ -30,138 +192,229 @@ class MetricsCollector:
         with self.lock:
             key = self._build_key(name, tags)
             self.counters[key] += value
+        COLLECTOR_EVENTS.inc(value, metric=name, tags=self._tag_string(tags))
     
     def set_gauge(self, name, value, tags=None):
         """Establecer valor de gauge"""
         with self.lock:
             key = self._build_key(name, tags)
             self.gauges[key] = value
+        COLLECTOR_GAUGES.set(value, metric=name, tags=self._tag_string(tags))
+    
+    def _shard(self):
+        """Shard del hilo actual (asignado una sola vez por hilo)"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            with self.lock:
+                shard = self._shards[self._next_shard % len(self._shards)]
+                self._next_shard += 1
+            self._local.shard = shard
+        return shard
     
-    def record_histogram(self, name, value, tags=None):
+    def record_histogram(self, name, value, tags=None, now=None):
         """Registrar valor en histograma"""
-        with self.lock:
-            key = self._build_key(name, tags)
-            self.histograms[key].append({
-                'value': value,
-                'timestamp': datetime.utcnow()
-            })
+        key = self._build_key(name, tags)
+        shard = self._shard()
+        with shard.lock:
+            shard.histograms[key].record(value, now)
+        COLLECTOR_OBSERVATIONS.observe(value, metric=name, tags=self._tag_string(tags))
     
     def record_timing(self, name, duration_ms, tags=None):
         """Registrar tiempo de ejecución"""
         self.record_histogram(f"{name}.duration", duration_ms, tags)
     
+    def _tag_string(self, tags):
+        return ','.join([f"{k}={v}" for k, v in sorted(tags.items())]) if tags else ''
+    
     def _build_key(self, name, tags):
         """Construir clave única para métrica"""
         if tags:
-            tag_str = ','.join([f"{k}={v}" for k, v in sorted(tags.items())])
-            return f"{name}[{tag_str}]"
+            return f"{name}[{self._tag_string(tags)}]"
         return name
     
-    def get_metrics_summary(self):
+    def histogram_snapshot(self, now=None):
+        """Histograma combinado de la ventana por clave (cada shard se bloquea solo mientras se copia)"""
+        merged = {}
+        for shard in self._shards:
+            with shard.lock:
+                for key, window in shard.histograms.items():
+                    target = merged.get(key) or StreamingHistogram()
+                    if window.merge_into(target, now):
+                        merged[key] = target
+        return merged
+    
+    def get_metrics_summary(self, now=None):
         """Obtener resumen de métricas"""
         with self.lock:
-            summary = {
-                'timestamp': datetime.utcnow().isoformat(),
-                'uptime_seconds': (datetime.utcnow() - self.start_time).total_seconds(),
-                'counters': dict(self.counters),
-                'gauges': dict(self.gauges),
-                'histograms': {}
-            }
-            
-            # Procesar histogramas
-            for key, values in self.histograms.items():
-                if values:
-                    recent_values = [v['value'] for v in values if 
-                                   (datetime.utcnow() - v['timestamp']).total_seconds() < 300]  # Últimos 5 minutos
-                    
-                    if recent_values:
-                        summary['histograms'][key] = {
-                            'count': len(recent_values),
-                            'min': min(recent_values),
-                            'max': max(recent_values),
-                            'avg': sum(recent_values) / len(recent_values),
-                            'p50': self._percentile(recent_values, 50),
-                            'p95': self._percentile(recent_values, 95),
-                            'p99': self._percentile(recent_values, 99)
-                        }
-            
-            return summary
-    
-    def _percentile(self, values, percentile):
-        """Calcular percentil"""
-        if not values:
-            return 0
-        sorted_values = sorted(values)
-        index = int((percentile / 100) * len(sorted_values))
-        return sorted_values[min(index, len(sorted_values) - 1)]
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+        
+        # Percentiles calculados fuera de cualquier lock
+        return {
+            'timestamp': datetime.utcnow().isoformat(),
+            'uptime_seconds': (datetime.utcnow() - self.start_time).total_seconds(),
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': {key: histogram.summary() for key, histogram in self.histogram_snapshot(now).items()}
+        }
 
 class HealthChecker:
-    """Verificador de salud del sistema"""
+    """Verificador de salud del sistema: verificaciones en paralelo con límite de tiempo y
+    resultado cacheado unos segundos para que las sondas frecuentes no se acumulen"""
     
-    def __init__(self):
+    def __init__(self, cache_ttl=None, workers=None):
         self.checks = {}
         self.last_check_time = None
         self.check_interval = 60  # segundos
+        self.cache_ttl = HEALTH_CONFIG['cache_ttl'] if cache_ttl is None else cache_ttl
+        self.workers = workers or HEALTH_CONFIG['workers']
+        self._executor = None
+        self._lock = threading.Lock()       # Protege el executor y el caché
+        self._run_lock = threading.Lock()   # Una sola ronda a la vez: el resto espera y usa su resultado
+        self._cached = None
+        self._cached_at = 0.0
+        self.stats = {'runs': 0, 'cache_hits': 0, 'timeouts': 0}
     
-    def register_check(self, name, check_function, critical=False):
+    def register_check(self, name, check_function, critical=False, timeout=None):
         """Registrar verificación de salud"""
         self.checks[name] = {
             'function': check_function,
             'critical': critical,
+            'timeout': timeout or HEALTH_CONFIG['timeout'],
             'last_result': None,
-            'last_check': None
+            'last_check': None,
+            'future': None
         }
+        with self._lock:
+            self._cached = None
     
-    def run_checks(self):
-        """Ejecutar todas las verificaciones"""
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='health-check')
+            return self._executor
+    
+    @staticmethod
+    def _call(function, app):
+        """Ejecutar la verificación en el hilo del pool con el contexto de la aplicación"""
+        start = time.perf_counter()
+        if app is None:
+            result = function()
+        else:
+            with app.app_context():
+                result = function()
+        return result or {}, (time.perf_counter() - start) * 1000
+    
+    def run_checks(self, use_cache=True):
+        """Ejecutar todas las verificaciones en paralelo (o devolver la última ronda si sigue vigente)"""
+        if use_cache:
+            cached = self._fresh_result()
+            if cached is not None:
+                return cached
+        
+        with self._run_lock:
+            # Otro hilo pudo completar una ronda mientras se esperaba el lock
+            if use_cache:
+                cached = self._fresh_result()
+                if cached is not None:
+                    return cached
+            results = self._run_round()
+            with self._lock:
+                self._cached = results
+                self._cached_at = time.monotonic()
+            return results
+    
+    def _fresh_result(self):
+        with self._lock:
+            if self._cached is not None and time.monotonic() - self._cached_at < self.cache_ttl:
+                self.stats['cache_hits'] += 1
+                return self._cached
+        return None
+    
+    def _run_round(self):
         results = {
             'timestamp': datetime.utcnow().isoformat(),
             'overall_status': 'healthy',
             'checks': {}
         }
+        app = current_app._get_current_object() if has_app_context() else None
+        pool = self._pool()
+        started = time.monotonic()
+        self.stats['runs'] += 1
+        
+        # Enviar todas las verificaciones antes de esperar cualquiera
+        pending = {}
+        for name, check_config in list(self.checks.items()):
+            future = check_config['future']
+            if future is not None and not future.done():
+                pending[name] = None   # Sigue colgada desde una ronda anterior: no se acumula otra
+                continue
+            check_config['future'] = pool.submit(self._call, check_config['function'], app)
+            pending[name] = check_config['future']
         
-        for name, check_config in self.checks.items():
+        for name, future in pending.items():
+            check_config = self.checks[name]
+            remaining = check_config['timeout'] - (time.monotonic() - started)
+            duration = (time.monotonic() - started) * 1000
             try:
-                start_time = time.time()
-                result = check_config['function']()
-                duration = (time.time() - start_time) * 1000  # ms
-                
+                if future is None:
+                    raise FuturesTimeoutError()
+                result, duration = future.result(timeout=max(remaining, 0))
                 check_result = {
                     'status': 'healthy' if result.get('healthy', True) else 'unhealthy',
                     'message': result.get('message', 'OK'),
-                    'duration_ms': duration,
-                    'details': result.get('details', {}),
-                    'critical': check_config['critical']
+                    'details': result.get('details', {})
                 }
-                
-                # Actualizar estado general
-                if not result.get('healthy', True):
-                    if check_config['critical']:
-                        results['overall_status'] = 'critical'
-                    elif results['overall_status'] == 'healthy':
-                        results['overall_status'] = 'degraded'
-                
-                check_config['last_result'] = check_result
-                check_config['last_check'] = datetime.utcnow()
-                
+                healthy = result.get('healthy', True)
+            except FuturesTimeoutError:
+                duration = (time.monotonic() - started) * 1000
+                self.stats['timeouts'] += 1
+                check_result = {
+                    'status': 'timeout',
+                    'message': (f"Check timed out after {check_config['timeout']:.1f}s" if future is not None
+                                else 'Check still running from a previous round'),
+                    'details': {}
+                }
+                healthy = False
             except Exception as e:
                 check_result = {
                     'status': 'error',
                     'message': f'Check failed: {str(e)}',
-                    'duration_ms': 0,
-                    'details': {'error': str(e)},
-                    'critical': check_config['critical']
+                    'details': {'error': str(e)}
                 }
-                
+                healthy = False
+            
+            check_result['duration_ms'] = duration
+            check_result['critical'] = check_config['critical']
+            
+            # Actualizar estado general
+            if not healthy:
                 if check_config['critical']:
                     results['overall_status'] = 'critical'
                 elif results['overall_status'] == 'healthy':
                     results['overall_status'] = 'degraded'
             
+            check_config['last_result'] = check_result
+            check_config['last_check'] = datetime.utcnow()
             results['checks'][name] = check_result
         
+        results['duration_ms'] = (time.monotonic() - started) * 1000
         self.last_check_time = datetime.utcnow()
         return results
+    
+    def liveness(self):
+        """Sonda de vida: el proceso responde (no consulta dependencias)"""
+        return {
+            'status': 'alive',
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.monotonic() - _PROCESS_START, 1),
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    def readiness(self):
+        """Sonda de disponibilidad: verificaciones de dependencias (cacheadas)"""
+        results = self.run_checks()
+        return dict(results, ready=results['overall_status'] != 'critical')
 
 class MonitoringService:
     """Servicio principal de monitoreo"""
@@ -170,7 +423,7 @@ class MonitoringService:
         self.app = app
         self.metrics = MetricsCollector()
         self.health_checker = HealthChecker()
-        self.alerts = []
+        self.profiler = sampling_profiler   # Pilas muestreadas bajo demanda y continuas
         self.alert_thresholds = {}
         
         if app is not None:
@@ -239,7 +492,7 @@ class MonitoringService:
         def check_cpu():
             """Verificar uso de CPU"""
             try:
-                cpu_percent = psutil.cpu_percent(interval=1)
+                cpu_percent = psutil.cpu_percent(interval=None)   # Desde la llamada anterior: no bloquea
                 if cpu_percent > 90:
                     return {'healthy': False, 'message': f'High CPU usage: {cpu_percent:.1f}%'}
                 elif cpu_percent > 80:
@@ -249,14 +502,33 @@ class MonitoringService:
             except Exception as e:
                 return {'healthy': False, 'message': f'CPU check error: {str(e)}'}
         
+        redis_clients = {}
+        
+        def check_redis():
+            """Verificar conexión a Redis (si está configurado)"""
+            redis_url = current_app.config.get('REDIS_URL') if has_app_context() else None
+            if not redis_url:
+                return {'healthy': True, 'message': 'Redis not configured'}
+            try:
+                import redis
+                client = redis_clients.get(redis_url)
+                if client is None:
+                    client = redis_clients[redis_url] = redis.from_url(redis_url, socket_timeout=1,
+                                                                       socket_connect_timeout=1)
+                client.ping()
+                return {'healthy': True, 'message': 'Redis connection OK'}
+            except Exception as e:
+                return {'healthy': False, 'message': f'Redis error: {str(e)}'}
+        
         # Registrar verificaciones
         self.health_checker.register_check('database', check_database, critical=True)
+        self.health_checker.register_check('redis', check_redis, critical=False)
         self.health_checker.register_check('disk_space', check_disk_space, critical=True)
         self.health_checker.register_check('memory', check_memory, critical=False)
         self.health_checker.register_check('cpu', check_cpu, critical=False)
     
     def _setup_default_alert_thresholds(self):
-        """Configurar umbrales de alerta por defecto"""
+        """Configurar umbrales de alerta por defecto y sus reglas (promedio de 5 minutos sostenido 2 minutos)"""
         self.alert_thresholds = {
             'response_time_p95': 2000,  # ms
             'error_rate': 5,  # %
@@ -264,25 +536,37 @@ class MonitoringService:
             'cpu_usage': 85,  # %
             'disk_usage': 85,  # %
         }
+        
+        thresholds = self.alert_thresholds
+        common = {'aggregation': 'mean', 'window': 300, 'for_seconds': 120, 'group': 'system',
+                  'source': 'monitoring_service'}
+        alert_engine.add_rules([
+            AlertRule('system.response_time.warning', 'http.request.duration.p95', thresholds['response_time_p95'],
+                      clear=thresholds['response_time_p95'] * 0.75, title='Tiempo de respuesta alto',
+                      message='P95 response time: {value:.0f}ms', **common),
+            AlertRule('system.error_rate.warning', 'http.error_rate', thresholds['error_rate'],
+                      clear=thresholds['error_rate'] * 0.6, title='Tasa de errores alta',
+                      message='Error rate: {value:.1f}%', **common),
+            AlertRule('system.memory.warning', 'system.memory.usage_percent', thresholds['memory_usage'],
+                      clear=thresholds['memory_usage'] - 5, title='Uso de memoria alto',
+                      message='Memory usage: {value:.1f}%', inhibited_by=('system.memory.critical',), **common),
+            AlertRule('system.cpu.warning', 'system.cpu.usage_percent', thresholds['cpu_usage'],
+                      clear=thresholds['cpu_usage'] - 10, title='Uso de CPU alto',
+                      message='CPU usage: {value:.1f}%', inhibited_by=('system.cpu.critical',), **common),
+            AlertRule('system.disk.warning', 'system.disk.usage_percent', thresholds['disk_usage'],
+                      clear=thresholds['disk_usage'] - 5, title='Poco espacio en disco',
+                      message='Disk usage: {value:.1f}%', **common)
+        ])
     
     def _start_background_monitoring(self):
-        """Iniciar monitoreo en background"""
+        """Iniciar monitoreo en background (una vez por cluster, en el líder que evalúa las alertas)"""
+        from cluster_scheduler import cluster_scheduler
+        
         def monitor():
-            while True:
-                try:
-                    # Recolectar métricas del sistema
-                    self._collect_system_metrics()
-                    
-                    # Verificar umbrales de alerta
-                    self._check_alert_thresholds()
-                    
-                    time.sleep(60)  # Ejecutar cada minuto
-                except Exception as e:
-                    current_app.logger.error(f"Error in background monitoring: {str(e)}")
-                    time.sleep(60)
+            # Recolectar métricas del sistema (las reglas de alerta las evalúan sobre su ventana)
+            self._collect_system_metrics()
         
-        thread = threading.Thread(target=monitor, daemon=True)
-        thread.start()
+        cluster_scheduler.interval('monitoring_service.system', 60, monitor, timeout=60)
     
     def _collect_system_metrics(self):
         """Recolectar métricas del sistema"""
@@ -290,17 +574,27 @@ class MonitoringService:
             # Métricas de CPU
             cpu_percent = psutil.cpu_percent()
             self.metrics.set_gauge('system.cpu.usage_percent', cpu_percent)
+            alert_engine.record('system.cpu.usage_percent', cpu_percent)
             
             # Métricas de memoria
             memory = psutil.virtual_memory()
             self.metrics.set_gauge('system.memory.usage_percent', memory.percent)
             self.metrics.set_gauge('system.memory.available_bytes', memory.available)
+            alert_engine.record('system.memory.usage_percent', memory.percent)
             
             # Métricas de disco
             disk = psutil.disk_usage('/')
             disk_percent = (disk.used / disk.total) * 100
             self.metrics.set_gauge('system.disk.usage_percent', disk_percent)
             self.metrics.set_gauge('system.disk.free_bytes', disk.free)
+            alert_engine.record('system.disk.usage_percent', disk_percent)
+            
+            # Latencia y porcentaje de respuestas 5xx desde la recolección anterior, sumando todos los contenedores web
+            from request_metrics import request_metrics
+            window = request_metrics.cluster_window('monitoring_service')
+            if window['requests']:
+                alert_engine.record('http.request.duration.p95', window['latency_p95'] * 1000)
+                alert_engine.record('http.error_rate', 100 * window['error_rate'])
             
             # Métricas de red (si están disponibles)
             try:
@@ -313,50 +607,6 @@ class MonitoringService:
         except Exception as e:
             current_app.logger.error(f"Error collecting system metrics: {str(e)}")
     
-    def _check_alert_thresholds(self):
-        """Verificar umbrales de alerta"""
-        try:
-            metrics_summary = self.metrics.get_metrics_summary()
-            
-            # Verificar tiempo de respuesta
-            if 'http.request.duration' in metrics_summary['histograms']:
-                p95 = metrics_summary['histograms']['http.request.duration']['p95']
-                if p95 > self.alert_thresholds['response_time_p95']:
-                    self._create_alert('high_response_time', f'P95 response time: {p95:.0f}ms', 'warning')
-            
-            # Verificar uso de memoria
-            memory_usage = metrics_summary['gauges'].get('system.memory.usage_percent', 0)
-            if memory_usage > self.alert_thresholds['memory_usage']:
-                self._create_alert('high_memory_usage', f'Memory usage: {memory_usage:.1f}%', 'warning')
-            
-            # Verificar uso de CPU
-            cpu_usage = metrics_summary['gauges'].get('system.cpu.usage_percent', 0)
-            if cpu_usage > self.alert_thresholds['cpu_usage']:
-                self._create_alert('high_cpu_usage', f'CPU usage: {cpu_usage:.1f}%', 'warning')
-            
-        except Exception as e:
-            current_app.logger.error(f"Error checking alert thresholds: {str(e)}")
-    
-    def _create_alert(self, alert_type, message, severity='info'):
-        """Crear alerta"""
-        alert = {
-            'id': len(self.alerts) + 1,
-            'type': alert_type,
-            'message': message,
-            'severity': severity,
-            'timestamp': datetime.utcnow().isoformat(),
-            'resolved': False
-        }
-        
-        self.alerts.append(alert)
-        
-        # Mantener solo las últimas 100 alertas
-        if len(self.alerts) > 100:
-            self.alerts = self.alerts[-100:]
-        
-        # Log de la alerta
-        current_app.logger.warning(f"Alert created: {alert_type} - {message}")
-    
     def _before_request(self):
         """Middleware antes de request"""
         g.start_time = time.time()
@@ -405,17 +655,12 @@ class MonitoringService:
         return self.metrics.get_metrics_summary()
     
     def get_alerts(self, limit=50):
-        """Obtener alertas recientes"""
-        return self.alerts[-limit:] if self.alerts else []
+        """Obtener alertas recientes (disparos y resoluciones de las reglas del sistema)"""
+        return alert_engine.recent_history(limit, source='monitoring_service')
     
     def resolve_alert(self, alert_id):
         """Resolver alerta"""
-        for alert in self.alerts:
-            if alert['id'] == alert_id:
-                alert['resolved'] = True
-                alert['resolved_at'] = datetime.utcnow().isoformat()
-                return True
-        return False
+        return alert_engine.resolve(alert_id)
     
     def add_custom_metric(self, name, value, metric_type='gauge', tags=None):
         """Agregar métrica personalizada"""
@@ -426,9 +671,14 @@ class MonitoringService:
         elif metric_type == 'histogram':
             self.metrics.record_histogram(name, value, tags)
     
-    def register_health_check(self, name, check_function, critical=False):
+    def register_health_check(self, name, check_function, critical=False, timeout=None):
         """Registrar verificación de salud personalizada"""
-        self.health_checker.register_check(name, check_function, critical)
+        self.health_checker.register_check(name, check_function, critical, timeout)
+    
+    def ensure_health_checks(self):
+        """Registrar las verificaciones por defecto si init_app no se ejecutó"""
+        if 'database' not in self.health_checker.checks:
+            self._setup_default_health_checks()
 
 # Decoradores para métricas
 def monitor_performance(metric_name=None):
@@ -446,6 +696,8 @@ def monitor_performance(metric_name=None):
                 duration_ms = (time.time() - start_time) * 1000
                 monitoring_service.metrics.record_timing(name, duration_ms, tags={'status': 'success'})
                 monitoring_service.metrics.increment_counter(f"{name}.calls", tags={'status': 'success'})
+                FUNCTION_DURATION.observe(duration_ms / 1000, function=name, status='success')
+                FUNCTION_CALLS.inc(function=name, status='success')
                 
                 return result
                 
@@ -455,6 +707,8 @@ def monitor_performance(metric_name=None):
                 monitoring_service.metrics.record_timing(name, duration_ms, tags={'status': 'error'})
                 monitoring_service.metrics.increment_counter(f"{name}.calls", tags={'status': 'error'})
                 monitoring_service.metrics.increment_counter(f"{name}.errors")
+                FUNCTION_DURATION.observe(duration_ms / 1000, function=name, status='error')
+                FUNCTION_CALLS.inc(function=name, status='error')
                 
                 raise
         
@@ -468,6 +722,7 @@ def count_calls(metric_name=None):
         def decorated_function(*args, **kwargs):
             name = metric_name or f"{f.__module__}.{f.__name__}.calls"
             monitoring_service.metrics.increment_counter(name)
+            FUNCTION_CALLS.inc(function=name, status='called')
             return f(*args, **kwargs)
         
         return decorated_function
@@ -475,3 +730,21 @@ def count_calls(metric_name=None):
 
 # Instancia global del servicio de monitoreo
 monitoring_service = MonitoringService()
+
+
+def init_health_checks(app):
+    """Registrar las sondas de vida y disponibilidad (sin el middleware completo de monitoreo)"""
+    monitoring_service.ensure_health_checks()
+    
+    @app.route('/health/live')
+    def health_live():
+        """Sonda de vida: responde sin consultar la base de datos ni otras dependencias"""
+        return jsonify(monitoring_service.health_checker.liveness())
+    
+    @app.route('/health/ready')
+    def health_ready():
+        """Sonda de disponibilidad: verificaciones en paralelo, cacheadas unos segundos"""
+        status = monitoring_service.health_checker.readiness()
+        return jsonify(status), 200 if status['ready'] else 503
+    
+    print("✅ Sondas de salud inicializadas")
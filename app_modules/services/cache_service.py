@@ -9,6 +9,9 @@ from functools import wraps
 from typing import Any, Optional, Union
 from flask import current_app
 
+from slo_tracker import note_cache_miss
+from request_tracing import traced
+
 try:
     import redis
     REDIS_AVAILABLE = True
@@ -57,6 +60,7 @@ class CacheService:
             return False
     
     @classmethod
+    @traced('cache.set', key_arg=1)
     def set(cls, key: str, value: Any, expire: int = 3600) -> bool:
         """
         Guardar valor en cache
@@ -90,6 +94,7 @@ class CacheService:
             return False
     
     @classmethod
+    @traced('cache.get', key_arg=1)
     def get(cls, key: str) -> Optional[Any]:
         """
         Obtener valor del cache
@@ -105,6 +110,7 @@ class CacheService:
                 # Usar Redis
                 value = cls._redis_client.get(key)
                 if value is None:
+                    note_cache_miss()
                     return None
                 
                 # Intentar deserializar JSON
@@ -115,6 +121,7 @@ class CacheService:
             else:
                 # Usar cache en memoria
                 if key not in cls._memory_cache:
+                    note_cache_miss()
                     return None
                 
                 # Verificar expiración
@@ -122,6 +129,7 @@ class CacheService:
                     if datetime.utcnow() > cls._memory_cache_expiry[key]:
                         del cls._memory_cache[key]
                         del cls._memory_cache_expiry[key]
+                        note_cache_miss()
                         return None
                 
                 return cls._memory_cache[key]
@@ -131,6 +139,7 @@ class CacheService:
             return None
     
     @classmethod
+    @traced('cache.delete', key_arg=1)
     def delete(cls, key: str) -> bool:
         """
         Eliminar valor del cache
@@ -11,6 +11,8 @@ from flask_socketio import emit, join_room, leave_room, disconnect
 from collections import defaultdict
 import uuid
 
+from presence_tracker import presence_tracker
+
 try:
     from flask_socketio import SocketIO
     SOCKETIO_AVAILABLE = True
@@ -83,6 +85,7 @@ class WebSocketService:
                 
                 if current_user.is_authenticated:
                     cls._user_sessions[current_user.id].add(session_id)
+                    presence_tracker.connect(session_id, current_user.id)
                     
                     # Unirse a sala personal
                     join_room(f'user_{current_user.id}')
@@ -117,6 +120,7 @@ class WebSocketService:
             try:
                 session_id = request.sid
                 user_info = cls._connected_users.get(session_id)
+                presence_tracker.disconnect(session_id)
                 
                 if user_info:
                     user_id = user_info['user_id']
@@ -0,0 +1,190 @@
+"""
+Gestor de Tareas en Segundo Plano
+Ejecuta operaciones largas fuera del ciclo request/response y expone su progreso
+"""
+
+import logging
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import jsonify
+from flask_login import login_required, current_user
+
+logger = logging.getLogger(__name__)
+
+# Configuración de tareas en segundo plano
+BACKGROUND_JOBS_CONFIG = {
+    'max_workers': 2,
+    'max_history': 200  # Tareas terminadas que se conservan para consultar su estado
+}
+
+
+class JobStatus(Enum):
+    """Estados posibles de una tarea"""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+@dataclass
+class BackgroundJob:
+    """Tarea en segundo plano con seguimiento de progreso"""
+    id: str
+    name: str
+    owner_id: Optional[int] = None
+    status: JobStatus = JobStatus.PENDING
+    processed: int = 0
+    total: int = 0
+    result: Any = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    def update_progress(self, processed: int, total: Optional[int] = None):
+        """Actualizar progreso de la tarea"""
+        self.processed = processed
+        if total is not None:
+            self.total = total
+
+    @property
+    def progress_percentage(self) -> float:
+        if self.status == JobStatus.COMPLETED:
+            return 100.0
+        if not self.total:
+            return 0.0
+        return round(min(100.0, self.processed / self.total * 100), 1)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convertir a diccionario para JSON"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status.value,
+            'processed': self.processed,
+            'total': self.total,
+            'progress_percentage': self.progress_percentage,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class BackgroundJobManager:
+    """Gestor de tareas en segundo plano"""
+
+    def __init__(self, max_workers: int = None, max_history: int = None):
+        self.app = None
+        self.max_workers = max_workers or BACKGROUND_JOBS_CONFIG['max_workers']
+        self.max_history = max_history or BACKGROUND_JOBS_CONFIG['max_history']
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self._executor = None
+
+    def init_app(self, app):
+        """Inicializar gestor con la aplicación Flask"""
+        self.app = app
+        self.max_workers = app.config.get('BACKGROUND_JOBS_MAX_WORKERS', self.max_workers)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self.lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix='background-job'
+                    )
+        return self._executor
+
+    def submit(self, name: str, func: Callable, *args, owner_id: int = None,
+               total: int = 0, **kwargs) -> BackgroundJob:
+        """
+        Encolar una tarea. La función recibe la tarea como primer argumento
+        para poder informar su progreso con job.update_progress().
+        """
+        job = BackgroundJob(id=uuid.uuid4().hex, name=name, owner_id=owner_id, total=total)
+
+        with self.lock:
+            self.jobs[job.id] = job
+            self._evict_finished_jobs()
+
+        self.executor.submit(self._run, job, func, args, kwargs)
+        logger.info(f"Tarea encolada: {name} ({job.id})")
+        return job
+
+    def _run(self, job: BackgroundJob, func: Callable, args, kwargs):
+        """Ejecutar tarea dentro del contexto de la aplicación"""
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.utcnow()
+
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    job.result = func(job, *args, **kwargs)
+            else:
+                job.result = func(job, *args, **kwargs)
+            job.status = JobStatus.COMPLETED
+        except Exception as e:
+            job.error = str(e)
+            job.status = JobStatus.FAILED
+            logger.error(f"Error en tarea {job.name} ({job.id}): {e}\n{traceback.format_exc()}")
+        finally:
+            job.finished_at = datetime.utcnow()
+
+    def _evict_finished_jobs(self):
+        """Descartar las tareas terminadas más antiguas (requiere lock)"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.is_finished]
+        excess = len(finished) - self.max_history
+        for job_id in finished[:max(0, excess)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[BackgroundJob]:
+        """Obtener tarea por ID"""
+        return self.jobs.get(job_id)
+
+    def list_jobs(self, owner_id: int = None) -> List[BackgroundJob]:
+        """Listar tareas, opcionalmente filtradas por usuario"""
+        with self.lock:
+            jobs = list(self.jobs.values())
+        if owner_id is not None:
+            jobs = [job for job in jobs if job.owner_id == owner_id]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+
+# Instancia global
+job_manager = BackgroundJobManager()
+
+
+def init_background_jobs(app):
+    """Inicializar gestor de tareas en segundo plano en la aplicación Flask"""
+    job_manager.init_app(app)
+
+    @app.route('/api/v1/jobs/<job_id>', methods=['GET'])
+    @login_required
+    def get_background_job(job_id):
+        """Obtener estado y progreso de una tarea"""
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': 'Tarea no encontrada'}), 404
+
+        if job.owner_id != current_user.id and not current_user.can_access_admin():
+            return jsonify({'success': False, 'error': 'Permisos insuficientes'}), 403
+
+        return jsonify({'success': True, 'data': job.to_dict()})
+
+    print("✅ Gestor de tareas en segundo plano inicializado")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark de Analytics
+Genera una base SQLite temporal (por defecto 10.000 usuarios y 1.000.000 de visitas)
+y mide la segmentación vectorizada frente al enfoque anterior de una consulta por usuario.
+
+Uso: python benchmark_analytics.py [--users 10000] [--visits 1000000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import insert
+
+from models import db, User, Visit, Reservation, Expense, Maintenance
+
+BATCH = 50000
+
+
+def print_header(title):
+    """Imprimir header decorado"""
+    print("\n" + "=" * 60)
+    print(f"🚀 {title}")
+    print("=" * 60)
+
+
+def create_app(path: str) -> Flask:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def populate(users: int, visits: int, seed: int = 42):
+    """Insertar datos sintéticos por lotes con sentencias Core"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    def moment(max_days):
+        return now - timedelta(seconds=rng.randint(0, max_days * 86400))
+
+    db.session.execute(insert(User), [
+        {'username': f'vecino{i}', 'email': f'vecino{i}@test.com', 'name': f'Vecino {i}',
+         'password_hash': 'x', 'role': 'resident', 'created_at': moment(720)}
+        for i in range(users)
+    ])
+
+    for offset in range(0, visits, BATCH):
+        db.session.execute(insert(Visit), [
+            {'visitor_name': 'Invitado', 'resident_id': rng.randint(1, users), 'status': 'completed',
+             'created_at': moment(365)}
+            for _ in range(min(BATCH, visits - offset))
+        ])
+
+    db.session.execute(insert(Reservation), [
+        {'user_id': rng.randint(1, users), 'space_type': 'sum', 'space_name': 'SUM', 'status': 'cancelled',
+         'start_time': now, 'end_time': now, 'created_at': moment(365)}
+        for _ in range(visits // 20)
+    ])
+    db.session.execute(insert(Expense), [
+        {'user_id': rng.randint(1, users), 'month': '2025-01', 'amount': rng.uniform(1000, 50000),
+         'status': rng.choice(['paid', 'pending']), 'created_at': moment(365)}
+        for _ in range(users * 12)
+    ])
+    db.session.execute(insert(Maintenance), [
+        {'user_id': rng.randint(1, users), 'title': 'Reclamo', 'description': '...', 'created_at': moment(365)}
+        for _ in range(users // 2)
+    ])
+    db.session.commit()
+
+
+def legacy_segmentation(sample: int) -> float:
+    """Enfoque anterior: una consulta COUNT por usuario (se mide una muestra y se extrapola)"""
+    since = datetime.utcnow() - timedelta(days=7)
+    users = User.query.limit(sample).all()
+    start = time.perf_counter()
+    for user in users:
+        Visit.query.filter(Visit.resident_id == user.id, Visit.created_at >= since).count()
+    return time.perf_counter() - start
+
+
+def benchmark_segmentation(users: int):
+    from services.user_segmentation import load_user_features, summarize_segments, activity_summary
+
+    print_header("SEGMENTACIÓN DE USUARIOS")
+
+    start = time.perf_counter()
+    features = load_user_features()
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    segments = summarize_segments(features)
+    activity_summary(features)
+    compute_time = time.perf_counter() - start
+
+    sample = min(users, 500)
+    legacy_time = legacy_segmentation(sample) * users / sample
+
+    print(f"Consultas agrupadas: {load_time:.2f}s")
+    print(f"Cálculo vectorizado: {compute_time * 1000:.1f}ms")
+    print(f"Una consulta por usuario (estimado): {legacy_time:.2f}s")
+    for segment in segments:
+        print(f"  {segment['name']}: {segment['user_count']} usuarios "
+              f"(engagement {segment['engagement_score']:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de analytics')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--visits', type=int, default=1000000)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = create_app(path)
+
+    try:
+        with app.app_context():
+            db.create_all()
+            print_header(f"GENERANDO DATOS: {args.users} usuarios, {args.visits} visitas")
+            start = time.perf_counter()
+            populate(args.users, args.visits)
+            print(f"Datos generados en {time.perf_counter() - start:.1f}s")
+
+            benchmark_segmentation(args.users)
+            db.session.remove()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark del proceso worker
+Mide la latencia de requests mientras corren los ciclos de monitoreo y refresco
+de analytics en el mismo proceso (PROCESS_ROLE=all) frente a ejecutarlos en un
+proceso worker separado, como corren con PROCESS_ROLE=web y worker.py.
+
+Los ciclos se ejecutan con un intervalo comprimido (--interval) para que su
+efecto sobre el GIL sea visible en una corrida corta.
+
+Uso: python benchmark_worker.py [--users 2000] [--visits 100000] [--seconds 10] [--clients 4]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from flask import jsonify
+from sqlalchemy import select
+
+from benchmark_analytics import create_app, populate, print_header
+from models import db, Visit
+
+
+def background_checks():
+    """Verificaciones periódicas que podrían pasar a un proceso separado"""
+    from intelligent_monitoring import intelligent_monitoring
+    from services.user_segmentation import load_user_features, summarize_segments
+
+    def segmentation():
+        summarize_segments(load_user_features())
+
+    return [
+        intelligent_monitoring._check_user_activity,
+        intelligent_monitoring._check_maintenance_trends,
+        intelligent_monitoring._check_financial_metrics,
+        segmentation
+    ]
+
+
+def run_background(path: str, interval: float, stop):
+    """Ejecutar las verificaciones en ciclo hasta que se pida detenerlas"""
+    app = create_app(path)
+    checks = background_checks()
+    with app.app_context():
+        while not stop.is_set():
+            for check in checks:
+                try:
+                    check()
+                except Exception as e:
+                    print(f"⚠️ Error en verificación: {e}")
+                db.session.remove()
+            stop.wait(interval)
+
+
+def measure_requests(app, seconds: float, clients: int):
+    """Requests concurrentes con el cliente de pruebas; devuelve latencias en ms"""
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        local = []
+        with app.test_client() as test_client:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                test_client.get('/recent-visits')
+                local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies)
+
+
+def report(title: str, latencies):
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+    print(f"{title}: {len(latencies)} requests | p50 {percentile(50):.1f}ms | "
+          f"p95 {percentile(95):.1f}ms | p99 {percentile(99):.1f}ms")
+    return percentile(95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del proceso worker')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--visits', type=int, default=100000)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=0.5)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = create_app(path)
+
+    @app.route('/recent-visits')
+    def recent_visits():
+        visits = db.session.execute(select(Visit).order_by(Visit.id.desc()).limit(50)).scalars().all()
+        return jsonify([{'id': visit.id, 'visitor': visit.visitor_name, 'status': visit.status,
+                         'created_at': visit.created_at.isoformat()} for visit in visits])
+
+    try:
+        with app.app_context():
+            db.create_all()
+            print_header(f"GENERANDO DATOS: {args.users} usuarios, {args.visits} visitas")
+            populate(args.users, args.visits)
+            db.session.remove()
+
+        print_header("LATENCIA DE REQUESTS")
+        baseline = report("Sin tareas en segundo plano", measure_requests(app, args.seconds, args.clients))
+
+        # PROCESS_ROLE=all: los ciclos comparten el GIL con los requests
+        stop = threading.Event()
+        thread = threading.Thread(target=run_background, args=(path, args.interval, stop), daemon=True)
+        thread.start()
+        same_process = report("Tareas en el proceso web", measure_requests(app, args.seconds, args.clients))
+        stop.set()
+        thread.join()
+
+        # Los ciclos en un proceso separado
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        worker = context.Process(target=run_background, args=(path, args.interval, stop))
+        worker.start()
+        separate = report("Tareas en proceso worker", measure_requests(app, args.seconds, args.clients))
+        stop.set()
+        worker.join()
+
+        print(f"\np95 con worker separado: {separate:.1f}ms frente a {same_process:.1f}ms "
+              f"({(1 - separate / same_process) * 100:.0f}% menos; base {baseline:.1f}ms)")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,9 @@ from functools import wraps
 from flask import current_app, request
 import logging
 
+from slo_tracker import note_cache_miss
+from request_tracing import traced
+
 logger = logging.getLogger(__name__)
 
 class CacheManager:
@@ -62,6 +65,7 @@ class CacheManager:
         
         return key_string
     
+    @traced('cache.get', key_arg=1)
     def get(self, key, default=None):
         """Obtener valor del caché"""
         if not self.is_connected():
@@ -70,6 +74,7 @@ class CacheManager:
         try:
             value = self.redis_client.get(key)
             if value is None:
+                note_cache_miss()
                 return default
             
             # Intentar deserializar como JSON primero
@@ -82,6 +87,7 @@ class CacheManager:
             logger.error(f"Error al obtener caché para {key}: {e}")
             return default
     
+    @traced('cache.set', key_arg=1)
     def set(self, key, value, timeout=None):
         """Establecer valor en caché"""
         if not self.is_connected():
@@ -102,6 +108,7 @@ class CacheManager:
             logger.error(f"Error al establecer caché para {key}: {e}")
             return False
     
+    @traced('cache.delete', key_arg=1)
     def delete(self, key):
         """Eliminar clave del caché"""
         if not self.is_connected():
@@ -246,27 +253,14 @@ class SpaceCache:
     """Caché específico para espacios comunes"""
     
     @staticmethod
-    @cached(timeout=1800, key_prefix="spaces")  # 30 minutos
+    @cached(timeout=60, key_prefix="spaces")  # 1 minuto, igual que el índice de disponibilidad
     def get_available_spaces(date):
         """Obtener espacios disponibles para una fecha"""
-        from models import Reservation, Space
-        
-        # Obtener reservas existentes para la fecha
-        existing_reservations = Reservation.query.filter(
-            Reservation.date == date,
-            Reservation.status.in_(['confirmed', 'pending'])
-        ).all()
-        
-        # Calcular disponibilidad
-        spaces = Space.query.all()
-        availability = {}
+        from services.reservation_availability import availability_engine
+        from dateutil import parser
         
-        for space in spaces:
-            space_reservations = [r for r in existing_reservations if r.space_id == space.id]
-            availability[space.id] = {
-                'space': space,
-                'reserved_hours': [r.start_time.hour for r in space_reservations],
-                'available': True
-            }
+        day = parser.parse(date).date() if isinstance(date, str) else date
+        if isinstance(day, datetime):
+            day = day.date()
         
-        return availability
+        return availability_engine.spaces_summary(day)
@@ -307,17 +307,16 @@ def start_demo_detection(camera_id='CAM_001'):
     """Iniciar demostración de detección"""
     print(f"🎬 Demo de detección iniciada para cámara {camera_id}")
     
-    # Simular algunas detecciones
+    # Simular algunas detecciones en el gestor de tareas en segundo plano
     import time
-    import threading
+    from background_jobs import job_manager
     
-    def demo_loop():
+    def demo_loop(job):
         for i in range(3):
             frame_data = f"demo_frame_{i}"
             result = camera_detector.analyze_frame(camera_id, frame_data)
             print(f"Demo {i+1}: {result.get('total_incidents', 0)} incidentes detectados")
+            job.update_progress(i + 1, 3)
             time.sleep(2)
     
-    thread = threading.Thread(target=demo_loop)
-    thread.daemon = True
-    thread.start()
+    return job_manager.submit('camera_demo', demo_loop, total=3)
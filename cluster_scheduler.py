@@ -0,0 +1,703 @@
+"""
+Programador de tareas del cluster
+Registro único de tareas periódicas (intervalo o cron) ejecutadas por un solo
+hilo por proceso. Las tareas de alcance 'cluster' corren solo en el worker que
+tiene el liderazgo (lock de archivo, lock consultivo de PostgreSQL o lease en
+Redis), de modo que cada una se ejecuta una vez por cluster; las de alcance
+'local' mantienen estado en memoria de cada worker y corren en todos.
+
+Cada tarea declara en `roles` qué procesos la ejecutan: el proceso worker
+(PROCESS_ROLE=worker, worker.py) o los procesos que hacen de todo (all). Los
+procesos web (PROCESS_ROLE=web) solo atienden requests: no inician el hilo del
+programador ni compiten por el liderazgo. Lo que las tareas calculan y las
+páginas muestran (resúmenes del monitoreo, KPIs, alertas, totales de requests)
+se comparte por la base de datos (shared_state) y la cola de trabajos.
+"""
+
+import fcntl
+import logging
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# Configuración del programador
+SCHEDULER_CONFIG = {
+    'lease_backend': os.environ.get('SCHEDULER_LEASE_BACKEND', 'auto'),   # auto | file | database | redis
+    'lease_seconds': 30,             # Vigencia del lease en Redis
+    'lock_path': os.environ.get('SCHEDULER_LOCK_PATH',
+                                os.path.join(tempfile.gettempdir(), 'portal_scheduler.lock')),
+    'redis_key': 'portal:scheduler:leader',
+    'advisory_lock_id': 724301,      # Clave del lock consultivo de PostgreSQL
+    'tick_seconds': 1.0,
+    'max_workers': 4,                # Tareas ejecutándose a la vez por proceso
+    'default_timeout': 600,
+    'history_size': 50,
+    'status_key': 'cluster_scheduler.status',   # Estado publicado para los procesos web
+    'status_seconds': 15,
+    # Con gunicorn el hilo se inicia en cada worker (post_fork o primer request), no en el master
+    'defer_start': os.environ.get('SCHEDULER_DEFER_START', '').lower() in ('1', 'true', 'yes'),
+    # all: requests y tareas | web: solo requests, sin hilos de fondo | worker: tareas y cola de trabajos
+    'process_role': os.environ.get('PROCESS_ROLE', 'all').lower()
+}
+
+SCOPES = ('cluster', 'local')
+PROCESS_ROLES = ('all', 'web', 'worker')
+JOB_ROLES = ('all', 'worker')          # Los procesos web no ejecutan tareas
+DEFAULT_JOB_ROLES = JOB_ROLES
+
+
+# Disparadores
+
+class IntervalTrigger:
+    """Cada `seconds` segundos; la primera ejecución tras `delay` (por defecto un intervalo)"""
+
+    def __init__(self, seconds: float, delay: float = None):
+        if seconds <= 0:
+            raise ValueError('El intervalo debe ser positivo')
+        self.seconds = seconds
+        self.delay = delay
+
+    def first_run(self, now: float) -> float:
+        return now + (self.seconds if self.delay is None else self.delay)
+
+    def next_run(self, now: float) -> float:
+        return now + self.seconds
+
+    def describe(self) -> str:
+        return f'every {self.seconds:g}s'
+
+
+def _parse_cron_field(expression: str, low: int, high: int) -> List[int]:
+    values = set()
+    for part in expression.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f'Paso inválido en cron: {expression}')
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f'Valor fuera de rango en cron: {expression}')
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+class CronTrigger:
+    """Expresión cron de cinco campos (minuto hora día mes día-de-semana) en hora local"""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'La expresión cron necesita 5 campos: {expression}')
+        self.expression = expression
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        # 0 y 7 son domingo; se pasa a la numeración de Python (lunes = 0)
+        self.weekdays = sorted({(day - 1) % 7 for day in _parse_cron_field(fields[4], 0, 7)})
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = moment.weekday() in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok   # Como en cron, con ambos restringidos basta uno
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f'La expresión cron no tiene próximas ejecuciones: {self.expression}')
+
+    def first_run(self, now: float) -> float:
+        return self.next_run(now)
+
+    def next_run(self, now: float) -> float:
+        return self.next_after(datetime.fromtimestamp(now)).timestamp()
+
+    def describe(self) -> str:
+        return f'cron {self.expression}'
+
+
+def daily_at(hour_minute: str) -> CronTrigger:
+    """Disparador diario a la hora 'HH:MM'"""
+    hour, minute = (int(value) for value in hour_minute.split(':'))
+    return CronTrigger(f'{minute} {hour} * * *')
+
+
+# Liderazgo
+
+class FileLease:
+    """Lock exclusivo de archivo: un solo proceso por host; se libera solo si el proceso muere"""
+
+    name = 'file'
+
+    def __init__(self, path: str = None):
+        self.path = path or SCHEDULER_CONFIG['lock_path']
+        self._handle = None
+
+    def acquire(self) -> bool:
+        if self._handle is not None:
+            return True
+        handle = open(self.path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._handle = handle
+        return True
+
+    def release(self):
+        if self._handle is not None:
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+            self._handle.close()
+            self._handle = None
+
+
+class RedisLease:
+    """Lease con vencimiento en Redis, renovado por el líder antes de que venza"""
+
+    name = 'redis'
+    _RENEW = ("if redis.call('get', KEYS[1]) == ARGV[1] then "
+              "return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end")
+    _RELEASE = ("if redis.call('get', KEYS[1]) == ARGV[1] then "
+                "return redis.call('del', KEYS[1]) else return 0 end")
+
+    def __init__(self, client, node_id: str, key: str = None, seconds: int = None):
+        self.client = client
+        self.node_id = node_id
+        self.key = key or SCHEDULER_CONFIG['redis_key']
+        self.milliseconds = int((seconds or SCHEDULER_CONFIG['lease_seconds']) * 1000)
+
+    def acquire(self) -> bool:
+        if self.client.eval(self._RENEW, 1, self.key, self.node_id, self.milliseconds):
+            return True
+        return bool(self.client.set(self.key, self.node_id, nx=True, px=self.milliseconds))
+
+    def release(self):
+        self.client.eval(self._RELEASE, 1, self.key, self.node_id)
+
+
+class DatabaseLease:
+    """Lock consultivo de PostgreSQL tomado en una conexión dedicada"""
+
+    name = 'database'
+
+    def __init__(self, engine, lock_id: int = None):
+        self.engine = engine
+        self.lock_id = lock_id or SCHEDULER_CONFIG['advisory_lock_id']
+        self._connection = None
+
+    def acquire(self) -> bool:
+        from sqlalchemy import text
+
+        if self._connection is not None:
+            try:
+                self._connection.execute(text('SELECT 1'))
+                return True
+            except Exception:
+                # Conexión perdida: el lock se liberó junto con ella
+                self._discard()
+        # Sin autocommit el SELECT abre una transacción que nunca se confirma: la conexión queda
+        # "idle in transaction" y idle_in_transaction_session_timeout la cierra junto con el lock
+        connection = self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        if connection.execute(text('SELECT pg_try_advisory_lock(:id)'), {'id': self.lock_id}).scalar():
+            self._connection = connection
+            return True
+        connection.close()
+        return False
+
+    def _discard(self):
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+
+    def release(self):
+        from sqlalchemy import text
+
+        if self._connection is not None:
+            try:
+                self._connection.execute(text('SELECT pg_advisory_unlock(:id)'), {'id': self.lock_id})
+            finally:
+                self._discard()
+
+
+# Tareas
+
+@dataclass
+class JobRun:
+    """Resultado de una ejecución"""
+    job: str
+    node: str
+    trigger: str
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    status: str = 'running'           # running | success | error | timeout
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job': self.job,
+            'node': self.node,
+            'trigger': self.trigger,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration': self.duration,
+            'status': self.status,
+            'error': self.error
+        }
+
+
+@dataclass
+class ScheduledJob:
+    """Tarea registrada con su disparador y su historial"""
+    name: str
+    func: Callable
+    trigger: Any
+    scope: str = 'cluster'
+    timeout: float = None
+    jitter: float = 0
+    app_context: bool = True
+    description: str = ''
+    roles: Tuple[str, ...] = DEFAULT_JOB_ROLES
+    next_run: Optional[float] = None
+    running: Optional[JobRun] = None
+    deadline: Optional[float] = None
+    history: deque = field(default_factory=lambda: deque(maxlen=SCHEDULER_CONFIG['history_size']))
+    skipped: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        last = self.history[-1] if self.history else None
+        return {
+            'name': self.name,
+            'description': self.description,
+            'scope': self.scope,
+            'roles': list(self.roles),
+            'trigger': self.trigger.describe(),
+            'timeout': self.timeout,
+            'jitter': self.jitter,
+            'next_run': datetime.fromtimestamp(self.next_run).isoformat() if self.next_run else None,
+            'running': self.running is not None,
+            'last_status': last.status if last else None,
+            'skipped_overlaps': self.skipped
+        }
+
+
+class ClusterScheduler:
+    """Registro de tareas y hilo de disparo por proceso con elección de líder"""
+
+    def __init__(self):
+        self.app = None
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self.lock = threading.RLock()
+        self.lease = None
+        self.is_leader = False
+        self.is_running = False
+        self.node_id = None
+        self._pid = None
+        self._executor = None
+        self._stop = threading.Event()
+
+    # Registro
+
+    def register(self, name: str, func: Callable, trigger, scope: str = 'cluster', timeout: float = None,
+                 jitter: float = 0, app_context: bool = True, description: str = '',
+                 roles: Tuple[str, ...] = DEFAULT_JOB_ROLES) -> ScheduledJob:
+        """Registrar (o reemplazar) una tarea por nombre"""
+        if scope not in SCOPES:
+            raise ValueError(f'Alcance no soportado: {scope}')
+        unknown = set(roles) - set(JOB_ROLES)
+        if unknown:
+            raise ValueError(f'Roles no soportados: {sorted(unknown)} (los procesos web no ejecutan tareas)')
+        job = ScheduledJob(name=name, func=func, trigger=trigger, scope=scope,
+                           timeout=timeout or SCHEDULER_CONFIG['default_timeout'], jitter=jitter,
+                           app_context=app_context, description=description or getattr(func, '__doc__', '') or '',
+                           roles=tuple(roles))
+        with self.lock:
+            previous = self.jobs.get(name)
+            if previous is not None:
+                job.history = previous.history
+                job.running = previous.running
+            self.jobs[name] = job
+            self._schedule_first(job, time.time())
+        return job
+
+    def interval(self, name: str, seconds: float, func: Callable, delay: float = None, **options) -> ScheduledJob:
+        return self.register(name, func, IntervalTrigger(seconds, delay), **options)
+
+    def cron(self, name: str, expression: str, func: Callable, **options) -> ScheduledJob:
+        return self.register(name, func, CronTrigger(expression), **options)
+
+    def unregister(self, name: str):
+        with self.lock:
+            self.jobs.pop(name, None)
+
+    def _jitter(self, job: ScheduledJob) -> float:
+        return random.uniform(0, job.jitter) if job.jitter else 0.0
+
+    def _schedule_first(self, job: ScheduledJob, now: float):
+        job.next_run = job.trigger.first_run(now) + self._jitter(job)
+
+    # Liderazgo
+
+    def _create_lease(self):
+        backend = SCHEDULER_CONFIG['lease_backend']
+        app = self.app
+
+        if backend in ('auto', 'redis') and app is not None:
+            redis_url = app.config.get('SCHEDULER_REDIS_URL', app.config.get('REDIS_URL'))
+            if redis_url and not app.config.get('TESTING'):
+                try:
+                    import redis
+                    client = redis.from_url(redis_url, socket_timeout=1)
+                    client.ping()
+                    return RedisLease(client, self.node_id)
+                except Exception as e:
+                    if backend == 'redis':
+                        logger.warning(f'Lease en Redis no disponible ({e}), se usa lock de archivo')
+
+        if backend in ('auto', 'database') and app is not None:
+            with app.app_context():
+                from models import db
+                if db.engine.dialect.name == 'postgresql':
+                    return DatabaseLease(db.engine)
+                if backend == 'database':
+                    logger.warning('El lock consultivo requiere PostgreSQL, se usa lock de archivo')
+
+        return FileLease()
+
+    @staticmethod
+    def role() -> str:
+        role = SCHEDULER_CONFIG['process_role']
+        return role if role in PROCESS_ROLES else 'all'
+
+    def _refresh_leadership(self):
+        was_leader = self.is_leader
+        if self.role() == 'web':
+            # Los procesos web no ejecutan tareas: el líder sale del worker (o de los procesos 'all')
+            self.is_leader = False
+            return
+        try:
+            if self.lease is None:
+                self.lease = self._create_lease()
+            if self.app is not None and isinstance(self.lease, DatabaseLease):
+                with self.app.app_context():
+                    self.is_leader = self.lease.acquire()
+            else:
+                self.is_leader = self.lease.acquire()
+        except Exception as e:
+            logger.warning(f'Error verificando liderazgo del programador: {e}')
+            self.is_leader = False
+        if self.is_leader != was_leader:
+            logger.info(f"Programador {self.node_id}: {'líder' if self.is_leader else 'seguidor'} "
+                        f"({self.lease.name if self.lease else 'sin lease'})")
+            _leader_gauge().set(1 if self.is_leader else 0)
+
+    # Ejecución
+
+    def _invoke(self, job: ScheduledJob):
+        if job.app_context and self.app is not None:
+            with self.app.app_context():
+                return job.func()
+        return job.func()
+
+    def _finish(self, job: ScheduledJob, run: JobRun, status: str, error: str = None):
+        with self.lock:
+            if run.status == 'running':
+                run.status = status
+                run.error = error
+                run.finished_at = datetime.utcnow()
+                _record_run_metrics(run)
+            if job.running is run:
+                job.running = None
+                job.deadline = None
+
+    def _execute(self, job: ScheduledJob, run: JobRun):
+        try:
+            self._invoke(job)
+            self._finish(job, run, 'success')
+        except Exception as e:
+            logger.error(f'Error en tarea programada {job.name}: {e}')
+            self._finish(job, run, 'error', str(e))
+
+    def _start_run(self, job: ScheduledJob, trigger: str, now: float) -> JobRun:
+        # Se llama con el lock tomado
+        run = JobRun(job=job.name, node=self.node_id, trigger=trigger, started_at=datetime.utcnow())
+        job.running = run
+        job.deadline = now + job.timeout
+        job.history.append(run)
+        self._executor.submit(self._execute, job, run)
+        return run
+
+    def tick(self, now: float = None) -> List[str]:
+        """Disparar las tareas vencidas; devuelve los nombres iniciados"""
+        now = time.time() if now is None else now
+        started = []
+        with self.lock:
+            for job in list(self.jobs.values()):
+                if job.running is not None and job.deadline is not None and now > job.deadline:
+                    # No se puede interrumpir un hilo: la ejecución queda marcada y sin superposición
+                    run = job.running
+                    run.status, run.error, run.finished_at = 'timeout', f'Superó {job.timeout:g}s', datetime.utcnow()
+                    _record_run_metrics(run)
+                    job.deadline = None
+                    logger.warning(f'Tarea programada {job.name} superó su tiempo límite')
+
+                if job.next_run is None or now < job.next_run:
+                    continue
+                job.next_run = job.trigger.next_run(now) + self._jitter(job)
+                if self.role() not in job.roles:
+                    continue
+                if job.scope == 'cluster' and not self.is_leader:
+                    continue
+                if job.running is not None:
+                    job.skipped += 1
+                    continue
+                self._start_run(job, 'schedule', now)
+                started.append(job.name)
+        return started
+
+    def run_now(self, name: str) -> Dict[str, Any]:
+        """Ejecutar una tarea en este proceso y esperar el resultado"""
+        with self.lock:
+            job = self.jobs.get(name)
+            if job is None:
+                raise KeyError(name)
+            if job.running is not None:
+                raise RuntimeError(f'La tarea {name} ya se está ejecutando')
+            run = JobRun(job=name, node=self.node_id or self._node(), trigger='manual', started_at=datetime.utcnow())
+            job.running = run
+            job.history.append(run)
+        self._execute(job, run)
+        return run.to_dict()
+
+    # Ciclo de vida
+
+    @staticmethod
+    def _node() -> str:
+        return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+
+    def start(self):
+        """Iniciar el hilo en este proceso (tras un fork se reinicia con lease propio)"""
+        if self.role() == 'web':
+            logger.info('Proceso web: el programador de tareas no se inicia (las tareas corren en el worker)')
+            return
+        pid = os.getpid()
+        if self.is_running and self._pid == pid:
+            return
+        with self.lock:
+            if self.is_running and self._pid == pid:
+                return
+            self._pid = pid
+            self.node_id = self._node()
+            self.lease = None
+            self.is_leader = False
+            self._executor = ThreadPoolExecutor(max_workers=SCHEDULER_CONFIG['max_workers'],
+                                                thread_name_prefix='cluster-scheduler')
+            self._stop.clear()
+            self.is_running = True
+            # Las ejecuciones heredadas del proceso padre no existen en este proceso
+            for job in self.jobs.values():
+                job.running = None
+                job.deadline = None
+
+        def run():
+            last_election = 0.0
+            while not self._stop.is_set():
+                now = time.time()
+                if now - last_election >= SCHEDULER_CONFIG['lease_seconds'] / 3:
+                    self._refresh_leadership()
+                    last_election = now
+                try:
+                    self.tick(now)
+                except Exception as e:
+                    logger.error(f'Error en el programador de tareas: {e}')
+                self._stop.wait(SCHEDULER_CONFIG['tick_seconds'])
+
+        threading.Thread(target=run, daemon=True, name='cluster-scheduler').start()
+
+    def stop(self):
+        self._stop.set()
+        with self.lock:
+            self.is_running = False
+            if self.lease is not None:
+                try:
+                    self.lease.release()
+                except Exception as e:
+                    logger.debug(f'No se pudo liberar el lease: {e}')
+            self.is_leader = False
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'node': self.node_id,
+                'role': self.role(),
+                'is_running': self.is_running,
+                'is_leader': self.is_leader,
+                'lease_backend': self.lease.name if self.lease else None,
+                'jobs': [job.to_dict() for job in sorted(self.jobs.values(), key=lambda job: job.name)]
+            }
+
+    def history(self, name: str) -> List[Dict[str, Any]]:
+        with self.lock:
+            job = self.jobs.get(name)
+            return [run.to_dict() for run in reversed(job.history)] if job else []
+
+    def publish_status(self):
+        """Publicar estado e historial para que los procesos web (sin hilo propio) los muestren"""
+        from shared_state import shared_state
+
+        data = self.status()
+        data['history'] = {job['name']: self.history(job['name']) for job in data['jobs']}
+        data['published_at'] = datetime.utcnow().isoformat()
+        shared_state.publish(SCHEDULER_CONFIG['status_key'], data)
+
+    def published_status(self) -> Optional[Dict[str, Any]]:
+        from shared_state import shared_state
+        return shared_state.read(SCHEDULER_CONFIG['status_key'])
+
+
+# Instancia global
+cluster_scheduler = ClusterScheduler()
+
+
+def _leader_gauge():
+    from metrics_registry import metrics_registry
+    return metrics_registry.gauge('portal_scheduler_leader', 'Proceso líder del programador de tareas', mode='all')
+
+
+def _record_run_metrics(run: JobRun):
+    try:
+        from metrics_registry import metrics_registry
+        metrics_registry.counter('portal_scheduler_runs', 'Ejecuciones de tareas programadas',
+                                 ['job', 'status']).inc(job=run.job, status=run.status)
+        if run.duration is not None:
+            metrics_registry.histogram('portal_scheduler_run_duration_seconds', 'Duración de tareas programadas',
+                                       ['job'], buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+                                       ).observe(run.duration, job=run.job)
+    except Exception as e:
+        logger.debug(f'No se pudieron registrar métricas del programador: {e}')
+
+
+def init_cluster_scheduler(app):
+    """Inicializar el programador y sus rutas de administración"""
+    from flask_login import login_required, current_user
+
+    cluster_scheduler.app = app
+
+    from job_queue import job_queue
+
+    @job_queue.handler('scheduler.run')
+    def run_queued_scheduler_job(name):
+        """Ejecución manual pedida desde un proceso web"""
+        run = cluster_scheduler.run_now(name)
+        if run['status'] == 'error':
+            raise RuntimeError(run['error'])
+
+    cluster_scheduler.interval('cluster_scheduler.status', SCHEDULER_CONFIG['status_seconds'],
+                               cluster_scheduler.publish_status, scope='cluster')
+
+    def admin_required():
+        if not current_user.can_access_admin():
+            return jsonify({'success': False, 'error': 'Permisos insuficientes'}), 403
+        return None
+
+    @app.route('/api/v1/scheduler/jobs', methods=['GET'])
+    @login_required
+    def get_scheduler_jobs():
+        """Tareas registradas, liderazgo del proceso e historial opcional"""
+        denied = admin_required()
+        if denied:
+            return denied
+        name = request.args.get('history')
+        published = cluster_scheduler.published_status() if cluster_scheduler.role() == 'web' else None
+        if published:
+            # Las tareas corren en el worker: se muestra lo que publicó su líder
+            data = dict(published)
+            history = data.pop('history', {})
+            if name:
+                data['history'] = history.get(name, [])
+        else:
+            data = cluster_scheduler.status()
+            if name:
+                data['history'] = cluster_scheduler.history(name)
+        return jsonify({'success': True, 'data': data})
+
+    @app.route('/api/v1/scheduler/jobs/<name>/run', methods=['POST'])
+    @login_required
+    def run_scheduler_job(name):
+        """Ejecutar una tarea ahora, en segundo plano (en el worker si este es un proceso web)"""
+        denied = admin_required()
+        if denied:
+            return denied
+        if name not in cluster_scheduler.jobs:
+            return jsonify({'success': False, 'error': f'Tarea desconocida: {name}'}), 404
+
+        if cluster_scheduler.role() == 'web':
+            job_id = job_queue.enqueue('scheduler.run', {'name': name}, max_attempts=1)
+            return jsonify({'success': True, 'queued_job_id': job_id}), 202
+
+        from background_jobs import job_manager
+        from flask import url_for
+
+        job = job_manager.submit(f'scheduler:{name}', lambda _job: cluster_scheduler.run_now(name),
+                                 owner_id=current_user.id)
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': url_for('get_background_job', job_id=job.id)
+        }), 202
+
+    if app.config.get('SCHEDULER_ENABLED', True):
+        if SCHEDULER_CONFIG['defer_start']:
+            @app.before_request
+            def start_cluster_scheduler():
+                cluster_scheduler.start()
+        else:
+            cluster_scheduler.start()
+
+    print("✅ Programador de tareas del cluster inicializado")
@@ -48,6 +48,12 @@ class Config:
     
     # Configuración de Redis (para Celery y cache)
     REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+    # Token Bearer requerido por /metrics (sin token el endpoint es público)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Valor de X-Trace que fuerza una traza sin sesión de admin (sin token solo los admins con X-Trace: 1)
+    TRACING_TOKEN = os.environ.get('TRACING_TOKEN')
     
     # Configuración de sesión
     PERMANENT_SESSION_LIFETIME = timedelta(days=30)
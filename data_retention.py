@@ -0,0 +1,435 @@
+"""
+Retención y Archivo de Datos
+Políticas por modelo que mueven filas frías a tablas <tabla>_archive o compactan
+columnas pesadas, por bloques y en segundo plano, con una vía de consulta que
+incluye lo archivado para administradores.
+"""
+
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, date
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import jsonify, request
+from flask_login import login_required, current_user
+from sqlalchemy import (MetaData, Table, Column, DateTime, select, insert, delete, update,
+                        literal, union_all, func, bindparam, true, false)
+
+from models import db, Notification, ChatbotSession, Visit, SecurityReport
+
+logger = logging.getLogger(__name__)
+
+# Configuración de retención
+RETENTION_CONFIG = {
+    'batch_size': 1000,
+    'max_batches_per_run': 100,   # Límite de bloques por política en cada ejecución
+    'batch_pause': 0.05,          # Segundos entre bloques para no saturar la base de datos
+    'run_at': '04:00',            # Ejecución diaria programada
+    'chatbot_history_keep': 20,   # Mensajes que se conservan al compactar una sesión
+    'max_records_page': 500
+}
+
+
+class RetentionAction(Enum):
+    """Acciones de retención"""
+    ARCHIVE = "archive"    # Mover a tabla de archivo
+    COMPACT = "compact"    # Reducir columnas pesadas sin mover la fila
+
+
+@dataclass
+class RetentionPolicy:
+    """Política de retención para un modelo"""
+    name: str
+    model: Any
+    age_column: Any
+    max_age_days: int
+    action: RetentionAction
+    description: str
+    criteria: Callable[[], List[Any]] = lambda: []
+    compact_values: Dict[str, Any] = field(default_factory=dict)   # Compactación por UPDATE directo
+    transform_column: Optional[str] = None                         # Compactación fila a fila
+    transform: Optional[Callable[[Any], Any]] = None
+
+    def conditions(self, now: datetime = None) -> List[Any]:
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.max_age_days)
+        return [self.age_column < cutoff] + list(self.criteria())
+
+
+def compact_chatbot_context(raw: Optional[str]) -> Optional[str]:
+    """Conservar solo los últimos mensajes de cada historial del contexto JSON"""
+    if not raw:
+        return raw
+    try:
+        context = json.loads(raw)
+    except (TypeError, ValueError):
+        return raw
+
+    keep = RETENTION_CONFIG['chatbot_history_keep']
+    if isinstance(context, list):
+        context = context[-keep:]
+    elif isinstance(context, dict):
+        context = {key: value[-keep:] if isinstance(value, list) else value for key, value in context.items()}
+    return json.dumps(context, ensure_ascii=False)
+
+
+RETENTION_POLICIES = [
+    RetentionPolicy(
+        name='notifications_read',
+        model=Notification,
+        age_column=Notification.created_at,
+        max_age_days=90,
+        action=RetentionAction.ARCHIVE,
+        description='Archivar notificaciones leídas de más de 90 días',
+        criteria=lambda: [Notification.is_read == True]
+    ),
+    RetentionPolicy(
+        name='notifications_unread',
+        model=Notification,
+        age_column=Notification.created_at,
+        max_age_days=365,
+        action=RetentionAction.ARCHIVE,
+        description='Archivar notificaciones no leídas de más de un año'
+    ),
+    RetentionPolicy(
+        name='chatbot_sessions_compact',
+        model=ChatbotSession,
+        age_column=ChatbotSession.updated_at,
+        max_age_days=1,
+        action=RetentionAction.COMPACT,
+        description='Cerrar sesiones de chatbot inactivas y recortar su historial',
+        criteria=lambda: [ChatbotSession.is_active == True],
+        compact_values={'is_active': False},
+        transform_column='context',
+        transform=compact_chatbot_context
+    ),
+    RetentionPolicy(
+        name='chatbot_sessions_archive',
+        model=ChatbotSession,
+        age_column=ChatbotSession.updated_at,
+        max_age_days=90,
+        action=RetentionAction.ARCHIVE,
+        description='Archivar sesiones de chatbot finalizadas hace más de 90 días',
+        criteria=lambda: [ChatbotSession.is_active == False]
+    ),
+    RetentionPolicy(
+        name='visits_strip_qr',
+        model=Visit,
+        age_column=Visit.created_at,
+        max_age_days=7,
+        action=RetentionAction.COMPACT,
+        description='Quitar el QR en base64 de visitas finalizadas (se regenera desde qr_code_id)',
+        criteria=lambda: [Visit.status.in_(['completed', 'cancelled']), Visit.qr_code.isnot(None)],
+        compact_values={'qr_code': None}
+    ),
+    RetentionPolicy(
+        name='visits_archive',
+        model=Visit,
+        age_column=Visit.created_at,
+        max_age_days=365,
+        action=RetentionAction.ARCHIVE,
+        description='Archivar visitas finalizadas de más de un año',
+        criteria=lambda: [Visit.status.in_(['completed', 'cancelled'])]
+    ),
+    RetentionPolicy(
+        name='security_reports_archive',
+        model=SecurityReport,
+        age_column=SecurityReport.updated_at,
+        max_age_days=730,
+        action=RetentionAction.ARCHIVE,
+        description='Archivar reportes de seguridad cerrados hace más de dos años',
+        criteria=lambda: [SecurityReport.status.in_(['resolved', 'closed'])]
+    )
+]
+
+# Tablas de archivo: misma estructura sin claves foráneas ni restricciones únicas
+archive_metadata = MetaData()
+
+
+def archive_table_for(model) -> Table:
+    """Tabla <tabla>_archive con las columnas del modelo más archived_at"""
+    name = f'{model.__tablename__}_archive'
+    if name in archive_metadata.tables:
+        return archive_metadata.tables[name]
+
+    columns = [Column(column.name, column.type, primary_key=column.primary_key, autoincrement=False)
+               for column in model.__table__.columns]
+    columns.append(Column('archived_at', DateTime, nullable=False, index=True))
+    return Table(name, archive_metadata, *columns)
+
+
+ARCHIVED_MODELS = {policy.model.__tablename__: policy.model for policy in RETENTION_POLICIES}
+
+
+class RetentionManager:
+    """Ejecutor de políticas de retención"""
+
+    def __init__(self, policies: List[RetentionPolicy] = None):
+        self.app = None
+        self.policies = {policy.name: policy for policy in (policies or RETENTION_POLICIES)}
+        self.lock = threading.Lock()
+        self.is_running = False
+        self.last_run = None
+        self._tables_ready = False
+
+    def init_app(self, app):
+        """Inicializar con la aplicación Flask"""
+        self.app = app
+        for key in ('batch_size', 'max_batches_per_run', 'run_at'):
+            RETENTION_CONFIG[key] = app.config.get(f'RETENTION_{key.upper()}', RETENTION_CONFIG[key])
+
+    def ensure_archive_tables(self):
+        """Crear tablas de archivo faltantes"""
+        if self._tables_ready:
+            return
+        for model in ARCHIVED_MODELS.values():
+            archive_table_for(model)
+        archive_metadata.create_all(db.engine)
+        self._tables_ready = True
+
+    def pending_count(self, policy: RetentionPolicy) -> int:
+        """Filas que la política procesaría ahora"""
+        primary_key = policy.model.__table__.primary_key.columns.values()[0]
+        return db.session.execute(
+            select(func.count(primary_key)).where(*policy.conditions())
+        ).scalar() or 0
+
+    def archived_count(self, model) -> int:
+        self.ensure_archive_tables()
+        table = archive_table_for(model)
+        return db.session.execute(select(func.count()).select_from(table)).scalar() or 0
+
+    def run(self, job=None, policy_names: List[str] = None) -> Dict[str, Any]:
+        """Ejecutar políticas por bloques; cada bloque se confirma por separado"""
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError('Ya hay una ejecución de retención en curso')
+
+        try:
+            self.ensure_archive_tables()
+            policies = [self.policies[name] for name in (policy_names or self.policies) if name in self.policies]
+
+            if job is not None:
+                job.update_progress(0, sum(self.pending_count(policy) for policy in policies))
+
+            processed = 0
+            results = {}
+            for policy in policies:
+                started = time.time()
+                affected = 0
+                for _ in range(RETENTION_CONFIG['max_batches_per_run']):
+                    batch = self._run_batch(policy)
+                    if not batch:
+                        break
+                    affected += batch
+                    processed += batch
+                    if job is not None:
+                        job.update_progress(processed)
+                    time.sleep(RETENTION_CONFIG['batch_pause'])
+
+                results[policy.name] = {
+                    'action': policy.action.value,
+                    'affected': affected,
+                    'duration_seconds': round(time.time() - started, 2)
+                }
+                if affected:
+                    logger.info(f'Retención {policy.name}: {affected} filas ({policy.action.value})')
+
+            self.last_run = {'finished_at': datetime.utcnow().isoformat(), 'results': results}
+            return self.last_run
+        finally:
+            self.lock.release()
+
+    def _run_batch(self, policy: RetentionPolicy) -> int:
+        """Procesar un bloque de filas de la política"""
+        table = policy.model.__table__
+        primary_key = table.primary_key.columns.values()[0]
+
+        try:
+            ids = db.session.execute(
+                select(primary_key).where(*policy.conditions()).order_by(primary_key)
+                .limit(RETENTION_CONFIG['batch_size'])
+            ).scalars().all()
+            if not ids:
+                return 0
+
+            if policy.action == RetentionAction.ARCHIVE:
+                self._archive_rows(policy.model, ids)
+            else:
+                self._compact_rows(policy, ids)
+
+            db.session.commit()
+            return len(ids)
+        except Exception:
+            db.session.rollback()
+            logger.error(f'Error aplicando política de retención {policy.name}')
+            raise
+
+    def _archive_rows(self, model, ids: List[int]):
+        """Copiar filas a la tabla de archivo y eliminarlas de la tabla activa"""
+        table = model.__table__
+        archive = archive_table_for(model)
+        primary_key = table.primary_key.columns.values()[0]
+        names = [column.name for column in table.columns]
+
+        db.session.execute(
+            insert(archive).from_select(
+                names + ['archived_at'],
+                select(*table.columns, literal(datetime.utcnow(), DateTime)).where(primary_key.in_(ids))
+            )
+        )
+        db.session.execute(delete(table).where(primary_key.in_(ids)))
+
+    def _compact_rows(self, policy: RetentionPolicy, ids: List[int]):
+        """Reducir columnas pesadas de un bloque de filas"""
+        table = policy.model.__table__
+        primary_key = table.primary_key.columns.values()[0]
+
+        if policy.transform_column:
+            column = table.c[policy.transform_column]
+            rows = db.session.execute(select(primary_key, column).where(primary_key.in_(ids))).all()
+            params = [{'row_id': row_id, 'value': policy.transform(value)} for row_id, value in rows]
+            if params:
+                db.session.execute(
+                    update(table).where(primary_key == bindparam('row_id')).values({column.name: bindparam('value')}),
+                    params
+                )
+
+        if policy.compact_values:
+            db.session.execute(update(table).where(primary_key.in_(ids)).values(**policy.compact_values))
+
+    def query_with_archived(self, model, filters: Dict[str, Any] = None, include_archived: bool = True,
+                            order_by: str = None, limit: int = 100, offset: int = 0,
+                            exclude_columns: List[str] = None) -> List[Dict[str, Any]]:
+        """
+        Consultar un modelo incluyendo filas archivadas (UNION ALL con su tabla de archivo).
+        Los filtros son igualdades por nombre de columna y se aplican a ambas tablas.
+        """
+        table = model.__table__
+        exclude_columns = set(exclude_columns or [])
+        names = [column.name for column in table.columns if column.name not in exclude_columns]
+        filters = {key: value for key, value in (filters or {}).items() if key in table.c}
+
+        live = select(*[table.c[name] for name in names], false().label('archived')).where(
+            *[table.c[key] == value for key, value in filters.items()]
+        )
+
+        if include_archived:
+            self.ensure_archive_tables()
+            archive = archive_table_for(model)
+            archived = select(*[archive.c[name] for name in names], true().label('archived')).where(
+                *[archive.c[key] == value for key, value in filters.items()]
+            )
+            combined = union_all(live, archived).subquery()
+        else:
+            combined = live.subquery()
+
+        order_column = combined.c[order_by] if order_by and order_by in combined.c else combined.c[names[0]]
+        rows = db.session.execute(
+            select(combined).order_by(order_column.desc()).limit(limit).offset(offset)
+        ).mappings().all()
+
+        return [{key: value.isoformat() if isinstance(value, (datetime, date)) else value
+                 for key, value in row.items()} for row in rows]
+
+    def start_scheduler(self):
+        """Programar la ejecución diaria, una vez por cluster"""
+        if self.is_running:
+            return
+        from cluster_scheduler import cluster_scheduler, daily_at
+
+        cluster_scheduler.register('data_retention.run', self.run, daily_at(RETENTION_CONFIG['run_at']), timeout=3 * 3600)
+        self.is_running = True
+
+
+# Instancia global
+retention_manager = RetentionManager()
+
+
+def init_data_retention(app):
+    """Inicializar retención de datos en la aplicación Flask"""
+    retention_manager.init_app(app)
+
+    with app.app_context():
+        retention_manager.ensure_archive_tables()
+
+    def admin_required():
+        if not current_user.can_access_admin():
+            return jsonify({'success': False, 'error': 'Permisos insuficientes'}), 403
+        return None
+
+    @app.route('/api/v1/retention/policies', methods=['GET'])
+    @login_required
+    def get_retention_policies():
+        """Políticas de retención con filas pendientes y archivadas"""
+        denied = admin_required()
+        if denied:
+            return denied
+
+        policies = [{
+            'name': policy.name,
+            'table': policy.model.__tablename__,
+            'action': policy.action.value,
+            'max_age_days': policy.max_age_days,
+            'description': policy.description,
+            'pending': retention_manager.pending_count(policy)
+        } for policy in retention_manager.policies.values()]
+        archived = {name: retention_manager.archived_count(model) for name, model in ARCHIVED_MODELS.items()}
+
+        return jsonify({'success': True, 'data': {
+            'policies': policies,
+            'archived': archived,
+            'last_run': retention_manager.last_run
+        }})
+
+    @app.route('/api/v1/retention/run', methods=['POST'])
+    @login_required
+    def run_retention():
+        """Ejecutar políticas en segundo plano"""
+        denied = admin_required()
+        if denied:
+            return denied
+
+        from background_jobs import job_manager
+        from flask import url_for
+
+        data = request.get_json(silent=True) or {}
+        job = job_manager.submit('data_retention', retention_manager.run,
+                                 policy_names=data.get('policies'), owner_id=current_user.id)
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': url_for('get_background_job', job_id=job.id)
+        }), 202
+
+    @app.route('/api/v1/retention/records/<table_name>', methods=['GET'])
+    @login_required
+    def get_records_with_archived(table_name):
+        """Consultar registros de una tabla incluyendo los archivados"""
+        denied = admin_required()
+        if denied:
+            return denied
+
+        model = ARCHIVED_MODELS.get(table_name)
+        if model is None:
+            return jsonify({'success': False, 'error': f'Tabla sin archivo: {table_name}'}), 404
+
+        reserved = ('include_archived', 'limit', 'offset', 'order_by')
+        filters = {key: value for key, value in request.args.items() if key not in reserved}
+        records = retention_manager.query_with_archived(
+            model,
+            filters=filters,
+            include_archived=request.args.get('include_archived', '1').lower() in ('1', 'true', 'yes'),
+            order_by=request.args.get('order_by', 'created_at'),
+            limit=min(request.args.get('limit', 100, type=int), RETENTION_CONFIG['max_records_page']),
+            offset=request.args.get('offset', 0, type=int),
+            exclude_columns=['qr_code', 'context']
+        )
+        return jsonify({'success': True, 'data': records})
+
+    if app.config.get('RETENTION_SCHEDULE_ENABLED', True):
+        retention_manager.start_scheduler()
+
+    print("✅ Retención y archivo de datos inicializado")
@@ -9,8 +9,14 @@ from sqlalchemy.sql import func
 from datetime import datetime, timedelta
 import logging
 
+from metrics_registry import metrics_registry
+
 logger = logging.getLogger(__name__)
 
+# Métricas compartidas entre workers
+QUERY_DURATION = metrics_registry.histogram('portal_db_query_duration_seconds', 'Duración de consultas monitoreadas', ['query'])
+SLOW_QUERIES = metrics_registry.counter('portal_db_slow_queries', 'Consultas de más de 1 segundo', ['query'])
+
 class DatabaseOptimizer:
     """Optimizador de consultas y rendimiento de base de datos"""
     
@@ -195,9 +201,11 @@ class PerformanceMonitor:
                 
                 execution_time = (end_time - start_time).total_seconds()
                 self.query_times[query_name] = execution_time
+                QUERY_DURATION.observe(execution_time, query=query_name)
                 
                 # Registrar consultas lentas
                 if execution_time > 1.0:  # Más de 1 segundo
+                    SLOW_QUERIES.inc(query=query_name)
                     self.slow_queries.append({
                         'query': query_name,
                         'time': execution_time,
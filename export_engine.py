@@ -0,0 +1,509 @@
+"""
+Motor de Exportación de Datos
+Exporta tablas completas en CSV, NDJSON y XLSX con memoria constante:
+las filas se leen por bloques (yield_per) y se envían en una respuesta por partes.
+Las exportaciones grandes se generan en segundo plano y se descargan al terminar.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, date
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from flask import Response, stream_with_context, request, jsonify, url_for, send_file
+from flask_login import login_required, current_user
+from sqlalchemy import select, func
+
+from models import db, User, Visit, Reservation, Maintenance, Expense, SecurityReport, Notification
+from optional_dependencies import safe_import
+
+logger = logging.getLogger(__name__)
+
+# Configuración de exportación
+EXPORT_CONFIG = {
+    'chunk_size': 1000,          # Filas por bloque leído de la base de datos
+    'async_threshold': 50000,    # Filas a partir de las cuales se exporta en segundo plano
+    'file_ttl_hours': 24,        # Antigüedad máxima de archivos generados en segundo plano
+    'gzip_level': 6,
+    'read_size': 64 * 1024       # Tamaño de lectura al enviar archivos temporales
+}
+
+EXPORT_FORMATS = {
+    'csv': {'extension': 'csv', 'mimetype': 'text/csv'},
+    'ndjson': {'extension': 'ndjson', 'mimetype': 'application/x-ndjson'},
+    'xlsx': {'extension': 'xlsx',
+             'mimetype': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'}
+}
+
+# Nombres alternativos aceptados por las APIs existentes
+FORMAT_ALIASES = {
+    'json': 'ndjson',
+    'excel': 'xlsx'
+}
+
+
+def _yes_no(value) -> str:
+    return 'Sí' if value else 'No'
+
+
+def _datetime(value) -> str:
+    return value.strftime('%d/%m/%Y %H:%M') if value else ''
+
+
+@dataclass
+class ExportColumn:
+    """Columna exportable con su cabecera y formato opcional"""
+    header: str
+    column: Any
+    formatter: Optional[Callable[[Any], Any]] = None
+
+
+@dataclass
+class ExportDataset:
+    """Definición de un conjunto de datos exportable"""
+    name: str
+    columns: List[ExportColumn]
+    owner_column: Any = None                  # Columna para limitar la exportación a un usuario
+    date_column: Any = None                   # Columna usada por los filtros date_from/date_to
+    filterable: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def headers(self) -> List[str]:
+        return [column.header for column in self.columns]
+
+    @property
+    def formatters(self) -> List[Optional[Callable]]:
+        return [column.formatter for column in self.columns]
+
+
+EXPORT_DATASETS = {
+    'users': ExportDataset(
+        name='usuarios',
+        columns=[
+            ExportColumn('ID', User.id),
+            ExportColumn('Username', User.username),
+            ExportColumn('Email', User.email),
+            ExportColumn('Nombre', User.name),
+            ExportColumn('Rol', User.role),
+            ExportColumn('Activo', User.is_active, _yes_no),
+            ExportColumn('Email Verificado', User.email_verified, _yes_no),
+            ExportColumn('Teléfono', User.phone, lambda value: value or ''),
+            ExportColumn('Dirección', User.address, lambda value: value or ''),
+            ExportColumn('Creado', User.created_at, _datetime),
+            ExportColumn('Último Login', User.last_login, _datetime)
+        ],
+        owner_column=User.id,
+        date_column=User.created_at,
+        filterable={'role': User.role, 'is_active': User.is_active}
+    ),
+    'visits': ExportDataset(
+        name='visitas',
+        columns=[
+            ExportColumn('ID', Visit.id),
+            ExportColumn('Visitante', Visit.visitor_name),
+            ExportColumn('Documento', Visit.visitor_document),
+            ExportColumn('Patente', Visit.vehicle_plate),
+            ExportColumn('Residente', Visit.resident_id),
+            ExportColumn('Motivo', Visit.visit_purpose),
+            ExportColumn('Estado', Visit.status),
+            ExportColumn('Ingreso', Visit.entry_time, _datetime),
+            ExportColumn('Egreso', Visit.exit_time, _datetime),
+            ExportColumn('Creado', Visit.created_at, _datetime)
+        ],
+        owner_column=Visit.resident_id,
+        date_column=Visit.created_at,
+        filterable={'status': Visit.status}
+    ),
+    'reservations': ExportDataset(
+        name='reservas',
+        columns=[
+            ExportColumn('ID', Reservation.id),
+            ExportColumn('Usuario', Reservation.user_id),
+            ExportColumn('Tipo Espacio', Reservation.space_type),
+            ExportColumn('Espacio', Reservation.space_name),
+            ExportColumn('Inicio', Reservation.start_time, _datetime),
+            ExportColumn('Fin', Reservation.end_time, _datetime),
+            ExportColumn('Invitados', Reservation.guests_count),
+            ExportColumn('Evento', Reservation.event_type),
+            ExportColumn('Estado', Reservation.status),
+            ExportColumn('Creado', Reservation.created_at, _datetime)
+        ],
+        owner_column=Reservation.user_id,
+        date_column=Reservation.start_time,
+        filterable={'status': Reservation.status, 'space_type': Reservation.space_type}
+    ),
+    'maintenance': ExportDataset(
+        name='mantenimiento',
+        columns=[
+            ExportColumn('ID', Maintenance.id),
+            ExportColumn('Usuario', Maintenance.user_id),
+            ExportColumn('Título', Maintenance.title),
+            ExportColumn('Categoría', Maintenance.category),
+            ExportColumn('Prioridad', Maintenance.priority),
+            ExportColumn('Estado', Maintenance.status),
+            ExportColumn('Asignado A', Maintenance.assigned_to),
+            ExportColumn('Creado', Maintenance.created_at, _datetime),
+            ExportColumn('Completado', Maintenance.completed_at, _datetime)
+        ],
+        owner_column=Maintenance.user_id,
+        date_column=Maintenance.created_at,
+        filterable={'status': Maintenance.status, 'priority': Maintenance.priority,
+                    'category': Maintenance.category}
+    ),
+    'expenses': ExportDataset(
+        name='expensas',
+        columns=[
+            ExportColumn('ID', Expense.id),
+            ExportColumn('Usuario', Expense.user_id),
+            ExportColumn('Mes', Expense.month),
+            ExportColumn('Monto', Expense.amount),
+            ExportColumn('Recargo', Expense.late_fee),
+            ExportColumn('Estado', Expense.status),
+            ExportColumn('Vencimiento', Expense.due_date, _datetime),
+            ExportColumn('Fecha Pago', Expense.payment_date, _datetime),
+            ExportColumn('Medio de Pago', Expense.payment_method)
+        ],
+        owner_column=Expense.user_id,
+        date_column=Expense.created_at,
+        filterable={'status': Expense.status, 'month': Expense.month}
+    ),
+    'security_reports': ExportDataset(
+        name='reportes_seguridad',
+        columns=[
+            ExportColumn('ID', SecurityReport.id),
+            ExportColumn('Usuario', SecurityReport.user_id),
+            ExportColumn('Título', SecurityReport.title),
+            ExportColumn('Tipo', SecurityReport.incident_type),
+            ExportColumn('Severidad', SecurityReport.severity),
+            ExportColumn('Estado', SecurityReport.status),
+            ExportColumn('Ubicación', SecurityReport.location),
+            ExportColumn('Creado', SecurityReport.created_at, _datetime),
+            ExportColumn('Resuelto', SecurityReport.resolved_at, _datetime)
+        ],
+        owner_column=SecurityReport.user_id,
+        date_column=SecurityReport.created_at,
+        filterable={'status': SecurityReport.status, 'severity': SecurityReport.severity}
+    ),
+    'notifications': ExportDataset(
+        name='notificaciones',
+        columns=[
+            ExportColumn('ID', Notification.id),
+            ExportColumn('Usuario', Notification.user_id),
+            ExportColumn('Título', Notification.title),
+            ExportColumn('Tipo', Notification.type),
+            ExportColumn('Categoría', Notification.category),
+            ExportColumn('Leída', Notification.is_read, _yes_no),
+            ExportColumn('Creado', Notification.created_at, _datetime)
+        ],
+        owner_column=Notification.user_id,
+        date_column=Notification.created_at,
+        filterable={'category': Notification.category, 'is_read': Notification.is_read}
+    )
+}
+
+
+def normalize_format(fmt: Optional[str]) -> str:
+    """Normalizar nombre de formato; lanza ValueError si no es soportado"""
+    fmt = (fmt or 'csv').lower()
+    fmt = FORMAT_ALIASES.get(fmt, fmt)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Formato {fmt} no soportado')
+    if fmt == 'xlsx' and safe_import('openpyxl') is None:
+        raise ValueError('Formato xlsx no disponible (openpyxl no instalado)')
+    return fmt
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = None) -> Iterator[bytes]:
+    """Comprimir un flujo de bytes en formato gzip sin acumularlo en memoria"""
+    compressor = zlib.compressobj(level or EXPORT_CONFIG['gzip_level'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class ExportEngine:
+    """Motor de exportación en streaming"""
+
+    def __init__(self):
+        self.export_dir = None
+        self.chunk_size = EXPORT_CONFIG['chunk_size']
+        self.async_threshold = EXPORT_CONFIG['async_threshold']
+
+    def init_app(self, app):
+        """Inicializar motor con la aplicación Flask"""
+        self.export_dir = app.config.get('EXPORT_FOLDER', os.path.join(app.instance_path, 'exports'))
+        self.chunk_size = app.config.get('EXPORT_CHUNK_SIZE', self.chunk_size)
+        self.async_threshold = app.config.get('EXPORT_ASYNC_THRESHOLD', self.async_threshold)
+
+    def get_dataset(self, dataset_name: str) -> ExportDataset:
+        dataset = EXPORT_DATASETS.get(dataset_name)
+        if dataset is None:
+            raise ValueError(f'Conjunto de datos desconocido: {dataset_name}')
+        return dataset
+
+    def build_statement(self, dataset: ExportDataset, filters: Dict[str, Any] = None,
+                        owner_id: int = None):
+        """Construir SELECT de las columnas exportadas con filtros aplicados"""
+        stmt = select(*[column.column for column in dataset.columns])
+        return self._apply_filters(stmt, dataset, filters, owner_id).order_by(dataset.columns[0].column)
+
+    def count_rows(self, dataset: ExportDataset, filters: Dict[str, Any] = None,
+                   owner_id: int = None) -> int:
+        """Contar filas a exportar"""
+        stmt = select(func.count()).select_from(dataset.columns[0].column.table)
+        return db.session.execute(self._apply_filters(stmt, dataset, filters, owner_id)).scalar() or 0
+
+    def _apply_filters(self, stmt, dataset: ExportDataset, filters: Dict[str, Any], owner_id: int):
+        filters = filters or {}
+
+        if owner_id is not None:
+            if dataset.owner_column is None:
+                raise ValueError('Este conjunto de datos solo puede exportarlo un administrador')
+            stmt = stmt.where(dataset.owner_column == owner_id)
+
+        if dataset.date_column is not None:
+            try:
+                if filters.get('date_from'):
+                    stmt = stmt.where(dataset.date_column >= datetime.fromisoformat(filters['date_from']))
+                if filters.get('date_to'):
+                    stmt = stmt.where(dataset.date_column <= datetime.fromisoformat(filters['date_to']))
+            except (TypeError, ValueError):
+                raise ValueError('Fechas de filtro inválidas, usar formato ISO (YYYY-MM-DD)')
+
+        for name, column in dataset.filterable.items():
+            if name in filters and filters[name] not in (None, ''):
+                value = filters[name]
+                if isinstance(value, str) and value.lower() in ('true', 'false'):
+                    value = value.lower() == 'true'
+                stmt = stmt.where(column == value)
+
+        return stmt
+
+    def iter_chunks(self, dataset: ExportDataset, filters: Dict[str, Any] = None,
+                    owner_id: int = None) -> Iterator[List[list]]:
+        """Leer filas formateadas por bloques usando yield_per"""
+        stmt = self.build_statement(dataset, filters, owner_id).execution_options(yield_per=self.chunk_size)
+        formatters = dataset.formatters
+        result = db.session.execute(stmt)
+        try:
+            for partition in result.partitions():
+                yield [
+                    [formatter(value) if formatter else value for formatter, value in zip(formatters, row)]
+                    for row in partition
+                ]
+        finally:
+            result.close()
+
+    def generate(self, dataset: ExportDataset, fmt: str, filters: Dict[str, Any] = None,
+                 owner_id: int = None, compress: bool = False,
+                 on_progress: Callable[[int], None] = None) -> Iterator[bytes]:
+        """Generar el archivo exportado como flujo de bytes"""
+        chunks = self.iter_chunks(dataset, filters, owner_id)
+        if on_progress is not None:
+            chunks = self._track_progress(chunks, on_progress)
+
+        writer = {
+            'csv': self._write_csv,
+            'ndjson': self._write_ndjson,
+            'xlsx': self._write_xlsx
+        }[fmt]
+        stream = writer(dataset, chunks)
+        return gzip_stream(stream) if compress else stream
+
+    def _track_progress(self, chunks: Iterator[List[list]], on_progress: Callable[[int], None]):
+        processed = 0
+        for chunk in chunks:
+            yield chunk
+            processed += len(chunk)
+            on_progress(processed)
+
+    def _write_csv(self, dataset: ExportDataset, chunks: Iterator[List[list]]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(dataset.headers)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    def _write_ndjson(self, dataset: ExportDataset, chunks: Iterator[List[list]]) -> Iterator[bytes]:
+        headers = dataset.headers
+        for chunk in chunks:
+            lines = [json.dumps(dict(zip(headers, row)), ensure_ascii=False, default=_json_default)
+                     for row in chunk]
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def _write_xlsx(self, dataset: ExportDataset, chunks: Iterator[List[list]]) -> Iterator[bytes]:
+        # XLSX es un zip: se escribe en modo write-only a un archivo temporal y luego se envía por partes
+        openpyxl = safe_import('openpyxl')
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=dataset.name[:31])
+        sheet.append(dataset.headers)
+        for chunk in chunks:
+            for row in chunk:
+                sheet.append(row)
+
+        with tempfile.TemporaryFile() as tmp:
+            workbook.save(tmp)
+            tmp.seek(0)
+            while True:
+                data = tmp.read(EXPORT_CONFIG['read_size'])
+                if not data:
+                    break
+                yield data
+
+    def filename(self, dataset: ExportDataset, fmt: str, compress: bool = False, suffix: str = '') -> str:
+        name = f"{dataset.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}.{EXPORT_FORMATS[fmt]['extension']}"
+        return f'{name}.gz' if compress else name
+
+    def stream_response(self, dataset_name: str, fmt: str, filters: Dict[str, Any] = None,
+                        owner_id: int = None, compress: bool = False) -> Response:
+        """Respuesta HTTP por partes con el archivo exportado"""
+        dataset = self.get_dataset(dataset_name)
+        fmt = normalize_format(fmt)
+        # Validar filtros antes de empezar a enviar la respuesta
+        self.build_statement(dataset, filters, owner_id)
+
+        mimetype = 'application/gzip' if compress else EXPORT_FORMATS[fmt]['mimetype']
+        response = Response(
+            stream_with_context(self.generate(dataset, fmt, filters, owner_id, compress)),
+            mimetype=mimetype
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename={self.filename(dataset, fmt, compress)}'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    def export_to_file(self, job, dataset_name: str, fmt: str, filters: Dict[str, Any] = None,
+                       owner_id: int = None, compress: bool = False) -> Dict[str, Any]:
+        """Escribir la exportación a disco (tarea en segundo plano)"""
+        dataset = self.get_dataset(dataset_name)
+        fmt = normalize_format(fmt)
+        total = self.count_rows(dataset, filters, owner_id)
+        if job is not None:
+            job.update_progress(0, total)
+
+        os.makedirs(self.export_dir, exist_ok=True)
+        self.cleanup_expired_files()
+
+        suffix = f'_{job.id[:8]}' if job is not None else ''
+        filename = self.filename(dataset, fmt, compress, suffix)
+        path = os.path.join(self.export_dir, filename)
+        on_progress = (lambda processed: job.update_progress(processed)) if job is not None else None
+
+        with open(path, 'wb') as output:
+            for data in self.generate(dataset, fmt, filters, owner_id, compress, on_progress):
+                output.write(data)
+
+        return {
+            'filename': filename,
+            'rows': total,
+            'size_bytes': os.path.getsize(path)
+        }
+
+    def cleanup_expired_files(self):
+        """Eliminar archivos exportados más antiguos que el TTL configurado"""
+        if not self.export_dir or not os.path.isdir(self.export_dir):
+            return
+        limit = time.time() - EXPORT_CONFIG['file_ttl_hours'] * 3600
+        for entry in os.scandir(self.export_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < limit:
+                    os.remove(entry.path)
+            except OSError as e:
+                logger.warning(f'No se pudo eliminar exportación vencida {entry.name}: {e}')
+
+    def export(self, dataset_name: str, fmt: str, filters: Dict[str, Any] = None,
+               owner_id: int = None, compress: bool = False, requested_by: int = None,
+               force_async: bool = False):
+        """
+        Exportar en streaming o, si supera el umbral de filas, encolar una tarea
+        que genera el archivo y devuelve el enlace de descarga.
+        """
+        dataset = self.get_dataset(dataset_name)
+        fmt = normalize_format(fmt)
+
+        if not force_async and self.count_rows(dataset, filters, owner_id) < self.async_threshold:
+            return self.stream_response(dataset_name, fmt, filters, owner_id, compress)
+
+        from background_jobs import job_manager
+        job = job_manager.submit(
+            f'export_{dataset_name}_{fmt}',
+            self.export_to_file,
+            dataset_name, fmt, filters, owner_id, compress,
+            owner_id=requested_by
+        )
+        return jsonify({
+            'success': True,
+            'message': 'Exportación en proceso',
+            'job_id': job.id,
+            'status_url': url_for('get_background_job', job_id=job.id),
+            'download_url': url_for('download_export', job_id=job.id)
+        }), 202
+
+
+# Instancia global
+export_engine = ExportEngine()
+
+
+def export_request_options() -> Dict[str, Any]:
+    """Leer formato, compresión y filtros de la request actual (query string o JSON)"""
+    data = request.get_json(silent=True) or {}
+    args = request.args
+    filters = dict(data.get('filters') or {})
+    for key, value in args.items():
+        if key not in ('format', 'gzip', 'async', 'dataset') and value:
+            filters[key] = value
+    return {
+        'fmt': data.get('format') or args.get('format', 'csv'),
+        'compress': str(data.get('gzip', args.get('gzip', ''))).lower() in ('1', 'true', 'yes'),
+        'force_async': str(data.get('async', args.get('async', ''))).lower() in ('1', 'true', 'yes'),
+        'filters': filters
+    }
+
+
+def init_export_engine(app):
+    """Inicializar motor de exportación en la aplicación Flask"""
+    export_engine.init_app(app)
+
+    @app.route('/api/v1/exports/<job_id>/download', methods=['GET'])
+    @login_required
+    def download_export(job_id):
+        """Descargar archivo generado por una exportación en segundo plano"""
+        from background_jobs import job_manager, JobStatus
+
+        job = job_manager.get(job_id)
+        if job is None or not job.name.startswith('export_'):
+            return jsonify({'success': False, 'error': 'Exportación no encontrada'}), 404
+
+        if job.owner_id != current_user.id and not current_user.can_access_admin():
+            return jsonify({'success': False, 'error': 'Permisos insuficientes'}), 403
+
+        if job.status != JobStatus.COMPLETED:
+            return jsonify({'success': False, 'error': 'La exportación aún no está lista',
+                            'status': job.status.value}), 409
+
+        path = os.path.join(export_engine.export_dir, job.result['filename'])
+        if not os.path.exists(path):
+            return jsonify({'success': False, 'error': 'El archivo de exportación expiró'}), 410
+
+        return send_file(path, as_attachment=True, download_name=job.result['filename'])
+
+    print("✅ Motor de exportación inicializado")
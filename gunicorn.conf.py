@@ -41,6 +41,27 @@ tmp_upload_dir = None
 secure_scheme_headers = {"X-FORWARDED-PROTOCOL": "ssl", "X-FORWARDED-PROTO": "https", "X-FORWARDED-SSL": "on"}
 forwarded_allow_ips = "*"
 
+# Métricas de requests compartidas entre workers (archivos mapeados en memoria)
+os.environ.setdefault("REQUEST_METRICS_DIR", os.path.join("/tmp", "portal_request_metrics"))
+os.environ.setdefault("METRICS_MULTIPROC_DIR", os.path.join("/tmp", "portal_metrics"))
+
+# El programador de tareas corre en los workers (elige líder entre ellos), nunca en el master
+os.environ.setdefault("SCHEDULER_DEFER_START", "1")
+
+def on_starting(server):
+    """Called just before the master process is initialized."""
+    from request_metrics import request_metrics
+    from metrics_registry import metrics_registry
+    request_metrics.reset()
+    metrics_registry.reset()
+
+def child_exit(server, worker):
+    """Called just after a worker has been exited, in the master process."""
+    from request_metrics import request_metrics
+    from metrics_registry import metrics_registry
+    request_metrics.retire(worker.pid)
+    metrics_registry.retire(worker.pid)
+
 def when_ready(server):
     """Called just after the server is started."""
     server.log.info("Server is ready. Spawning workers")
@@ -56,6 +77,10 @@ def pre_fork(server, worker):
 def post_fork(server, worker):
     """Called just after a worker has been forked."""
     server.log.info("Worker spawned (pid: %s)", worker.pid)
+    # Con preload_app la aplicación ya está cargada: iniciar el programador en este worker
+    from cluster_scheduler import cluster_scheduler
+    if cluster_scheduler.app is not None and cluster_scheduler.app.config.get('SCHEDULER_ENABLED', True):
+        cluster_scheduler.start()
 
 def worker_abort(worker):
     """Called when a worker is killed due to a timeout."""
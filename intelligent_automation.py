@@ -10,8 +10,6 @@ from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from enum import Enum
 import asyncio
-from threading import Thread
-import schedule
 import time
 
 from flask import current_app
@@ -263,7 +261,7 @@ class SmartMaintenanceScheduler:
     """Programador inteligente de mantenimiento"""
     
     def __init__(self):
-        self.scheduler = schedule.Scheduler()
+        self.job_names = []
         self.logger = logging.getLogger(__name__)
         self.workflow_engine = IntelligentWorkflowEngine()
         self._setup_default_workflows()
@@ -315,12 +313,18 @@ class SmartMaintenanceScheduler:
         """Programar mantenimiento preventivo"""
         next_date = datetime.now() + timedelta(days=frequency_days)
         
-        # Crear tarea programada
-        self.scheduler.every(frequency_days).days.do(
-            self._execute_preventive_maintenance,
-            equipment=equipment,
-            scheduled_date=next_date
+        # Crear tarea programada (una ejecución por cluster)
+        from cluster_scheduler import cluster_scheduler
+        name = f'maintenance.preventive.{equipment}'
+        cluster_scheduler.interval(
+            name,
+            frequency_days * 86400,
+            lambda: self._execute_preventive_maintenance(equipment=equipment, scheduled_date=next_date),
+            jitter=600,
+            description=f'Mantenimiento preventivo de {equipment}'
         )
+        if name not in self.job_names:
+            self.job_names.append(name)
         
         self.logger.info(f"Mantenimiento preventivo programado para {equipment} cada {frequency_days} días")
     
@@ -339,14 +343,7 @@ class SmartMaintenanceScheduler:
             self.logger.error(f"Error ejecutando mantenimiento preventivo para {equipment}")
     
     def start_scheduler(self):
-        """Iniciar el programador en un hilo separado"""
-        def run_scheduler():
-            while True:
-                self.scheduler.run_pending()
-                time.sleep(60)  # Verificar cada minuto
-                
-        scheduler_thread = Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
+        """Las tareas se ejecutan en el programador del cluster (cluster_scheduler)"""
         self.logger.info("Programador de mantenimiento iniciado")
 
 
@@ -674,7 +671,7 @@ class AutomationManager:
             },
             'scheduler': {
                 'running': True,
-                'scheduled_jobs': len(self.maintenance_scheduler.scheduler.jobs)
+                'scheduled_jobs': len(self.maintenance_scheduler.job_names)
             },
             'notifications': {
                 'rules_count': len(self.notification_system.notification_rules),
@@ -12,9 +12,9 @@ from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from enum import Enum
 import asyncio
-from threading import Thread
 import statistics
 from collections import defaultdict, deque
+from functools import partial
 # Importar numpy de forma segura
 from optional_dependencies import get_numpy, NUMPY_AVAILABLE
 np = get_numpy()
@@ -24,8 +24,22 @@ from sqlalchemy import and_, or_, func, desc
 from sqlalchemy.orm import joinedload
 
 from models import db, User, Maintenance, Visit, Reservation, SecurityReport, Expense, Notification
+from timeseries_store import TimeSeriesStore
+from alert_rules import AlertRule, alert_engine
+from metrics_registry import metrics_registry
 from intelligent_automation import automation_manager, AutomationType
 
+# Clave del resumen de métricas publicado en shared_state
+MONITORING_SHARED_KEY = 'intelligent_monitoring.metrics'
+
+# Métricas compartidas entre workers
+MONITORED_VALUE = metrics_registry.gauge('portal_monitoring_metric', 'Último valor de las métricas del monitoreo inteligente',
+                                         ['metric', 'category', 'unit'], mode='max')
+MONITORED_DURATION = metrics_registry.histogram('portal_monitored_duration_seconds',
+                                                'Duración de funciones con @monitored_metric', ['metric', 'category'])
+MONITORED_RUNS = metrics_registry.counter('portal_monitored_runs', 'Ejecuciones de funciones con @monitored_metric',
+                                          ['metric', 'category', 'outcome'])
+
 
 class MonitoringType(Enum):
     """Tipos de monitoreo disponibles"""
@@ -79,12 +93,22 @@ class IntelligentMonitoringSystem:
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.metrics_history = defaultdict(lambda: deque(maxlen=1000))  # Últimos 1000 valores
-        self.active_alerts = {}
+        self.metrics_history = TimeSeriesStore()  # Búferes circulares por métrica (1 s / 1 min / 1 h)
+        self.metric_forecasts = {}  # Último pronóstico por métrica
         self.monitoring_rules = self._load_monitoring_rules()
         self.predictive_models = {}
         self.monitoring_enabled = True
         
+        # Los umbrales se evalúan como reglas sobre las series registradas
+        alert_engine.attach_store('intelligent_monitoring', self.metrics_history)
+        alert_engine.add_rules(self._build_alert_rules())
+        alert_engine.subscribe(self._on_alerts)
+    
+    @property
+    def active_alerts(self) -> Dict[str, Any]:
+        """Alertas activas de este sistema por id"""
+        return {alert.id: alert for alert in alert_engine.active(source='intelligent_monitoring')}
+        
     def _load_monitoring_rules(self) -> Dict:
         """Cargar reglas de monitoreo"""
         return {
@@ -110,253 +134,220 @@ class IntelligentMonitoringSystem:
             }
         }
     
+    def _build_alert_rules(self) -> List[AlertRule]:
+        """Reglas de alerta a partir de los umbrales (último valor, ventana de dos verificaciones)"""
+        performance = self.monitoring_rules[MonitoringType.SYSTEM_PERFORMANCE]
+        security = self.monitoring_rules[MonitoringType.SECURITY_EVENTS]
+        maintenance = self.monitoring_rules[MonitoringType.MAINTENANCE_TRENDS]
+        financial = self.monitoring_rules[MonitoringType.FINANCIAL_METRICS]
+        common = {'store': 'intelligent_monitoring', 'source': 'intelligent_monitoring'}
+        
+        return [
+            AlertRule('high_response_time', 'system_response_time', performance['response_time_threshold'],
+                      clear=performance['response_time_threshold'] * 0.75, window=120, group='system_performance',
+                      title='Tiempo de respuesta alto',
+                      message='El tiempo de respuesta del sistema es {value:.2f}s (umbral: {threshold}s)', **common),
+            AlertRule('high_error_rate', 'system_error_rate', performance['error_rate_threshold'],
+                      clear=performance['error_rate_threshold'] * 0.6, window=120, severity='critical',
+                      group='system_performance', title='Tasa de errores alta',
+                      message='La tasa de errores es {value:.2%} (umbral: {threshold:.2%})', **common),
+            AlertRule('suspicious_activity_detected', 'suspicious_activities', security['suspicious_activity_threshold'],
+                      window=120, severity='critical', group='security', title='Actividad sospechosa detectada',
+                      message='Se han detectado {value:.0f} actividades sospechosas en la última hora', **common),
+            AlertRule('multiple_failed_logins', 'failed_logins', security['failed_login_threshold'],
+                      window=120, group='security', title='Múltiples intentos de login fallidos',
+                      message='Se han detectado {value:.0f} intentos de login fallidos',
+                      inhibited_by=('suspicious_activity_detected',), **common),
+            AlertRule('high_pending_maintenance', 'pending_maintenance', maintenance['pending_maintenance_threshold'],
+                      window=1200, group='maintenance', title='Muchas solicitudes de mantenimiento pendientes',
+                      message='Hay {value:.0f} solicitudes de mantenimiento pendientes',
+                      inhibited_by=('high_priority_maintenance_urgent',), **common),
+            AlertRule('high_priority_maintenance_urgent', 'high_priority_maintenance', maintenance['high_priority_threshold'],
+                      window=1200, severity='critical', group='maintenance',
+                      title='Solicitudes de mantenimiento de alta prioridad',
+                      message='Hay {value:.0f} solicitudes de mantenimiento de alta prioridad pendientes', **common),
+            AlertRule('high_overdue_payments', 'overdue_payments_ratio', financial['overdue_payments_threshold'],
+                      window=7200, group='financial', title='Alta tasa de pagos vencidos',
+                      message='El {value:.1%} de los pagos están vencidos', **common),
+            AlertRule('expense_increase', 'expense_trend', financial['expense_increase_threshold'],
+                      window=7200, group='financial', title='Aumento significativo en gastos',
+                      message='Los gastos han aumentado un {value:.1%}', **common),
+            AlertRule('budget_limit_approaching', 'budget_utilization', financial['budget_utilization_threshold'],
+                      clear=financial['budget_utilization_threshold'] - 0.05, window=7200, group='financial',
+                      title='Límite de presupuesto próximo', message='Se ha utilizado el {value:.1%} del presupuesto',
+                      **common)
+        ]
+    
+    def _on_alerts(self, group: str, transitions: List[Dict]):
+        """Ejecutar la automatización de seguridad para alertas críticas disparadas"""
+        from cluster_scheduler import cluster_scheduler
+        
+        # Las reglas se evalúan en el líder; una evaluación manual en otro proceso no repite la automatización
+        if group != 'security' or not cluster_scheduler.is_leader:
+            return
+        for alert in transitions:
+            if alert['state'] == 'firing' and alert['severity'] in (AlertLevel.CRITICAL.value, AlertLevel.EMERGENCY.value):
+                automation_manager.execute_automation(
+                    AutomationType.SECURITY_MONITORING,
+                    {
+                        'alert_id': alert['id'],
+                        'title': alert['title'],
+                        'message': alert['message'],
+                        'level': alert['severity']
+                    }
+                )
+    
     def start_monitoring(self):
         """Iniciar sistema de monitoreo"""
         if not self.monitoring_enabled:
             return
         
-        # En producción, no verificamos el contexto de Flask inmediatamente
-        # ya que puede no estar disponible durante la inicialización
-        # El sistema de monitoreo manejará los errores de contexto internamente
-        
-        # Iniciar monitoreo en hilos separados
-        monitoring_threads = [
-            Thread(target=self._monitor_system_performance, daemon=True),
-            Thread(target=self._monitor_user_activity, daemon=True),
-            Thread(target=self._monitor_security_events, daemon=True),
-            Thread(target=self._monitor_maintenance_trends, daemon=True),
-            Thread(target=self._monitor_financial_metrics, daemon=True)
+        # Una vez por cluster (en el líder): consultan la base de datos y publican el resumen en shared_state
+        from cluster_scheduler import cluster_scheduler
+        checks = [
+            ('system_performance', 60, self._check_system_performance),
+            ('user_activity', 300, self._check_user_activity),
+            ('security_events', 60, self._check_security_events),
+            ('maintenance_trends', 600, self._check_maintenance_trends),
+            ('financial_metrics', 3600, self._check_financial_metrics)
         ]
-        
-        for thread in monitoring_threads:
-            thread.start()
+        for name, seconds, check in checks:
+            cluster_scheduler.interval(f'monitoring.{name}', seconds, partial(self._run_check, check), delay=5,
+                                       jitter=min(seconds / 10, 30), timeout=seconds, description=check.__doc__)
             
         self.logger.info("Sistema de monitoreo inteligente iniciado")
     
-    def _monitor_system_performance(self):
+    def _run_check(self, check):
+        """Ejecutar una verificación y publicar el resumen actualizado para los demás procesos"""
+        from shared_state import shared_state
+        
+        check()
+        shared_state.publish(MONITORING_SHARED_KEY, {
+            'metrics': self._summarize(),
+            'updated_at': datetime.now().isoformat()
+        })
+    
+    def _published(self) -> Optional[Dict]:
+        """Último resumen publicado por el líder (None si todavía no hay uno)"""
+        from shared_state import shared_state
+        return shared_state.read(MONITORING_SHARED_KEY)
+    
+    def _check_system_performance(self):
         """Monitorear rendimiento del sistema"""
-        while self.monitoring_enabled:
-            try:
-                # Simular métricas de rendimiento
-                response_time = self._measure_response_time()
-                error_rate = self._calculate_error_rate()
-                concurrent_users = self._get_concurrent_users()
-                
-                # Registrar métricas
-                self._record_metric('system_response_time', response_time, 'seconds', 'system')
-                self._record_metric('system_error_rate', error_rate, 'percentage', 'system')
-                self._record_metric('concurrent_users', concurrent_users, 'users', 'system')
-                
-                # Verificar umbrales
-                rules = self.monitoring_rules[MonitoringType.SYSTEM_PERFORMANCE]
-                
-                if response_time > rules['response_time_threshold']:
-                    self._create_alert(
-                        'high_response_time',
-                        'Tiempo de respuesta alto',
-                        f'El tiempo de respuesta del sistema es {response_time:.2f}s (umbral: {rules["response_time_threshold"]}s)',
-                        AlertLevel.WARNING,
-                        'system_performance'
-                    )
-                
-                if error_rate > rules['error_rate_threshold']:
-                    self._create_alert(
-                        'high_error_rate',
-                        'Tasa de errores alta',
-                        f'La tasa de errores es {error_rate:.2%} (umbral: {rules["error_rate_threshold"]:.2%})',
-                        AlertLevel.CRITICAL,
-                        'system_performance'
-                    )
-                
-                time.sleep(60)  # Verificar cada minuto
-                
-            except Exception as e:
-                self.logger.error(f"Error en monitoreo de rendimiento: {e}")
-                time.sleep(60)
+        try:
+            # Requests terminados desde la verificación anterior, sumando todos los contenedores web
+            from request_metrics import request_metrics
+            window = request_metrics.cluster_window('intelligent_monitoring')
+            response_time = self._measure_response_time(window)
+            error_rate = self._calculate_error_rate(window)
+            concurrent_users = self._get_concurrent_users(window)
+            
+            # Registrar métricas
+            self._record_metric('system_response_time', response_time, 'seconds', 'system')
+            self._record_metric('system_error_rate', error_rate, 'percentage', 'system')
+            self._record_metric('concurrent_users', concurrent_users, 'users', 'system')
+            
+        except Exception as e:
+            self.logger.error(f"Error en monitoreo de rendimiento: {e}")
     
-    def _monitor_user_activity(self):
+    def _check_user_activity(self):
         """Monitorear actividad de usuarios"""
-        while self.monitoring_enabled:
-            try:
-                # Obtener métricas de actividad
-                active_users = self._get_active_users_count()
-                new_registrations = self._get_new_registrations_count()
-                login_frequency = self._get_login_frequency()
-                
-                # Registrar métricas
-                self._record_metric('active_users', active_users, 'users', 'user_activity')
-                self._record_metric('new_registrations', new_registrations, 'users', 'user_activity')
-                self._record_metric('login_frequency', login_frequency, 'logins/hour', 'user_activity')
-                
-                # Análisis predictivo
-                self._predict_user_trends()
-                
-                time.sleep(300)  # Verificar cada 5 minutos
-                
-            except Exception as e:
-                self.logger.error(f"Error en monitoreo de actividad: {e}")
-                time.sleep(300)
+        try:
+            # Obtener métricas de actividad
+            active_users = self._get_active_users_count()
+            new_registrations = self._get_new_registrations_count()
+            login_frequency = self._get_login_frequency()
+            
+            # Registrar métricas
+            self._record_metric('active_users', active_users, 'users', 'user_activity')
+            self._record_metric('new_registrations', new_registrations, 'users', 'user_activity')
+            self._record_metric('login_frequency', login_frequency, 'logins/hour', 'user_activity')
+            
+            # Análisis predictivo
+            self._predict_user_trends()
+
+        except Exception as e:
+            self.logger.error(f"Error en monitoreo de actividad: {e}")
     
-    def _monitor_security_events(self):
+    def _check_security_events(self):
         """Monitorear eventos de seguridad"""
-        while self.monitoring_enabled:
-            try:
-                # Obtener eventos de seguridad recientes
-                security_events = self._get_recent_security_events()
-                failed_logins = self._get_failed_login_attempts()
-                suspicious_activities = self._get_suspicious_activities()
-                
-                # Validar que las funciones retornen listas válidas
-                if security_events is None:
-                    security_events = []
-                if failed_logins is None:
-                    failed_logins = []
-                if suspicious_activities is None:
-                    suspicious_activities = []
-                
-                # Registrar métricas
-                self._record_metric('security_events', len(security_events), 'events', 'security')
-                self._record_metric('failed_logins', len(failed_logins), 'attempts', 'security')
-                self._record_metric('suspicious_activities', len(suspicious_activities), 'events', 'security')
-                
-                # Verificar umbrales
-                rules = self.monitoring_rules[MonitoringType.SECURITY_EVENTS]
-                
-                if len(suspicious_activities) > rules['suspicious_activity_threshold']:
-                    self._create_alert(
-                        'suspicious_activity_detected',
-                        'Actividad sospechosa detectada',
-                        f'Se han detectado {len(suspicious_activities)} actividades sospechosas en la última hora',
-                        AlertLevel.CRITICAL,
-                        'security'
-                    )
-                
-                if len(failed_logins) > rules['failed_login_threshold']:
-                    self._create_alert(
-                        'multiple_failed_logins',
-                        'Múltiples intentos de login fallidos',
-                        f'Se han detectado {len(failed_logins)} intentos de login fallidos',
-                        AlertLevel.WARNING,
-                        'security'
-                    )
-                
-                time.sleep(60)  # Verificar cada minuto
-                
-            except Exception as e:
-                self.logger.error(f"Error en monitoreo de seguridad: {e}")
-                time.sleep(60)
+        try:
+            # Obtener eventos de seguridad recientes
+            security_events = self._get_recent_security_events()
+            failed_logins = self._get_failed_login_attempts()
+            suspicious_activities = self._get_suspicious_activities()
+            
+            # Validar que las funciones retornen listas válidas
+            if security_events is None:
+                security_events = []
+            if failed_logins is None:
+                failed_logins = []
+            if suspicious_activities is None:
+                suspicious_activities = []
+            
+            # Registrar métricas
+            self._record_metric('security_events', len(security_events), 'events', 'security')
+            self._record_metric('failed_logins', len(failed_logins), 'attempts', 'security')
+            self._record_metric('suspicious_activities', len(suspicious_activities), 'events', 'security')
+            
+        except Exception as e:
+            self.logger.error(f"Error en monitoreo de seguridad: {e}")
     
-    def _monitor_maintenance_trends(self):
+    def _check_maintenance_trends(self):
         """Monitorear tendencias de mantenimiento"""
-        while self.monitoring_enabled:
-            try:
-                # Obtener métricas de mantenimiento
-                pending_maintenance = self._get_pending_maintenance_count()
-                high_priority_maintenance = self._get_high_priority_maintenance_count()
-                avg_response_time = self._get_maintenance_response_time()
-                
-                # Registrar métricas
-                self._record_metric('pending_maintenance', pending_maintenance, 'requests', 'maintenance')
-                self._record_metric('high_priority_maintenance', high_priority_maintenance, 'requests', 'maintenance')
-                self._record_metric('maintenance_response_time', avg_response_time, 'hours', 'maintenance')
-                
-                # Verificar umbrales
-                rules = self.monitoring_rules[MonitoringType.MAINTENANCE_TRENDS]
-                
-                if pending_maintenance > rules['pending_maintenance_threshold']:
-                    self._create_alert(
-                        'high_pending_maintenance',
-                        'Muchas solicitudes de mantenimiento pendientes',
-                        f'Hay {pending_maintenance} solicitudes de mantenimiento pendientes',
-                        AlertLevel.WARNING,
-                        'maintenance'
-                    )
-                
-                if high_priority_maintenance > rules['high_priority_threshold']:
-                    self._create_alert(
-                        'high_priority_maintenance_urgent',
-                        'Solicitudes de mantenimiento de alta prioridad',
-                        f'Hay {high_priority_maintenance} solicitudes de mantenimiento de alta prioridad pendientes',
-                        AlertLevel.CRITICAL,
-                        'maintenance'
-                    )
-                
-                # Análisis predictivo de mantenimiento
-                self._predict_maintenance_needs()
-                
-                time.sleep(600)  # Verificar cada 10 minutos
-                
-            except Exception as e:
-                self.logger.error(f"Error en monitoreo de mantenimiento: {e}")
-                time.sleep(600)
+        try:
+            # Obtener métricas de mantenimiento
+            pending_maintenance = self._get_pending_maintenance_count()
+            high_priority_maintenance = self._get_high_priority_maintenance_count()
+            avg_response_time = self._get_maintenance_response_time()
+            
+            # Registrar métricas
+            self._record_metric('pending_maintenance', pending_maintenance, 'requests', 'maintenance')
+            self._record_metric('high_priority_maintenance', high_priority_maintenance, 'requests', 'maintenance')
+            self._record_metric('maintenance_response_time', avg_response_time, 'hours', 'maintenance')
+            
+            # Análisis predictivo de mantenimiento
+            self._predict_maintenance_needs()
+
+        except Exception as e:
+            self.logger.error(f"Error en monitoreo de mantenimiento: {e}")
     
-    def _monitor_financial_metrics(self):
+    def _check_financial_metrics(self):
         """Monitorear métricas financieras"""
-        while self.monitoring_enabled:
-            try:
-                # Obtener métricas financieras
-                overdue_payments = self._get_overdue_payments_ratio()
-                expense_trend = self._get_expense_trend()
-                budget_utilization = self._get_budget_utilization()
-                
-                # Registrar métricas
-                self._record_metric('overdue_payments_ratio', overdue_payments, 'percentage', 'financial')
-                self._record_metric('expense_trend', expense_trend, 'percentage', 'financial')
-                self._record_metric('budget_utilization', budget_utilization, 'percentage', 'financial')
-                
-                # Verificar umbrales
-                rules = self.monitoring_rules[MonitoringType.FINANCIAL_METRICS]
-                
-                if overdue_payments > rules['overdue_payments_threshold']:
-                    self._create_alert(
-                        'high_overdue_payments',
-                        'Alta tasa de pagos vencidos',
-                        f'El {overdue_payments:.1%} de los pagos están vencidos',
-                        AlertLevel.WARNING,
-                        'financial'
-                    )
-                
-                if expense_trend > rules['expense_increase_threshold']:
-                    self._create_alert(
-                        'expense_increase',
-                        'Aumento significativo en gastos',
-                        f'Los gastos han aumentado un {expense_trend:.1%}',
-                        AlertLevel.WARNING,
-                        'financial'
-                    )
-                
-                if budget_utilization > rules['budget_utilization_threshold']:
-                    self._create_alert(
-                        'budget_limit_approaching',
-                        'Límite de presupuesto próximo',
-                        f'Se ha utilizado el {budget_utilization:.1%} del presupuesto',
-                        AlertLevel.WARNING,
-                        'financial'
-                    )
-                
-                time.sleep(3600)  # Verificar cada hora
-                
-            except Exception as e:
-                self.logger.error(f"Error en monitoreo financiero: {e}")
-                time.sleep(3600)
-    
-    def _measure_response_time(self) -> float:
-        """Medir tiempo de respuesta del sistema"""
-        # Simular medición de tiempo de respuesta
-        import random
-        return random.uniform(0.5, 3.0)
-    
-    def _calculate_error_rate(self) -> float:
-        """Calcular tasa de errores"""
-        # Simular cálculo de tasa de errores
-        import random
-        return random.uniform(0.01, 0.1)
-    
-    def _get_concurrent_users(self) -> int:
-        """Obtener número de usuarios concurrentes"""
-        # Simular conteo de usuarios concurrentes
-        import random
-        return random.randint(10, 150)
+        try:
+            # Obtener métricas financieras
+            overdue_payments = self._get_overdue_payments_ratio()
+            expense_trend = self._get_expense_trend()
+            budget_utilization = self._get_budget_utilization()
+            
+            # Registrar métricas
+            self._record_metric('overdue_payments_ratio', overdue_payments, 'percentage', 'financial')
+            self._record_metric('expense_trend', expense_trend, 'percentage', 'financial')
+            self._record_metric('budget_utilization', budget_utilization, 'percentage', 'financial')
+            
+        except Exception as e:
+            self.logger.error(f"Error en monitoreo financiero: {e}")
+    
+    def _measure_response_time(self, window: Dict = None) -> float:
+        """Medir tiempo de respuesta del sistema (p95 de los requests recientes)"""
+        if window is None:
+            from request_metrics import request_metrics
+            window = request_metrics.summary()
+        return window['latency_p95']
+    
+    def _calculate_error_rate(self, window: Dict = None) -> float:
+        """Calcular tasa de errores (respuestas 5xx de los requests recientes)"""
+        if window is None:
+            from request_metrics import request_metrics
+            window = request_metrics.summary()
+        return window['error_rate']
+    
+    def _get_concurrent_users(self, window: Dict = None) -> int:
+        """Obtener concurrencia actual (requests en curso en todos los workers)"""
+        if window is None:
+            from request_metrics import request_metrics
+            window = request_metrics.summary()
+        return window['in_flight']
     
     def _get_active_users_count(self) -> int:
         """Obtener número de usuarios activos"""
@@ -423,10 +414,12 @@ class IntelligentMonitoringSystem:
     def _get_login_frequency(self) -> float:
         """Obtener frecuencia de logins por hora"""
         try:
-            # Simular cálculo de frecuencia de logins
-            # En un sistema real, esto se calcularía basado en logs de autenticación
-            import random
-            return random.uniform(5, 50)
+            from services.temporal_aggregation import time_series
+            
+            # Último login de cada usuario agrupado por hora en las últimas 24 horas
+            end = datetime.utcnow()
+            _, logins = time_series(User.last_login, 'hour', end - timedelta(hours=24), end)
+            return float(sum(logins)) / 24
         except Exception as e:
             self.logger.error(f"Error calculando frecuencia de logins: {e}")
             return 0.0
@@ -666,79 +659,48 @@ class IntelligentMonitoringSystem:
     
     def _record_metric(self, name: str, value: float, unit: str, category: str):
         """Registrar métrica"""
-        metric = MonitoringMetric(
-            name=name,
-            value=value,
-            unit=unit,
-            timestamp=datetime.now(),
-            category=category
-        )
-        
-        self.metrics_history[name].append(metric)
+        series = self.metrics_history.record(name, value, unit=unit, category=category)
+        MONITORED_VALUE.set(value, metric=name, category=category, unit=unit)
         
         # Calcular tendencia
-        if len(self.metrics_history[name]) >= 3:
-            recent_values = [m.value for m in list(self.metrics_history[name])[-3:]]
+        recent_values = self.metrics_history.last_values(name, 3)
+        if len(recent_values) >= 3:
             if recent_values[2] > recent_values[1] > recent_values[0]:
-                metric.trend = 'increasing'
+                series.trend = 'increasing'
             elif recent_values[2] < recent_values[1] < recent_values[0]:
-                metric.trend = 'decreasing'
+                series.trend = 'decreasing'
             else:
-                metric.trend = 'stable'
+                series.trend = 'stable'
     
     def _create_alert(self, alert_id: str, title: str, message: str, level: AlertLevel, category: str, data: Dict = None):
-        """Crear alerta"""
-        if alert_id in self.active_alerts:
-            return  # Evitar alertas duplicadas
-        
-        alert = Alert(
-            id=alert_id,
-            title=title,
-            message=message,
-            level=level,
-            category=category,
-            timestamp=datetime.now(),
-            source='intelligent_monitoring',
-            data=data or {}
-        )
-        
-        self.active_alerts[alert_id] = alert
+        """Crear alerta por evento (predicciones y anomalías): se resuelve sola si deja de repetirse"""
+        alert_engine.trigger(alert_id, title, message, severity=level.value, group=category,
+                             source='intelligent_monitoring', data=data)
+    
+    def _forecast_metrics(self, window: int = 10) -> Dict[str, Dict]:
+        """Pronosticar en una pasada todas las métricas con al menos `window` valores"""
+        from services.forecasting import forecast_batch
         
-        # Ejecutar automatización según el tipo de alerta
-        if category == 'security' and level in [AlertLevel.CRITICAL, AlertLevel.EMERGENCY]:
-            automation_manager.execute_automation(
-                AutomationType.SECURITY_MONITORING,
-                {
-                    'alert_id': alert_id,
-                    'title': title,
-                    'message': message,
-                    'level': level.value
-                }
-            )
+        names, rows = [], []
+        for metric_name, series in self.metrics_history.items():
+            values = self.metrics_history.last_values(metric_name, window)
+            if len(values) == window:
+                names.append(metric_name)
+                rows.append(values)
         
-        self.logger.warning(f"Alerta creada: {title} - {message}")
+        self.metric_forecasts = forecast_batch(names, np.asarray(rows), non_negative=False) if rows else {}
+        return self.metric_forecasts
     
     def _predict_user_trends(self):
         """Predecir tendencias de usuarios"""
         try:
-            # Obtener datos históricos de usuarios activos
-            active_users_data = list(self.metrics_history['active_users'])
+            forecast = self._forecast_metrics().get('active_users')
             
-            if len(active_users_data) < 10:
+            if forecast is None:
                 return
             
-            # Calcular tendencia usando regresión lineal simple
-            values = [m.value for m in active_users_data[-10:]]
-            x = list(range(len(values)))
-            
-            # Calcular pendiente
-            n = len(values)
-            sum_x = sum(x)
-            sum_y = sum(values)
-            sum_xy = sum(x[i] * values[i] for i in range(n))
-            sum_x2 = sum(x[i] ** 2 for i in range(n))
-            
-            slope = (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x ** 2)
+            # Pendiente por muestra de la recta ajustada
+            slope = forecast['slope']
             
             # Predecir tendencia
             if slope > 2:
@@ -757,6 +719,17 @@ class IntelligentMonitoringSystem:
                     AlertLevel.WARNING,
                     'user_activity'
                 )
+            
+            for metric_name, metric_forecast in self.metric_forecasts.items():
+                if metric_forecast['anomaly']:
+                    self._create_alert(
+                        f'metric_anomaly_{metric_name}',
+                        f'Valor inusual en {metric_name}',
+                        f"El último valor ({metric_forecast['current']:.2f}) está fuera de la banda esperada "
+                        f"({metric_forecast['band']['lower']:.2f} - {metric_forecast['band']['upper']:.2f})",
+                        AlertLevel.WARNING,
+                        self.metrics_history.get(metric_name).category
+                    )
                 
         except Exception as e:
             self.logger.error(f"Error prediciendo tendencias de usuarios: {e}")
@@ -765,13 +738,12 @@ class IntelligentMonitoringSystem:
         """Predecir necesidades de mantenimiento"""
         try:
             # Obtener datos históricos de mantenimiento
-            maintenance_data = list(self.metrics_history['pending_maintenance'])
+            recent_values = self.metrics_history.last_values('pending_maintenance', 5)
             
-            if len(maintenance_data) < 5:
+            if len(recent_values) < 5:
                 return
             
             # Calcular tendencia
-            recent_values = [m.value for m in maintenance_data[-5:]]
             avg_value = statistics.mean(recent_values)
             
             # Si el promedio es alto, predecir necesidad de más recursos
@@ -789,62 +761,62 @@ class IntelligentMonitoringSystem:
     
     def get_monitoring_status(self) -> Dict:
         """Obtener estado del sistema de monitoreo"""
+        published = self._published()
         return {
             'enabled': self.monitoring_enabled,
             'active_alerts_count': len(self.active_alerts),
-            'metrics_tracked': len(self.metrics_history),
-            'last_update': datetime.now().isoformat()
+            'metrics_tracked': len(published['metrics']) if published else len(self.metrics_history),
+            'last_update': published['updated_at'] if published else None
         }
     
     def get_metrics_summary(self, category: Optional[str] = None) -> Dict:
-        """Obtener resumen de métricas"""
+        """Obtener resumen de métricas (el publicado por el líder o, sin publicación, el de este proceso)"""
+        published = self._published()
+        summary = published['metrics'] if published else self._summarize()
+        return {name: metric for name, metric in summary.items() if not category or metric['category'] == category}
+    
+    def _summarize(self) -> Dict:
+        """Resumen de las series registradas en este proceso"""
         summary = {}
         
-        for metric_name, history in self.metrics_history.items():
-            if category and not any(m.category == category for m in history):
-                continue
-                
-            if history:
-                recent_metrics = list(history)[-10:]  # Últimos 10 valores
-                values = [m.value for m in recent_metrics]
+        for metric_name, series in self.metrics_history.items():
+            if len(series):
+                values = self.metrics_history.last_values(metric_name, 10)  # Últimos 10 valores
+                last_hour = self.metrics_history.stats(metric_name, 3600)
                 
                 summary[metric_name] = {
-                    'current_value': values[-1],
+                    'current_value': series.last_value,
                     'average': statistics.mean(values),
-                    'trend': recent_metrics[-1].trend if recent_metrics[-1].trend else 'stable',
-                    'unit': recent_metrics[-1].unit,
-                    'category': recent_metrics[-1].category
+                    'trend': series.trend or 'stable',
+                    'unit': series.unit,
+                    'category': series.category,
+                    'forecast': self.metric_forecasts.get(metric_name, {}).get('forecast'),
+                    'last_hour': {
+                        'mean': last_hour['mean'],
+                        'slope_per_minute': last_hour['slope'] * 60,
+                        'p95': last_hour['percentiles']['p95']
+                    }
                 }
         
         return summary
     
     def get_active_alerts(self, level: Optional[AlertLevel] = None) -> List[Dict]:
         """Obtener alertas activas"""
-        alerts = []
-        
-        for alert in self.active_alerts.values():
-            if level and alert.level != level:
-                continue
-                
-            alerts.append({
-                'id': alert.id,
-                'title': alert.title,
-                'message': alert.message,
-                'level': alert.level.value,
-                'category': alert.category,
-                'timestamp': alert.timestamp.isoformat(),
-                'resolved': alert.resolved
-            })
-        
-        return sorted(alerts, key=lambda x: x['timestamp'], reverse=True)
+        alerts = alert_engine.active(source='intelligent_monitoring', severity=level.value if level else None)
+        return [{
+            'id': alert.id,
+            'title': alert.title,
+            'message': alert.message,
+            'level': alert.severity,
+            'category': alert.group,
+            'timestamp': datetime.fromtimestamp(alert.started_at).isoformat(),
+            'resolved': False,
+            'inhibited': alert.inhibited
+        } for alert in sorted(alerts, key=lambda alert: alert.started_at, reverse=True)]
     
     def resolve_alert(self, alert_id: str):
         """Resolver alerta"""
-        if alert_id in self.active_alerts:
-            alert = self.active_alerts[alert_id]
-            alert.resolved = True
-            alert.resolved_at = datetime.now()
-            
+        if alert_engine.resolve(alert_id):
             self.logger.info(f"Alerta resuelta: {alert_id}")
     
     def stop_monitoring(self):
@@ -866,17 +838,8 @@ def init_intelligent_monitoring(app):
             logger.warning("⚠️ numpy no disponible - monitoreo inteligente deshabilitado")
             return
         
-        # Configurar el sistema de monitoreo pero no iniciarlo inmediatamente
-        # Se iniciará cuando la aplicación esté completamente configurada
-        def start_monitoring_delayed():
-            import time
-            time.sleep(5)  # Esperar 5 segundos para que la app esté lista
-            intelligent_monitoring.start_monitoring()
-        
-        # Iniciar monitoreo en un hilo separado después de un delay
-        from threading import Thread
-        monitoring_thread = Thread(target=start_monitoring_delayed, daemon=True)
-        monitoring_thread.start()
+        # Registrar las verificaciones en el programador del cluster
+        intelligent_monitoring.start_monitoring()
         
         # Registrar rutas de API para monitoreo
         @app.route('/api/v1/monitoring/status', methods=['GET'])
@@ -950,6 +913,8 @@ def monitored_metric(metric_name: str, category: str = 'custom'):
                     category
                 )
                 
+                MONITORED_DURATION.observe(execution_time, metric=metric_name, category=category)
+                MONITORED_RUNS.inc(metric=metric_name, category=category, outcome='success')
                 intelligent_monitoring._record_metric(
                     f"{metric_name}_success_rate",
                     1.0,
@@ -969,6 +934,8 @@ def monitored_metric(metric_name: str, category: str = 'custom'):
                     category
                 )
                 
+                MONITORED_DURATION.observe(execution_time, metric=metric_name, category=category)
+                MONITORED_RUNS.inc(metric=metric_name, category=category, outcome='error')
                 intelligent_monitoring._record_metric(
                     f"{metric_name}_success_rate",
                     0.0,
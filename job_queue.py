@@ -0,0 +1,242 @@
+"""
+Cola de trabajos persistente
+Los procesos web encolan trabajos en la tabla job_queue y el proceso worker
+(worker.py) los ejecuta; con PROCESS_ROLE=all los drena cada proceso. Cada consumidor toma un trabajo con un UPDATE
+condicionado al estado 'pending', de modo que varios consumidores pueden
+drenar la cola a la vez sin ejecutar dos veces el mismo trabajo.
+"""
+
+import importlib
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from flask import jsonify
+from sqlalchemy import select, update, delete, func
+
+from models import db, QueuedJob
+
+logger = logging.getLogger(__name__)
+
+# Configuración de la cola
+JOB_QUEUE_CONFIG = {
+    'poll_seconds': 2,            # Intervalo de drenado
+    'batch_size': 20,             # Trabajos tomados por consulta
+    'max_drain_seconds': 30,      # Tiempo máximo de un drenado antes de ceder
+    'max_attempts': 3,
+    'retry_backoff_seconds': 30,  # Espera antes del reintento n: backoff * 2^(n-1)
+    'stale_after_seconds': 900,   # Un trabajo 'running' más viejo se considera abandonado
+    'keep_finished_hours': 72,
+    # Módulos que registran handlers al importarse
+    'handler_modules': ['notification_service']
+}
+
+JOB_STATES = ('pending', 'running', 'done', 'failed')
+
+
+class JobQueue:
+    """Registro de handlers, encolado y consumo de trabajos"""
+
+    def __init__(self):
+        self.handlers: Dict[str, Callable] = {}
+        self.stats = {'processed': 0, 'failed': 0, 'retried': 0}
+
+    def handler(self, name: str):
+        """Decorador: registrar la función que ejecuta los trabajos de un nombre"""
+        def decorator(func: Callable) -> Callable:
+            self.handlers[name] = func
+            return func
+        return decorator
+
+    def enqueue(self, name: str, payload: Dict[str, Any] = None, delay: float = 0,
+                max_attempts: int = None) -> int:
+        """Encolar un trabajo (el payload debe ser serializable a JSON); devuelve su id"""
+        if name not in self.handlers:
+            raise KeyError(f'No hay handler registrado para {name}')
+        job = QueuedJob(
+            name=name,
+            payload=json.dumps(payload or {}, default=str),
+            max_attempts=max_attempts or JOB_QUEUE_CONFIG['max_attempts'],
+            run_after=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+    def enqueue_many(self, name: str, payloads: List[Dict[str, Any]], delay: float = 0,
+                     max_attempts: int = None) -> List[int]:
+        """Encolar varios trabajos del mismo nombre en un solo commit; devuelve sus ids"""
+        if name not in self.handlers:
+            raise KeyError(f'No hay handler registrado para {name}')
+        run_after = datetime.utcnow() + timedelta(seconds=delay)
+        jobs = [QueuedJob(name=name, payload=json.dumps(payload or {}, default=str),
+                          max_attempts=max_attempts or JOB_QUEUE_CONFIG['max_attempts'], run_after=run_after)
+                for payload in payloads]
+        db.session.add_all(jobs)
+        db.session.commit()
+        return [job.id for job in jobs]
+
+    # Consumo
+
+    def _node_id(self) -> str:
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def _claim(self, now: datetime) -> List[QueuedJob]:
+        """Tomar trabajos vencidos; el UPDATE condicionado evita que dos consumidores tomen el mismo"""
+        candidates = db.session.execute(
+            select(QueuedJob.id)
+            .where(QueuedJob.status == 'pending', QueuedJob.run_after <= now)
+            .order_by(QueuedJob.run_after, QueuedJob.id)
+            .limit(JOB_QUEUE_CONFIG['batch_size'])
+        ).scalars().all()
+
+        node = self._node_id()
+        claimed = []
+        for job_id in candidates:
+            result = db.session.execute(
+                update(QueuedJob)
+                .where(QueuedJob.id == job_id, QueuedJob.status == 'pending')
+                .values(status='running', locked_by=node, locked_at=now, attempts=QueuedJob.attempts + 1)
+            )
+            if result.rowcount == 1:
+                claimed.append(job_id)
+        db.session.commit()
+        if not claimed:
+            return []
+        return db.session.execute(select(QueuedJob).where(QueuedJob.id.in_(claimed))
+                                  .order_by(QueuedJob.id)).scalars().all()
+
+    def _run(self, job: QueuedJob):
+        started = time.perf_counter()
+        status = 'done'
+        try:
+            func = self.handlers.get(job.name)
+            if func is None:
+                raise KeyError(f'No hay handler registrado para {job.name}')
+            func(**json.loads(job.payload or '{}'))
+            job.status = 'done'
+            job.error = None
+            job.finished_at = datetime.utcnow()
+            self.stats['processed'] += 1
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(QueuedJob, job.id)
+            job.error = str(e)
+            if job.attempts < job.max_attempts:
+                status = 'retry'
+                job.status = 'pending'
+                job.run_after = datetime.utcnow() + timedelta(
+                    seconds=JOB_QUEUE_CONFIG['retry_backoff_seconds'] * 2 ** (job.attempts - 1))
+                self.stats['retried'] += 1
+                logger.warning(f'Trabajo {job.name}#{job.id} falló (intento {job.attempts}): {e}')
+            else:
+                status = 'failed'
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+                self.stats['failed'] += 1
+                logger.error(f'Trabajo {job.name}#{job.id} descartado tras {job.attempts} intentos: {e}')
+        job.locked_by = None
+        db.session.commit()
+        _record_metrics(job.name, status, time.perf_counter() - started)
+
+    def requeue_stale(self, now: datetime = None) -> int:
+        """Devolver a la cola los trabajos de consumidores que murieron a mitad de ejecución"""
+        now = now or datetime.utcnow()
+        result = db.session.execute(
+            update(QueuedJob)
+            .where(QueuedJob.status == 'running',
+                   QueuedJob.locked_at < now - timedelta(seconds=JOB_QUEUE_CONFIG['stale_after_seconds']))
+            .values(status='pending', locked_by=None)
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def drain(self, max_seconds: float = None) -> int:
+        """Ejecutar trabajos vencidos hasta vaciar la cola o agotar el tiempo; devuelve los ejecutados"""
+        max_seconds = JOB_QUEUE_CONFIG['max_drain_seconds'] if max_seconds is None else max_seconds
+        deadline = time.monotonic() + max_seconds
+        executed = 0
+        self.requeue_stale()
+        while time.monotonic() < deadline:
+            jobs = self._claim(datetime.utcnow())
+            if not jobs:
+                break
+            for job in jobs:
+                self._run(job)
+                executed += 1
+        return executed
+
+    def purge(self, now: datetime = None) -> int:
+        """Borrar trabajos terminados más viejos que keep_finished_hours"""
+        now = now or datetime.utcnow()
+        result = db.session.execute(
+            delete(QueuedJob)
+            .where(QueuedJob.status.in_(('done', 'failed')),
+                   QueuedJob.finished_at < now - timedelta(hours=JOB_QUEUE_CONFIG['keep_finished_hours']))
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        rows = db.session.execute(
+            select(QueuedJob.status, func.count(QueuedJob.id)).group_by(QueuedJob.status)
+        ).all()
+        counts = {status: 0 for status in JOB_STATES}
+        counts.update({status: total for status, total in rows})
+        return counts
+
+
+# Instancia global
+job_queue = JobQueue()
+
+
+def _record_metrics(name: str, status: str, duration: float):
+    try:
+        from metrics_registry import metrics_registry
+        metrics_registry.counter('portal_job_queue_jobs', 'Trabajos de la cola ejecutados',
+                                 ['job', 'status']).inc(job=name, status=status)
+        metrics_registry.histogram('portal_job_queue_duration_seconds', 'Duración de los trabajos de la cola',
+                                   ['job']).observe(duration, job=name)
+    except Exception as e:
+        logger.debug(f'No se pudieron registrar métricas de la cola: {e}')
+
+
+def init_job_queue(app):
+    """Inicializar handlers, drenado periódico y ruta de estado"""
+    from flask_login import login_required, current_user
+    from cluster_scheduler import cluster_scheduler
+
+    for module in JOB_QUEUE_CONFIG['handler_modules']:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            logger.warning(f'No se pudieron registrar handlers de {module}: {e}')
+
+    # Los procesos web solo encolan; el worker (o cada proceso con rol 'all') drena
+    cluster_scheduler.interval('job_queue.drain', JOB_QUEUE_CONFIG['poll_seconds'], job_queue.drain,
+                               scope='local', delay=0, timeout=JOB_QUEUE_CONFIG['stale_after_seconds'],
+                               roles=('all', 'worker'), description='Ejecutar trabajos encolados por los procesos web')
+    cluster_scheduler.interval('job_queue.purge', 3600, job_queue.purge, jitter=120,
+                               description='Borrar trabajos terminados antiguos')
+
+    @app.route('/api/v1/job-queue', methods=['GET'])
+    @login_required
+    def get_job_queue():
+        """Trabajos por estado y handlers registrados"""
+        if not current_user.can_access_admin():
+            return jsonify({'success': False, 'error': 'Permisos insuficientes'}), 403
+        return jsonify({
+            'success': True,
+            'data': {
+                'role': cluster_scheduler.role(),
+                'counts': job_queue.counts(),
+                'handlers': sorted(job_queue.handlers),
+                'stats': dict(job_queue.stats)
+            }
+        })
+
+    print("✅ Cola de trabajos inicializada")
@@ -166,6 +166,104 @@ def create_app(config_name=None):
     login_manager.login_message = 'Por favor inicia sesión para acceder a esta página.'
     login_manager.login_message_category = 'info'
     
+    # Inicializar métricas de requests (primer middleware para medir el request completo)
+    try:
+        from request_metrics import init_request_metrics
+        init_request_metrics(app)
+    except Exception as e:
+        print(f"⚠️ No se pudieron inicializar métricas de requests: {e}")
+
+    # Inicializar SLO por endpoint (consumo del presupuesto de error y ejemplares lentos)
+    try:
+        from slo_tracker import init_slo_tracker
+        init_slo_tracker(app)
+    except Exception as e:
+        print(f"⚠️ No se pudo inicializar seguimiento de SLO: {e}")
+
+    # Inicializar trazas por request (después de SLO para reutilizar g.request_id)
+    try:
+        from request_tracing import init_request_tracing
+        init_request_tracing(app)
+    except Exception as e:
+        print(f"⚠️ No se pudieron inicializar las trazas por request: {e}")
+
+    # Inicializar profiler por muestreo (bajo demanda y continuo a baja frecuencia)
+    try:
+        from sampling_profiler import init_sampling_profiler
+        init_sampling_profiler(app)
+    except Exception as e:
+        print(f"⚠️ No se pudo inicializar el profiler: {e}")
+
+    # Inicializar sondas de salud (/health/live sin dependencias, /health/ready en paralelo y cacheada)
+    try:
+        from app_modules.core.monitoring_service import init_health_checks
+        init_health_checks(app)
+    except Exception as e:
+        print(f"⚠️ No se pudieron inicializar las sondas de salud: {e}")
+
+    # Inicializar endpoint /metrics (OpenMetrics, combinado entre workers)
+    try:
+        from metrics_registry import init_metrics_endpoint
+        init_metrics_endpoint(app)
+    except Exception as e:
+        print(f"⚠️ No se pudo inicializar el endpoint de métricas: {e}")
+
+    # Inicializar gestor de tareas en segundo plano
+    try:
+        from background_jobs import init_background_jobs
+        init_background_jobs(app)
+    except Exception as e:
+        print(f"⚠️ No se pudo inicializar gestor de tareas en segundo plano: {e}")
+
+    # Inicializar programador de tareas del cluster (una ejecución por cluster con elección de líder)
+    try:
+        from cluster_scheduler import init_cluster_scheduler
+        init_cluster_scheduler(app)
+    except Exception as e:
+        print(f"⚠️ No se pudo inicializar el programador de tareas: {e}")
+
+    # Inicializar cola de trabajos (los procesos web encolan, el worker ejecuta)
+    try:
+        from job_queue import init_job_queue
+        init_job_queue(app)
+    except Exception as e:
+        print(f"⚠️ No se pudo inicializar la cola de trabajos: {e}")
+
+    # Inicializar motor de reglas de alerta (evaluación incremental en el líder)
+    try:
+        from alert_rules import init_alert_rules
+        init_alert_rules(app)
+    except Exception as e:
+        print(f"⚠️ No se pudo inicializar el motor de alertas: {e}")
+
+    # Inicializar motor de exportación
+    try:
+        from export_engine import init_export_engine
+        init_export_engine(app)
+    except Exception as e:
+        print(f"⚠️ No se pudo inicializar motor de exportación: {e}")
+
+    # Inicializar seguimiento de presencia
+    try:
+        from presence_tracker import init_presence_tracker
+        init_presence_tracker(app)
+    except Exception as e:
+        print(f"⚠️ No se pudo inicializar seguimiento de presencia: {e}")
+
+    # Inicializar retención y archivo de datos
+    try:
+        from data_retention import init_data_retention
+        init_data_retention(app)
+    except Exception as e:
+        print(f"⚠️ No se pudo inicializar retención de datos: {e}")
+
+    # Inicializar snapshots analíticos (Parquet)
+    try:
+        from analytics_snapshots import init_analytics_snapshots
+        init_analytics_snapshots(app)
+    except Exception as e:
+        print(f"⚠️ No se pudieron inicializar snapshots analíticos: {e}")
+
     # Inicializar optimizaciones de performance (Fase 1)
     try:
         from performance_integration import init_performance
@@ -453,6 +551,8 @@ if SOCKETIO_AVAILABLE and SocketIO:
             'manage_session': False
         }
         socketio = SocketIO(app, **socketio_config)
+        from presence_tracker import register_socketio_handlers
+        register_socketio_handlers(socketio)
     except Exception as e:
         print(f"⚠️ Error configurando SocketIO para producción: {e}")
         socketio = None
@@ -568,6 +668,10 @@ with app.app_context():
         # Ejecutar migración automática para columnas de IA
         migrate_ai_columns()
         
+        # Reclamar franjas de reservas vigentes previas a reservation_slots
+        from services.reservation_availability import backfill_reservation_slots
+        backfill_reservation_slots()
+        
         print("✅ Base de datos inicializada correctamente")
     except Exception as e:
         print(f"⚠️ Error inicializando BD: {e}")
@@ -576,6 +680,8 @@ with app.app_context():
 if __name__ == '__main__':
     if SOCKETIO_AVAILABLE and SocketIO:
         socketio = SocketIO(app)
+        from presence_tracker import register_socketio_handlers
+        register_socketio_handlers(socketio)
         socketio.run(app, debug=True, host='0.0.0.0', port=5000)
     else:
         app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,488 @@
+"""
+Registro de métricas multiproceso
+Contadores, gauges e histogramas registrados una sola vez por nombre. Cada
+worker escribe sus valores en un archivo mapeado en memoria propio y el endpoint
+/metrics suma los archivos de todos los workers al momento del scrape y los
+expone en formato OpenMetrics.
+"""
+
+import fcntl
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import request
+
+logger = logging.getLogger(__name__)
+
+# Configuración del registro de métricas
+METRICS_CONFIG = {
+    'directory': os.environ.get('METRICS_MULTIPROC_DIR',
+                                os.path.join(tempfile.gettempdir(), 'portal_metrics')),
+    'initial_file_size': 64 * 1024,
+    # Límites superiores por defecto de los histogramas en segundos (el último es +Inf)
+    'default_buckets': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    'content_type': 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+}
+
+RETIRED_FILE = 'retired.db'
+GAUGE_MODES = ('sum', 'max', 'min', 'all')   # Cómo combinar un gauge entre workers ('all': uno por pid)
+_HEADER = struct.Struct('<Q')                # Bytes usados del archivo
+_ENTRY = struct.Struct('<I')                 # Largo de la clave
+
+
+def _padded(length: int) -> int:
+    return length + (-length % 8)
+
+
+class MmapStore:
+    """Archivo de un proceso con entradas (clave, valor float64) que solo crecen"""
+
+    def __init__(self, path: str, size: int = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self._positions: Dict[str, int] = {}
+        with open(path, 'a+b') as handle:
+            minimum = size or METRICS_CONFIG['initial_file_size']
+            if os.path.getsize(path) < minimum:
+                handle.truncate(minimum)
+        self._file = open(path, 'r+b')
+        self._map(os.path.getsize(path))
+        self._used = _HEADER.unpack_from(self._mmap, 0)[0] or _HEADER.size
+        for key, _, position in _entries(self._mmap, self._used):
+            self._positions[key] = position
+
+    def _map(self, size: int):
+        self._size = size
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+
+    def _position(self, key: str) -> int:
+        # Se llama con el lock tomado
+        position = self._positions.get(key)
+        if position is not None:
+            return position
+        encoded = key.encode('utf-8')
+        entry_size = _padded(_ENTRY.size + len(encoded)) + 8   # Largo, clave alineada a 8 bytes y valor
+        if self._used + entry_size > self._size:
+            self._mmap.close()
+            new_size = self._size
+            while self._used + entry_size > new_size:
+                new_size *= 2
+            self._file.truncate(new_size)
+            self._map(new_size)
+        start = self._used
+        _ENTRY.pack_into(self._mmap, start, len(encoded))
+        self._mmap[start + _ENTRY.size:start + _ENTRY.size + len(encoded)] = encoded
+        position = start + entry_size - 8
+        struct.pack_into('<d', self._mmap, position, 0.0)
+        # El encabezado se actualiza al final: un lector nunca ve una entrada a medio escribir
+        self._used = start + entry_size
+        _HEADER.pack_into(self._mmap, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def add(self, key: str, amount: float):
+        with self.lock:
+            position = self._position(key)
+            struct.pack_into('<d', self._mmap, position, struct.unpack_from('<d', self._mmap, position)[0] + amount)
+
+    def set(self, key: str, value: float):
+        with self.lock:
+            struct.pack_into('<d', self._mmap, self._position(key), value)
+
+    def close(self):
+        with self.lock:
+            self._mmap.close()
+            self._file.close()
+
+
+def _entries(buffer, used: int) -> Iterable[Tuple[str, float, int]]:
+    """(clave, valor, posición del valor) de cada entrada"""
+    offset = _HEADER.size
+    while offset + _ENTRY.size <= used:
+        length = _ENTRY.unpack_from(buffer, offset)[0]
+        key_end = offset + _ENTRY.size + length
+        position = offset + _padded(_ENTRY.size + length)
+        if position + 8 > used:
+            break
+        yield bytes(buffer[offset + _ENTRY.size:key_end]).decode('utf-8'), struct.unpack_from('<d', buffer, position)[0], position
+        offset = position + 8
+
+
+def read_store(path: str) -> Dict[str, float]:
+    """Valores de un archivo de métricas (vacío si no existe)"""
+    try:
+        with open(path, 'rb') as handle:
+            data = handle.read()
+    except FileNotFoundError:
+        return {}
+    if len(data) < _HEADER.size:
+        return {}
+    used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+    return {key: value for key, value, _ in _entries(data, used)}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def sanitize_name(name: str) -> str:
+    """Nombre válido para OpenMetrics (p. ej. 'http.request' -> 'http_request')"""
+    cleaned = ''.join(char if char.isalnum() or char == '_' else '_' for char in name)
+    return cleaned if cleaned and not cleaned[0].isdigit() else f'_{cleaned}'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return str(int(value)) if value == int(value) and abs(value) < 1e15 else repr(value)
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+class MetricFamily:
+    """Familia de series con el mismo nombre, tipo y etiquetas"""
+
+    kind = None
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str, labelnames: Sequence[str]):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _label_items(self, labels: Dict[str, Any]) -> List[Tuple[str, str]]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} requiere las etiquetas {self.labelnames}')
+        return [(name, str(labels[name])) for name in self.labelnames]
+
+    def _key(self, suffix: str, labels: List[Tuple[str, str]], mode: str = '') -> str:
+        return json.dumps([self.name, self.kind, mode, suffix, labels], separators=(',', ':'))
+
+    def labels(self, **labels) -> 'BoundMetric':
+        return BoundMetric(self, self._label_items(labels))
+
+
+class BoundMetric:
+    """Serie concreta de una familia (valores de etiquetas fijados)"""
+
+    def __init__(self, family: MetricFamily, labels: List[Tuple[str, str]]):
+        self.family = family
+        self.label_items = labels
+
+    def inc(self, amount: float = 1):
+        self.family._inc(self.label_items, amount)
+
+    def dec(self, amount: float = 1):
+        self.family._set_or_add(self.label_items, -amount, add=True)
+
+    def set(self, value: float):
+        self.family._set_or_add(self.label_items, value, add=False)
+
+    def observe(self, value: float):
+        self.family._observe(self.label_items, value)
+
+
+class Counter(MetricFamily):
+    kind = 'counter'
+
+    def _inc(self, labels, amount: float):
+        if amount < 0:
+            raise ValueError('Los contadores solo pueden aumentar')
+        self.registry._store().add(self._key('_total', labels), amount)
+
+    def inc(self, amount: float = 1, **labels):
+        self._inc(self._label_items(labels), amount)
+
+
+class Gauge(MetricFamily):
+    kind = 'gauge'
+
+    def __init__(self, registry, name, documentation, labelnames, mode: str = 'all'):
+        if mode not in GAUGE_MODES:
+            raise ValueError(f'Modo de gauge no soportado: {mode}')
+        super().__init__(registry, name, documentation, labelnames)
+        self.mode = mode
+
+    def _set_or_add(self, labels, value: float, add: bool):
+        store = self.registry._store()
+        key = self._key('', labels, self.mode)
+        store.add(key, value) if add else store.set(key, value)
+
+    def _inc(self, labels, amount: float):
+        self._set_or_add(labels, amount, add=True)
+
+    def set(self, value: float, **labels):
+        self._set_or_add(self._label_items(labels), value, add=False)
+
+    def inc(self, amount: float = 1, **labels):
+        self._set_or_add(self._label_items(labels), amount, add=True)
+
+
+class Histogram(MetricFamily):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames, buckets: Sequence[float] = None):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets or METRICS_CONFIG['default_buckets']))
+        self._initialized = set()
+
+    def _observe(self, labels, value: float):
+        store = self.registry._store()
+        if (store.path, tuple(labels)) not in self._initialized:
+            # Todos los buckets quedan en el archivo: el scrape los expone aunque no conozca la familia
+            for bound in self.buckets + (math.inf,):
+                store.add(self._key('_bucket', labels + [('le', _format_value(bound))]), 0)
+            self._initialized.add((store.path, tuple(labels)))
+        # Se guarda la cuenta de cada bucket; la exposición la acumula
+        bound = next((bound for bound in self.buckets if value <= bound), math.inf)
+        store.add(self._key('_bucket', labels + [('le', _format_value(bound))]), 1)
+        store.add(self._key('_sum', labels), value)
+        store.add(self._key('_count', labels), 1)
+
+    def observe(self, value: float, **labels):
+        self._observe(self._label_items(labels), value)
+
+
+class MetricsRegistry:
+    """Familias registradas por nombre y archivos por worker combinados al exponer"""
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or METRICS_CONFIG['directory']
+        self.families: Dict[str, MetricFamily] = {}
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[str, List, float]]]]]] = []
+        self.lock = threading.Lock()
+        self._worker: Optional[MmapStore] = None
+        self._worker_pid = None
+
+    # Registro
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Sequence[str], **options) -> MetricFamily:
+        name = sanitize_name(name)
+        with self.lock:
+            family = self.families.get(name)
+            if family is None:
+                family = self.families[name] = cls(self, name, documentation, labelnames, **options)
+            elif type(family) is not cls or family.labelnames != tuple(labelnames):
+                raise ValueError(f'La métrica {name} ya está registrada con otro tipo o etiquetas')
+            return family
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), mode: str = 'all') -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames, mode=mode)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = None) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable):
+        """Función que devuelve familias ya combinadas entre workers: (nombre, tipo, ayuda, muestras)"""
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    # Escritura
+
+    def _store(self) -> MmapStore:
+        # Tras un fork el hijo abre su propio archivo
+        pid = os.getpid()
+        if self._worker is None or self._worker_pid != pid:
+            with self.lock:
+                if self._worker is None or self._worker_pid != pid:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._worker = MmapStore(os.path.join(self.directory, f'metrics_{pid}.db'))
+                    self._worker_pid = pid
+        return self._worker
+
+    # Lectura combinada
+
+    def _locked(self, mode):
+        """Lock entre procesos: exclusivo al retirar workers, compartido al leer"""
+        os.makedirs(self.directory, exist_ok=True)
+        lock = open(os.path.join(self.directory, '.lock'), 'a')
+        fcntl.flock(lock, mode)
+        return lock
+
+    def _files(self) -> Dict[str, Optional[int]]:
+        files = {}
+        for name in os.listdir(self.directory):
+            if name == RETIRED_FILE:
+                files[name] = None
+            elif name.startswith('metrics_') and name.endswith('.db'):
+                files[name] = int(name[len('metrics_'):-len('.db')])
+        return files
+
+    def retire(self, pid: int):
+        """Sumar contadores e histogramas de un worker terminado al archivo de retirados; sus gauges se descartan"""
+        path = os.path.join(self.directory, f'metrics_{pid}.db')
+        lock = self._locked(fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(path):
+                return
+            values = read_store(path)
+            retired = MmapStore(os.path.join(self.directory, RETIRED_FILE))
+            try:
+                for key, value in values.items():
+                    if json.loads(key)[1] != 'gauge':
+                        retired.add(key, value)
+            finally:
+                retired.close()
+            os.unlink(path)
+        finally:
+            lock.close()
+
+    def collect(self) -> Dict[Tuple[str, str, str], Dict[Tuple, float]]:
+        """Valores de todos los workers por (nombre, tipo, modo) y (sufijo, etiquetas)"""
+        merged: Dict[Tuple[str, str, str], Dict[Tuple, float]] = {}
+        if not os.path.isdir(self.directory):
+            return merged
+
+        for pid in self._files().values():
+            if pid is not None and not _pid_alive(pid):
+                try:
+                    self.retire(pid)
+                except OSError as e:
+                    logger.debug(f'No se pudo retirar el worker {pid}: {e}')
+
+        lock = self._locked(fcntl.LOCK_SH)
+        try:
+            for file_name, pid in self._files().items():
+                for key, value in read_store(os.path.join(self.directory, file_name)).items():
+                    name, kind, mode, suffix, labels = json.loads(key)
+                    labels = [tuple(label) for label in labels]
+                    if kind == 'gauge' and mode == 'all':
+                        labels.append(('pid', str(pid)))
+                    series = merged.setdefault((name, kind, mode), {})
+                    sample = (suffix, tuple(labels))
+                    if sample not in series:
+                        series[sample] = value
+                    elif kind == 'gauge' and mode == 'max':
+                        series[sample] = max(series[sample], value)
+                    elif kind == 'gauge' and mode == 'min':
+                        series[sample] = min(series[sample], value)
+                    else:
+                        series[sample] += value
+        finally:
+            lock.close()
+        return merged
+
+    def _histogram_samples(self, name: str, series: Dict[Tuple, float]) -> List[Tuple[str, List, float]]:
+        """Buckets acumulados (con +Inf) seguidos de _count y _sum por conjunto de etiquetas"""
+        grouped: Dict[Tuple, Dict[str, Any]] = {}
+        for (suffix, labels), value in series.items():
+            if suffix == '_bucket':
+                base = tuple(label for label in labels if label[0] != 'le')
+                bound = float(dict(labels)['le'])
+                grouped.setdefault(base, {'buckets': {}})['buckets'][bound] = value
+            else:
+                grouped.setdefault(labels, {'buckets': {}})[suffix] = value
+
+        family = self.families.get(name)
+        samples = []
+        for labels, values in sorted(grouped.items()):
+            bounds = set(values['buckets']) | set(family.buckets if isinstance(family, Histogram) else ())
+            cumulative = 0.0
+            for bound in sorted(bounds | {math.inf}):
+                cumulative += values['buckets'].get(bound, 0.0)
+                samples.append(('_bucket', list(labels) + [('le', _format_value(bound))], cumulative))
+            samples.append(('_count', list(labels), values.get('_count', cumulative)))
+            samples.append(('_sum', list(labels), values.get('_sum', 0.0)))
+        return samples
+
+    def exposition(self) -> str:
+        """Texto OpenMetrics con las familias de todos los workers y de los colectores"""
+        families = []
+        for (name, kind, _), series in sorted(self.collect().items()):
+            if kind == 'histogram':
+                samples = self._histogram_samples(name, series)
+            else:
+                samples = [(suffix, list(labels), value) for (suffix, labels), value in sorted(series.items())]
+            family = self.families.get(name)
+            families.append((name, kind, family.documentation if family else '', samples))
+
+        for collector in self.collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.warning(f'Error en colector de métricas: {e}')
+
+        lines = []
+        for name, kind, documentation, samples in families:
+            if documentation:
+                lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for suffix, labels, value in samples:
+                lines.append(f'{name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """Borrar los archivos (al iniciar el master de gunicorn)"""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.db'):
+                os.unlink(os.path.join(self.directory, name))
+
+
+# Instancia global
+metrics_registry = MetricsRegistry()
+
+
+def request_metrics_collector():
+    """Familias HTTP a partir de las métricas de requests (ya combinadas entre workers)"""
+    from request_metrics import request_metrics, STATUS_CLASSES
+
+    layout = request_metrics.layout
+    totals = request_metrics.totals()
+    buckets = []
+    cumulative = 0.0
+    for index, bound in enumerate(layout.buckets + (math.inf,)):
+        cumulative += totals[layout.histogram + index]
+        buckets.append(('_bucket', [('le', _format_value(bound))], cumulative))
+    buckets.append(('_count', [], totals[layout.requests]))
+    buckets.append(('_sum', [], totals[layout.latency_sum]))
+
+    return [
+        ('portal_http_request_duration_seconds', 'histogram', 'Duración de los requests HTTP', buckets),
+        ('portal_http_responses', 'counter', 'Respuestas HTTP por clase de estado',
+         [('_total', [('status_class', name)], totals[layout.status + index])
+          for index, name in enumerate(STATUS_CLASSES)]),
+        ('portal_http_requests_in_flight', 'gauge', 'Requests en curso',
+         [('', [], max(0.0, totals[layout.in_flight]))])
+    ]
+
+
+def init_metrics_endpoint(app):
+    """Registrar /metrics (protegido con token si METRICS_TOKEN está configurado)"""
+    metrics_registry.register_collector(request_metrics_collector)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        token = app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return {'error': 'No autorizado'}, 401
+        return app.response_class(metrics_registry.exposition(), mimetype=None,
+                                  content_type=METRICS_CONFIG['content_type'])
+
+    print("✅ Endpoint de métricas /metrics inicializado")
@@ -170,6 +170,9 @@ class Reservation(db.Model):
     # Relación con el aprobador
     approver = db.relationship('User', foreign_keys=[approved_by])
     
+    # Franjas horarias ocupadas (garantía en base de datos contra reservas superpuestas)
+    slots = db.relationship('ReservationSlot', backref='reservation', lazy='select', cascade='all, delete-orphan')
+    
     def get_duration(self):
         """Obtener duración de la reserva"""
         return self.end_time - self.start_time
@@ -186,6 +189,18 @@ class Reservation(db.Model):
         return (self.status in ['pending', 'approved'] and 
                 self.start_time > datetime.utcnow() + timedelta(hours=24))
 
+class ReservationSlot(db.Model):
+    """Franja horaria ocupada por una reserva; la restricción única impide superposiciones"""
+    __tablename__ = 'reservation_slots'
+    __table_args__ = (
+        db.UniqueConstraint('space_type', 'slot_start', name='uq_reservation_slot'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    reservation_id = db.Column(db.Integer, db.ForeignKey('reservations.id', ondelete='CASCADE'), nullable=False, index=True)
+    space_type = db.Column(db.String(50), nullable=False)
+    slot_start = db.Column(db.DateTime, nullable=False)
+
 class News(db.Model):
     """Modelo de noticias y comunicaciones"""
     __tablename__ = 'news'
@@ -551,3 +566,50 @@ class ChatbotSession(db.Model):
         context = self.get_context_dict()
         context[key] = value
         self.set_context(context)
+
+class CohortRetention(db.Model):
+    """Tabla materializada: usuarios activos de cada cohorte mensual de alta por mes de actividad"""
+    __tablename__ = 'cohort_retention'
+    __table_args__ = (
+        db.UniqueConstraint('cohort_month', 'activity_month', name='uq_cohort_retention'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    cohort_month = db.Column(db.String(7), nullable=False, index=True)  # YYYY-MM de alta
+    activity_month = db.Column(db.String(7), nullable=False)  # YYYY-MM de actividad
+    period_index = db.Column(db.Integer, nullable=False)  # Meses desde el alta
+    cohort_size = db.Column(db.Integer, nullable=False, default=0)
+    active_users = db.Column(db.Integer, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @property
+    def retention(self):
+        return self.active_users / self.cohort_size if self.cohort_size else 0.0
+
+class QueuedJob(db.Model):
+    """Trabajo encolado por los procesos web y ejecutado por el proceso worker"""
+    __tablename__ = 'job_queue'
+    __table_args__ = (
+        db.Index('ix_job_queue_status_run_after', 'status', 'run_after'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # Handler registrado en job_queue
+    payload = db.Column(db.Text, nullable=False, default='{}')  # Argumentos en JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(120))  # Proceso que lo tomó
+    locked_at = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class SharedState(db.Model):
+    """Resultado publicado por un proceso (el líder del programador) para que lo lean los demás"""
+    __tablename__ = 'shared_state'
+
+    key = db.Column(db.String(150), primary_key=True)
+    value = db.Column(db.Text, nullable=False, default='null')  # JSON
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
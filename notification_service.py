@@ -13,6 +13,7 @@ from email import encoders
 from datetime import datetime
 from flask import current_app
 import logging
+from request_tracing import span
 
 class NotificationService:
     """Servicio de notificaciones por email y WhatsApp"""
@@ -79,10 +80,11 @@ class NotificationService:
                         msg.attach(part)
             
             # Conectar y enviar
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
+            with span('smtp.send', 'client', {'net.peer.name': self.smtp_server or '', 'net.peer.port': self.smtp_port}):
+                with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+                    server.starttls()
+                    server.login(self.smtp_username, self.smtp_password)
+                    server.send_message(msg)
             
             self.logger.info(f"Email enviado exitosamente a {to_email}")
             return True
@@ -507,6 +509,62 @@ Mantenimiento del Barrio
                 stats['errors'] += 1
         
         return stats
+    
+    def queue_notification(self, user, notification_type, data, channels=None):
+        """
+        Encolar la notificación para que la entregue el proceso worker
+        
+        Returns:
+            int: ID del trabajo encolado
+        """
+        from job_queue import job_queue
+        return job_queue.enqueue('notifications.deliver', {
+            'user_id': user.id,
+            'notification_type': notification_type,
+            'data': data,
+            'channels': channels
+        })
+    
+    def queue_bulk_notification(self, users, notification_type, data, channels=None):
+        """Encolar la misma notificación para cada usuario; devuelve los IDs de los trabajos"""
+        return self.queue_personalized_notifications([(user, data) for user in users], notification_type, channels)
+    
+    def queue_personalized_notifications(self, recipients, notification_type, channels=None):
+        """
+        Encolar una notificación con datos propios por destinatario, en un solo commit
+        
+        Args:
+            recipients (list): Pares (usuario, datos de la notificación)
+        
+        Returns:
+            list: IDs de los trabajos encolados
+        """
+        from job_queue import job_queue
+        return job_queue.enqueue_many('notifications.deliver', [{
+            'user_id': user.id,
+            'notification_type': notification_type,
+            'data': data,
+            'channels': channels
+        } for user, data in recipients])
 
 # Instancia global del servicio
 notification_service = NotificationService()
+
+
+def _register_queue_handlers():
+    from job_queue import job_queue
+    
+    @job_queue.handler('notifications.deliver')
+    def deliver_notification(user_id, notification_type, data, channels=None):
+        """Entregar una notificación encolada (se reintenta si fallan todos los canales)"""
+        from models import db, User
+        user = db.session.get(User, user_id)
+        if user is None:
+            notification_service.logger.warning(f"Notificación descartada: usuario {user_id} inexistente")
+            return
+        results = notification_service.send_notification(user, notification_type, data, channels)
+        if results and not any(results.values()):
+            raise RuntimeError(f"No se pudo entregar la notificación por {', '.join(results)}")
+
+
+_register_queue_handlers()
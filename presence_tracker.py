@@ -0,0 +1,239 @@
+"""
+Seguimiento de Presencia
+Registra la última actividad de cada usuario (requests y conexiones WebSocket) en
+un sorted set de Redis compartido entre workers, con respaldo en memoria, y
+responde "activos en los últimos 5 min / 1 h / 24 h" en O(log n) sin consultar
+la tabla de usuarios.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from flask import jsonify, request
+from flask_login import login_required, current_user
+
+logger = logging.getLogger(__name__)
+
+# Configuración de presencia
+PRESENCE_CONFIG = {
+    'windows': {'5m': 300, '1h': 3600, '24h': 86400},
+    'max_age': 86400,          # Actividad más antigua que se conserva
+    'touch_interval': 30,      # Segundos mínimos entre escrituras del mismo usuario por worker
+    'prune_interval': 300,
+    'key_prefix': 'presence',
+    'ignored_prefixes': ('/static/', '/favicon')
+}
+
+
+class MemoryPresenceStore:
+    """Respaldo en memoria (por proceso): última actividad ordenada por tiempo"""
+
+    def __init__(self):
+        self._last_seen: Dict[int, float] = {}
+        self._entries = []   # (timestamp, user_id) ordenado
+        self._connections: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def touch(self, user_id: int, timestamp: float):
+        with self.lock:
+            previous = self._last_seen.get(user_id)
+            if previous is not None:
+                if previous >= timestamp:
+                    return
+                index = bisect.bisect_left(self._entries, (previous, user_id))
+                if index < len(self._entries) and self._entries[index] == (previous, user_id):
+                    del self._entries[index]
+            self._last_seen[user_id] = timestamp
+            bisect.insort(self._entries, (timestamp, user_id))
+
+    def count_since(self, cutoff: float) -> int:
+        with self.lock:
+            return len(self._entries) - bisect.bisect_left(self._entries, (cutoff, -1))
+
+    def last_seen(self, user_id: int) -> Optional[float]:
+        return self._last_seen.get(user_id)
+
+    def prune(self, cutoff: float):
+        with self.lock:
+            index = bisect.bisect_left(self._entries, (cutoff, -1))
+            for _, user_id in self._entries[:index]:
+                self._last_seen.pop(user_id, None)
+            del self._entries[:index]
+
+    def connect(self, sid: str, user_id: int, timestamp: float):
+        with self.lock:
+            self._connections[sid] = user_id
+
+    def disconnect(self, sid: str) -> Optional[int]:
+        with self.lock:
+            return self._connections.pop(sid, None)
+
+    def connection_count(self) -> int:
+        return len(self._connections)
+
+
+class RedisPresenceStore:
+    """Sorted sets en Redis: miembro = usuario o conexión, puntaje = última actividad"""
+
+    def __init__(self, client, prefix: str):
+        self.client = client
+        self.users_key = f'{prefix}:users'
+        self.connections_key = f'{prefix}:connections'
+        self.owners_key = f'{prefix}:connection_users'
+
+    def touch(self, user_id: int, timestamp: float):
+        # GT: solo avanzar la última actividad (Redis >= 6.2); sin soporte, ZADD simple
+        try:
+            self.client.zadd(self.users_key, {str(user_id): timestamp}, gt=True)
+        except Exception:
+            self.client.zadd(self.users_key, {str(user_id): timestamp})
+
+    def count_since(self, cutoff: float) -> int:
+        return int(self.client.zcount(self.users_key, cutoff, '+inf'))
+
+    def last_seen(self, user_id: int) -> Optional[float]:
+        score = self.client.zscore(self.users_key, str(user_id))
+        return float(score) if score is not None else None
+
+    def prune(self, cutoff: float):
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self.users_key, '-inf', f'({cutoff}')
+        pipe.zremrangebyscore(self.connections_key, '-inf', f'({cutoff}')
+        pipe.execute()
+
+    def connect(self, sid: str, user_id: int, timestamp: float):
+        pipe = self.client.pipeline()
+        pipe.zadd(self.connections_key, {sid: timestamp})
+        pipe.hset(self.owners_key, sid, user_id)
+        pipe.execute()
+
+    def disconnect(self, sid: str) -> Optional[int]:
+        pipe = self.client.pipeline()
+        pipe.hget(self.owners_key, sid)
+        pipe.zrem(self.connections_key, sid)
+        pipe.hdel(self.owners_key, sid)
+        user_id = pipe.execute()[0]
+        return int(user_id) if user_id is not None else None
+
+    def connection_count(self) -> int:
+        return int(self.client.zcard(self.connections_key))
+
+
+class PresenceTracker:
+    """Presencia de usuarios con Redis compartido o respaldo en memoria"""
+
+    def __init__(self):
+        self.store = MemoryPresenceStore()
+        self.backend = 'memory'
+        self._memory = self.store
+        self._local_touches: Dict[int, float] = {}
+        self._last_prune = 0.0
+
+    def init_app(self, app):
+        """Conectar a Redis si está configurado"""
+        redis_url = app.config.get('PRESENCE_REDIS_URL', app.config.get('REDIS_URL'))
+        if not redis_url or app.config.get('TESTING'):
+            return
+        try:
+            import redis
+            client = redis.from_url(redis_url, socket_timeout=1)
+            client.ping()
+            self.store = RedisPresenceStore(client, PRESENCE_CONFIG['key_prefix'])
+            self.backend = 'redis'
+            logger.info("✅ Presencia de usuarios compartida en Redis")
+        except Exception as e:
+            logger.info(f"ℹ️ Presencia en memoria por worker (Redis no disponible: {e})")
+
+    def _call(self, method: str, *args):
+        """Ejecutar en el backend activo; ante fallas de Redis usar la memoria del worker"""
+        try:
+            return getattr(self.store, method)(*args)
+        except Exception as e:
+            if self.store is self._memory:
+                raise
+            logger.warning(f"Presencia: Redis no disponible ({e}), usando memoria")
+            return getattr(self._memory, method)(*args)
+
+    def touch(self, user_id: int, timestamp: float = None, force: bool = False):
+        """Registrar actividad (limitada a una escritura cada touch_interval por usuario y worker)"""
+        timestamp = time.time() if timestamp is None else timestamp
+        if not force and timestamp - self._local_touches.get(user_id, 0) < PRESENCE_CONFIG['touch_interval']:
+            return
+        self._local_touches[user_id] = timestamp
+        self._call('touch', user_id, timestamp)
+
+        if timestamp - self._last_prune > PRESENCE_CONFIG['prune_interval']:
+            self._last_prune = timestamp
+            cutoff = timestamp - PRESENCE_CONFIG['max_age']
+            self._call('prune', cutoff)
+            self._local_touches = {user: seen for user, seen in self._local_touches.items() if seen >= cutoff}
+
+    def count_active(self, seconds: int, now: float = None) -> int:
+        """Usuarios con actividad en los últimos `seconds` segundos"""
+        now = time.time() if now is None else now
+        return self._call('count_since', now - seconds)
+
+    def last_seen(self, user_id: int) -> Optional[float]:
+        return self._call('last_seen', user_id)
+
+    def connect(self, sid: str, user_id: int):
+        timestamp = time.time()
+        self._call('connect', sid, user_id, timestamp)
+        self.touch(user_id, timestamp, force=True)
+
+    def disconnect(self, sid: str):
+        user_id = self._call('disconnect', sid)
+        if user_id is not None:
+            self.touch(user_id, force=True)
+
+    def summary(self, now: float = None) -> Dict[str, int]:
+        now = time.time() if now is None else now
+        result = {f'active_{name}': self.count_active(seconds, now)
+                  for name, seconds in PRESENCE_CONFIG['windows'].items()}
+        result['websocket_connections'] = self._call('connection_count')
+        return result
+
+
+# Instancia global
+presence_tracker = PresenceTracker()
+
+
+def register_socketio_handlers(socketio):
+    """Registrar conexión y desconexión WebSocket en la presencia"""
+
+    @socketio.on('connect')
+    def presence_connect(auth=None):
+        if current_user.is_authenticated:
+            presence_tracker.connect(request.sid, current_user.id)
+
+    @socketio.on('disconnect')
+    def presence_disconnect():
+        presence_tracker.disconnect(request.sid)
+
+
+def init_presence_tracker(app):
+    """Inicializar seguimiento de presencia en la aplicación Flask"""
+    presence_tracker.init_app(app)
+
+    @app.before_request
+    def track_presence():
+        if request.path.startswith(PRESENCE_CONFIG['ignored_prefixes']):
+            return
+        try:
+            if current_user.is_authenticated:
+                presence_tracker.touch(current_user.id)
+        except Exception as e:
+            logger.debug(f"No se pudo registrar presencia: {e}")
+
+    @app.route('/api/v1/presence', methods=['GET'])
+    @login_required
+    def get_presence():
+        """Usuarios activos por ventana de tiempo"""
+        if not current_user.can_access_admin():
+            return jsonify({'success': False, 'error': 'Permisos insuficientes'}), 403
+        return jsonify({'success': True, 'backend': presence_tracker.backend, 'data': presence_tracker.summary()})
+
+    print(f"✅ Seguimiento de presencia inicializado ({presence_tracker.backend})")
@@ -0,0 +1,385 @@
+"""
+Métricas de Requests
+Un único middleware registra latencia (histograma por buckets), respuestas por
+clase de estado y requests en curso. Cada worker escribe en su propio archivo
+mapeado en memoria (un bloque por hilo, sin locks en el camino del request) y
+los lectores suman los archivos de todos los workers de gunicorn, de modo que
+el p95, la tasa de errores y la concurrencia reflejan a toda la aplicación.
+
+Los archivos son locales de cada contenedor: cada uno publica sus totales en
+shared_state (desde el teardown del request, a lo sumo cada `publish_seconds`)
+y las verificaciones que corren en el worker leen la suma de todos los
+contenedores con `cluster_window`.
+"""
+
+import fcntl
+import logging
+import mmap
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+# Configuración de métricas de requests
+REQUEST_METRICS_CONFIG = {
+    'directory': os.environ.get('REQUEST_METRICS_DIR',
+                                os.path.join(tempfile.gettempdir(), 'portal_request_metrics')),
+    # Límites superiores de los buckets de latencia en segundos (el último es +Inf)
+    'latency_buckets': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    'slots_per_worker': 16,        # Hilos por worker con bloque propio
+    'ignored_prefixes': ('/static/', '/favicon'),
+    'shared_prefix': 'request_metrics.',   # Clave por contenedor en shared_state
+    'publish_seconds': 15,         # Frecuencia máxima de publicación por worker
+    'fresh_seconds': 60,           # Contenedores sin publicar hace más no suman requests en curso
+    'host_ttl_seconds': 86400      # Contenedores sin publicar hace más se olvidan (deploys anteriores)
+}
+
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+RETIRED_FILE = 'retired.bin'
+
+
+class SlotLayout:
+    """Posiciones de cada campo dentro del bloque de un hilo (arreglo de float64)"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.histogram = 0                                  # len(buckets) + 1 contadores
+        self.latency_sum = len(self.buckets) + 1
+        self.requests = self.latency_sum + 1
+        self.status = self.requests + 1                     # Un contador por clase de estado
+        self.in_flight = self.status + len(STATUS_CLASSES)
+        self.size = self.in_flight + 1
+
+    @property
+    def counters(self) -> range:
+        """Campos acumulativos (todo excepto el gauge de requests en curso)"""
+        return range(self.in_flight)
+
+
+class WorkerFile:
+    """Archivo mapeado con un bloque por hilo, escrito solo por su proceso"""
+
+    def __init__(self, path: str, layout: SlotLayout, slots: int):
+        self.path = path
+        self.layout = layout
+        self.slots = slots
+        size = layout.size * slots * 8
+        with open(path, 'a+b') as handle:
+            if os.path.getsize(path) < size:
+                handle.truncate(size)
+        self._file = open(path, 'r+b')
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self.values = memoryview(self._mmap).cast('d')
+        self._next_slot = 0
+        self._allocation_lock = threading.Lock()
+        self._local = threading.local()
+
+    def slot_offset(self) -> int:
+        """Inicio del bloque del hilo actual (se asigna una sola vez por hilo)"""
+        offset = getattr(self._local, 'offset', None)
+        if offset is None:
+            with self._allocation_lock:
+                slot = self._next_slot % self.slots   # Con más hilos que bloques se comparten
+                self._next_slot += 1
+            offset = self._local.offset = slot * self.layout.size
+        return offset
+
+    def close(self):
+        self.values.release()
+        self._mmap.close()
+        self._file.close()
+
+
+def read_totals(path: str, layout: SlotLayout) -> Optional[List[float]]:
+    """Suma de los bloques de un archivo (None si no existe o tiene otro formato)"""
+    try:
+        with open(path, 'rb') as handle:
+            data = handle.read()
+    except FileNotFoundError:
+        return None
+    if not data or len(data) % (layout.size * 8):
+        return None
+    values = memoryview(data).cast('d')
+    totals = [0.0] * layout.size
+    for start in range(0, len(values), layout.size):
+        for index in range(layout.size):
+            totals[index] += values[start + index]
+    return totals
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def percentile_from_histogram(buckets, counts, q: float) -> Optional[float]:
+    """Percentil estimado por interpolación lineal dentro del bucket"""
+    total = sum(counts)
+    if not total:
+        return None
+    target = total * q / 100
+    cumulative = 0.0
+    lower = 0.0
+    for index, count in enumerate(counts):
+        upper = buckets[index] if index < len(buckets) else buckets[-1]
+        if cumulative + count >= target and count:
+            return lower + (upper - lower) * (target - cumulative) / count
+        cumulative += count
+        lower = upper
+    return buckets[-1]
+
+
+class RequestMetrics:
+    """Registro por worker y lectura agregada entre workers"""
+
+    def __init__(self, directory: str = None, buckets=None):
+        self.directory = directory or REQUEST_METRICS_CONFIG['directory']
+        self.layout = SlotLayout(buckets or REQUEST_METRICS_CONFIG['latency_buckets'])
+        self._worker: Optional[WorkerFile] = None
+        self._worker_pid = None
+        self._windows: Dict[str, Dict[str, Any]] = {}
+        self._cluster_windows: Dict[str, Dict[str, Any]] = {}
+        self._published_at = 0.0
+        self.started_at = time.time()
+
+    # Escritura (camino del request)
+
+    def _file(self) -> WorkerFile:
+        # Tras un fork el hijo abre su propio archivo
+        pid = os.getpid()
+        if self._worker is None or self._worker_pid != pid:
+            os.makedirs(self.directory, exist_ok=True)
+            self._worker = WorkerFile(os.path.join(self.directory, f'worker_{pid}.bin'), self.layout,
+                                      REQUEST_METRICS_CONFIG['slots_per_worker'])
+            self._worker_pid = pid
+        return self._worker
+
+    def request_started(self):
+        worker = self._file()
+        worker.values[worker.slot_offset() + self.layout.in_flight] += 1
+
+    def request_finished(self, duration: float, status_code: int):
+        worker = self._file()
+        offset = worker.slot_offset()
+        layout = self.layout
+        values = worker.values
+
+        bucket = len(layout.buckets)
+        for index, bound in enumerate(layout.buckets):
+            if duration <= bound:
+                bucket = index
+                break
+        values[offset + layout.histogram + bucket] += 1
+        values[offset + layout.latency_sum] += duration
+        values[offset + layout.requests] += 1
+        status_class = min(max(status_code // 100, 1), 5) - 1
+        values[offset + layout.status + status_class] += 1
+        values[offset + layout.in_flight] -= 1
+
+    # Lectura agregada
+
+    def _locked(self, mode):
+        """Lock entre procesos: exclusivo al retirar workers, compartido al leer"""
+        os.makedirs(self.directory, exist_ok=True)
+        lock = open(os.path.join(self.directory, '.lock'), 'a')
+        fcntl.flock(lock, mode)
+        return lock
+
+    def retire(self, pid: int):
+        """Sumar los contadores de un worker terminado al archivo de retirados y borrar el suyo"""
+        path = os.path.join(self.directory, f'worker_{pid}.bin')
+        lock = self._locked(fcntl.LOCK_EX)
+        try:
+            totals = read_totals(path, self.layout)
+            if totals is None:
+                return
+            retired = WorkerFile(os.path.join(self.directory, RETIRED_FILE), self.layout, 1)
+            try:
+                for index in self.layout.counters:
+                    retired.values[index] += totals[index]
+            finally:
+                retired.close()
+            os.unlink(path)
+        finally:
+            lock.close()
+
+    def _worker_files(self) -> Dict[str, Optional[int]]:
+        """Archivos de métricas y su pid (None para los retirados)"""
+        files = {}
+        for name in os.listdir(self.directory):
+            if name == RETIRED_FILE:
+                files[name] = None
+            elif name.startswith('worker_') and name.endswith('.bin'):
+                files[name] = int(name[len('worker_'):-len('.bin')])
+        return files
+
+    def totals(self) -> List[float]:
+        """Suma de todos los workers (vivos y retirados); el gauge solo cuenta procesos vivos"""
+        totals = [0.0] * self.layout.size
+        if not os.path.isdir(self.directory):
+            return totals
+
+        for pid in self._worker_files().values():
+            if pid is not None and not _pid_alive(pid):
+                try:
+                    self.retire(pid)
+                except OSError as e:
+                    logger.debug(f'No se pudo retirar el worker {pid}: {e}')
+
+        lock = self._locked(fcntl.LOCK_SH)
+        try:
+            for name, pid in self._worker_files().items():
+                values = read_totals(os.path.join(self.directory, name), self.layout)
+                if values is None:
+                    continue
+                for index in range(self.layout.size):
+                    if pid is None and index == self.layout.in_flight:
+                        continue
+                    totals[index] += values[index]
+        finally:
+            lock.close()
+        return totals
+
+    def _stats(self, totals: List[float], seconds: Optional[float]) -> Dict[str, Any]:
+        layout = self.layout
+        counts = totals[layout.histogram:layout.histogram + len(layout.buckets) + 1]
+        requests = totals[layout.requests]
+        status = {name: int(totals[layout.status + index]) for index, name in enumerate(STATUS_CLASSES)}
+        return {
+            'requests': int(requests),
+            'latency_avg': totals[layout.latency_sum] / requests if requests else 0.0,
+            'latency_p50': percentile_from_histogram(layout.buckets, counts, 50) or 0.0,
+            'latency_p95': percentile_from_histogram(layout.buckets, counts, 95) or 0.0,
+            'latency_p99': percentile_from_histogram(layout.buckets, counts, 99) or 0.0,
+            'status': status,
+            'error_rate': status['5xx'] / requests if requests else 0.0,
+            'client_error_rate': status['4xx'] / requests if requests else 0.0,
+            'throughput': requests / seconds if seconds else 0.0,
+            'in_flight': max(0, int(totals[layout.in_flight])),
+            'histogram': {'buckets': list(layout.buckets), 'counts': [int(count) for count in counts]}
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Estadísticas acumuladas desde que se creó el directorio de métricas"""
+        return self._stats(self.totals(), time.time() - self.started_at)
+
+    def window(self, consumer: str) -> Dict[str, Any]:
+        """Estadísticas de los requests terminados desde la lectura anterior del mismo consumidor"""
+        now = time.time()
+        totals = self.totals()
+        previous = self._windows.get(consumer)
+        self._windows[consumer] = {'totals': totals, 'at': now}
+
+        if previous is None:
+            return self._stats(totals, now - self.started_at)
+        delta = [current - before for current, before in zip(totals, previous['totals'])]
+        if delta[self.layout.requests] < 0:
+            # El directorio se reinició (nuevo master): tomar los valores actuales
+            delta = totals
+        delta[self.layout.in_flight] = totals[self.layout.in_flight]
+        return self._stats(delta, now - previous['at'])
+
+    # Agregado entre contenedores
+
+    def publish(self, now: float = None, force: bool = False):
+        """Publicar los totales de este contenedor (requiere contexto de aplicación)"""
+        now = time.time() if now is None else now
+        if not force and now - self._published_at < REQUEST_METRICS_CONFIG['publish_seconds']:
+            return
+        self._published_at = now    # También ante un error, para no reintentar en cada request
+        from shared_state import shared_state
+        shared_state.publish(f"{REQUEST_METRICS_CONFIG['shared_prefix']}{socket.gethostname()}",
+                             {'totals': self.totals(), 'at': now})
+
+    def _published_hosts(self, now: float) -> Dict[str, Dict[str, Any]]:
+        """Totales publicados por cada contenedor, olvidando los que dejaron de publicar"""
+        from shared_state import shared_state
+
+        prefix = REQUEST_METRICS_CONFIG['shared_prefix']
+        hosts = {}
+        for key, value in shared_state.read_prefix(prefix).items():
+            if now - value.get('at', 0) > REQUEST_METRICS_CONFIG['host_ttl_seconds']:
+                try:
+                    shared_state.delete(key)
+                except Exception as e:
+                    logger.debug(f'No se pudo olvidar {key}: {e}')
+                continue
+            if len(value.get('totals') or ()) == self.layout.size:
+                hosts[key[len(prefix):]] = value
+        return hosts
+
+    def cluster_window(self, consumer: str) -> Dict[str, Any]:
+        """Como `window`, sumando lo publicado por todos los contenedores"""
+        now = time.time()
+        layout = self.layout
+        hosts = self._published_hosts(now)
+        previous = self._cluster_windows.get(consumer)
+        self._cluster_windows[consumer] = {'hosts': {host: value['totals'] for host, value in hosts.items()},
+                                           'at': now}
+
+        delta = [0.0] * layout.size
+        for host, value in hosts.items():
+            totals = value['totals']
+            before = previous['hosts'].get(host) if previous else None
+            if before is None or totals[layout.requests] < before[layout.requests]:
+                # Contenedor nuevo o reiniciado: tomar los valores actuales
+                before = [0.0] * layout.size
+            for index in layout.counters:
+                delta[index] += totals[index] - before[index]
+            if now - value['at'] <= REQUEST_METRICS_CONFIG['fresh_seconds']:
+                delta[layout.in_flight] += totals[layout.in_flight]
+        return self._stats(delta, now - previous['at'] if previous else now - self.started_at)
+
+    def reset(self):
+        """Borrar los archivos (al iniciar el master de gunicorn)"""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.bin'):
+                os.unlink(os.path.join(self.directory, name))
+
+
+# Instancia global
+request_metrics = RequestMetrics()
+
+
+def init_request_metrics(app):
+    """Registrar el middleware de métricas de requests"""
+    ignored = REQUEST_METRICS_CONFIG['ignored_prefixes']
+
+    @app.before_request
+    def start_request_metrics():
+        if request.path.startswith(ignored):
+            return
+        g.request_metrics_start = time.perf_counter()
+        request_metrics.request_started()
+
+    @app.after_request
+    def capture_status(response):
+        g.request_metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        start = g.pop('request_metrics_start', None)
+        if start is None:
+            return
+        status = g.pop('request_metrics_status', 500 if exc is not None else 200)
+        try:
+            request_metrics.request_finished(time.perf_counter() - start, status)
+            request_metrics.publish()
+        except Exception as e:
+            logger.debug(f'No se pudo registrar la métrica del request: {e}')
+
+    print("✅ Métricas de requests inicializadas")
@@ -0,0 +1,443 @@
+"""
+Trazas por request
+Cada request muestreado abre un span raíz identificado por g.request_id y
+registra como hijos las sentencias SQL, las llamadas a caché, los renders de
+plantillas Jinja, las llamadas HTTP salientes hechas con `requests` y las
+llamadas a Anthropic. Las trazas terminadas se guardan en un anillo acotado en
+memoria y se exportan como JSON compatible con OTLP o como cascada resumida.
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import g, has_request_context, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# Configuración de trazas
+TRACING_CONFIG = {
+    'sample_rate': float(os.environ.get('TRACING_SAMPLE_RATE', '0.05')),
+    # X-Trace: 1 fuerza el muestreo si lo envía un admin; X-Trace: <TRACING_TOKEN> desde cualquier cliente
+    'force_header': 'X-Trace',
+    'ring_size': 200,                   # Trazas terminadas en memoria por worker
+    'max_spans': 1000,                  # Spans por traza (el resto se cuenta como descartado)
+    'statement_length': 500,
+    'service_name': 'portalbarriosprivados',
+    'ignored_prefixes': ('/static/', '/favicon')
+}
+
+# Tipos de span de OTLP
+SPAN_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+
+_HEX_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class Span:
+    """Operación con inicio, fin y atributos dentro de una traza"""
+    __slots__ = ('name', 'kind', 'span_id', 'parent_id', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, name: str, kind: str, span_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = time.perf_counter_ns()
+        self.end = None
+        self.attributes = attributes
+        self.error = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter_ns()) - self.start) / 1e6
+
+    @property
+    def category(self) -> str:
+        return self.name.split('.', 1)[0]
+
+
+class Trace:
+    """Spans de un request; el primero es el span raíz"""
+
+    def __init__(self, trace_id: str, request_id: str):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.spans: List[Span] = []
+        self.stack: List[Span] = []
+        self.dropped = 0
+        self._unix_anchor = time.time_ns()
+        self._perf_anchor = time.perf_counter_ns()
+
+    def start_span(self, name: str, kind: str = 'internal', attributes: Dict[str, Any] = None) -> Optional[Span]:
+        if len(self.spans) >= TRACING_CONFIG['max_spans']:
+            self.dropped += 1
+            return None
+        parent = self.stack[-1].span_id if self.stack else None
+        span = Span(name, kind, os.urandom(8).hex(), parent, attributes or {})
+        self.spans.append(span)
+        self.stack.append(span)
+        return span
+
+    def end_span(self, span: Optional[Span], error: BaseException = None):
+        if span is None:
+            return
+        span.end = time.perf_counter_ns()
+        if error is not None:
+            span.error = f'{type(error).__name__}: {error}'
+        # Normalmente es el último; si un span quedó abierto por error se cierra junto con su padre
+        while self.stack:
+            top = self.stack.pop()
+            if top is span:
+                break
+            if top.end is None:
+                top.end = span.end
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    def unix_nanos(self, perf_ns: int) -> int:
+        return self._unix_anchor + (perf_ns - self._perf_anchor)
+
+    def breakdown(self) -> Dict[str, float]:
+        """Tiempo en dependencias por categoría (db, cache, template, http, anthropic)"""
+        totals: Dict[str, float] = {}
+        categories = {span.span_id: span.category for span in self.spans[1:]}
+        for span in self.spans[1:]:
+            # Solo los spans cuyo padre no es de la misma categoría: no se cuenta dos veces el anidamiento
+            if categories.get(span.parent_id) == span.category:
+                continue
+            totals[span.category] = totals.get(span.category, 0.0) + span.duration_ms
+        return {category: round(value, 3) for category, value in sorted(totals.items(), key=lambda item: -item[1])}
+
+    def summary(self) -> Dict[str, Any]:
+        root = self.root
+        return {
+            'trace_id': self.trace_id,
+            'request_id': self.request_id,
+            'name': root.name,
+            'status_code': root.attributes.get('http.status_code'),
+            'started_at': self.unix_nanos(root.start) / 1e9,
+            'duration_ms': round(root.duration_ms, 3),
+            'spans': len(self.spans),
+            'dropped_spans': self.dropped,
+            'breakdown_ms': self.breakdown()
+        }
+
+    def waterfall(self) -> Dict[str, Any]:
+        """Spans con desplazamiento desde el inicio del request y profundidad"""
+        depth = {None: -1}
+        rows = []
+        for span in self.spans:
+            depth[span.span_id] = depth.get(span.parent_id, -1) + 1
+            rows.append({
+                'span_id': span.span_id,
+                'parent_id': span.parent_id,
+                'name': span.name,
+                'depth': depth[span.span_id],
+                'offset_ms': round((span.start - self.root.start) / 1e6, 3),
+                'duration_ms': round(span.duration_ms, 3),
+                'attributes': span.attributes,
+                'error': span.error
+            })
+        return dict(self.summary(), waterfall=rows)
+
+
+def _otlp_value(value) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(traces: List[Trace]) -> Dict[str, Any]:
+    """Documento ExportTraceServiceRequest de OTLP/JSON"""
+    spans = []
+    for trace in traces:
+        for span in trace.spans:
+            item = {
+                'traceId': trace.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': SPAN_KINDS.get(span.kind, 1),
+                'startTimeUnixNano': str(trace.unix_nanos(span.start)),
+                'endTimeUnixNano': str(trace.unix_nanos(span.end or span.start)),
+                'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in span.attributes.items()],
+                'status': {'code': 2, 'message': span.error} if span.error else {'code': 1}
+            }
+            if span.parent_id:
+                item['parentSpanId'] = span.parent_id
+            spans.append(item)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': TRACING_CONFIG['service_name']}},
+                {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}}
+            ]},
+            'scopeSpans': [{'scope': {'name': 'request_tracing'}, 'spans': spans}]
+        }]
+    }
+
+
+class TraceStore:
+    """Anillo acotado de trazas terminadas"""
+
+    def __init__(self, size: int = None):
+        self.traces: deque = deque(maxlen=size or TRACING_CONFIG['ring_size'])
+        self.lock = threading.Lock()
+        self.stats = {'sampled': 0, 'skipped': 0}
+
+    def add(self, trace: Trace):
+        with self.lock:
+            self.traces.append(trace)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self.lock:
+            return next((trace for trace in self.traces if trace_id in (trace.trace_id, trace.request_id)), None)
+
+    def recent(self, limit: int = None, min_ms: float = 0) -> List[Trace]:
+        with self.lock:
+            traces = [trace for trace in reversed(self.traces) if trace.root.duration_ms >= min_ms]
+        return traces[:limit] if limit else traces
+
+    def clear(self):
+        with self.lock:
+            self.traces.clear()
+
+
+# Instancia global
+trace_store = TraceStore()
+
+
+# API de instrumentación
+
+def current_trace() -> Optional[Trace]:
+    if not has_request_context():
+        return None
+    return g.get('trace')
+
+
+@contextmanager
+def span(name: str, kind: str = 'internal', attributes: Dict[str, Any] = None):
+    """Span hijo del span activo (sin efecto si el request no se está trazando)"""
+    trace = current_trace()
+    if trace is None:
+        yield None
+        return
+    current = trace.start_span(name, kind, attributes)
+    try:
+        yield current
+    except BaseException as e:
+        trace.end_span(current, e)
+        raise
+    trace.end_span(current)
+
+
+def traced(name: str, kind: str = 'internal', key_arg: int = None):
+    """Decorador: ejecutar la función dentro de un span; key_arg registra ese argumento como cache.key"""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_trace() is None:
+                return func(*args, **kwargs)
+            attributes = {'code.function': func.__qualname__}
+            if key_arg is not None and len(args) > key_arg:
+                attributes['cache.key'] = str(args[key_arg])[:200]
+            with span(name, kind, attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Ganchos de dependencias
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = current_trace()
+    if trace is not None and context is not None:
+        context._trace_span = trace.start_span('db.query', 'client', {
+            'db.system': conn.dialect.name,
+            'db.statement': statement[:TRACING_CONFIG['statement_length']],
+            'db.executemany': bool(executemany)
+        })
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span_ = getattr(context, '_trace_span', None)
+    if span_ is not None:
+        trace = current_trace()
+        if trace is not None:
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                span_.attributes['db.rowcount'] = cursor.rowcount
+            trace.end_span(span_)
+        context._trace_span = None
+
+
+def _handle_db_error(exception_context):
+    context = exception_context.execution_context
+    span_ = getattr(context, '_trace_span', None) if context is not None else None
+    trace = current_trace()
+    if span_ is not None and trace is not None:
+        trace.end_span(span_, exception_context.original_exception)
+        context._trace_span = None
+
+
+def _template_started(sender, template, context, **extra):
+    trace = current_trace()
+    if trace is not None:
+        trace.start_span('template.render', 'internal', {'template.name': template.name or '<string>'})
+
+
+def _template_rendered(sender, template, context, **extra):
+    trace = current_trace()
+    if trace is not None and trace.stack and trace.stack[-1].name == 'template.render':
+        trace.end_span(trace.stack[-1])
+
+
+def instrument_requests():
+    """Span 'http.client' para cada llamada de la librería requests (external_integrations,
+    NotificationService, routes/expenses y demás)"""
+    import requests
+
+    send = requests.Session.send
+    if getattr(send, '_traced', False):
+        return
+
+    @wraps(send)
+    def traced_send(session, prepared, **kwargs):
+        if current_trace() is None:
+            return send(session, prepared, **kwargs)
+        url = prepared.url.split('?', 1)[0]
+        with span('http.client', 'client', {'http.method': prepared.method, 'http.url': url}) as current:
+            response = send(session, prepared, **kwargs)
+            if current is not None:
+                current.attributes['http.status_code'] = response.status_code
+            return response
+
+    traced_send._traced = True
+    requests.Session.send = traced_send
+
+
+def _trace_id(request_id: str) -> str:
+    """Los IDs de OTLP son 16 bytes en hexadecimal; otros request ids se derivan con un hash"""
+    if _HEX_ID.match(request_id):
+        return request_id
+    return hashlib.md5(request_id.encode('utf-8')).hexdigest()
+
+
+def init_request_tracing(app):
+    """Registrar el span raíz de cada request, los ganchos de dependencias y las rutas de consulta"""
+    import uuid
+    from flask import before_render_template, template_rendered
+    from flask_login import login_required, current_user
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    ignored = TRACING_CONFIG['ignored_prefixes']
+
+    def trace_forced() -> bool:
+        """El header fuerza la traza solo con el token configurado o para un admin autenticado"""
+        value = request.headers.get(TRACING_CONFIG['force_header'])
+        if not value:
+            return False
+        token = app.config.get('TRACING_TOKEN')
+        if token and hmac.compare_digest(value.encode('utf-8'), token.encode('utf-8')):
+            return True
+        try:
+            return value == '1' and current_user.is_authenticated and current_user.can_access_admin()
+        except Exception:
+            return False
+
+    for name, listener in (('before_cursor_execute', _before_cursor_execute),
+                           ('after_cursor_execute', _after_cursor_execute),
+                           ('handle_error', _handle_db_error)):
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_rendered, app)
+    instrument_requests()
+
+    @app.before_request
+    def start_trace():
+        if request.path.startswith(ignored):
+            return
+        forced = trace_forced()
+        if not forced and random.random() >= TRACING_CONFIG['sample_rate']:
+            trace_store.stats['skipped'] += 1
+            return
+        trace_store.stats['sampled'] += 1
+        request_id = g.get('request_id') or uuid.uuid4().hex
+        g.request_id = request_id
+        trace = g.trace = Trace(_trace_id(request_id), request_id)
+        trace.start_span(f'{request.method} {request.url_rule.rule if request.url_rule else request.path}',
+                         'server', {'http.method': request.method, 'http.target': request.path,
+                                    'http.route': request.endpoint or 'unknown'})
+
+    @app.after_request
+    def tag_trace(response):
+        trace = g.get('trace')
+        if trace is not None:
+            trace.root.attributes['http.status_code'] = response.status_code
+            response.headers['X-Trace-Id'] = trace.trace_id
+        return response
+
+    @app.teardown_request
+    def finish_trace(exc):
+        trace = g.pop('trace', None)
+        if trace is None:
+            return
+        try:
+            if current_user and current_user.is_authenticated:
+                trace.root.attributes['enduser.id'] = current_user.get_id()
+        except Exception:
+            pass
+        trace.end_span(trace.root, exc)
+        trace_store.add(trace)
+
+    def admin_required():
+        if not current_user.can_access_admin():
+            return jsonify({'success': False, 'error': 'Permisos insuficientes'}), 403
+        return None
+
+    @app.route('/api/v1/traces', methods=['GET'])
+    @login_required
+    def list_traces():
+        """Trazas recientes de este worker: ?min_ms=500&limit=50&format=otlp"""
+        denied = admin_required()
+        if denied:
+            return denied
+        traces = trace_store.recent(request.args.get('limit', 50, type=int), request.args.get('min_ms', 0, type=float))
+        if request.args.get('format') == 'otlp':
+            return jsonify(to_otlp(traces))
+        return jsonify({'success': True, 'data': {
+            'sample_rate': TRACING_CONFIG['sample_rate'],
+            'stats': dict(trace_store.stats),
+            'traces': [trace.summary() for trace in traces]
+        }})
+
+    @app.route('/api/v1/traces/<trace_id>', methods=['GET'])
+    @login_required
+    def get_trace(trace_id):
+        """Cascada de una traza (por trace id o request id): ?format=otlp"""
+        denied = admin_required()
+        if denied:
+            return denied
+        trace = trace_store.get(trace_id)
+        if trace is None:
+            return jsonify({'success': False, 'error': 'Traza no encontrada'}), 404
+        if request.args.get('format') == 'otlp':
+            return jsonify(to_otlp([trace]))
+        return jsonify({'success': True, 'data': trace.waterfall()})
+
+    print("✅ Trazas por request inicializadas")
@@ -6,7 +6,7 @@ Envío masivo de comunicados por email y WhatsApp con un solo clic
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
 from models import db, User
-from notification_service import NotificationService
+from notification_service import notification_service
 from datetime import datetime, timedelta
 import json
 
@@ -75,41 +75,23 @@ def send_broadcast():
         if not users:
             return jsonify({'error': 'No hay usuarios que cumplan los criterios seleccionados'}), 400
         
-        # Simular envío por métodos seleccionados
-        notification_service = NotificationService()
-        results = {
-            'email_sent': 0,
-            'whatsapp_sent': 0,
-            'failed': 0,
-            'details': []
-        }
-        
-        for user in users:
-            try:
-                if 'email' in methods and user.email:
-                    # Simular envío de email
-                    results['email_sent'] += 1
-                    results['details'].append(f"✅ Email enviado a {user.username}")
-                
-                if 'whatsapp' in methods:
-                    # Simular envío de WhatsApp
-                    results['whatsapp_sent'] += 1
-                    results['details'].append(f"✅ WhatsApp enviado a {user.username}")
-                        
-            except Exception as e:
-                results['failed'] += 1
-                results['details'].append(f"❌ Error con {user.username}: {str(e)}")
+        # La entrega la hace el proceso worker: aquí solo se encola un trabajo por usuario
+        job_ids = notification_service.queue_bulk_notification(users, 'broadcast', {
+            'subject': title,
+            'message': message,
+            'priority': priority
+        }, channels=methods)
         
         return jsonify({
             'success': True,
-            'message': f'Comunicado enviado exitosamente',
+            'message': 'Comunicado encolado para envío',
             'stats': {
                 'total_users': len(users),
-                'email_sent': results['email_sent'],
-                'whatsapp_sent': results['whatsapp_sent'],
-                'failed': results['failed']
+                'queued': len(job_ids),
+                'email_queued': sum(1 for user in users if 'email' in methods and user.email),
+                'whatsapp_queued': sum(1 for user in users if 'whatsapp' in methods and user.phone)
             },
-            'details': results['details'][:10]  # Primeros 10 detalles
+            'job_ids': job_ids[:10]  # Primeros 10 trabajos
         })
         
     except Exception as e:
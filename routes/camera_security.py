@@ -118,11 +118,12 @@ def start_detection_demo():
         data = request.get_json()
         camera_id = data.get('camera_id', 'CAM_001')
         
-        start_demo_detection(camera_id)
+        job = start_demo_detection(camera_id)
         
         return jsonify({
             'success': True,
-            'message': f'Demostración iniciada para cámara {camera_id}'
+            'message': f'Demostración iniciada para cámara {camera_id}',
+            'job_id': job.id
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -8,6 +8,7 @@ from datetime import datetime
 import json
 import re
 import anthropic
+from request_tracing import span
 
 bp = Blueprint('chatbot', __name__, url_prefix='/chatbot')
 
@@ -194,12 +195,17 @@ IMPORTANTE:
         messages.append({"role": "user", "content": message})
         
         # Llamar a la API de Claude
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            messages=messages,
-            max_tokens=500,
-            temperature=0.7
-        )
+        model = "claude-sonnet-4-20250514"
+        with span('anthropic.messages.create', 'client', {'llm.model': model, 'llm.messages': len(messages)}) as current:
+            response = client.messages.create(
+                model=model,
+                messages=messages,
+                max_tokens=500,
+                temperature=0.7
+            )
+            if current is not None and getattr(response, 'usage', None) is not None:
+                current.attributes['llm.input_tokens'] = response.usage.input_tokens
+                current.attributes['llm.output_tokens'] = response.usage.output_tokens
         
         return response.content[0].text.strip()
         
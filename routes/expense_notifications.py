@@ -16,7 +16,7 @@ except Exception as e:
 
 # Importar servicio de notificaciones de manera segura
 try:
-    from notification_service import NotificationService
+    from notification_service import notification_service
     NOTIFICATION_SERVICE_AVAILABLE = True
 except Exception as e:
     print(f"⚠️ Error importando notification service: {e}")
@@ -24,6 +24,26 @@ except Exception as e:
 
 bp = Blueprint('expense_notifications', __name__, url_prefix='/admin/expense-notifications')
 
+def _channels(method):
+    """Canales de notification_service para el método elegido ('email', 'whatsapp' o 'both')"""
+    return ['email', 'whatsapp'] if method == 'both' else [method]
+
+def _expense_data(user, expense):
+    """Datos de la plantilla expense_due (serializables para la cola de trabajos)"""
+    due_date = getattr(expense, 'due_date', None)
+    return {
+        'resident_name': user.name or user.username,
+        'description': getattr(expense, 'description', None) or f'Expensa {expense.period}',
+        'amount': expense.amount,
+        'due_date': due_date.strftime('%d/%m/%Y') if due_date else '',
+        'period': expense.period
+    }
+
+def _mark_notified(expense, method):
+    expense.notification_sent = True
+    expense.notification_date = datetime.now()
+    expense.notification_method = method
+
 @bp.route('/alive')
 def alive():
     """Ruta de test sin autenticación ni dependencias"""
@@ -116,45 +136,19 @@ def send_notification():
         method = data.get('method', 'email')  # 'email', 'whatsapp', 'both'
         
         expense = Expense.query.get_or_404(expense_id)
-        user = expense.user
-        
-        service = NotificationService()
         
-        if method == 'both':
-            # Enviar por ambos métodos
-            email_success, email_msg = service.send_expense_notification(user, expense, 'email')
-            whatsapp_success, whatsapp_msg = service.send_expense_notification(user, expense, 'whatsapp')
-            
-            if email_success or whatsapp_success:
-                expense.notification_sent = True
-                expense.notification_date = datetime.now()
-                expense.notification_method = method
-                db.session.commit()
-                
-                return jsonify({
-                    'success': True,
-                    'message': f'Notificación enviada. Email: {email_msg}, WhatsApp: {whatsapp_msg}'
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'message': f'Error en ambos métodos. Email: {email_msg}, WhatsApp: {whatsapp_msg}'
-                })
+        # La entrega la hace el proceso worker; la expensa queda marcada al encolar
+        job_id = notification_service.queue_notification(expense.user, 'expense_due',
+                                                         _expense_data(expense.user, expense),
+                                                         channels=_channels(method))
+        _mark_notified(expense, method)
+        db.session.commit()
         
-        else:
-            # Enviar por un método específico
-            success, message = service.send_expense_notification(user, expense, method)
-            
-            if success:
-                expense.notification_sent = True
-                expense.notification_date = datetime.now()
-                expense.notification_method = method
-                db.session.commit()
-            
-            return jsonify({
-                'success': success,
-                'message': message
-            })
+        return jsonify({
+            'success': True,
+            'message': 'Notificación encolada para envío',
+            'job_id': job_id
+        })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -183,25 +177,19 @@ def send_bulk_notifications():
         if not expenses:
             return jsonify({'error': 'No hay expensas para procesar'}), 400
         
-        # Preparar datos para envío masivo
-        expenses_data = [(expense.user, expense) for expense in expenses]
+        # Un trabajo por expensa en un solo commit; la entrega la hace el proceso worker
+        job_ids = notification_service.queue_personalized_notifications(
+            [(expense.user, _expense_data(expense.user, expense)) for expense in expenses],
+            'expense_due', channels=_channels(method))
         
-        service = NotificationService()
-        results = service.send_bulk_expense_notifications(expenses_data, method)
-        
-        # Marcar como enviadas las exitosas
         for expense in expenses:
-            if any(f"✅ {expense.user.username}" in detail for detail in results['details']):
-                expense.notification_sent = True
-                expense.notification_date = datetime.now()
-                expense.notification_method = method
-        
+            _mark_notified(expense, method)
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'message': f'Proceso completado: {results["success"]} exitosas, {results["failed"]} fallidas',
-            'results': results
+            'message': f'{len(job_ids)} notificaciones encoladas para envío',
+            'job_ids': job_ids
         })
         
     except Exception as e:
@@ -254,12 +242,17 @@ def send_test_notification():
             'created_at': datetime.now()
         })()
         
-        service = NotificationService()
-        success, message = service.send_expense_notification(current_user, test_expense, method)
+        # La prueba se envía en el momento para informar el resultado de cada canal
+        results = notification_service.send_notification(current_user, 'expense_due',
+                                                         _expense_data(current_user, test_expense),
+                                                         channels=_channels(method))
+        success = bool(results) and all(results.values())
         
         return jsonify({
             'success': success,
-            'message': message
+            'message': ', '.join(f"{channel}: {'enviado' if sent else 'error'}" for channel, sent in results.items())
+                       or 'El usuario no tiene datos de contacto para los canales elegidos',
+            'results': results
         })
         
     except Exception as e:
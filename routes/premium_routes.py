@@ -336,76 +336,23 @@ def feedback_api():
 @login_required
 def export_data_api():
     """
-    API para exportar datos en diferentes formatos
+    API para exportar datos en diferentes formatos (csv, ndjson/json, xlsx)
+    Los usuarios exportan sus propios registros; los administradores, todos.
     """
-    format_type = request.args.get('format', 'json')
+    from export_engine import export_engine, export_request_options
     
-    # Simular datos para exportar
-    export_data = {
-        'user_info': {
-            'name': current_user.username,
-            'email': current_user.email,
-            'preferences': {
-                'theme': 'light',
-                'language': 'es'
-            }
-        },
-        'metrics': {
-            'active_users': 1250,
-            'system_uptime': 98.5,
-            'performance_score': 95.2
-        },
-        'timestamp': datetime.now().isoformat()
-    }
-    
-    if format_type == 'csv':
-        # Convertir a CSV
-        import csv
-        import io
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Escribir headers
-        writer.writerow(['Metric', 'Value'])
-        
-        # Escribir datos
-        for key, value in export_data['metrics'].items():
-            writer.writerow([key, value])
-        
-        return output.getvalue(), 200, {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': 'attachment; filename=metrics.csv'
-        }
-    
-    elif format_type == 'xml':
-        # Convertir a XML
-        import xml.etree.ElementTree as ET
-        
-        root = ET.Element('data')
-        
-        user_info = ET.SubElement(root, 'user_info')
-        for key, value in export_data['user_info'].items():
-            if isinstance(value, dict):
-                sub_elem = ET.SubElement(user_info, key)
-                for sub_key, sub_value in value.items():
-                    ET.SubElement(sub_elem, sub_key).text = str(sub_value)
-            else:
-                ET.SubElement(user_info, key).text = str(value)
-        
-        metrics = ET.SubElement(root, 'metrics')
-        for key, value in export_data['metrics'].items():
-            ET.SubElement(metrics, key).text = str(value)
-        
-        ET.SubElement(root, 'timestamp').text = export_data['timestamp']
-        
-        return ET.tostring(root, encoding='unicode'), 200, {
-            'Content-Type': 'application/xml',
-            'Content-Disposition': 'attachment; filename=data.xml'
-        }
+    dataset = request.args.get('dataset', 'reservations')
+    options = export_request_options()
+    owner_id = None if current_user.can_access_admin() else current_user.id
     
-    # Por defecto, devolver JSON
-    return jsonify(export_data)
+    try:
+        return export_engine.export(dataset, options['fmt'], options['filters'],
+                                    owner_id=owner_id,
+                                    compress=options['compress'],
+                                    requested_by=current_user.id,
+                                    force_async=options['force_async'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
 
 @premium_bp.route('/api/system-status')
 @login_required
@@ -1,6 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 from models import db, Reservation, User
+from services.reservation_availability import availability_engine
+from services.calendar_feed import calendar_feed, month_bounds
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
 from dateutil import parser
 
@@ -77,14 +80,7 @@ def new():
                 return render_template('reservations/new.html')
             
             # Verificar disponibilidad
-            conflicting = Reservation.query.filter(
-                Reservation.space_type == space_type,
-                Reservation.status == 'approved',
-                Reservation.start_time < end_datetime,
-                Reservation.end_time > start_datetime
-            ).first()
-            
-            if conflicting:
+            if not availability_engine.is_available(space_type, start_datetime, end_datetime):
                 flash('El espacio no está disponible en ese horario', 'error')
                 return render_template('reservations/new.html')
             
@@ -106,6 +102,11 @@ def new():
             flash('Reserva solicitada exitosamente', 'success')
             return redirect(url_for('reservations.index'))
             
+        except IntegrityError:
+            # Otra solicitud reservó el mismo horario en simultáneo
+            db.session.rollback()
+            flash('El espacio no está disponible en ese horario', 'error')
+            return render_template('reservations/new.html')
         except Exception as e:
             db.session.rollback()
             flash(f'Error al crear la reserva: {str(e)}', 'error')
@@ -187,15 +188,7 @@ def edit(reservation_id):
                 return render_template('reservations/edit.html', reservation=reservation)
             
             # Verificar disponibilidad (excluyendo la reserva actual)
-            conflicting = Reservation.query.filter(
-                Reservation.space_type == space_type,
-                Reservation.status == 'approved',
-                Reservation.start_time < end_datetime,
-                Reservation.end_time > start_datetime,
-                Reservation.id != reservation.id
-            ).first()
-            
-            if conflicting:
+            if not availability_engine.is_available(space_type, start_datetime, end_datetime, ignore=reservation):
                 flash('El espacio no está disponible en ese horario', 'error')
                 return render_template('reservations/edit.html', reservation=reservation)
             
@@ -213,6 +206,9 @@ def edit(reservation_id):
             flash('Reserva actualizada exitosamente', 'success')
             return redirect(url_for('reservations.show', reservation_id=reservation.id))
             
+        except IntegrityError:
+            db.session.rollback()
+            flash('El espacio no está disponible en ese horario', 'error')
         except Exception as e:
             db.session.rollback()
             flash(f'Error al actualizar la reserva: {str(e)}', 'error')
@@ -278,30 +274,71 @@ def cancel(reservation_id):
 @bp.route('/calendar')
 @login_required
 def calendar():
-    """Calendario de reservas"""
-    # Obtener reservas del mes actual
-    now = datetime.now()
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(seconds=1)
+    """Calendario de reservas (los eventos se cargan por mes desde la API)"""
+    return render_template('reservations/calendar.html',
+                           events_url=url_for('reservations.calendar_events'))
+
+def _calendar_response(payload, etag):
+    """Respuesta JSON cacheable por el navegador, revalidada con ETag"""
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@bp.route('/api/calendar/<int:year>/<int:month>')
+@login_required
+def calendar_month(year, month):
+    """API con los eventos de un mes, opcionalmente filtrados por espacio"""
+    if not 1 <= month <= 12:
+        return jsonify({'error': 'Mes inválido'}), 400
     
-    reservations = Reservation.query.filter(
-        Reservation.start_time >= start_of_month,
-        Reservation.start_time <= end_of_month,
-        Reservation.status == 'approved'
-    ).all()
+    key = f'{year:04d}-{month:02d}'
+    space_type = request.args.get('space') or None
+    fingerprint = calendar_feed.fingerprint(key)
+    etag = calendar_feed.etag(key, space_type, fingerprint)
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
     
-    # Formatear reservas para el calendario
-    calendar_events = []
-    for reservation in reservations:
-        calendar_events.append({
-            'id': reservation.id,
-            'title': f"{reservation.space_name} - {reservation.user.name}",
-            'start': reservation.start_time.isoformat(),
-            'end': reservation.end_time.isoformat(),
-            'url': url_for('reservations.show', reservation_id=reservation.id)
-        })
+    data = calendar_feed.get_month(key, url_for('reservations.index'), space_type, fingerprint)
+    return _calendar_response(data, etag)
+
+@bp.route('/api/calendar-events')
+@login_required
+def calendar_events():
+    """API de eventos por rango (parámetros start/end de FullCalendar)"""
+    space_type = request.args.get('space') or None
+    try:
+        if request.args.get('start'):
+            start = parser.parse(request.args['start']).replace(tzinfo=None)
+        else:
+            start = month_bounds(f'{datetime.now().year:04d}-{datetime.now().month:02d}')[0]
+        if request.args.get('end'):
+            end = parser.parse(request.args['end']).replace(tzinfo=None)
+        else:
+            end = month_bounds(f'{start.year:04d}-{start.month:02d}')[1]
+    except (ValueError, OverflowError):
+        return jsonify({'error': 'Rango de fechas inválido'}), 400
+    
+    if end <= start:
+        return jsonify({'error': 'La fecha de fin debe ser posterior a la de inicio'}), 400
     
-    return render_template('reservations/calendar.html', events=calendar_events)
+    try:
+        fingerprints = calendar_feed.range_fingerprints(start, end)
+        etag = calendar_feed.range_etag(start, end, space_type, fingerprints)
+        if request.if_none_match.contains(etag):
+            return _not_modified(etag)
+        
+        data = calendar_feed.get_range(start, end, url_for('reservations.index'), space_type, fingerprints)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return _calendar_response(data['events'], data['etag'])
 
 @bp.route('/api/availability/<space_type>')
 @login_required
@@ -312,30 +349,31 @@ def availability(space_type):
         return jsonify({'error': 'Fecha requerida'}), 400
     
     try:
-        # Obtener reservas para la fecha especificada
-        start_date = parser.parse(date).replace(hour=0, minute=0, second=0, microsecond=0)
-        end_date = start_date + timedelta(days=1)
-        
-        reservations = Reservation.query.filter(
-            Reservation.space_type == space_type,
-            Reservation.status == 'approved',
-            Reservation.start_time >= start_date,
-            Reservation.start_time < end_date
-        ).all()
-        
-        # Formatear horarios ocupados
-        busy_times = []
-        for reservation in reservations:
-            busy_times.append({
-                'start': reservation.start_time.strftime('%H:%M'),
-                'end': reservation.end_time.strftime('%H:%M')
-            })
+        day = parser.parse(date).date()
         
         return jsonify({
             'space_type': space_type,
             'date': date,
-            'busy_times': busy_times
+            'busy_times': availability_engine.busy_intervals(space_type, day)
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/free-slots')
+@login_required
+def free_slots():
+    """API con horarios libres de los próximos días para todos los espacios"""
+    days = request.args.get('days', 14, type=int)
+    spaces = request.args.get('spaces')
+    space_types = [space.strip() for space in spaces.split(',') if space.strip()] if spaces else None
+    
+    try:
+        start_date = parser.parse(request.args['start']).date() if request.args.get('start') else None
+    except (ValueError, OverflowError):
+        return jsonify({'error': 'Fecha de inicio inválida'}), 400
+    
+    try:
+        return jsonify(availability_engine.free_slots(days, space_types, start_date))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -11,11 +11,30 @@ from scalability_deployment import (
     scalability_manager, DeploymentConfig, DeploymentType
 )
 from optional_dependencies import DOCKER_AVAILABLE
+from app_modules.core.monitoring_service import HealthChecker
 import json
 from datetime import datetime
 
 scalability_bp = Blueprint('scalability', __name__, url_prefix='/scalability')
 
+
+def _ping(get_client):
+    """Verificación de conectividad para un cliente con ping()"""
+    def check():
+        client = get_client()
+        if client is None:
+            return {'healthy': True, 'message': 'not configured', 'details': {'configured': False}}
+        client.ping()
+        return {'healthy': True, 'message': 'OK', 'details': {'configured': True}}
+    return check
+
+
+# Docker y Redis se verifican en paralelo, con límite de tiempo y resultado cacheado
+scalability_health = HealthChecker()
+scalability_health.register_check('docker', _ping(lambda: scalability_manager.docker_manager.client), timeout=2.0)
+scalability_health.register_check('redis', _ping(lambda: scalability_manager.load_balancer.redis_client),
+                                  timeout=1.0)
+
 @scalability_bp.route('/deploy', methods=['POST'])
 @login_required
 def deploy_application():
@@ -249,6 +268,7 @@ def get_system_alerts():
 def health_check():
     """Health check del sistema de escalabilidad"""
     try:
+        checks = scalability_health.run_checks()['checks']
         health_status = {
             "docker": scalability_manager.docker_manager.client is not None,
             "redis": scalability_manager.load_balancer.redis_client is not None,
@@ -256,20 +276,10 @@ def health_check():
             "timestamp": datetime.now().isoformat()
         }
         
-        # Verificar conectividad
-        if health_status["docker"]:
-            try:
-                scalability_manager.docker_manager.client.ping()
-                health_status["docker_connected"] = True
-            except:
-                health_status["docker_connected"] = False
-        
-        if health_status["redis"]:
-            try:
-                scalability_manager.load_balancer.redis_client.ping()
-                health_status["redis_connected"] = True
-            except:
-                health_status["redis_connected"] = False
+        # Conectividad según la última ronda de verificaciones
+        for name in ("docker", "redis"):
+            if health_status[name]:
+                health_status[f"{name}_connected"] = checks[name]['status'] == 'healthy'
         
         return jsonify({
             "success": True,
@@ -5,6 +5,7 @@ Sistema avanzado de gestión de usuarios para administradores
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app
 from flask_login import login_required, current_user
 from models import db, User
+from services.bulk_user_actions import BulkUserActions, normalize_user_ids, ASYNC_THRESHOLD, PROTECTED_USERNAMES
 from datetime import datetime
 import json
 
@@ -261,7 +262,6 @@ def bulk_actions():
         # Obtener datos JSON
         try:
             data = request.get_json()
-            current_app.logger.info(f'JSON recibido: {data}')
         except Exception as e:
             current_app.logger.error(f'Error parseando JSON: {str(e)}')
             return jsonify({'error': 'Datos JSON inválidos'}), 400
@@ -269,8 +269,9 @@ def bulk_actions():
         if not data:
             return jsonify({'error': 'Datos JSON requeridos'}), 400
             
-        user_ids = data.get('user_ids', [])
+        user_ids = normalize_user_ids(data.get('user_ids', []))
         action = data.get('action')
+        new_role = data.get('new_role')
         
         current_app.logger.info(f'Acción: {action}, Usuarios: {len(user_ids)}')
         
@@ -278,99 +279,50 @@ def bulk_actions():
         if not user_ids or not action:
             return jsonify({'error': 'Faltan parámetros: user_ids y action son requeridos'}), 400
         
-        # Obtener usuarios
-        try:
-            users = User.query.filter(User.id.in_(user_ids)).all()
-            current_app.logger.info(f'Usuarios encontrados: {len(users)}')
-        except Exception as e:
-            current_app.logger.error(f'Error consultando usuarios: {str(e)}')
-            return jsonify({'error': 'Error consultando usuarios'}), 500
-        
-        results = []
-        deleted_count = 0
-        protected_users = ['admin', 'mcastro2025']
-        
-        # Procesar cada usuario
-        for user in users:
-            try:
-                current_app.logger.info(f'Procesando: {user.username} (ID: {user.id})')
-                
-                if action == 'activate':
-                    if user.id != current_user.id:
-                        user.is_active = True
-                        results.append(f'{user.username}: activado')
-                    else:
-                        results.append(f'{user.username}: saltado (usuario actual)')
-                    
-                elif action == 'deactivate':
-                    if user.id != current_user.id:
-                        user.is_active = False
-                        results.append(f'{user.username}: desactivado')
-                    else:
-                        results.append(f'{user.username}: saltado (usuario actual)')
-                    
-                elif action == 'verify_email':
-                    user.email_verified = True
-                    results.append(f'{user.username}: email verificado')
-                    
-                elif action == 'reset_password':
-                    temp_password = 'temp123456'
-                    user.set_password(temp_password)
-                    results.append(f'{user.username}: contraseña resetada')
-                
-                elif action == 'delete':
-                    # Verificaciones para eliminación
-                    if user.id == current_user.id:
-                        results.append(f'{user.username}: error - No puedes eliminar tu propia cuenta')
-                        continue
-                    
-                    if user.username in protected_users:
-                        results.append(f'{user.username}: error - Usuario protegido del sistema')
-                        continue
-                    
-                    # Eliminar usuario
-                    username = user.username
-                    db.session.delete(user)
-                    deleted_count += 1
-                    results.append(f'{user.username}: eliminado')
-                    continue
-                else:
-                    results.append(f'{user.username}: error - Acción desconocida: {action}')
-                    continue
-                    
-                # Actualizar timestamp
-                user.updated_at = datetime.utcnow()
-                
-            except Exception as e:
-                error_msg = f'{user.username}: error - {str(e)}'
-                results.append(error_msg)
-                current_app.logger.error(f'Error procesando {user.username}: {str(e)}')
-        
-        # Commit de transacción
+        validation_error = BulkUserActions.validate(action, new_role)
+        if validation_error:
+            return jsonify({'error': validation_error}), 400
+        
+        # Selecciones grandes: ejecutar en segundo plano y devolver la tarea
+        if len(user_ids) >= ASYNC_THRESHOLD:
+            from background_jobs import job_manager
+            acting_user_id = current_user.id
+            job = job_manager.submit(
+                f'bulk_users_{action}',
+                lambda job: BulkUserActions.apply(action, user_ids, acting_user_id, new_role, job=job),
+                owner_id=acting_user_id,
+                total=len(user_ids)
+            )
+
+            current_app.logger.info(f'Bulk action {action} encolada como tarea {job.id}')
+            return jsonify({
+                'success': True,
+                'message': f'Acción {action} en proceso para {len(user_ids)} usuarios',
+                'job_id': job.id,
+                'status_url': url_for('get_background_job', job_id=job.id),
+                'results': []
+            }), 202
+        
         try:
-            db.session.commit()
-            current_app.logger.info('Transacción completada exitosamente')
+            summary = BulkUserActions.apply(action, user_ids, current_user.id, new_role)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
-            db.session.rollback()
-            current_app.logger.error(f'Error en commit: {str(e)}')
+            current_app.logger.error(f'Error aplicando acción en lote: {str(e)}')
             return jsonify({'error': 'Error guardando cambios'}), 500
         
         # Preparar respuesta
         if action == 'delete':
-            response_data = {
-                'success': True,
-                'message': f'{deleted_count} usuarios eliminados exitosamente',
-                'results': results
-            }
+            message = f'{summary["affected"]} usuarios eliminados exitosamente'
         else:
-            response_data = {
-                'success': True,
-                'message': f'Acción {action} aplicada a {len(users)} usuarios',
-                'results': results
-            }
+            message = f'Acción {action} aplicada a {summary["affected"]} usuarios'
         
         current_app.logger.info(f'Bulk action completada: {action}')
-        return jsonify(response_data)
+        return jsonify({
+            'success': True,
+            'message': message,
+            'results': summary['results']
+        })
         
     except Exception as e:
         db.session.rollback()
@@ -387,43 +339,17 @@ def export_users():
         flash('No tienes permisos para esta acción', 'error')
         return redirect(url_for('user_management.index'))
     
-    import csv
-    from io import StringIO
-    from flask import make_response
-    
-    # Obtener usuarios
-    users = User.query.all()
-    
-    # Crear CSV
-    output = StringIO()
-    writer = csv.writer(output)
+    from export_engine import export_engine, export_request_options
     
-    # Headers
-    writer.writerow(['ID', 'Username', 'Email', 'Nombre', 'Rol', 'Activo', 'Email Verificado', 
-                    'Teléfono', 'Dirección', 'Creado', 'Último Login'])
-    
-    # Datos
-    for user in users:
-        writer.writerow([
-            user.id,
-            user.username,
-            user.email,
-            user.name,
-            user.role,
-            'Sí' if user.is_active else 'No',
-            'Sí' if user.email_verified else 'No',
-            user.phone or '',
-            user.address or '',
-            user.created_at.strftime('%d/%m/%Y %H:%M') if user.created_at else '',
-            user.last_login.strftime('%d/%m/%Y %H:%M') if user.last_login else ''
-        ])
-    
-    # Crear respuesta
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename=usuarios_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-    
-    return response
+    options = export_request_options()
+    try:
+        return export_engine.export('users', options['fmt'], options['filters'],
+                                    compress=options['compress'],
+                                    requested_by=current_user.id,
+                                    force_async=options['force_async'])
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('user_management.index'))
 
 @bp.route('/test', methods=['POST'])
 @login_required
@@ -499,8 +425,7 @@ def delete_user(user_id):
             }), 400
         
         # Verificar que no sea un usuario protegido
-        protected_users = ['admin', 'mcastro2025']
-        if user.username in protected_users:
+        if user.username in PROTECTED_USERNAMES:
             return jsonify({
                 'success': False,
                 'error': f'No se puede eliminar el usuario "{user.username}" - Usuario protegido del sistema'
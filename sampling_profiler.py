@@ -0,0 +1,354 @@
+"""
+Profiler por muestreo
+Un hilo toma periódicamente las pilas de todos los hilos del proceso con
+sys._current_frames() y las acumula como pilas colapsadas ("a;b;c cantidad").
+Se usa bajo demanda (N segundos a la frecuencia pedida) o de forma continua a
+baja frecuencia con un agregado por ventana deslizante; el muestreo continuo
+mide su propio costo y baja la frecuencia si supera el presupuesto de overhead.
+Las pilas se exportan en formato colapsado (flamegraph.pl) o speedscope.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Response, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# Configuración del profiler
+PROFILER_CONFIG = {
+    'default_hz': 100,
+    'max_hz': 1000,
+    'max_seconds': 60,             # Duración máxima de un perfil bajo demanda
+    'continuous_hz': float(os.environ.get('PROFILER_CONTINUOUS_HZ', '2')),   # 0 desactiva
+    'slice_seconds': 60,
+    'window_slices': 10,           # Agregado continuo de los últimos 10 minutos
+    'max_overhead': 0.02,          # Fracción máxima de CPU (sobre el tiempo de pared) dedicada a muestrear
+    'max_depth': 128
+}
+
+# Hojas de pila de hilos bloqueados esperando (se omiten salvo include_idle)
+IDLE_LEAVES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('queue.py', 'get'),
+    ('socket.py', 'accept'),
+    ('socketserver.py', 'serve_forever'),
+    ('sync.py', 'wait'),        # Worker sync de gunicorn esperando conexiones
+    ('sync.py', 'accept')
+}
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+class StackProfile:
+    """Pilas colapsadas con su cantidad de muestras"""
+
+    def __init__(self, hz: float, started: float = None):
+        self.hz = hz
+        self.started = time.time() if started is None else started
+        self.duration = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+
+    def add(self, stacks: List[Tuple[str, ...]]):
+        self.samples += 1
+        self.stacks.update(stacks)
+
+    def merge(self, other: 'StackProfile'):
+        self.samples += other.samples
+        self.duration += other.duration
+        self.stacks.update(other.stacks)
+
+    def collapsed(self) -> str:
+        """Formato colapsado: una línea 'marco;marco;marco cantidad' por pila"""
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def speedscope(self, name: str = 'portal') -> Dict[str, Any]:
+        """Perfil 'sampled' de speedscope (una muestra por pila, pesada por su tiempo estimado)"""
+        frames: List[Dict[str, Any]] = []
+        index: Dict[str, int] = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.most_common():
+            indexes = []
+            for label in stack:
+                if label not in index:
+                    index[label] = len(frames)
+                    frames.append(_speedscope_frame(label))
+                indexes.append(index[label])
+            samples.append(indexes)
+            weights.append(count / self.hz)
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'exporter': 'portal sampling_profiler',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': round(sum(weights), 6),
+                'samples': samples,
+                'weights': weights
+            }]
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'hz': self.hz,
+            'started': self.started,
+            'duration_seconds': round(self.duration, 3),
+            'samples': self.samples,
+            'distinct_stacks': len(self.stacks)
+        }
+
+
+def _speedscope_frame(label: str) -> Dict[str, Any]:
+    # Etiquetas 'función (archivo:línea)'; la raíz es el nombre del hilo
+    if label.endswith(')') and ' (' in label:
+        name, location = label[:-1].rsplit(' (', 1)
+        path, _, line = location.rpartition(':')
+        if line.isdigit():
+            return {'name': name, 'file': path, 'line': int(line)}
+    return {'name': label}
+
+
+class SamplingProfiler:
+    """Muestreo de pilas bajo demanda y continuo"""
+
+    def __init__(self):
+        self._labels: Dict[Any, str] = {}
+        self._root = os.getcwd() + os.sep
+        self._profile_lock = threading.Lock()
+        self._ring_lock = threading.Lock()
+        self._ring: List[Optional[Tuple[int, StackProfile]]] = [None] * PROFILER_CONFIG['window_slices']
+        self._pid = None
+        self._stop = threading.Event()
+        self.continuous_hz = 0.0     # Frecuencia efectiva (puede bajar por overhead)
+        self.sampling_seconds = 0.0
+        self.elapsed_seconds = 0.0
+
+    # Muestreo
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            if filename.startswith(self._root):
+                filename = filename[len(self._root):]
+            label = self._labels[code] = f'{code.co_name} ({filename}:{code.co_firstlineno})'
+        return label
+
+    @staticmethod
+    def _is_idle(code) -> bool:
+        return (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES
+
+    def sample(self, include_idle: bool = False, exclude: int = None) -> List[Tuple[str, ...]]:
+        """Pila de cada hilo (raíz primero, precedida por el nombre del hilo)"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        max_depth = PROFILER_CONFIG['max_depth']
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == exclude:
+                continue
+            if not include_idle and self._is_idle(frame.f_code):
+                continue
+            labels = []
+            while frame is not None and len(labels) < max_depth:
+                labels.append(self._label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(ident, f'thread-{ident}'))
+            labels.reverse()
+            stacks.append(tuple(labels))
+        return stacks
+
+    def profile(self, seconds: float, hz: float = None, include_idle: bool = False) -> StackProfile:
+        """Muestrear todos los hilos durante `seconds` (bloquea al hilo que llama)"""
+        hz = min(hz or PROFILER_CONFIG['default_hz'], PROFILER_CONFIG['max_hz'])
+        seconds = min(seconds, PROFILER_CONFIG['max_seconds'])
+        if not self._profile_lock.acquire(blocking=False):
+            raise RuntimeError('Ya hay un perfil en curso en este proceso')
+        try:
+            result = StackProfile(hz)
+            me = threading.get_ident()
+            interval = 1.0 / hz
+            start = time.perf_counter()
+            deadline = start + seconds
+            next_sample = start
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if now < next_sample:
+                    time.sleep(next_sample - now)
+                    continue
+                result.add(self.sample(include_idle, exclude=me))
+                next_sample += interval
+                if next_sample < now:
+                    next_sample = now + interval   # Atrasado: no acumular muestras perdidas
+            result.duration = time.perf_counter() - start
+            return result
+        finally:
+            self._profile_lock.release()
+
+    # Muestreo continuo
+
+    def _record(self, stacks: List[Tuple[str, ...]], hz: float, now: float):
+        slice_id = int(now // PROFILER_CONFIG['slice_seconds'])
+        position = slice_id % len(self._ring)
+        with self._ring_lock:
+            entry = self._ring[position]
+            if entry is None or entry[0] != slice_id:
+                entry = self._ring[position] = (slice_id, StackProfile(hz, started=slice_id * PROFILER_CONFIG['slice_seconds']))
+            entry[1].add(stacks)
+            entry[1].duration += 1.0 / hz
+
+    def continuous(self, minutes: float = None, now: float = None) -> StackProfile:
+        """Agregado de los últimos `minutes` (por defecto toda la ventana)"""
+        now = time.time() if now is None else now
+        slices = len(self._ring) if minutes is None else max(1, int(minutes * 60 // PROFILER_CONFIG['slice_seconds']))
+        current = int(now // PROFILER_CONFIG['slice_seconds'])
+        result = StackProfile(self.continuous_hz or PROFILER_CONFIG['continuous_hz'] or 1)
+        with self._ring_lock:
+            for entry in self._ring:
+                if entry is not None and current - slices < entry[0] <= current:
+                    result.merge(entry[1])
+        if result.samples:
+            result.started = now - result.duration
+        return result
+
+    @property
+    def overhead(self) -> float:
+        return self.sampling_seconds / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def _adjust_rate(self, target_hz: float):
+        """Bajar la frecuencia si el costo supera el presupuesto y recuperarla cuando sobra margen"""
+        budget = PROFILER_CONFIG['max_overhead']
+        if self.overhead > budget:
+            self.continuous_hz = max(self.continuous_hz / 2, 0.1)
+        elif self.overhead < budget / 4 and self.continuous_hz < target_hz:
+            self.continuous_hz = min(self.continuous_hz * 2, target_hz)
+
+    def ensure_continuous(self):
+        """Iniciar el muestreo continuo en este proceso (tras un fork se inicia de nuevo)"""
+        target_hz = PROFILER_CONFIG['continuous_hz']
+        pid = os.getpid()
+        if target_hz <= 0 or self._pid == pid:
+            return
+        with self._ring_lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._ring = [None] * PROFILER_CONFIG['window_slices']
+        self.continuous_hz = target_hz
+        self.sampling_seconds = self.elapsed_seconds = 0.0
+        self._stop.clear()
+
+        def run():
+            me = threading.get_ident()
+            last = time.perf_counter()
+            while not self._stop.wait(1.0 / self.continuous_hz):
+                # Tiempo de CPU del hilo: la espera por el GIL no es costo del muestreo
+                started = time.thread_time()
+                try:
+                    self._record(self.sample(exclude=me), self.continuous_hz, time.time())
+                except Exception as e:
+                    logger.debug(f'Error muestreando pilas: {e}')
+                finished = time.perf_counter()
+                # Ventana de costo exponencial: el overhead reciente pesa más
+                self.sampling_seconds = self.sampling_seconds * 0.9 + (time.thread_time() - started)
+                self.elapsed_seconds = self.elapsed_seconds * 0.9 + (finished - last)
+                last = finished
+                self._adjust_rate(target_hz)
+
+        threading.Thread(target=run, daemon=True, name='sampling-profiler').start()
+
+    def stop(self):
+        self._stop.set()
+        self._pid = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'pid': os.getpid(),
+            'continuous': self._pid == os.getpid(),
+            'target_hz': PROFILER_CONFIG['continuous_hz'],
+            'effective_hz': round(self.continuous_hz, 3),
+            'overhead': round(self.overhead, 5),
+            'max_overhead': PROFILER_CONFIG['max_overhead'],
+            'profiling': self._profile_lock.locked(),
+            'window': self.continuous().summary()
+        }
+
+
+# Instancia global
+sampling_profiler = SamplingProfiler()
+
+
+def _render(profile: StackProfile, output: str, name: str):
+    if output == 'speedscope':
+        response = jsonify(profile.speedscope(name))
+        response.headers['Content-Disposition'] = f'attachment; filename="{name}.speedscope.json"'
+        return response
+    if output == 'collapsed':
+        return Response(profile.collapsed(), mimetype='text/plain; charset=utf-8')
+    return jsonify({'success': False, 'error': f'Formato desconocido: {output}'}), 400
+
+
+def init_sampling_profiler(app):
+    """Registrar rutas de administración e iniciar el muestreo continuo en cada worker"""
+    from flask_login import login_required, current_user
+
+    def admin_required():
+        if not current_user.can_access_admin():
+            return jsonify({'success': False, 'error': 'Permisos insuficientes'}), 403
+        return None
+
+    @app.route('/api/v1/profiler', methods=['GET'])
+    @login_required
+    def get_profiler_status():
+        """Estado del muestreo continuo de este worker"""
+        denied = admin_required()
+        if denied:
+            return denied
+        return jsonify({'success': True, 'data': sampling_profiler.status()})
+
+    @app.route('/api/v1/profiler/profile', methods=['POST'])
+    @login_required
+    def run_profile():
+        """Perfil bajo demanda: ?seconds=10&hz=100&format=speedscope|collapsed&idle=0"""
+        denied = admin_required()
+        if denied:
+            return denied
+        seconds = request.args.get('seconds', 10, type=float)
+        hz = request.args.get('hz', PROFILER_CONFIG['default_hz'], type=float)
+        if seconds <= 0 or hz <= 0:
+            return jsonify({'success': False, 'error': 'seconds y hz deben ser positivos'}), 400
+        try:
+            profile = sampling_profiler.profile(seconds, hz, include_idle=request.args.get('idle') == '1')
+        except RuntimeError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        return _render(profile, request.args.get('format', 'speedscope'), f'profile-{os.getpid()}')
+
+    @app.route('/api/v1/profiler/continuous', methods=['GET'])
+    @login_required
+    def get_continuous_profile():
+        """Agregado continuo: ?minutes=10&format=speedscope|collapsed"""
+        denied = admin_required()
+        if denied:
+            return denied
+        profile = sampling_profiler.continuous(request.args.get('minutes', type=float))
+        return _render(profile, request.args.get('format', 'speedscope'), f'continuous-{os.getpid()}')
+
+    # Con gunicorn los hilos no sobreviven al fork: se inicia en el primer request de cada worker
+    @app.before_request
+    def start_sampling_profiler():
+        sampling_profiler.ensure_continuous()
+
+    print("✅ Profiler por muestreo inicializado")
@@ -11,8 +11,6 @@ import json
 from optional_dependencies import get_docker, DOCKER_AVAILABLE
 docker = get_docker()
 import logging
-import time
-import threading
 from typing import Dict, List, Optional
 from dataclasses import dataclass
 from enum import Enum
@@ -20,8 +18,8 @@ import requests
 import psutil
 import redis
 from datetime import datetime
-import schedule
 from flask import current_app, request, jsonify
+from alert_rules import AlertRule, alert_engine
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -167,6 +165,15 @@ class MonitoringSystem:
     
     def __init__(self):
         self.metrics = {}
+        # Umbrales críticos: inhiben a las alertas de advertencia del mismo recurso
+        common = {'aggregation': 'last', 'window': 120, 'for_seconds': 60, 'severity': 'critical',
+                  'group': 'system', 'source': 'scalability'}
+        alert_engine.add_rules([
+            AlertRule('system.cpu.critical', 'system.cpu.usage_percent', 90, clear=85,
+                      message='CPU usage critical: {value:.1f}%', **common),
+            AlertRule('system.memory.critical', 'system.memory.usage_percent', 95, clear=90,
+                      message='Memory usage critical: {value:.1f}%', **common)
+        ])
     
     def collect_metrics(self) -> Dict:
         try:
@@ -182,34 +189,21 @@ class MonitoringSystem:
             }
             
             self.metrics = metrics
+            alert_engine.record('system.cpu.usage_percent', cpu_percent)
+            alert_engine.record('system.memory.usage_percent', memory.percent)
             return metrics
         except Exception as e:
             logger.error(f"❌ Error recolectando métricas: {e}")
             return {}
     
     def check_alerts(self) -> List[Dict]:
-        alerts = []
-        
-        if not self.metrics:
-            return alerts
-        
-        if self.metrics["cpu_percent"] > 90:
-            alerts.append({
-                "level": "critical",
-                "metric": "cpu",
-                "value": self.metrics["cpu_percent"],
-                "message": f"CPU usage critical: {self.metrics['cpu_percent']}%"
-            })
-        
-        if self.metrics["memory_percent"] > 95:
-            alerts.append({
-                "level": "critical",
-                "metric": "memory",
-                "value": self.metrics["memory_percent"],
-                "message": f"Memory usage critical: {self.metrics['memory_percent']}%"
-            })
-        
-        return alerts
+        """Alertas críticas activas según las reglas evaluadas sobre la ventana de métricas"""
+        return [{
+            "level": alert.severity,
+            "metric": alert.data.get("metric", alert.id),
+            "value": alert.value,
+            "message": alert.message
+        } for alert in alert_engine.active(source='scalability')]
 
 class ScalabilityManager:
     """Gestor principal de escalabilidad"""
@@ -222,15 +216,9 @@ class ScalabilityManager:
     
     def _init_scheduled_tasks(self):
         try:
-            schedule.every(30).seconds.do(self._monitoring_task)
-            
-            def run_scheduler():
-                while True:
-                    schedule.run_pending()
-                    time.sleep(1)
-            
-            scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-            scheduler_thread.start()
+            from cluster_scheduler import cluster_scheduler
+            cluster_scheduler.interval('scalability.monitoring', 30, self._monitoring_task,
+                                       app_context=False, timeout=30)
             
             logger.info("✅ Tareas programadas inicializadas")
         except Exception as e:
@@ -238,11 +226,8 @@ class ScalabilityManager:
     
     def _monitoring_task(self):
         try:
-            metrics = self.monitoring.collect_metrics()
-            alerts = self.monitoring.check_alerts()
-            
-            for alert in alerts:
-                logger.warning(f"🚨 ALERTA: {alert['message']}")
+            # Las reglas de alerta evalúan las muestras y notifican agrupado por su cuenta
+            self.monitoring.collect_metrics()
         except Exception as e:
             logger.error(f"❌ Error en monitoreo: {e}")
     
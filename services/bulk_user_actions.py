@@ -0,0 +1,254 @@
+"""
+Acciones en lote sobre usuarios
+Aplica activación, desactivación, cambio de rol, verificación y eliminación
+con sentencias UPDATE/DELETE por bloques en lugar de cargar cada usuario
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+from datetime import datetime
+from sqlalchemy import select, update, delete, func, or_
+from werkzeug.security import generate_password_hash
+from models import (db, User, Visit, Reservation, ReservationSlot, News, Maintenance, Expense, Classified,
+                    SecurityReport, Notification, ChatbotSession)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de bloque para las cláusulas IN (por debajo del límite de variables de SQLite)
+CHUNK_SIZE = 500
+
+# Selecciones a partir de este tamaño se procesan como tarea en segundo plano
+ASYNC_THRESHOLD = 500
+
+PROTECTED_USERNAMES = ['admin', 'mcastro2025']
+
+VALID_ROLES = ['resident', 'admin', 'security', 'maintenance']
+
+TEMP_PASSWORD = 'temp123456'
+
+# Tablas hijas que se eliminan junto con el usuario (cascade='all, delete-orphan' en User)
+CASCADE_DELETES = [
+    (Visit, Visit.resident_id),
+    (Reservation, Reservation.user_id),
+    (News, News.author_id),
+    (Maintenance, Maintenance.user_id),
+    (Expense, Expense.user_id),
+    (Classified, Classified.user_id),
+    (SecurityReport, SecurityReport.user_id),
+    (Notification, Notification.user_id),
+]
+
+# Referencias opcionales a usuarios que quedan en NULL al eliminarlos
+NULLIFY_REFERENCES = [
+    (Reservation, Reservation.approved_by),
+    (Maintenance, Maintenance.assigned_to),
+    (SecurityReport, SecurityReport.assigned_to),
+    (ChatbotSession, ChatbotSession.user_id),
+]
+
+ACTION_LABELS = {
+    'activate': 'activado',
+    'deactivate': 'desactivado',
+    'verify_email': 'email verificado',
+    'reset_password': 'contraseña resetada',
+    'change_role': 'rol cambiado',
+    'delete': 'eliminado'
+}
+
+
+def chunked(values: List[int], size: int = None) -> Iterable[List[int]]:
+    """Dividir una lista de IDs en bloques"""
+    size = size or CHUNK_SIZE
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def normalize_user_ids(user_ids: Iterable[Any]) -> List[int]:
+    """Convertir IDs recibidos (str o int) a enteros únicos conservando el orden"""
+    normalized = []
+    seen = set()
+    for user_id in user_ids:
+        try:
+            value = int(user_id)
+        except (TypeError, ValueError):
+            continue
+        if value not in seen:
+            seen.add(value)
+            normalized.append(value)
+    return normalized
+
+
+class BulkUserActions:
+    """Ejecutor de acciones en lote basado en sentencias por bloques"""
+
+    @staticmethod
+    def validate(action: str, new_role: Optional[str] = None) -> Optional[str]:
+        """Validar parámetros; devuelve mensaje de error o None"""
+        if action not in ACTION_LABELS:
+            return f'Acción desconocida: {action}'
+        if action == 'change_role' and new_role not in VALID_ROLES:
+            return 'Rol inválido'
+        return None
+
+    @staticmethod
+    def apply(action: str, user_ids: List[int], acting_user_id: int,
+              new_role: Optional[str] = None, job=None) -> Dict[str, Any]:
+        """
+        Aplicar una acción a todos los usuarios seleccionados.
+        Cada bloque se confirma por separado; si se recibe una tarea
+        en segundo plano se informa el progreso tras cada bloque.
+        """
+        user_ids = normalize_user_ids(user_ids)
+        total = len(user_ids)
+        results = []
+        affected = 0
+        processed = 0
+
+        if job is not None:
+            job.update_progress(0, total)
+
+        if action == 'change_role' and new_role != 'admin':
+            BulkUserActions._ensure_admin_remains(user_ids)
+
+        password_hash = generate_password_hash(TEMP_PASSWORD) if action == 'reset_password' else None
+
+        for chunk in chunked(user_ids):
+            try:
+                skipped = BulkUserActions._skipped_users(action, chunk, acting_user_id)
+                for username, reason in skipped.values():
+                    results.append(f'{username}: {reason}')
+                target_ids = [user_id for user_id in chunk if user_id not in skipped]
+
+                if target_ids:
+                    if action == 'delete':
+                        affected += BulkUserActions._delete_chunk(target_ids)
+                    else:
+                        affected += BulkUserActions._update_chunk(action, target_ids, new_role, password_hash)
+
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.error(f'Error aplicando {action} en bloque ({processed}/{total} procesados)')
+                raise
+
+            processed += len(chunk)
+            if job is not None:
+                job.update_progress(processed, total)
+
+        results.insert(0, f'{affected} usuarios: {ACTION_LABELS[action]}')
+
+        if action == 'delete' and affected:
+            # Las eliminaciones por SQL no pasan por los eventos del ORM
+            from services.kpi_engine import kpi_engine
+            kpi_engine.mark_stale()
+
+        return {
+            'action': action,
+            'requested': total,
+            'affected': affected,
+            'results': results
+        }
+
+    @staticmethod
+    def _skipped_users(action: str, chunk: List[int], acting_user_id: int) -> Dict[int, tuple]:
+        """Usuarios del bloque que no deben modificarse, con el motivo"""
+        if action in ('activate', 'deactivate'):
+            if acting_user_id not in chunk:
+                return {}
+            username = db.session.execute(
+                select(User.username).where(User.id == acting_user_id)
+            ).scalar()
+            return {acting_user_id: (username, 'saltado (usuario actual)')}
+
+        if action == 'delete':
+            rows = db.session.execute(
+                select(User.id, User.username).where(
+                    User.id.in_(chunk),
+                    or_(User.id == acting_user_id, User.username.in_(PROTECTED_USERNAMES))
+                )
+            ).all()
+            skipped = {}
+            for user_id, username in rows:
+                if user_id == acting_user_id:
+                    skipped[user_id] = (username, 'error - No puedes eliminar tu propia cuenta')
+                else:
+                    skipped[user_id] = (username, 'error - Usuario protegido del sistema')
+            return skipped
+
+        return {}
+
+    @staticmethod
+    def _update_chunk(action: str, user_ids: List[int], new_role: Optional[str],
+                      password_hash: Optional[str]) -> int:
+        """UPDATE de un bloque de usuarios"""
+        values = {'updated_at': datetime.utcnow()}
+        if action == 'activate':
+            values['is_active'] = True
+        elif action == 'deactivate':
+            values['is_active'] = False
+        elif action == 'verify_email':
+            values['email_verified'] = True
+        elif action == 'reset_password':
+            values['password_hash'] = password_hash
+        elif action == 'change_role':
+            values['role'] = new_role
+
+        result = db.session.execute(
+            update(User)
+            .where(User.id.in_(user_ids))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    @staticmethod
+    def _delete_chunk(user_ids: List[int]) -> int:
+        """DELETE de un bloque de usuarios y sus dependencias, una sentencia por tabla"""
+        for model, column in NULLIFY_REFERENCES:
+            db.session.execute(
+                update(model)
+                .where(column.in_(user_ids))
+                .values({column.key: None})
+                .execution_options(synchronize_session=False)
+            )
+
+        # Franjas reclamadas por las reservas de los usuarios eliminados
+        db.session.execute(
+            delete(ReservationSlot)
+            .where(ReservationSlot.reservation_id.in_(
+                select(Reservation.id).where(Reservation.user_id.in_(user_ids))
+            ))
+            .execution_options(synchronize_session=False)
+        )
+
+        for model, column in CASCADE_DELETES:
+            db.session.execute(
+                delete(model)
+                .where(column.in_(user_ids))
+                .execution_options(synchronize_session=False)
+            )
+
+        result = db.session.execute(
+            delete(User)
+            .where(User.id.in_(user_ids))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    @staticmethod
+    def _ensure_admin_remains(user_ids: List[int]):
+        """Evitar quitar el rol de admin al último administrador activo"""
+        active_admins = db.session.execute(
+            select(func.count(User.id)).where(User.role == 'admin', User.is_active == True)
+        ).scalar() or 0
+
+        selected_admins = 0
+        for chunk in chunked(user_ids):
+            selected_admins += db.session.execute(
+                select(func.count(User.id)).where(
+                    User.id.in_(chunk), User.role == 'admin', User.is_active == True
+                )
+            ).scalar() or 0
+
+        if selected_admins and active_admins - selected_admins < 1:
+            raise ValueError('No puedes quitar el rol de admin al último administrador')
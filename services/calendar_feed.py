@@ -0,0 +1,209 @@
+"""
+Feed de calendario de reservas
+Precalcula los eventos aprobados de cada mes en una sola consulta (con el nombre
+del usuario incluido), los sirve como JSON con ETag por espacio y mes, e invalida
+solo los meses afectados cuando cambia una reserva.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from models import db, Reservation, User
+
+logger = logging.getLogger(__name__)
+
+# Configuración del feed de calendario
+CALENDAR_FEED_CONFIG = {
+    'statuses': ('approved',),   # Estados visibles en el calendario
+    'max_cached_months': 48,
+    'max_range_months': 6         # Límite para consultas por rango de FullCalendar
+}
+
+ALL_SPACES = '*'
+
+
+def month_key(value) -> str:
+    return f'{value.year:04d}-{value.month:02d}'
+
+
+def month_bounds(key: str) -> Tuple[datetime, datetime]:
+    """Inicio y fin (exclusivo) de un mes 'YYYY-MM'"""
+    year, month = (int(part) for part in key.split('-'))
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def months_between(start: datetime, end: datetime) -> List[str]:
+    """Meses que se superponen con [start, end)"""
+    months = []
+    year, month = start.year, start.month
+    while datetime(year, month, 1) < end:
+        months.append(f'{year:04d}-{month:02d}')
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+class CalendarFeed:
+    """Caché de eventos de calendario por mes"""
+
+    def __init__(self, max_months: int = None):
+        self.max_months = max_months or CALENDAR_FEED_CONFIG['max_cached_months']
+        self._months = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def fingerprint(self, key: str) -> str:
+        """Huella barata del mes (cantidad, última modificación, último ID) para detectar cambios de otros workers"""
+        start, end = month_bounds(key)
+        count, last_update, last_id = db.session.execute(
+            select(func.count(Reservation.id), func.max(Reservation.updated_at), func.max(Reservation.id)).where(
+                Reservation.status.in_(CALENDAR_FEED_CONFIG['statuses']),
+                Reservation.start_time < end,
+                Reservation.end_time > start
+            )
+        ).one()
+        return hashlib.md5(f'{key}:{count}:{last_update}:{last_id}'.encode()).hexdigest()
+
+    def etag(self, key: str, space_type: str = None, fingerprint: str = None) -> str:
+        fingerprint = fingerprint or self.fingerprint(key)
+        return hashlib.md5(f'{fingerprint}:{space_type or ALL_SPACES}'.encode()).hexdigest()
+
+    def _load_month(self, key: str, base_url: str) -> List[Dict[str, Any]]:
+        """Cargar eventos del mes con una sola consulta que incluye el nombre del usuario"""
+        start, end = month_bounds(key)
+        rows = db.session.execute(
+            select(Reservation.id, Reservation.space_type, Reservation.space_name,
+                   Reservation.start_time, Reservation.end_time, Reservation.description,
+                   User.name)
+            .join(User, Reservation.user_id == User.id)
+            .where(
+                Reservation.status.in_(CALENDAR_FEED_CONFIG['statuses']),
+                Reservation.start_time < end,
+                Reservation.end_time > start
+            )
+            .order_by(Reservation.start_time)
+        ).all()
+
+        return [{
+            'id': row.id,
+            'title': f'{row.space_name} - {row.name}',
+            'start': row.start_time.isoformat(),
+            'end': row.end_time.isoformat(),
+            'space_type': row.space_type,
+            'user': row.name,
+            'description': row.description or '',
+            'url': f'{base_url}{row.id}'
+        } for row in rows]
+
+    def get_month(self, key: str, base_url: str, space_type: str = None,
+                  fingerprint: str = None) -> Dict[str, Any]:
+        """Eventos de un mes (opcionalmente de un espacio) con su ETag"""
+        fingerprint = fingerprint or self.fingerprint(key)
+
+        with self.lock:
+            entry = self._months.get(key)
+            if entry is not None and entry['fingerprint'] == fingerprint:
+                self._months.move_to_end(key)
+                self.stats['hits'] += 1
+            else:
+                entry = None
+
+        if entry is None:
+            self.stats['misses'] += 1
+            entry = {'fingerprint': fingerprint, 'events': {ALL_SPACES: self._load_month(key, base_url)}}
+            with self.lock:
+                self._months[key] = entry
+                self._months.move_to_end(key)
+                while len(self._months) > self.max_months:
+                    self._months.popitem(last=False)
+
+        space_key = space_type or ALL_SPACES
+        events = entry['events'].get(space_key)
+        if events is None:
+            events = [item for item in entry['events'][ALL_SPACES] if item['space_type'] == space_type]
+            entry['events'][space_key] = events
+
+        return {
+            'month': key,
+            'space_type': space_type,
+            'etag': self.etag(key, space_type, fingerprint),
+            'events': events
+        }
+
+    def range_fingerprints(self, start: datetime, end: datetime) -> Dict[str, str]:
+        """Huellas de los meses que abarca un rango"""
+        months = months_between(start, end)
+        if len(months) > CALENDAR_FEED_CONFIG['max_range_months']:
+            raise ValueError(f"Rango máximo: {CALENDAR_FEED_CONFIG['max_range_months']} meses")
+        return {key: self.fingerprint(key) for key in months}
+
+    def get_range(self, start: datetime, end: datetime, base_url: str, space_type: str = None,
+                  fingerprints: Dict[str, str] = None) -> Dict[str, Any]:
+        """Eventos superpuestos con [start, end), armados desde los meses en caché"""
+        fingerprints = fingerprints or self.range_fingerprints(start, end)
+        months = sorted(fingerprints)
+        start_iso, end_iso = start.isoformat(), end.isoformat()
+        seen = set()
+        events = []
+        for key in months:
+            for item in self.get_month(key, base_url, space_type, fingerprints[key])['events']:
+                if item['id'] not in seen and item['start'] < end_iso and item['end'] > start_iso:
+                    seen.add(item['id'])
+                    events.append(item)
+
+        return {
+            'etag': self.range_etag(start, end, space_type, fingerprints),
+            'events': events
+        }
+
+    def range_etag(self, start: datetime, end: datetime, space_type: str = None,
+                   fingerprints: Dict[str, str] = None) -> str:
+        """ETag de un rango a partir de las huellas de sus meses"""
+        fingerprints = fingerprints or self.range_fingerprints(start, end)
+        raw = ':'.join([start.isoformat(), end.isoformat(), space_type or ALL_SPACES] +
+                       [fingerprints[key] for key in sorted(fingerprints)])
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def invalidate(self, start: Optional[datetime], end: Optional[datetime]):
+        """Invalidar solo los meses que abarca un intervalo"""
+        if start is None or end is None:
+            return
+        with self.lock:
+            for key in months_between(start, end) or [month_key(start)]:
+                if self._months.pop(key, None) is not None:
+                    self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self.lock:
+            self._months.clear()
+
+
+# Instancia global
+calendar_feed = CalendarFeed()
+
+_TRACKED_ATTRIBUTES = ('status', 'start_time', 'end_time', 'space_type', 'space_name', 'description', 'user_id')
+
+
+@event.listens_for(Session, 'before_flush')
+def _invalidate_calendar_months(session, flush_context, instances):
+    """Invalidar los meses (anterior y nuevo) de las reservas modificadas"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Reservation):
+            continue
+        state = inspect(obj)
+        if obj in session.dirty and not any(state.attrs[name].history.has_changes() for name in _TRACKED_ATTRIBUTES):
+            continue
+        old_start, old_end = (
+            state.attrs[name].history.deleted[0] if state.attrs[name].history.deleted else getattr(obj, name)
+            for name in ('start_time', 'end_time')
+        )
+        calendar_feed.invalidate(old_start, old_end)
+        calendar_feed.invalidate(obj.start_time, obj.end_time)
@@ -0,0 +1,210 @@
+"""
+Motor de cohortes
+Matriz cohorte de alta × mes de actividad (visitas, reservas, mantenimiento y
+logins) calculada con una sola consulta agrupada sobre la unión de actividades.
+El resultado se materializa en la tabla cohort_retention y las actualizaciones
+posteriores recalculan solo los meses de actividad desde la última actualización.
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, func, union_all, delete
+
+from models import db, User, Visit, Reservation, Maintenance, CohortRetention
+
+logger = logging.getLogger(__name__)
+
+# Configuración del motor de cohortes
+COHORT_CONFIG = {
+    'refresh_minutes': 60,
+    'default_months': 12
+}
+
+# Fuentes de actividad: (modelo, columna de usuario, columna de fecha)
+ACTIVITY_SOURCES = (
+    (Visit, 'resident_id', 'created_at'),
+    (Reservation, 'user_id', 'created_at'),
+    (Maintenance, 'user_id', 'created_at'),
+    (User, 'id', 'last_login')
+)
+
+
+def _month_key(value) -> str:
+    from services.temporal_aggregation import parse_bucket
+    return parse_bucket(value).strftime('%Y-%m')
+
+
+def shift_month(month: str, offset: int) -> str:
+    """Clave YYYY-MM desplazada `offset` meses"""
+    year, number = map(int, month.split('-'))
+    index = year * 12 + number - 1 + offset
+    return f'{index // 12:04d}-{index % 12 + 1:02d}'
+
+
+def month_offset(cohort_month: str, activity_month: str) -> int:
+    """Meses entre dos claves YYYY-MM"""
+    cohort_year, cohort = map(int, cohort_month.split('-'))
+    activity_year, activity = map(int, activity_month.split('-'))
+    return (activity_year - cohort_year) * 12 + activity - cohort
+
+
+class CohortEngine:
+    """Cálculo, materialización y lectura de la matriz de cohortes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.is_running = False
+        self.last_refresh = None
+        self.stats = {'full_refreshes': 0, 'incremental_refreshes': 0}
+
+    # Cálculo
+
+    def _activity_query(self, since: Optional[datetime]):
+        """Unión (usuario, mes) de todas las fuentes desde una fecha"""
+        from services.temporal_aggregation import bucket_expression, _dialect
+
+        dialect = _dialect()
+        selects = []
+        for model, user_column, date_column in ACTIVITY_SOURCES:
+            user_id = getattr(model, user_column)
+            moment = getattr(model, date_column)
+            conditions = [user_id.isnot(None), moment.isnot(None)]
+            if since is not None:
+                conditions.append(moment >= since)
+            selects.append(select(user_id.label('user_id'),
+                                  bucket_expression(moment, 'month', dialect).label('activity_month'))
+                           .where(*conditions))
+        return union_all(*selects).subquery()
+
+    def compute(self, since: datetime = None) -> List[Dict[str, Any]]:
+        """Filas de la matriz (cohorte, mes de actividad, activos) en una consulta agrupada"""
+        from services.temporal_aggregation import bucket_expression, _dialect
+
+        activity = self._activity_query(since)
+        cohorts = select(User.id.label('user_id'),
+                         bucket_expression(User.created_at, 'month', _dialect()).label('cohort_month')) \
+            .where(User.created_at.isnot(None)).subquery()
+
+        statement = (select(cohorts.c.cohort_month, activity.c.activity_month,
+                            func.count(func.distinct(activity.c.user_id)))
+                     .join(cohorts, cohorts.c.user_id == activity.c.user_id)
+                     .group_by(cohorts.c.cohort_month, activity.c.activity_month))
+
+        rows = []
+        for cohort_month, activity_month, active_users in db.session.execute(statement):
+            cohort_key, activity_key = _month_key(cohort_month), _month_key(activity_month)
+            period_index = month_offset(cohort_key, activity_key)
+            if period_index >= 0:
+                rows.append({'cohort_month': cohort_key, 'activity_month': activity_key,
+                             'period_index': period_index, 'active_users': int(active_users)})
+        return rows
+
+    def cohort_sizes(self) -> Dict[str, int]:
+        from services.temporal_aggregation import aggregate
+        return {_month_key(month): int(count) for month, count in aggregate(User.created_at, ['month'])}
+
+    # Materialización
+
+    def refresh(self, full: bool = False, now: datetime = None) -> Dict[str, Any]:
+        """Actualizar la tabla: completa la primera vez, luego desde el mes de la última actualización"""
+        from services.temporal_aggregation import truncate
+
+        now = now or datetime.utcnow()
+        with self.lock:
+            last_refreshed = db.session.execute(select(func.max(CohortRetention.refreshed_at))).scalar()
+            since = None if full or last_refreshed is None else truncate(min(last_refreshed, now), 'month')
+
+            rows = self.compute(since)
+            sizes = self.cohort_sizes()
+            for row in rows:
+                row['cohort_size'] = sizes.get(row['cohort_month'], 0)
+                row['refreshed_at'] = now
+
+            # Se reemplazan solo los meses de actividad recalculados
+            removed = delete(CohortRetention)
+            if since is not None:
+                removed = removed.where(CohortRetention.activity_month >= since.strftime('%Y-%m'))
+            db.session.execute(removed)
+            if rows:
+                db.session.execute(CohortRetention.__table__.insert(), rows)
+            # El tamaño de cohortes anteriores puede cambiar por altas tardías o bajas
+            for cohort_month, size in sizes.items():
+                db.session.execute(CohortRetention.__table__.update()
+                                   .where(CohortRetention.cohort_month == cohort_month)
+                                   .values(cohort_size=size))
+            db.session.commit()
+
+            self.last_refresh = now
+            self.stats['incremental_refreshes' if since is not None else 'full_refreshes'] += 1
+        return {'mode': 'incremental' if since is not None else 'full',
+                'since': since.isoformat() if since else None, 'rows': len(rows)}
+
+    def ensure_materialized(self):
+        if not db.session.execute(select(CohortRetention.id).limit(1)).first():
+            self.refresh(full=True)
+
+    # Lectura
+
+    def heatmap(self, months: int = None, now: datetime = None) -> Dict[str, Any]:
+        """Cohortes de los últimos meses con la retención de cada mes desde el alta"""
+        self.ensure_materialized()
+        months = months or COHORT_CONFIG['default_months']
+        current = (now or datetime.utcnow()).strftime('%Y-%m')
+        cohort_keys = [shift_month(current, offset) for offset in range(1 - months, 1)]
+
+        stored = db.session.execute(
+            select(CohortRetention.cohort_month, CohortRetention.period_index,
+                   CohortRetention.cohort_size, CohortRetention.active_users)
+            .where(CohortRetention.cohort_month >= cohort_keys[0])
+        ).all()
+        cells = {(cohort, period): active for cohort, period, _, active in stored}
+        sizes = self.cohort_sizes()
+
+        matrix = []
+        for cohort in cohort_keys:
+            size = sizes.get(cohort, 0)
+            available = month_offset(cohort, cohort_keys[-1]) + 1
+            matrix.append([round(cells.get((cohort, period), 0) / size, 4) if size else None
+                           for period in range(available)] + [None] * (months - available))
+
+        return {
+            'cohorts': cohort_keys,
+            'periods': list(range(months)),
+            'cohort_sizes': [sizes.get(cohort, 0) for cohort in cohort_keys],
+            'retention': matrix,
+            'last_refresh': self.last_refresh.isoformat() if self.last_refresh else None
+        }
+
+    def period_retention(self, period_index: int = 1, months: int = None, now: datetime = None) -> Dict[str, float]:
+        """Retención al mes `period_index` de cada cohorte que ya lo completó"""
+        heatmap = self.heatmap(months, now)
+        current = len(heatmap['cohorts']) - 1
+        return {cohort: row[period_index]
+                for position, (cohort, row) in enumerate(zip(heatmap['cohorts'], heatmap['retention']))
+                if position + period_index < current and row[period_index] is not None}
+
+    # Programación
+
+    def start_scheduler(self, app):
+        """Actualización incremental periódica, una vez por cluster"""
+        if self.is_running:
+            return
+        from cluster_scheduler import cluster_scheduler
+
+        def scheduled_refresh():
+            try:
+                self.refresh()
+            except Exception:
+                db.session.rollback()
+                raise
+
+        cluster_scheduler.interval('cohort_engine.refresh', COHORT_CONFIG['refresh_minutes'] * 60, scheduled_refresh,
+                                   jitter=60, description='Actualizar la matriz de cohortes')
+        self.is_running = True
+
+
+# Instancia global
+cohort_engine = CohortEngine()
@@ -0,0 +1,248 @@
+"""
+Pronósticos
+Tendencia por mínimos cuadrados, pronóstico estacional ingenuo y bandas de
+anomalía EWMA calculados con NumPy sobre matrices (una fila por serie), de modo
+que todas las categorías, espacios o métricas se pronostican en una sola pasada.
+Los resultados sobre datos de la base se guardan hasta que llegan datos nuevos.
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from sqlalchemy import select, func
+
+from models import db
+from optional_dependencies import get_numpy
+
+np = get_numpy()
+
+# Configuración de pronósticos
+FORECAST_CONFIG = {
+    'horizon': 3,              # Períodos a pronosticar
+    'season_length': 12,       # Meses por temporada
+    'ewma_alpha': 0.3,
+    'band_width': 3.0,         # Desvíos de la banda de anomalía
+    'min_points': 3,
+    'history_months': 24
+}
+
+
+def _as_matrix(values) -> Any:
+    matrix = np.asarray(values, dtype=np.float64)
+    return matrix.reshape(1, -1) if matrix.ndim == 1 else matrix
+
+
+def fit_trend(matrix) -> Dict[str, Any]:
+    """Recta por mínimos cuadrados de cada fila: pendiente, ordenada y R²"""
+    matrix = _as_matrix(matrix)
+    x = np.arange(matrix.shape[1], dtype=np.float64)
+    x_centered = x - x.mean()
+    denominator = float((x_centered ** 2).sum())
+    means = matrix.mean(axis=1)
+
+    if denominator == 0:
+        slopes = np.zeros(matrix.shape[0])
+    else:
+        slopes = (matrix - means[:, None]) @ x_centered / denominator
+    intercepts = means - slopes * x.mean()
+
+    fitted = intercepts[:, None] + slopes[:, None] * x
+    residual = ((matrix - fitted) ** 2).sum(axis=1)
+    total = ((matrix - means[:, None]) ** 2).sum(axis=1)
+    r_squared = np.where(total > 0, 1 - residual / np.where(total > 0, total, 1), 1.0)
+    return {'slope': slopes, 'intercept': intercepts, 'r_squared': r_squared}
+
+
+def trend_forecast(matrix, horizon: int = None, trend: Dict[str, Any] = None) -> Any:
+    """Extrapolación de la recta de cada fila (filas × horizonte)"""
+    matrix = _as_matrix(matrix)
+    horizon = horizon or FORECAST_CONFIG['horizon']
+    trend = trend or fit_trend(matrix)
+    future = np.arange(matrix.shape[1], matrix.shape[1] + horizon, dtype=np.float64)
+    return trend['intercept'][:, None] + trend['slope'][:, None] * future
+
+
+def seasonal_naive(matrix, season_length: int = None, horizon: int = None) -> Any:
+    """Valor del mismo período de la temporada anterior; último valor si no hay una temporada completa"""
+    matrix = _as_matrix(matrix)
+    horizon = horizon or FORECAST_CONFIG['horizon']
+    season_length = season_length or FORECAST_CONFIG['season_length']
+    length = matrix.shape[1]
+
+    if length < season_length:
+        return np.repeat(matrix[:, -1:], horizon, axis=1)
+    steps = np.arange(horizon)
+    return matrix[:, length - season_length + steps % season_length]
+
+
+def ewma_bands(matrix, alpha: float = None, width: float = None) -> Dict[str, Any]:
+    """Nivel y desvío EWMA hasta el penúltimo valor y si el último cae fuera de la banda"""
+    matrix = _as_matrix(matrix)
+    alpha = alpha or FORECAST_CONFIG['ewma_alpha']
+    width = width or FORECAST_CONFIG['band_width']
+
+    level = matrix[:, 0].copy()
+    variance = np.zeros(matrix.shape[0])
+    # Recursión sobre el tiempo, vectorizada sobre las series
+    for column in range(1, matrix.shape[1] - 1):
+        difference = matrix[:, column] - level
+        increment = alpha * difference
+        level += increment
+        variance = (1 - alpha) * (variance + difference * increment)
+
+    deviation = np.sqrt(variance)
+    upper = level + width * deviation
+    lower = level - width * deviation
+    last = matrix[:, -1]
+    anomaly = (matrix.shape[1] >= FORECAST_CONFIG['min_points']) & (deviation > 0) & ((last > upper) | (last < lower))
+    return {'level': level, 'deviation': deviation, 'upper': upper, 'lower': lower, 'anomaly': anomaly}
+
+
+def forecast_matrix(matrix, horizon: int = None, season_length: int = None, non_negative: bool = True) -> Dict[str, Any]:
+    """Tendencia, pronóstico estacional, combinado y bandas de todas las filas en una pasada"""
+    matrix = _as_matrix(matrix)
+    horizon = horizon or FORECAST_CONFIG['horizon']
+    season_length = season_length or FORECAST_CONFIG['season_length']
+
+    trend = fit_trend(matrix)
+    linear = trend_forecast(matrix, horizon, trend)
+    seasonal = seasonal_naive(matrix, season_length, horizon)
+    # Con al menos una temporada completa se promedian ambos métodos
+    combined = (linear + seasonal) / 2 if matrix.shape[1] >= season_length else linear
+    if non_negative:
+        linear, seasonal, combined = (np.clip(values, 0, None) for values in (linear, seasonal, combined))
+
+    return {
+        'trend': trend,
+        'linear': linear,
+        'seasonal': seasonal,
+        'forecast': combined,
+        'bands': ewma_bands(matrix)
+    }
+
+
+def trend_direction(slope: float, scale: float, tolerance: float = 0.02) -> str:
+    """'up', 'down' o 'stable' según la pendiente relativa al nivel de la serie"""
+    if scale and abs(slope) / abs(scale) < tolerance:
+        return 'stable'
+    return 'up' if slope > 0 else 'down' if slope < 0 else 'stable'
+
+
+def forecast_batch(labels: Sequence[Any], matrix, **options) -> Dict[Any, Dict[str, Any]]:
+    """Pronóstico por etiqueta (una fila de la matriz por etiqueta)"""
+    matrix = _as_matrix(matrix)
+    if not len(labels):
+        return {}
+    result = forecast_matrix(matrix, **options)
+    trend, bands = result['trend'], result['bands']
+    means = matrix.mean(axis=1)
+
+    forecasts = {}
+    for row, label in enumerate(labels):
+        slope = float(trend['slope'][row])
+        forecasts[label] = {
+            'current': float(matrix[row, -1]),
+            'average': float(means[row]),
+            'slope': slope,
+            'r_squared': float(trend['r_squared'][row]),
+            'trend': trend_direction(slope, means[row]),
+            'forecast': [float(value) for value in result['forecast'][row]],
+            'linear': [float(value) for value in result['linear'][row]],
+            'seasonal': [float(value) for value in result['seasonal'][row]],
+            'band': {'lower': float(bands['lower'][row]), 'upper': float(bands['upper'][row])},
+            'anomaly': bool(bands['anomaly'][row])
+        }
+    return forecasts
+
+
+class ForecastCache:
+    """Resultados por nombre válidos mientras no cambie la firma de los datos de origen"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Any, Any]] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, name: str, signature: Any, compute: Callable[[], Any]) -> Any:
+        with self.lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return entry[1]
+        value = compute()
+        with self.lock:
+            self.misses += 1
+            self._entries[name] = (signature, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+
+
+# Instancia global
+forecast_cache = ForecastCache()
+
+
+def data_signature(column, value=None, filters: Sequence[Any] = ()) -> Tuple:
+    """
+    Firma barata de una tabla para invalidar la caché: cantidad, última fecha, última modificación
+    (updated_at, si la tabla lo tiene) y suma de valores, más los filtros aplicados.
+    updated_at cubre los UPDATE que no cambian fechas ni montos (por ejemplo pending→overdue).
+    """
+    table = column.table
+    measures = [func.count(), func.max(column)]
+    if 'updated_at' in table.c:
+        measures.append(func.max(table.c.updated_at))
+    if value is not None:
+        measures.append(func.sum(value))
+    values = tuple(db.session.execute(select(*measures).select_from(table)).one())
+    return values + (_filters_key(filters),)
+
+
+def _filters_key(filters: Sequence[Any]) -> Tuple:
+    """Texto SQL y parámetros de cada filtro (dos filtros distintos no comparten resultados)"""
+    key = []
+    for expression in filters:
+        compiled = expression.compile()
+        key.append((str(compiled), tuple(sorted(compiled.params.items()))))
+    return tuple(key)
+
+
+def monthly_forecasts(name: str, column, key=None, value=None, agg: str = 'count', months: int = None,
+                      filters: Sequence[Any] = (), now: datetime = None) -> Dict[str, Any]:
+    """Pronósticos mensuales del total y por clave, recalculados solo con datos nuevos"""
+    from services.temporal_aggregation import keyed_time_series, time_series, truncate
+
+    months = months or FORECAST_CONFIG['history_months']
+    end_date = truncate(now or datetime.utcnow(), 'month')
+    signature = (data_signature(column, value, filters), end_date, months)
+
+    def compute():
+        start_date = truncate(end_date - timedelta(days=28 * months), 'month')
+        periods, total = time_series(column, 'month', start_date, end_date, value=value, agg=agg, filters=filters)
+        result = {
+            'periods': [period.strftime('%Y-%m') for period in periods],
+            'total': forecast_batch(['total'], total)['total'] if periods else None,
+            'by_key': {}
+        }
+        if key is not None and periods:
+            _, keys, matrix = keyed_time_series(column, key, 'month', start_date, end_date,
+                                                value=value, agg=agg, filters=filters)
+            result['by_key'] = forecast_batch(keys, matrix)
+        return result
+
+    return forecast_cache.get_or_compute(name, signature, compute)
+
+
+def forecast_confidence(forecast: Dict[str, Any]) -> float:
+    """Confianza del pronóstico a partir del ajuste de la tendencia"""
+    return round(0.5 + 0.45 * max(0.0, min(1.0, forecast['r_squared'])), 2)
+
+
+def top_movers(forecasts: Dict[Any, Dict[str, Any]], limit: int = 3) -> List[Tuple[Any, Dict[str, Any]]]:
+    """Claves con mayor crecimiento o con el último valor anómalo"""
+    ranked = sorted(forecasts.items(), key=lambda item: (item[1]['anomaly'], item[1]['slope']), reverse=True)
+    return [(label, forecast) for label, forecast in ranked[:limit] if forecast['anomaly'] or forecast['trend'] == 'up']
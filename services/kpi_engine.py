@@ -0,0 +1,442 @@
+"""
+Motor incremental de KPIs
+Los KPIs se declaran como numerador/denominador sobre componentes (conteos, sumas o
+valores distintos con ventana en días). Cada componente se mantiene en buckets
+diarios que se ajustan con los cambios confirmados del ORM y se recalculan por
+completo solo en la actualización programada, de modo que leer los KPIs no consulta
+la base de datos. El recalculo corre una vez por cluster (en el líder) y se publica
+en shared_state; cada proceso adopta los buckets publicados y vuelve a aplicar sus
+propios cambios confirmados después de que empezó ese recalculo.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime, date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect, select, func
+from sqlalchemy.orm import Session
+
+from models import db, User, Visit, SecurityReport, Maintenance, Expense
+
+logger = logging.getLogger(__name__)
+
+# Configuración del motor de KPIs
+KPI_CONFIG = {
+    'full_refresh_minutes': 15,   # Recalculo completo programado (corrige cambios de otros workers)
+    'history_size': 96,           # Puntos de historial por KPI
+    'history_interval': 900,      # Segundos mínimos entre puntos de historial
+    'shared_key': 'kpi_engine.state',
+    'journal_size': 5000          # Cambios propios recordados para reaplicar sobre el recalculo publicado
+}
+
+
+@dataclass
+class KPIComponent:
+    """Medida base mantenida por buckets diarios"""
+    name: str
+    model: Any
+    date_column: str = 'created_at'
+    window_days: Optional[int] = None        # None = total histórico
+    where: Dict[str, Any] = field(default_factory=dict)   # Igualdades (tupla = IN)
+    sum_column: Optional[str] = None         # Sumar esta columna en lugar de contar filas
+    distinct_column: Optional[str] = None    # Contar valores distintos de esta columna
+
+    @property
+    def columns(self) -> List[str]:
+        names = [self.date_column, *self.where, self.sum_column, self.distinct_column]
+        return [name for name in names if name]
+
+    def matches(self, values: Dict[str, Any]) -> bool:
+        for name, expected in self.where.items():
+            if isinstance(expected, tuple):
+                if values.get(name) not in expected:
+                    return False
+            elif values.get(name) != expected:
+                return False
+        return True
+
+    def sql_conditions(self) -> List[Any]:
+        conditions = []
+        for name, expected in self.where.items():
+            column = getattr(self.model, name)
+            conditions.append(column.in_(expected) if isinstance(expected, tuple) else column == expected)
+        return conditions
+
+    def bucket_for(self, moment: Optional[datetime]) -> Optional[date]:
+        if self.window_days is None:
+            return None
+        return (moment or datetime.utcnow()).date()
+
+
+@dataclass
+class KPIDefinition:
+    """KPI declarativo: numerador / denominador (o fórmula) sobre componentes"""
+    key: str
+    name: str
+    target_value: float
+    on_track_at: float
+    numerator: str
+    denominator: Optional[str] = None
+    scale: float = 1.0
+    empty_value: float = 0.0                 # Valor si el denominador es cero
+    lower_is_better: bool = False
+    formula: Optional[Callable[[Dict[str, float]], float]] = None
+
+    def evaluate(self, values: Dict[str, float]) -> float:
+        if self.formula is not None:
+            return self.formula(values)
+        numerator = values[self.numerator]
+        if self.denominator is None:
+            return numerator * self.scale
+        denominator = values[self.denominator]
+        return numerator / denominator * self.scale if denominator else self.empty_value
+
+    def progress(self, value: float) -> float:
+        if self.lower_is_better:
+            return max(0, 100 - (value / self.target_value) * 100)
+        return min(100, (value / self.target_value) * 100)
+
+    def status(self, value: float) -> str:
+        on_track = value <= self.on_track_at if self.lower_is_better else value >= self.on_track_at
+        return "on_track" if on_track else "at_risk"
+
+
+def _financial_health(values: Dict[str, float]) -> float:
+    # Ingresos estimados: $50 por usuario (en producción calcular real)
+    estimated_income = values['users_total'] * 50
+    return (estimated_income - values['expenses_total']) / estimated_income * 100 if estimated_income > 0 else 0
+
+
+KPI_COMPONENTS = [
+    KPIComponent('users_total', User),
+    KPIComponent('active_users_7d', Visit, window_days=7, distinct_column='resident_id'),
+    KPIComponent('security_reports_30d', SecurityReport, window_days=30),
+    KPIComponent('maintenance_30d', Maintenance, window_days=30),
+    KPIComponent('maintenance_completed_30d', Maintenance, window_days=30, where={'status': 'completed'}),
+    KPIComponent('expenses_total', Expense, sum_column='amount')
+]
+
+KPI_DEFINITIONS = [
+    KPIDefinition('user_growth', 'Crecimiento de Usuarios', target_value=100, on_track_at=80,
+                  numerator='users_total'),
+    KPIDefinition('user_engagement', 'Engagement de Usuarios', target_value=70, on_track_at=50,
+                  numerator='active_users_7d', denominator='users_total', scale=100),
+    KPIDefinition('security_incidents', 'Incidentes de Seguridad', target_value=5, on_track_at=3,
+                  numerator='security_reports_30d', lower_is_better=True),
+    KPIDefinition('maintenance_efficiency', 'Eficiencia de Mantenimiento', target_value=90, on_track_at=80,
+                  numerator='maintenance_completed_30d', denominator='maintenance_30d', scale=100,
+                  empty_value=100),
+    KPIDefinition('financial_health', 'Salud Financiera', target_value=85, on_track_at=70,
+                  numerator='expenses_total', formula=_financial_health)
+]
+
+
+class KPIEngine:
+    """Estado incremental de componentes e historial de KPIs"""
+
+    def __init__(self, components: List[KPIComponent] = None, definitions: List[KPIDefinition] = None):
+        self.components = {component.name: component for component in (components or KPI_COMPONENTS)}
+        self.definitions = {definition.key: definition for definition in (definitions or KPI_DEFINITIONS)}
+        self.lock = threading.RLock()
+        self._buckets: Dict[str, Dict[Optional[date], Any]] = {}
+        self.history: Dict[str, deque] = {key: deque(maxlen=KPI_CONFIG['history_size']) for key in self.definitions}
+        self.last_full_refresh = None
+        self._stale = False                # Marcado a mano: no adoptar publicaciones hasta recalcular
+        self._last_history_at = 0.0
+        self._journal: deque = deque(maxlen=KPI_CONFIG['journal_size'])   # (época, deltas) confirmados aquí
+        self.is_running = False
+        self.stats = {'full_refreshes': 0, 'deltas_applied': 0, 'snapshots_adopted': 0}
+
+    # Recalculo completo
+
+    def _load_component(self, component: KPIComponent, today: date) -> Dict[Optional[date], Any]:
+        """Buckets de un componente calculados en la base de datos"""
+        from services.temporal_aggregation import aggregate, parse_bucket
+
+        model = component.model
+        value_column = getattr(model, component.sum_column) if component.sum_column else None
+        agg = 'sum' if component.sum_column else 'count'
+
+        if component.window_days is None:
+            if component.distinct_column:
+                rows = db.session.execute(
+                    select(getattr(model, component.distinct_column), func.count())
+                    .where(*component.sql_conditions())
+                    .group_by(getattr(model, component.distinct_column))
+                ).all()
+                return {None: Counter({key: count for key, count in rows})}
+            measured = func.coalesce(func.sum(value_column), 0) if value_column is not None else func.count()
+            total = db.session.execute(select(measured).select_from(model).where(*component.sql_conditions())).scalar()
+            return {None: float(total or 0)}
+
+        start = datetime.combine(today - timedelta(days=component.window_days - 1), datetime.min.time())
+        date_column = getattr(model, component.date_column)
+        buckets: Dict[Optional[date], Any] = {}
+
+        if component.distinct_column:
+            for day, key, count in aggregate(date_column, ['day'], start, filters=component.sql_conditions(),
+                                             keys=[getattr(model, component.distinct_column)]):
+                buckets.setdefault(parse_bucket(day).date(), Counter())[key] += count
+        else:
+            for day, measured in aggregate(date_column, ['day'], start, value=value_column, agg=agg,
+                                           filters=component.sql_conditions()):
+                buckets[parse_bucket(day).date()] = float(measured or 0)
+        return buckets
+
+    def refresh(self):
+        """Recalcular todos los componentes desde la base de datos y publicar el resultado"""
+        started = time.time()
+        today = datetime.utcnow().date()
+        loaded = {name: self._load_component(component, today) for name, component in self.components.items()}
+        with self.lock:
+            self._buckets = loaded
+            self.last_full_refresh = datetime.utcnow()
+            self._stale = False
+            self.stats['full_refreshes'] += 1
+            self._forget_journal(started)
+        self.record_history(force=True)
+        self.publish(started)
+
+    def mark_stale(self):
+        """Forzar recalculo completo en la próxima lectura (p. ej. tras cambios masivos por SQL)"""
+        with self.lock:
+            self.last_full_refresh = None
+            self._stale = True
+
+    def ensure_loaded(self):
+        if self.sync():
+            return
+        with self.lock:
+            loaded = self.last_full_refresh is not None
+        if not loaded:
+            self.refresh()
+
+    # Estado compartido entre procesos
+
+    def publish(self, started: float):
+        """Publicar buckets e historial del último recalculo para los demás procesos"""
+        from shared_state import shared_state
+
+        with self.lock:
+            state = {
+                'started_at': started,
+                'refreshed_at': self.last_full_refresh.isoformat(),
+                'buckets': {name: _encode_buckets(buckets, self.components[name])
+                            for name, buckets in self._buckets.items() if name in self.components},
+                'history': {key: list(points) for key, points in self.history.items()}
+            }
+        try:
+            shared_state.publish(KPI_CONFIG['shared_key'], state)
+        except Exception as e:
+            logger.warning(f'No se pudo publicar el recalculo de KPIs: {e}')
+
+    def sync(self) -> bool:
+        """Adoptar el recalculo publicado si es más nuevo que el propio; False si no hay publicación"""
+        from shared_state import shared_state
+
+        if self._stale:
+            return False
+        state = shared_state.read(KPI_CONFIG['shared_key'])
+        if not state:
+            return False
+        refreshed_at = datetime.fromisoformat(state['refreshed_at'])
+        with self.lock:
+            if self.last_full_refresh is not None and refreshed_at <= self.last_full_refresh:
+                return True
+            self._buckets = {name: _decode_buckets(buckets, self.components[name])
+                             for name, buckets in state['buckets'].items() if name in self.components}
+            self.last_full_refresh = refreshed_at
+            for key, points in state['history'].items():
+                if key in self.history:
+                    self.history[key] = deque(points, maxlen=KPI_CONFIG['history_size'])
+            # Los cambios confirmados aquí durante o después del recalculo pueden no estar en él
+            self._forget_journal(state['started_at'])
+            for _, deltas in self._journal:
+                self._apply(deltas)
+            self.stats['snapshots_adopted'] += 1
+        return True
+
+    def _forget_journal(self, before: float):
+        while self._journal and self._journal[0][0] < before:
+            self._journal.popleft()
+
+    # Deltas
+
+    def apply_deltas(self, deltas: List[Tuple[str, Optional[date], Any, float]]):
+        """Aplicar cambios confirmados: (componente, día, clave distinta, cantidad)"""
+        with self.lock:
+            self._journal.append((time.time(), deltas))
+            if self.last_full_refresh is None:
+                return
+            self._apply(deltas)
+        self.record_history()
+
+    def _apply(self, deltas: List[Tuple[str, Optional[date], Any, float]]):
+        # Se llama con el lock tomado
+        for name, day, key, amount in deltas:
+            buckets = self._buckets.setdefault(name, {})
+            if self.components[name].distinct_column:
+                counter = buckets.setdefault(day, Counter())
+                counter[key] += amount
+                if counter[key] <= 0:
+                    del counter[key]
+            else:
+                buckets[day] = buckets.get(day, 0.0) + amount
+        self.stats['deltas_applied'] += len(deltas)
+
+    # Lectura
+
+    def component_value(self, name: str, today: date = None) -> float:
+        component = self.components[name]
+        buckets = self._buckets.get(name, {})
+
+        if component.window_days is None:
+            days = [None]
+        else:
+            today = today or datetime.utcnow().date()
+            days = [today - timedelta(days=offset) for offset in range(component.window_days)]
+
+        if component.distinct_column:
+            keys = set()
+            for day in days:
+                keys.update(key for key, count in buckets.get(day, {}).items() if count > 0)
+            return float(len(keys))
+        return float(sum(buckets.get(day, 0.0) for day in days))
+
+    def values(self) -> Dict[str, Dict[str, Any]]:
+        """Valor, progreso y estado de cada KPI"""
+        self.ensure_loaded()
+        with self.lock:
+            today = datetime.utcnow().date()
+            components = {name: self.component_value(name, today) for name in self.components}
+            updated = self.last_full_refresh
+
+        result = {}
+        for key, definition in self.definitions.items():
+            value = definition.evaluate(components)
+            result[key] = {
+                'name': definition.name,
+                'current_value': value,
+                'target_value': definition.target_value,
+                'status': definition.status(value),
+                'progress_percentage': definition.progress(value),
+                'last_updated': updated
+            }
+        return result
+
+    def record_history(self, force: bool = False):
+        """Agregar un punto de historial si pasó el intervalo mínimo"""
+        now = time.time()
+        if not force and now - self._last_history_at < KPI_CONFIG['history_interval']:
+            return
+        self._last_history_at = now
+        timestamp = datetime.utcnow().isoformat()
+        for key, kpi in self.values().items():
+            history = self.history[key]
+            if history and history[-1]['timestamp'][:16] == timestamp[:16]:
+                history.pop()
+            history.append({'timestamp': timestamp, 'value': kpi['current_value']})
+
+    def get_history(self, key: str = None) -> Dict[str, List[Dict[str, Any]]]:
+        self.sync()
+        keys = [key] if key else list(self.history)
+        return {name: list(self.history[name]) for name in keys}
+
+    # Programación
+
+    def start_scheduler(self, app):
+        """Recalculo completo periódico una vez por cluster; los demás procesos adoptan lo publicado"""
+        if self.is_running:
+            return
+        from cluster_scheduler import cluster_scheduler
+
+        cluster_scheduler.interval('kpi_engine.refresh', KPI_CONFIG['full_refresh_minutes'] * 60, self.refresh,
+                                   jitter=30)
+        self.is_running = True
+
+
+def _encode_buckets(buckets: Dict[Optional[date], Any], component: KPIComponent) -> List[list]:
+    """Buckets como JSON: [día ISO o None, valor] o [día, [[clave, cantidad], ...]] (conserva el tipo de la clave)"""
+    if component.distinct_column:
+        return [[day.isoformat() if day else None, [[key, count] for key, count in counter.items()]]
+                for day, counter in buckets.items()]
+    return [[day.isoformat() if day else None, value] for day, value in buckets.items()]
+
+
+def _decode_buckets(rows: List[list], component: KPIComponent) -> Dict[Optional[date], Any]:
+    buckets = {}
+    for day, value in rows:
+        day = date.fromisoformat(day) if day else None
+        buckets[day] = Counter({key: count for key, count in value}) if component.distinct_column else float(value)
+    return buckets
+
+
+# Instancia global
+kpi_engine = KPIEngine()
+
+_TRACKED_MODELS = tuple({component.model for component in KPI_COMPONENTS})
+
+
+def _row_values(obj, columns: List[str], previous: bool) -> Dict[str, Any]:
+    """Valores actuales o anteriores al cambio de las columnas indicadas"""
+    state = inspect(obj)
+    values = {}
+    for name in columns:
+        history = state.attrs[name].history
+        if previous and history.deleted:
+            values[name] = history.deleted[0]
+        elif previous and history.added and not history.unchanged:
+            values[name] = None
+        else:
+            values[name] = getattr(obj, name)
+    return values
+
+
+def _contributions(obj, previous: bool) -> List[Tuple[str, Optional[date], Any, float]]:
+    contributions = []
+    for component in kpi_engine.components.values():
+        if not isinstance(obj, component.model):
+            continue
+        values = _row_values(obj, component.columns, previous)
+        if not component.matches(values):
+            continue
+        amount = float(values[component.sum_column] or 0) if component.sum_column else 1.0
+        key = values[component.distinct_column] if component.distinct_column else None
+        contributions.append((component.name, component.bucket_for(values[component.date_column]), key, amount))
+    return contributions
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_kpi_deltas(session, flush_context, instances):
+    """Registrar aportes de filas nuevas, modificadas y eliminadas hasta el commit"""
+    deltas = session.info.setdefault('kpi_deltas', [])
+    for obj in session.new:
+        if isinstance(obj, _TRACKED_MODELS):
+            deltas.extend(_contributions(obj, previous=False))
+    for obj in session.dirty:
+        if isinstance(obj, _TRACKED_MODELS) and session.is_modified(obj):
+            deltas.extend((name, day, key, -amount) for name, day, key, amount in _contributions(obj, previous=True))
+            deltas.extend(_contributions(obj, previous=False))
+    for obj in session.deleted:
+        if isinstance(obj, _TRACKED_MODELS):
+            deltas.extend((name, day, key, -amount) for name, day, key, amount in _contributions(obj, previous=True))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_kpi_deltas(session):
+    deltas = session.info.pop('kpi_deltas', None)
+    if deltas:
+        try:
+            kpi_engine.apply_deltas(deltas)
+        except Exception as e:
+            logger.error(f'Error aplicando cambios de KPIs: {e}')
+            kpi_engine.mark_stale()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_kpi_deltas(session):
+    session.info.pop('kpi_deltas', None)
@@ -0,0 +1,321 @@
+"""
+Motor de disponibilidad de reservas
+Mantiene un mapa de bits de franjas ocupadas por espacio y día para resolver
+conflictos y horarios libres sin recorrer reservas. La tabla reservation_slots,
+con restricción única (espacio, franja), impide reservas superpuestas aun con
+solicitudes concurrentes.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import db, Reservation, ReservationSlot
+
+logger = logging.getLogger(__name__)
+
+# Configuración de disponibilidad
+RESERVATION_AVAILABILITY_CONFIG = {
+    'slot_minutes': 15,
+    'opening_hour': 8,
+    'closing_hour': 24,
+    'blocking_statuses': ('pending', 'approved'),  # Estados que ocupan el espacio
+    'cache_ttl': 60,         # Segundos de validez del mapa en memoria (otros workers pueden escribir)
+    'max_cache_entries': 5000,
+    'max_days': 60
+}
+
+SLOT_MINUTES = RESERVATION_AVAILABILITY_CONFIG['slot_minutes']
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+BLOCKING_STATUSES = RESERVATION_AVAILABILITY_CONFIG['blocking_statuses']
+
+
+def slot_mask(first: int, last: int) -> int:
+    """Máscara de bits para las franjas [first, last)"""
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+
+def split_by_day(start: datetime, end: datetime) -> List[Tuple[date, int, int]]:
+    """Dividir un intervalo en (día, primera franja, última franja exclusiva), redondeando hacia afuera"""
+    parts = []
+    day = start.date()
+    while _day_start(day) < end:
+        day_start = _day_start(day)
+        day_end = day_start + timedelta(days=1)
+        segment_start = max(start, day_start)
+        segment_end = min(end, day_end)
+        first = int((segment_start - day_start).total_seconds() // (SLOT_MINUTES * 60))
+        last = -int(-(segment_end - day_start).total_seconds() // (SLOT_MINUTES * 60))
+        if last > first:
+            parts.append((day, first, last))
+        day += timedelta(days=1)
+    return parts
+
+
+def slot_starts(start: datetime, end: datetime) -> List[datetime]:
+    """Inicio de cada franja cubierta por el intervalo"""
+    starts = []
+    for day, first, last in split_by_day(start, end):
+        day_start = _day_start(day)
+        starts.extend(day_start + timedelta(minutes=SLOT_MINUTES * index) for index in range(first, last))
+    return starts
+
+
+def _slot_label(index: int) -> str:
+    minutes = index * SLOT_MINUTES
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def bitmap_runs(bitmap: int, first: int = 0, last: int = SLOTS_PER_DAY, busy: bool = True) -> List[Dict[str, str]]:
+    """Intervalos contiguos de franjas ocupadas (busy=True) o libres dentro de [first, last)"""
+    runs = []
+    run_start = None
+    for index in range(first, last + 1):
+        inside = index < last and bool(bitmap >> index & 1) == busy
+        if inside and run_start is None:
+            run_start = index
+        elif not inside and run_start is not None:
+            runs.append({'start': _slot_label(run_start), 'end': _slot_label(index)})
+            run_start = None
+    return runs
+
+
+class AvailabilityEngine:
+    """Índice en memoria de franjas ocupadas por espacio y día"""
+
+    def __init__(self, ttl: int = None):
+        self.ttl = ttl or RESERVATION_AVAILABILITY_CONFIG['cache_ttl']
+        self._bitmaps = {}
+        self.lock = threading.Lock()
+
+    def load_range(self, start_day: date, days: int,
+                   space_types: Iterable[str] = None) -> Dict[Tuple[str, date], int]:
+        """Cargar con una sola consulta los mapas de bits de un rango de días"""
+        range_start = _day_start(start_day)
+        range_end = range_start + timedelta(days=days)
+
+        stmt = select(Reservation.space_type, Reservation.start_time, Reservation.end_time).where(
+            Reservation.status.in_(BLOCKING_STATUSES),
+            Reservation.start_time < range_end,
+            Reservation.end_time > range_start
+        )
+        if space_types is not None:
+            space_types = list(space_types)
+            stmt = stmt.where(Reservation.space_type.in_(space_types))
+
+        bitmaps = {}
+        for space_type in space_types or []:
+            for offset in range(days):
+                bitmaps[(space_type, start_day + timedelta(days=offset))] = 0
+
+        for space_type, start, end in db.session.execute(stmt):
+            for day, first, last in split_by_day(max(start, range_start), min(end, range_end)):
+                key = (space_type, day)
+                bitmaps[key] = bitmaps.get(key, 0) | slot_mask(first, last)
+
+        expires_at = time.time() + self.ttl
+        with self.lock:
+            if len(self._bitmaps) + len(bitmaps) > RESERVATION_AVAILABILITY_CONFIG['max_cache_entries']:
+                self._evict_expired()
+            for key, bitmap in bitmaps.items():
+                self._bitmaps[key] = (expires_at, bitmap)
+
+        return bitmaps
+
+    def _evict_expired(self):
+        """Descartar mapas vencidos (requiere lock)"""
+        now = time.time()
+        for key in [key for key, (expires_at, _) in self._bitmaps.items() if expires_at <= now]:
+            del self._bitmaps[key]
+
+    def get_day_bitmap(self, space_type: str, day: date) -> int:
+        """Mapa de bits de franjas ocupadas de un espacio en un día"""
+        entry = self._bitmaps.get((space_type, day))
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+        return self.load_range(day, 1, [space_type])[(space_type, day)]
+
+    def invalidate(self, space_type: str, start: Optional[datetime], end: Optional[datetime]):
+        """Invalidar los días afectados por un intervalo"""
+        if not space_type or start is None or end is None:
+            return
+        with self.lock:
+            for day, _, _ in split_by_day(start, end):
+                self._bitmaps.pop((space_type, day), None)
+
+    def clear(self):
+        with self.lock:
+            self._bitmaps.clear()
+
+    def is_available(self, space_type: str, start: datetime, end: datetime,
+                     ignore: Reservation = None) -> bool:
+        """Verificar que ninguna franja del intervalo esté ocupada (ignorando una reserva existente)"""
+        ignored = {}
+        if (ignore is not None and ignore.id is not None and ignore.space_type == space_type
+                and ignore.status in BLOCKING_STATUSES):
+            ignored = {day: slot_mask(first, last)
+                       for day, first, last in split_by_day(ignore.start_time, ignore.end_time)}
+
+        for day, first, last in split_by_day(start, end):
+            bitmap = self.get_day_bitmap(space_type, day) & ~ignored.get(day, 0)
+            if bitmap & slot_mask(first, last):
+                return False
+        return True
+
+    def busy_intervals(self, space_type: str, day: date) -> List[Dict[str, str]]:
+        """Horarios ocupados de un espacio en un día"""
+        return bitmap_runs(self.get_day_bitmap(space_type, day))
+
+    def free_intervals(self, bitmap: int, day: date, now: datetime = None) -> List[Dict[str, str]]:
+        """Horarios libres dentro del horario de apertura, sin franjas ya pasadas"""
+        first = RESERVATION_AVAILABILITY_CONFIG['opening_hour'] * 60 // SLOT_MINUTES
+        last = RESERVATION_AVAILABILITY_CONFIG['closing_hour'] * 60 // SLOT_MINUTES
+        now = now or datetime.now()
+        if day == now.date():
+            first = max(first, -int(-(now - _day_start(day)).total_seconds() // (SLOT_MINUTES * 60)))
+        elif day < now.date():
+            return []
+        return bitmap_runs(bitmap, first, last, busy=False)
+
+    def _configured_spaces(self) -> Dict[str, Any]:
+        if has_app_context():
+            return current_app.config.get('COMMON_SPACES', {})
+        return {}
+
+    def free_slots(self, days: int = 14, space_types: List[str] = None,
+                   start_day: date = None) -> Dict[str, Any]:
+        """Horarios libres de los próximos días para todos los espacios, con una sola consulta"""
+        start_day = start_day or date.today()
+        days = max(1, min(days, RESERVATION_AVAILABILITY_CONFIG['max_days']))
+        configured = self._configured_spaces()
+
+        if space_types is None:
+            bitmaps = self.load_range(start_day, days)
+            space_types = sorted(set(configured) | {space_type for space_type, _ in bitmaps})
+        else:
+            bitmaps = self.load_range(start_day, days, space_types)
+
+        now = datetime.now()
+        spaces = {}
+        for space_type in space_types:
+            space_config = configured.get(space_type, {})
+            horizon = min(days, space_config.get('advance_booking_days', days))
+            spaces[space_type] = {
+                'name': space_config.get('name', space_type),
+                'days': {
+                    (start_day + timedelta(days=offset)).isoformat(): self.free_intervals(
+                        bitmaps.get((space_type, start_day + timedelta(days=offset)), 0),
+                        start_day + timedelta(days=offset), now)
+                    for offset in range(horizon)
+                }
+            }
+
+        return {
+            'start_date': start_day.isoformat(),
+            'days': days,
+            'slot_minutes': SLOT_MINUTES,
+            'spaces': spaces
+        }
+
+    def spaces_summary(self, day: date) -> Dict[str, Any]:
+        """Resumen de disponibilidad de cada espacio en un día"""
+        configured = self._configured_spaces()
+        bitmaps = self.load_range(day, 1, list(configured) or None)
+        space_types = sorted(set(configured) | {space_type for space_type, _ in bitmaps})
+
+        summary = {}
+        for space_type in space_types:
+            bitmap = bitmaps.get((space_type, day), 0)
+            free = self.free_intervals(bitmap, day)
+            summary[space_type] = {
+                'space': configured.get(space_type, {'name': space_type}),
+                'reserved_hours': sorted({index * SLOT_MINUTES // 60 for index in range(SLOTS_PER_DAY)
+                                          if bitmap >> index & 1}),
+                'free_slots': free,
+                'available': bool(free)
+            }
+        return summary
+
+    def sync_slots(self, reservation: Reservation):
+        """Ajustar las franjas reclamadas por una reserva a su horario y estado actual"""
+        wanted = set()
+        if (reservation.status or 'pending') in BLOCKING_STATUSES and reservation.start_time and reservation.end_time:
+            wanted = set(slot_starts(reservation.start_time, reservation.end_time))
+
+        kept = [slot for slot in reservation.slots
+                if slot.space_type == reservation.space_type and slot.slot_start in wanted]
+        claimed = {slot.slot_start for slot in kept}
+        added = [ReservationSlot(space_type=reservation.space_type, slot_start=slot_start)
+                 for slot_start in sorted(wanted - claimed)]
+
+        if added or len(kept) != len(reservation.slots):
+            reservation.slots = kept + added
+
+
+# Instancia global
+availability_engine = AvailabilityEngine()
+
+_TRACKED_ATTRIBUTES = ('status', 'start_time', 'end_time', 'space_type')
+
+
+def _previous_values(reservation: Reservation) -> Tuple[Any, Any, Any]:
+    state = inspect(reservation)
+    values = []
+    for name in ('space_type', 'start_time', 'end_time'):
+        history = state.attrs[name].history
+        values.append(history.deleted[0] if history.deleted else getattr(reservation, name))
+    return tuple(values)
+
+
+@event.listens_for(Session, 'before_flush')
+def _sync_reservation_slots(session, flush_context, instances):
+    """Mantener reservation_slots y el índice en memoria sincronizados con las reservas"""
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Reservation):
+            continue
+        if obj not in session.new:
+            state = inspect(obj)
+            if not any(state.attrs[name].history.has_changes() for name in _TRACKED_ATTRIBUTES):
+                continue
+            availability_engine.invalidate(*_previous_values(obj))
+        availability_engine.sync_slots(obj)
+        availability_engine.invalidate(obj.space_type, obj.start_time, obj.end_time)
+
+    for obj in session.deleted:
+        if isinstance(obj, Reservation):
+            availability_engine.invalidate(*_previous_values(obj))
+
+
+def backfill_reservation_slots() -> int:
+    """Reclamar franjas para reservas vigentes creadas antes de existir reservation_slots"""
+    pending = db.session.execute(
+        select(Reservation).where(
+            Reservation.status.in_(BLOCKING_STATUSES),
+            Reservation.end_time >= datetime.now(),
+            ~Reservation.slots.any()
+        ).order_by(Reservation.created_at)
+    ).scalars().all()
+
+    claimed = 0
+    for reservation in pending:
+        try:
+            with db.session.begin_nested():
+                availability_engine.sync_slots(reservation)
+            claimed += 1
+        except IntegrityError:
+            logger.warning(f'Reserva {reservation.id} superpuesta con otra; no se reclamaron sus franjas')
+    db.session.commit()
+    return claimed
@@ -0,0 +1,197 @@
+"""
+Caché de resultados por intervalo
+Guarda la respuesta serializada de endpoints costosos por (endpoint, parámetros,
+intervalo de tiempo), p. ej. el bloque de 5 minutos en curso. Las claves
+consultadas se recalculan en segundo plano poco antes del cambio de intervalo y
+las respuestas llevan ETag y Cache-Control para que navegadores y proxies las
+reutilicen hasta el final del intervalo.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+from flask import current_app, request
+
+from slo_tracker import note_cache_miss
+
+logger = logging.getLogger(__name__)
+
+# Configuración de la caché de resultados
+RESULT_CACHE_CONFIG = {
+    'bucket_seconds': 300,      # Intervalo de validez de cada resultado
+    'precompute_lead': 30,      # Segundos antes del cambio de intervalo para precalcular
+    'max_entries': 256,
+    'cache_control': 'public'   # 'private' si las respuestas dependen del usuario
+}
+
+
+@dataclass
+class CachedResult:
+    """Respuesta serializada de un intervalo"""
+    body: bytes
+    mimetype: str
+    etag: str
+    bucket: int
+    expires_at: float
+
+
+@dataclass
+class HotKey:
+    """Clave consultada recientemente, con lo necesario para recalcularla"""
+    view: Callable
+    path: str
+    query_string: str
+    seconds: int
+    last_bucket: int
+
+
+class ResultCache:
+    """Caché en memoria del worker con precálculo del próximo intervalo"""
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or RESULT_CACHE_CONFIG['max_entries']
+        self._entries: 'OrderedDict[Tuple[str, str, int], CachedResult]' = OrderedDict()
+        self._hot: Dict[Tuple[str, str], HotKey] = {}
+        self.lock = threading.Lock()
+        self.is_running = False
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'precomputed': 0}
+
+    @staticmethod
+    def bucket_for(timestamp: float, seconds: int) -> int:
+        return int(timestamp // seconds)
+
+    @staticmethod
+    def etag_for(endpoint: str, params: str, bucket: int) -> str:
+        # Determinista entre workers: el contenido se considera equivalente dentro del intervalo
+        return hashlib.md5(f'{endpoint}?{params}@{bucket}'.encode()).hexdigest()
+
+    def get(self, endpoint: str, params: str, bucket: int) -> Optional[CachedResult]:
+        with self.lock:
+            entry = self._entries.get((endpoint, params, bucket))
+            if entry is not None:
+                self._entries.move_to_end((endpoint, params, bucket))
+            return entry
+
+    def store(self, endpoint: str, params: str, bucket: int, seconds: int, response) -> CachedResult:
+        entry = CachedResult(body=response.get_data(), mimetype=response.mimetype,
+                             etag=self.etag_for(endpoint, params, bucket), bucket=bucket,
+                             expires_at=(bucket + 1) * seconds)
+        with self.lock:
+            self._entries[(endpoint, params, bucket)] = entry
+            # Descartar intervalos vencidos de la misma clave y luego los menos usados
+            for key in [key for key in self._entries if key[:2] == (endpoint, params) and key[2] < bucket - 1]:
+                del self._entries[key]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self._hot.clear()
+
+    def _remember(self, endpoint: str, params: str, view: Callable, seconds: int, bucket: int):
+        with self.lock:
+            self._hot[(endpoint, params)] = HotKey(view, request.path, params, seconds, bucket)
+
+    def respond(self, entry: CachedResult, now: float):
+        """Respuesta con ETag y Cache-Control hasta el final del intervalo (304 si el cliente ya la tiene)"""
+        max_age = max(0, int(entry.expires_at - now))
+        cache_control = f"{RESULT_CACHE_CONFIG['cache_control']}, max-age={max_age}"
+
+        if entry.etag in request.if_none_match:
+            self.stats['not_modified'] += 1
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    # Precálculo
+
+    def precompute(self, app, now: float = None) -> int:
+        """Calcular el próximo intervalo de las claves recientes cuyo intervalo está por terminar"""
+        now = time.time() if now is None else now
+        computed = 0
+        with self.lock:
+            hot = list(self._hot.items())
+
+        for (endpoint, params), key in hot:
+            current = self.bucket_for(now, key.seconds)
+            if key.last_bucket < current - 1:
+                # Sin consultas en el último intervalo: dejar de precalcular
+                with self.lock:
+                    self._hot.pop((endpoint, params), None)
+                continue
+            if (current + 1) * key.seconds - now > RESULT_CACHE_CONFIG['precompute_lead']:
+                continue
+            if self.get(endpoint, params, current + 1) is not None:
+                continue
+            try:
+                with app.test_request_context(key.path, query_string=key.query_string):
+                    response = app.make_response(key.view())
+                    if response.status_code == 200:
+                        self.store(endpoint, params, current + 1, key.seconds, response)
+                        computed += 1
+            except Exception as e:
+                logger.warning(f'No se pudo precalcular {endpoint}: {e}')
+
+        self.stats['precomputed'] += computed
+        return computed
+
+    def start_precompute(self, app, interval: float = 5):
+        """Precálculo periódico en cada worker (la caché vive en su memoria)
+
+        Solo con PROCESS_ROLE=all: los procesos web no tienen hilos de fondo y el
+        worker no atiende estos requests, así que con procesos separados el
+        primer request de cada intervalo calcula el valor.
+        """
+        if self.is_running:
+            return
+        from cluster_scheduler import cluster_scheduler
+
+        cluster_scheduler.interval('result_cache.precompute', interval, lambda: self.precompute(app),
+                                   scope='local', app_context=False, timeout=60, roles=('all',),
+                                   description='Precalcular el próximo intervalo de las claves recientes')
+        self.is_running = True
+
+
+# Instancia global
+result_cache = ResultCache()
+
+
+def cached_endpoint(endpoint: str, seconds: int = None):
+    """Decorador de vistas GET: respuesta cacheada por parámetros e intervalo de tiempo"""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            bucket_seconds = seconds or RESULT_CACHE_CONFIG['bucket_seconds']
+            now = time.time()
+            bucket = ResultCache.bucket_for(now, bucket_seconds)
+            params = urlencode(sorted(request.args.items(multi=True)))
+            result_cache._remember(endpoint, params, lambda: view(*args, **kwargs), bucket_seconds, bucket)
+
+            entry = result_cache.get(endpoint, params, bucket)
+            if entry is not None:
+                result_cache.stats['hits'] += 1
+                return result_cache.respond(entry, now)
+
+            result_cache.stats['misses'] += 1
+            note_cache_miss()
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response   # Los errores no se cachean
+            return result_cache.respond(result_cache.store(endpoint, params, bucket, bucket_seconds, response), now)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,206 @@
+"""
+Agregación temporal
+Agrupa por hora, día, semana, mes, día de la semana u hora del día en la base de
+datos (strftime en SQLite, date_trunc/extract en PostgreSQL) y devuelve series
+densas como arreglos NumPy, incluido el mapa de calor 7×24 día/hora.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, func, cast, extract, Integer, literal
+
+from models import db
+from optional_dependencies import get_numpy
+
+np = get_numpy()
+
+# Unidades de agrupación soportadas
+PERIOD_UNITS = ('hour', 'day', 'week', 'month')
+CYCLIC_UNITS = {'weekday': 7, 'hour_of_day': 24}   # Índices 0 = lunes / 0 = medianoche
+
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+AGGREGATES = {
+    'count': lambda value: func.count(value),
+    'sum': lambda value: func.coalesce(func.sum(value), 0),
+    'avg': lambda value: func.avg(value),
+    'max': lambda value: func.max(value),
+    'min': lambda value: func.min(value)
+}
+
+_SQLITE_FORMATS = {
+    'hour': '%Y-%m-%d %H:00:00',
+    'day': '%Y-%m-%d',
+    'month': '%Y-%m-01'
+}
+
+
+def _dialect() -> str:
+    return db.session.get_bind().dialect.name
+
+
+def bucket_expression(column, unit: str, dialect: str = None):
+    """Expresión SQL del bucket de una columna de fecha según el motor"""
+    dialect = dialect or _dialect()
+
+    if dialect == 'sqlite':
+        if unit in _SQLITE_FORMATS:
+            return func.strftime(_SQLITE_FORMATS[unit], column)
+        if unit == 'week':
+            # Lunes de la semana (ISO)
+            return func.date(column, '-6 days', 'weekday 1')
+        if unit == 'weekday':
+            # strftime('%w'): 0 = domingo → 0 = lunes
+            return (cast(func.strftime('%w', column), Integer) + 6) % 7
+        if unit == 'hour_of_day':
+            return cast(func.strftime('%H', column), Integer)
+    else:
+        if unit in PERIOD_UNITS:
+            return func.date_trunc(unit, column)
+        if unit == 'weekday':
+            return cast(extract('isodow', column), Integer) - 1
+        if unit == 'hour_of_day':
+            return cast(extract('hour', column), Integer)
+
+    raise ValueError(f'Unidad de agrupación no soportada: {unit}')
+
+
+def parse_bucket(value) -> datetime:
+    """Bucket devuelto por la base de datos (texto en SQLite, fecha en PostgreSQL) como datetime"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return datetime(value.year, value.month, value.day)
+
+
+def truncate(moment: datetime, unit: str) -> datetime:
+    """Inicio del período que contiene un instante (mismo criterio que en SQL)"""
+    if unit == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == 'day':
+        return day
+    if unit == 'week':
+        return day - timedelta(days=day.weekday())
+    if unit == 'month':
+        return day.replace(day=1)
+    raise ValueError(f'Unidad de agrupación no soportada: {unit}')
+
+
+def period_starts(start: datetime, end: datetime, unit: str) -> List[datetime]:
+    """Inicios de todos los períodos que se superponen con [start, end)"""
+    current = truncate(start, unit)
+    periods = []
+    while current < end:
+        periods.append(current)
+        if unit == 'hour':
+            current += timedelta(hours=1)
+        elif unit == 'day':
+            current += timedelta(days=1)
+        elif unit == 'week':
+            current += timedelta(weeks=1)
+        else:
+            current = current.replace(year=current.year + 1, month=1) if current.month == 12 \
+                else current.replace(month=current.month + 1)
+    return periods
+
+
+def aggregate(column, units: Sequence[str], start: datetime = None, end: datetime = None,
+              value=None, agg: str = 'count', filters: Sequence[Any] = (), keys: Sequence[Any] = ()) -> List[Tuple]:
+    """Filas (bucket_1, ..., bucket_n, clave_1, ..., clave_m, valor) agrupadas en la base de datos"""
+    dialect = _dialect()
+    buckets = [bucket_expression(column, unit, dialect).label(f'bucket_{i}') for i, unit in enumerate(units)]
+    conditions = list(filters)
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        conditions.append(column < end)
+
+    # Los buckets se calculan en una subconsulta y se agrupa por sus columnas, así los
+    # parámetros de la expresión no se repiten en GROUP BY (PostgreSQL lo rechazaría)
+    measured = value if value is not None else literal(1) if agg == 'count' else column
+    key_labels = [key.label(f'key_{i}') for i, key in enumerate(keys)]
+    rows = select(*buckets, *key_labels, measured.label('value')).where(column.isnot(None), *conditions).subquery()
+    bucket_columns = [rows.c[f'bucket_{i}'] for i in range(len(units))] + [rows.c[f'key_{i}'] for i in range(len(keys))]
+    statement = select(*bucket_columns, AGGREGATES[agg](rows.c.value)).group_by(*bucket_columns)
+    return db.session.execute(statement).all()
+
+
+def _zeros(shape):
+    if np is not None:
+        return np.zeros(shape, dtype=np.float64)
+    if isinstance(shape, tuple):
+        return [[0.0] * shape[1] for _ in range(shape[0])]
+    return [0.0] * shape
+
+
+def time_series(column, unit: str, start: datetime, end: datetime, value=None, agg: str = 'count',
+                filters: Sequence[Any] = ()) -> Tuple[List[datetime], Any]:
+    """Serie densa por período en [start, end): (inicios, valores) con ceros en los períodos vacíos"""
+    if unit in CYCLIC_UNITS:
+        raise ValueError(f'Use cyclic_profile para la unidad {unit}')
+
+    periods = period_starts(start, end, unit)
+    positions = {period: index for index, period in enumerate(periods)}
+    values = _zeros(len(periods))
+    for bucket, measured in aggregate(column, [unit], start, end, value, agg, filters):
+        index = positions.get(parse_bucket(bucket))
+        if index is not None:
+            values[index] = float(measured or 0)
+    return periods, values
+
+
+def keyed_time_series(column, key, unit: str, start: datetime, end: datetime, value=None, agg: str = 'count',
+                      filters: Sequence[Any] = ()) -> Tuple[List[datetime], List[Any], Any]:
+    """Series densas por clave en una sola consulta: (inicios, claves, matriz claves × períodos)"""
+    periods = period_starts(start, end, unit)
+    positions = {period: index for index, period in enumerate(periods)}
+    rows = aggregate(column, [unit], start, end, value, agg, filters, keys=[key])
+    keys = sorted({row[1] for row in rows}, key=lambda item: (item is None, str(item)))
+    key_index = {item: index for index, item in enumerate(keys)}
+    matrix = _zeros((len(keys), len(periods)))
+    for bucket, item, measured in rows:
+        index = positions.get(parse_bucket(bucket))
+        if index is not None:
+            matrix[key_index[item]][index] = float(measured or 0)
+    return periods, keys, matrix
+
+
+def cyclic_profile(column, unit: str, start: datetime = None, end: datetime = None, value=None,
+                   agg: str = 'count', filters: Sequence[Any] = ()) -> Any:
+    """Perfil por día de la semana (7) u hora del día (24)"""
+    values = _zeros(CYCLIC_UNITS[unit])
+    for bucket, measured in aggregate(column, [unit], start, end, value, agg, filters):
+        values[int(bucket)] = float(measured or 0)
+    return values
+
+
+def weekday_hour_heatmap(column, start: datetime = None, end: datetime = None, value=None,
+                         agg: str = 'count', filters: Sequence[Any] = ()) -> Any:
+    """Mapa de calor 7×24 (fila 0 = lunes, columna = hora)"""
+    heatmap = _zeros((7, 24))
+    for weekday, hour, measured in aggregate(column, ['weekday', 'hour_of_day'], start, end, value, agg, filters):
+        heatmap[int(weekday)][int(hour)] = float(measured or 0)
+    return heatmap
+
+
+def heatmap_summary(heatmap, top_hours: int = 3) -> Dict[str, Any]:
+    """Totales por día de la semana y horas pico de un mapa de calor"""
+    if np is not None:
+        by_day = heatmap.sum(axis=1)
+        by_hour = heatmap.sum(axis=0)
+        total = float(heatmap.sum())
+    else:
+        by_day = [sum(row) for row in heatmap]
+        by_hour = [sum(row[hour] for row in heatmap) for hour in range(24)]
+        total = float(sum(by_day))
+
+    peak_hours = sorted(((hour, by_hour[hour]) for hour in range(24) if by_hour[hour]),
+                        key=lambda item: item[1], reverse=True)[:top_hours]
+    return {
+        'by_day': {WEEKDAY_NAMES[day]: int(by_day[day]) for day in range(7) if by_day[day]},
+        'peak_hours': [{'hour': hour, 'count': int(count)} for hour, count in peak_hours],
+        'total': total
+    }
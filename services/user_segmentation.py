@@ -0,0 +1,306 @@
+"""
+Segmentación de usuarios
+Calcula las características de actividad de todos los usuarios con una consulta
+agrupada por métrica (visitas, reservas, gastos, mantenimiento), las alinea en
+arreglos NumPy y asigna segmentos con operaciones vectorizadas.
+"""
+
+import logging
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, func, case
+
+from models import db, User, Visit, Reservation, Expense, Maintenance
+from optional_dependencies import get_numpy
+
+np = get_numpy()
+
+logger = logging.getLogger(__name__)
+
+# Configuración de segmentación
+USER_SEGMENTATION_CONFIG = {
+    'frequency_window_days': 30,
+    'spending_window_days': 365,
+    'maintenance_window_days': 90,
+    'new_user_days': 30,
+    'active_days': 30,
+    'very_active_days': 7,
+    'at_risk_days': 90,
+    'high_frequency': 8,          # Visitas + reservas en la ventana para "Muy Activos"
+    'high_maintenance': 3,        # Solicitudes en la ventana para "Alta Demanda de Mantenimiento"
+    'engagement_weights': (0.5, 0.35, 0.15)   # Recencia, frecuencia, gasto
+}
+
+# Segmentos excluyentes por actividad, evaluados en orden
+SEGMENT_DEFINITIONS = [
+    ('Usuarios Nuevos', {'account_age_days': f"<= {USER_SEGMENTATION_CONFIG['new_user_days']}"}),
+    ('Muy Activos', {'recency_days': f"<= {USER_SEGMENTATION_CONFIG['very_active_days']}",
+                     'frequency': f">= {USER_SEGMENTATION_CONFIG['high_frequency']}"}),
+    ('Activos', {'recency_days': f"<= {USER_SEGMENTATION_CONFIG['active_days']}"}),
+    ('En Riesgo', {'recency_days': f"<= {USER_SEGMENTATION_CONFIG['at_risk_days']}"}),
+    ('Inactivos', {'recency_days': f"> {USER_SEGMENTATION_CONFIG['at_risk_days']}"})
+]
+
+MAINTENANCE_SEGMENT = ('Alta Demanda de Mantenimiento',
+                       {'maintenance_requests': f">= {USER_SEGMENTATION_CONFIG['high_maintenance']}"})
+
+
+@dataclass
+class UserFeatures:
+    """Características por usuario alineadas por posición con user_ids"""
+    user_ids: Any
+    account_age_days: Any
+    recency_days: Any          # NaN (o None sin NumPy) si nunca tuvo actividad
+    frequency: Any             # Visitas + reservas en la ventana de frecuencia
+    total_visits: Any
+    spending: Any              # Gastos pagados en la ventana de gasto
+    maintenance_requests: Any  # Solicitudes en la ventana de mantenimiento
+
+    def __len__(self):
+        return len(self.user_ids)
+
+
+def _grouped_rows(now: datetime) -> Dict[str, List[tuple]]:
+    """Una consulta agrupada por métrica"""
+    config = USER_SEGMENTATION_CONFIG
+    frequency_since = now - timedelta(days=config['frequency_window_days'])
+    spending_since = now - timedelta(days=config['spending_window_days'])
+    maintenance_since = now - timedelta(days=config['maintenance_window_days'])
+
+    def recent(column, since):
+        return func.sum(case((column >= since, 1), else_=0))
+
+    return {
+        'users': db.session.execute(select(User.id, User.created_at).order_by(User.id)).all(),
+        'visits': db.session.execute(
+            select(Visit.resident_id, func.count(Visit.id), recent(Visit.created_at, frequency_since),
+                   func.max(Visit.created_at))
+            .group_by(Visit.resident_id)
+        ).all(),
+        'reservations': db.session.execute(
+            select(Reservation.user_id, recent(Reservation.created_at, frequency_since),
+                   func.max(Reservation.created_at))
+            .group_by(Reservation.user_id)
+        ).all(),
+        'expenses': db.session.execute(
+            select(Expense.user_id, func.sum(Expense.amount))
+            .where(Expense.status == 'paid', Expense.created_at >= spending_since)
+            .group_by(Expense.user_id)
+        ).all(),
+        'maintenance': db.session.execute(
+            select(Maintenance.user_id, recent(Maintenance.created_at, maintenance_since),
+                   func.max(Maintenance.created_at))
+            .group_by(Maintenance.user_id)
+        ).all()
+    }
+
+
+def _days_since(now: datetime, value: Optional[datetime]) -> Optional[float]:
+    return (now - value).total_seconds() / 86400 if value else None
+
+
+def load_user_features(now: datetime = None) -> UserFeatures:
+    """Cargar características de todos los usuarios (NumPy, o listas si no está disponible)"""
+    now = now or datetime.utcnow()
+    rows = _grouped_rows(now)
+    if np is not None:
+        return _numpy_features(now, rows)
+    return _python_features(now, rows)
+
+
+def _numpy_features(now: datetime, rows: Dict[str, List[tuple]]) -> UserFeatures:
+    user_ids = np.fromiter((row[0] for row in rows['users']), dtype=np.int64, count=len(rows['users']))
+    now64 = np.datetime64(now, 's')
+
+    def days_since(values) -> Any:
+        stamps = np.array([value or 'NaT' for value in values], dtype='datetime64[s]')
+        return (now64 - stamps) / np.timedelta64(1, 'D')
+
+    def positions(result):
+        """Posición de cada fila agrupada en user_ids y máscara de las que existen"""
+        keys = np.fromiter((row[0] if row[0] is not None else -1 for row in result), dtype=np.int64,
+                           count=len(result))
+        index = np.minimum(np.searchsorted(user_ids, keys), max(len(user_ids) - 1, 0))
+        return index, user_ids[index] == keys
+
+    def align(result, column, dtype):
+        """Ubicar los valores agrupados en la posición de cada usuario"""
+        aligned = np.zeros(len(user_ids), dtype=dtype)
+        if result and len(user_ids):
+            index, valid = positions(result)
+            values = np.array([row[column] or 0 for row in result], dtype=dtype)
+            aligned[index[valid]] = values[valid]
+        return aligned
+
+    def align_days(result, column):
+        aligned = np.full(len(user_ids), np.nan)
+        if result and len(user_ids):
+            index, valid = positions(result)
+            aligned[index[valid]] = days_since([row[column] for row in result])[valid]
+        return aligned
+
+    recency = np.fmin(np.fmin(align_days(rows['visits'], 3), align_days(rows['reservations'], 2)),
+                      align_days(rows['maintenance'], 2))
+
+    return UserFeatures(
+        user_ids=user_ids,
+        account_age_days=days_since(row[1] for row in rows['users']) if len(user_ids) else np.zeros(0),
+        recency_days=recency,
+        frequency=align(rows['visits'], 2, np.int64) + align(rows['reservations'], 1, np.int64),
+        total_visits=align(rows['visits'], 1, np.int64),
+        spending=align(rows['expenses'], 1, np.float64),
+        maintenance_requests=align(rows['maintenance'], 1, np.int64)
+    )
+
+
+def _python_features(now: datetime, rows: Dict[str, List[tuple]]) -> UserFeatures:
+    visits = {row[0]: row for row in rows['visits']}
+    reservations = {row[0]: row for row in rows['reservations']}
+    expenses = {row[0]: row[1] or 0.0 for row in rows['expenses']}
+    maintenance = {row[0]: row for row in rows['maintenance']}
+
+    def last_activity(user_id):
+        stamps = [source[user_id][column] for source, column in ((visits, 3), (reservations, 2), (maintenance, 2))
+                  if user_id in source and source[user_id][column]]
+        return _days_since(now, max(stamps)) if stamps else None
+
+    user_ids = [row[0] for row in rows['users']]
+    return UserFeatures(
+        user_ids=user_ids,
+        account_age_days=[_days_since(now, row[1]) for row in rows['users']],
+        recency_days=[last_activity(user_id) for user_id in user_ids],
+        frequency=[(visits[user_id][2] or 0 if user_id in visits else 0) +
+                   (reservations[user_id][1] or 0 if user_id in reservations else 0) for user_id in user_ids],
+        total_visits=[visits[user_id][1] if user_id in visits else 0 for user_id in user_ids],
+        spending=[expenses.get(user_id, 0.0) for user_id in user_ids],
+        maintenance_requests=[maintenance[user_id][1] or 0 if user_id in maintenance else 0 for user_id in user_ids]
+    )
+
+
+def engagement_scores(features: UserFeatures) -> Any:
+    """Puntaje 0-1 combinando recencia, frecuencia y gasto"""
+    config = USER_SEGMENTATION_CONFIG
+    w_recency, w_frequency, w_spending = config['engagement_weights']
+
+    if np is None:
+        max_spending = max(features.spending, default=0) or 1.0
+        return [
+            w_recency * (max(0.0, 1 - recency / config['at_risk_days']) if recency is not None else 0.0) +
+            w_frequency * min(1.0, frequency / config['high_frequency']) +
+            w_spending * spending / max_spending
+            for recency, frequency, spending in zip(features.recency_days, features.frequency, features.spending)
+        ]
+
+    recency_score = np.nan_to_num(np.clip(1 - features.recency_days / config['at_risk_days'], 0, 1))
+    frequency_score = np.clip(features.frequency / config['high_frequency'], 0, 1)
+    max_spending = features.spending.max() if len(features) and features.spending.max() > 0 else 1.0
+    return w_recency * recency_score + w_frequency * frequency_score + w_spending * features.spending / max_spending
+
+
+def segment_labels(features: UserFeatures) -> Any:
+    """Índice en SEGMENT_DEFINITIONS del segmento de cada usuario"""
+    config = USER_SEGMENTATION_CONFIG
+
+    if np is None:
+        labels = []
+        for age, recency, frequency in zip(features.account_age_days, features.recency_days, features.frequency):
+            if age is not None and age <= config['new_user_days']:
+                labels.append(0)
+            elif recency is not None and recency <= config['very_active_days'] and frequency >= config['high_frequency']:
+                labels.append(1)
+            elif recency is not None and recency <= config['active_days']:
+                labels.append(2)
+            elif recency is not None and recency <= config['at_risk_days']:
+                labels.append(3)
+            else:
+                labels.append(4)
+        return labels
+
+    recency = np.nan_to_num(features.recency_days, nan=math.inf)
+    conditions = [
+        np.nan_to_num(features.account_age_days, nan=math.inf) <= config['new_user_days'],
+        (recency <= config['very_active_days']) & (features.frequency >= config['high_frequency']),
+        recency <= config['active_days'],
+        recency <= config['at_risk_days']
+    ]
+    return np.select(conditions, [0, 1, 2, 3], default=4)
+
+
+def summarize_segments(features: UserFeatures) -> List[Dict[str, Any]]:
+    """Resumen por segmento: cantidad, porcentaje y promedios de actividad, gasto y engagement"""
+    total = len(features)
+    if not total:
+        return []
+
+    labels = segment_labels(features)
+    scores = engagement_scores(features)
+    segments = [(name, criteria, index) for index, (name, criteria) in enumerate(SEGMENT_DEFINITIONS)]
+    segments.append((*MAINTENANCE_SEGMENT, None))
+
+    summary = []
+    for name, criteria, index in segments:
+        if np is not None:
+            mask = labels == index if index is not None else \
+                features.maintenance_requests >= USER_SEGMENTATION_CONFIG['high_maintenance']
+            count = int(mask.sum())
+            if not count:
+                continue
+            averages = (float(features.frequency[mask].mean()), float(features.spending[mask].mean()),
+                        float(scores[mask].mean()))
+        else:
+            members = [position for position in range(total)
+                       if (labels[position] == index if index is not None else
+                           features.maintenance_requests[position] >= USER_SEGMENTATION_CONFIG['high_maintenance'])]
+            count = len(members)
+            if not count:
+                continue
+            averages = tuple(sum(values[position] for position in members) / count
+                             for values in (features.frequency, features.spending, scores))
+
+        summary.append({
+            'name': name,
+            'criteria': criteria,
+            'user_count': count,
+            'percentage': count / total * 100,
+            'avg_activity': round(averages[0], 2),
+            'avg_spending': round(averages[1], 2),
+            'engagement_score': round(averages[2], 3)
+        })
+    return summary
+
+
+def activity_summary(features: UserFeatures, now: datetime = None) -> Dict[str, Any]:
+    """Usuarios activos, engagement y retención por cohorte mensual a partir de las características"""
+    now = now or datetime.utcnow()
+    total = len(features)
+
+    if np is not None:
+        recency = np.nan_to_num(features.recency_days, nan=math.inf)
+        active_7d, active_30d = int((recency <= 7).sum()), int((recency <= 30).sum())
+        total_visits = int(features.total_visits.sum())
+        cohorts = {}
+        for i in range(4):
+            in_cohort = (features.account_age_days >= 30 * i) & (features.account_age_days < 30 * (i + 1))
+            if in_cohort.any():
+                cohorts[f'month_{i + 1}'] = float((recency[in_cohort] <= 30).mean())
+    else:
+        active_7d = sum(1 for recency in features.recency_days if recency is not None and recency <= 7)
+        active_30d = sum(1 for recency in features.recency_days if recency is not None and recency <= 30)
+        total_visits = sum(features.total_visits)
+        cohorts = {}
+        for i in range(4):
+            members = [recency for age, recency in zip(features.account_age_days, features.recency_days)
+                       if age is not None and 30 * i <= age < 30 * (i + 1)]
+            if members:
+                cohorts[f'month_{i + 1}'] = sum(1 for r in members if r is not None and r <= 30) / len(members)
+
+    return {
+        'total_users': total,
+        'active_users_7d': active_7d,
+        'active_users_30d': active_30d,
+        'total_visits': total_visits,
+        'cohort_retention': cohorts
+    }
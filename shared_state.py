@@ -0,0 +1,119 @@
+"""
+Estado compartido entre procesos
+Lo que se calcula una vez por cluster (en el líder del programador) se publica
+como JSON en la tabla shared_state y los demás procesos lo leen desde ahí, con
+una caché corta por proceso. Así el resultado no depende de qué worker de
+gunicorn ni qué contenedor atiende el request.
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, update, insert, delete
+from sqlalchemy.exc import IntegrityError
+
+from models import db, SharedState
+
+logger = logging.getLogger(__name__)
+
+# Configuración del estado compartido
+SHARED_STATE_CONFIG = {
+    'cache_seconds': 5    # Vigencia de una lectura en la memoria del proceso
+}
+
+
+class SharedStateStore:
+    """Publicación y lectura de valores JSON por clave en la base de datos"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._cache: Dict[str, tuple] = {}   # clave o prefijo -> (leído en, valor)
+
+    @property
+    def table(self):
+        return SharedState.__table__
+
+    def publish(self, key: str, value: Any):
+        """Guardar el valor (reemplaza el anterior) en una transacción propia"""
+        data = json.dumps(value, default=str)
+        now = datetime.utcnow()
+        statement = update(self.table).where(self.table.c.key == key).values(value=data, updated_at=now)
+        with db.engine.begin() as connection:
+            updated = connection.execute(statement).rowcount
+        if not updated:
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(insert(self.table).values(key=key, value=data, updated_at=now))
+            except IntegrityError:
+                # Otro proceso insertó la clave entre el UPDATE y el INSERT
+                with db.engine.begin() as connection:
+                    connection.execute(statement)
+        self.invalidate(key)
+        with self.lock:
+            self._cache[key] = (time.monotonic(), json.loads(data))
+
+    def delete(self, key: str):
+        with db.engine.begin() as connection:
+            connection.execute(delete(self.table).where(self.table.c.key == key))
+        self.invalidate(key)
+
+    def read(self, key: str, default: Any = None) -> Any:
+        """Último valor publicado (None fuera de contexto de aplicación o si nunca se publicó)"""
+        cached = self._cached(key)
+        if cached is not None:
+            value = cached[1]
+        else:
+            try:
+                with db.engine.connect() as connection:
+                    row = connection.execute(select(self.table.c.value)
+                                             .where(self.table.c.key == key)).scalar()
+            except Exception as e:
+                logger.debug(f'No se pudo leer el estado compartido {key}: {e}')
+                return default
+            value = json.loads(row) if row is not None else None
+            with self.lock:
+                self._cache[key] = (time.monotonic(), value)
+        return default if value is None else value
+
+    def read_prefix(self, prefix: str) -> Dict[str, Any]:
+        """Valores de todas las claves que empiezan con `prefix`"""
+        cache_key = f'{prefix}*'
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return dict(cached[1])
+        try:
+            with db.engine.connect() as connection:
+                rows = connection.execute(select(self.table.c.key, self.table.c.value)
+                                          .where(self.table.c.key.startswith(prefix, autoescape=True))).all()
+        except Exception as e:
+            logger.debug(f'No se pudo leer el estado compartido {prefix}*: {e}')
+            return {}
+        values = {key: json.loads(value) for key, value in rows}
+        with self.lock:
+            self._cache[cache_key] = (time.monotonic(), values)
+        return dict(values)
+
+    def _cached(self, key: str) -> Optional[tuple]:
+        with self.lock:
+            cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < SHARED_STATE_CONFIG['cache_seconds']:
+            return cached
+        return None
+
+    def invalidate(self, key: str = None):
+        """Descartar la caché de una clave (y de los prefijos que la contienen) o toda"""
+        with self.lock:
+            if key is None:
+                self._cache.clear()
+                return
+            for cached in list(self._cache):
+                if cached == key or (cached.endswith('*') and key.startswith(cached[:-1])):
+                    del self._cache[cached]
+
+
+# Instancia global
+shared_state = SharedStateStore()
@@ -0,0 +1,280 @@
+"""
+Objetivos de latencia por endpoint (SLO)
+Cada endpoint tiene un objetivo de p95, p99 y disponibilidad. Los requests se
+acumulan en tramos de una ventana deslizante y con ellos se calcula la tasa de
+consumo del presupuesto de error (burn rate) en una ventana corta y una larga.
+De los requests más lentos se guardan ejemplares (request id, usuario,
+cantidad de consultas SQL y fallos de caché) para saber qué optimizar primero.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from flask import g, has_request_context, jsonify, request
+
+from app_modules.core.monitoring_service import StreamingHistogram
+
+logger = logging.getLogger(__name__)
+
+# Configuración de SLO
+SLO_CONFIG = {
+    'slice_seconds': 60,
+    'window_slices': 60,            # Ventana larga: 1 hora
+    'short_window_slices': 5,       # Ventana corta: 5 minutos
+    'exemplars_per_slice': 5,       # Requests más lentos guardados por endpoint y tramo
+    'min_requests': 20,             # Con menos requests en la ventana no se calcula el consumo
+    'default_objective': {'p95_ms': 800, 'p99_ms': 2000, 'availability': 0.995},
+    # Objetivos propios por endpoint (el resto usa default_objective)
+    'objectives': {
+        'dashboard': {'p95_ms': 1000, 'p99_ms': 2500},
+        'auth.login': {'p95_ms': 500, 'p99_ms': 1500},
+        'metrics_endpoint': {'p95_ms': 250, 'p99_ms': 1000}
+    },
+    'ignored_prefixes': ('/static/', '/favicon')
+}
+
+
+@dataclass
+class EndpointObjective:
+    """Objetivo de un endpoint: el 95% y el 99% de los requests por debajo de su umbral"""
+    endpoint: str
+    p95_ms: float
+    p99_ms: float
+    availability: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'p95_ms': self.p95_ms, 'p99_ms': self.p99_ms, 'availability': self.availability}
+
+
+class _Slice:
+    """Contadores de un tramo de tiempo de un endpoint"""
+    __slots__ = ('slice_id', 'total', 'over_p95', 'over_p99', 'errors', 'histogram', 'exemplars')
+
+    def __init__(self, slice_id: int):
+        self.slice_id = slice_id
+        self.total = 0
+        self.over_p95 = 0
+        self.over_p99 = 0
+        self.errors = 0
+        self.histogram = StreamingHistogram()
+        self.exemplars = []   # Heap mínimo de (duración, secuencia, ejemplar)
+
+
+class EndpointWindow:
+    """Anillo de tramos de un endpoint"""
+
+    def __init__(self, objective: EndpointObjective):
+        self.objective = objective
+        self.lock = threading.Lock()
+        self._ring: List[Optional[_Slice]] = [None] * SLO_CONFIG['window_slices']
+
+    def record(self, duration_ms: float, status_code: int, exemplar: Dict[str, Any], now: float, sequence: int):
+        slice_id = int(now // SLO_CONFIG['slice_seconds'])
+        position = slice_id % len(self._ring)
+        with self.lock:
+            current = self._ring[position]
+            if current is None or current.slice_id != slice_id:
+                current = self._ring[position] = _Slice(slice_id)
+            current.total += 1
+            current.histogram.record(duration_ms)
+            if duration_ms > self.objective.p95_ms:
+                current.over_p95 += 1
+            if duration_ms > self.objective.p99_ms:
+                current.over_p99 += 1
+            if status_code >= 500:
+                current.errors += 1
+
+            entry = (duration_ms, sequence, exemplar)
+            if len(current.exemplars) < SLO_CONFIG['exemplars_per_slice']:
+                heapq.heappush(current.exemplars, entry)
+            elif duration_ms > current.exemplars[0][0]:
+                heapq.heapreplace(current.exemplars, entry)
+
+    def _slices(self, now: float, count: int) -> List[_Slice]:
+        current = int(now // SLO_CONFIG['slice_seconds'])
+        with self.lock:
+            return [entry for entry in self._ring if entry is not None and current - count < entry.slice_id <= current]
+
+    @staticmethod
+    def _burn(slices: List[_Slice], objective: EndpointObjective) -> Optional[Dict[str, float]]:
+        """Consumo del presupuesto: fracción de requests malos sobre la fracción permitida"""
+        total = sum(entry.total for entry in slices)
+        if total < SLO_CONFIG['min_requests']:
+            return None
+        rates = {
+            'p95': sum(entry.over_p95 for entry in slices) / total / 0.05,
+            'p99': sum(entry.over_p99 for entry in slices) / total / 0.01,
+            'availability': sum(entry.errors for entry in slices) / total / max(1 - objective.availability, 1e-9)
+        }
+        rates['max'] = max(rates.values())
+        return {key: round(value, 3) for key, value in rates.items()}
+
+    def report(self, now: float, exemplars: int) -> Dict[str, Any]:
+        window = self._slices(now, SLO_CONFIG['window_slices'])
+        short = [entry for entry in window
+                 if entry.slice_id > int(now // SLO_CONFIG['slice_seconds']) - SLO_CONFIG['short_window_slices']]
+
+        histogram = StreamingHistogram()
+        for entry in window:
+            histogram.merge(entry.histogram)
+        total = histogram.count
+        slowest = heapq.nlargest(exemplars, (item for entry in window for item in entry.exemplars))
+
+        long_burn = self._burn(window, self.objective)
+        return {
+            'endpoint': self.objective.endpoint,
+            'objective': self.objective.to_dict(),
+            'requests': total,
+            'errors': sum(entry.errors for entry in window),
+            'p95_ms': round(histogram.percentile(95), 2) if total else None,
+            'p99_ms': round(histogram.percentile(99), 2) if total else None,
+            # Presupuesto restante en la ventana larga (1 = intacto, negativo = agotado)
+            'budget_remaining': round(1 - long_burn['max'], 3) if long_burn else None,
+            'burn_rate': {'long': long_burn, 'short': self._burn(short, self.objective)},
+            'exemplars': [exemplar for _, _, exemplar in slowest]
+        }
+
+
+class SLOTracker:
+    """Ventanas por endpoint y ranking por consumo del presupuesto de error"""
+
+    def __init__(self):
+        self.windows: Dict[str, EndpointWindow] = {}
+        self.lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def objective(self, endpoint: str) -> EndpointObjective:
+        values = dict(SLO_CONFIG['default_objective'])
+        values.update(SLO_CONFIG['objectives'].get(endpoint, {}))
+        return EndpointObjective(endpoint=endpoint, **values)
+
+    def define(self, endpoint: str, **objective):
+        """Fijar el objetivo de un endpoint (reinicia su ventana)"""
+        SLO_CONFIG['objectives'][endpoint] = {**SLO_CONFIG['objectives'].get(endpoint, {}), **objective}
+        with self.lock:
+            self.windows.pop(endpoint, None)
+
+    def _window(self, endpoint: str) -> EndpointWindow:
+        window = self.windows.get(endpoint)
+        if window is None:
+            with self.lock:
+                window = self.windows.get(endpoint)
+                if window is None:
+                    window = self.windows[endpoint] = EndpointWindow(self.objective(endpoint))
+        return window
+
+    def observe(self, endpoint: str, duration_ms: float, status_code: int,
+                exemplar: Dict[str, Any] = None, now: float = None):
+        now = time.time() if now is None else now
+        exemplar = dict(exemplar or {}, duration_ms=round(duration_ms, 2), status=status_code, at=round(now, 3))
+        self._window(endpoint).record(duration_ms, status_code, exemplar, now, next(self._sequence))
+
+    def ranking(self, now: float = None, exemplars: int = 3) -> List[Dict[str, Any]]:
+        """Endpoints ordenados por consumo del presupuesto (ventana larga y luego corta)"""
+        now = time.time() if now is None else now
+        reports = [window.report(now, exemplars) for window in list(self.windows.values())]
+        reports = [report for report in reports if report['requests']]
+
+        def burn(report, window):
+            rates = report['burn_rate'][window]
+            return rates['max'] if rates else -1
+
+        return sorted(reports, key=lambda report: (burn(report, 'long'), burn(report, 'short')), reverse=True)
+
+    def reset(self):
+        with self.lock:
+            self.windows.clear()
+
+
+# Instancia global
+slo_tracker = SLOTracker()
+
+
+def note_request_event(name: str, amount: int = 1):
+    """Contar un evento del request actual (consultas SQL, fallos de caché) para los ejemplares"""
+    if has_request_context():
+        counters = g.get('slo_counters')
+        if counters is not None:
+            counters[name] = counters.get(name, 0) + amount
+
+
+def note_cache_miss():
+    note_request_event('cache_misses')
+
+
+def _count_sql(conn, cursor, statement, parameters, context, executemany):
+    note_request_event('sql_count')
+
+
+def init_slo_tracker(app):
+    """Registrar el middleware de SLO, el contador de SQL y la vista de administración"""
+    from flask_login import login_required, current_user
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    ignored = SLO_CONFIG['ignored_prefixes']
+
+    if not event.contains(Engine, 'before_cursor_execute', _count_sql):
+        event.listen(Engine, 'before_cursor_execute', _count_sql)
+
+    @app.before_request
+    def start_slo_timer():
+        if request.path.startswith(ignored):
+            return
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.slo_start = time.perf_counter()
+        g.slo_counters = {}
+
+    @app.after_request
+    def capture_slo_status(response):
+        g.slo_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_slo_timer(exc):
+        start = g.pop('slo_start', None)
+        if start is None:
+            return
+        duration_ms = (time.perf_counter() - start) * 1000
+        status = g.pop('slo_status', 500 if exc is not None else 200)
+        counters = g.pop('slo_counters', None) or {}
+        try:
+            user_id = current_user.get_id() if current_user and current_user.is_authenticated else None
+        except Exception:
+            user_id = None
+        try:
+            slo_tracker.observe(request.endpoint or 'unknown', duration_ms, status, {
+                'request_id': g.get('request_id'),
+                'user_id': user_id,
+                'method': request.method,
+                'path': request.path,
+                'sql_count': counters.get('sql_count', 0),
+                'cache_misses': counters.get('cache_misses', 0)
+            })
+        except Exception as e:
+            logger.debug(f'No se pudo registrar el SLO del request: {e}')
+
+    @app.route('/api/v1/slo', methods=['GET'])
+    @login_required
+    def get_slo_ranking():
+        """Endpoints de este worker ordenados por consumo del presupuesto de error"""
+        if not current_user.can_access_admin():
+            return jsonify({'success': False, 'error': 'Permisos insuficientes'}), 403
+        limit = request.args.get('limit', 20, type=int)
+        exemplars = request.args.get('exemplars', 3, type=int)
+        return jsonify({
+            'success': True,
+            'data': {
+                'window_minutes': SLO_CONFIG['window_slices'] * SLO_CONFIG['slice_seconds'] // 60,
+                'short_window_minutes': SLO_CONFIG['short_window_slices'] * SLO_CONFIG['slice_seconds'] // 60,
+                'endpoints': slo_tracker.ranking(exemplars=exemplars)[:limit]
+            }
+        })
+
+    print("✅ Seguimiento de SLO por endpoint inicializado")
@@ -0,0 +1,101 @@
+"""
+Fixtures compartidas: aplicación Flask mínima con base de datos SQLite en memoria
+"""
+
+import pytest
+from flask import Flask
+from flask_login import LoginManager
+from sqlalchemy import event
+from models import db, User
+from shared_state import shared_state
+
+
+@pytest.fixture
+def make_app():
+    """
+    Fábrica de aplicaciones mínimas con las tablas ya creadas.
+    login=True agrega flask_login; users=True crea admin (id 1) y vecino (id 2).
+    Las aplicaciones así creadas no dejan un contexto activo (evita el contexto compartido de pytest-flask).
+    """
+    def factory(login=False, users=False, **config):
+        # La caché de lecturas de shared_state no debe pasar de una base en memoria a otra
+        shared_state.invalidate()
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        app.config['SECRET_KEY'] = 'test'
+        app.config.update(config)
+        db.init_app(app)
+
+        if login:
+            login_manager = LoginManager(app)
+            login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+
+        with app.app_context():
+            db.create_all()
+            if users:
+                db.session.add(User(username='admin', email='admin@test.com', name='Admin', password_hash='x',
+                                    role='admin'))
+                db.session.add(User(username='vecino', email='vecino@test.com', name='Vecino', password_hash='x'))
+                db.session.commit()
+        return app
+    return factory
+
+
+@pytest.fixture
+def app_options():
+    """Opciones de make_app para el fixture app (los módulos la sobrescriben si necesitan otras)"""
+    return {}
+
+
+@pytest.fixture
+def app(make_app, app_options):
+    """Aplicación mínima con base de datos en memoria y contexto activo durante el test"""
+    app = make_app(**app_options)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def count_queries():
+    """Ejecutar una función registrando las sentencias SQL; devuelve (resultado, sentencias)"""
+    def run(func):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            result = func()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        return result, statements
+    return run
+
+
+@pytest.fixture
+def analytics_app(make_app, monkeypatch):
+    """Aplicación con usuarios y las rutas de analytics_engine; sus tareas van a un programador que no se inicia"""
+    import cluster_scheduler
+    from analytics_engine import init_analytics_engine
+    from services.cohort_engine import cohort_engine
+    from services.kpi_engine import kpi_engine
+    from services.result_cache import result_cache
+
+    monkeypatch.setattr(cluster_scheduler, 'cluster_scheduler', cluster_scheduler.ClusterScheduler())
+    for engine in (kpi_engine, cohort_engine, result_cache):
+        monkeypatch.setattr(engine, 'is_running', False)
+    app = make_app(login=True, users=True)
+    init_analytics_engine(app)
+    return app
+
+
+@pytest.fixture
+def login_client():
+    """Cliente de pruebas con la sesión de un usuario ya iniciada"""
+    def factory(app, user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        return client
+    return factory
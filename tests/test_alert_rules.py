@@ -0,0 +1,216 @@
+"""
+Tests para el motor de reglas de alerta
+"""
+
+import pytest
+from alert_rules import AlertRule, AlertRuleEngine, RuleWindow, ALERT_CONFIG
+
+START = 1_900_000_800.0   # Múltiplo de 3600
+
+
+@pytest.fixture
+def engine():
+    return AlertRuleEngine()
+
+
+def feed(engine, metric, values, start=START, step=1.0):
+    """Registrar valores consecutivos y devolver el momento de la última muestra"""
+    for index, value in enumerate(values):
+        engine.record(metric, value, timestamp=start + index * step)
+    return start + (len(values) - 1) * step
+
+
+class TestRuleWindow:
+    """Agregados incrementales de la ventana"""
+
+    def test_aggregations_follow_window(self):
+        window = RuleWindow(3)
+        window.update([(START, 10.0, 2.0, 4.0, 6.0), (START + 1, 3.0, 1.0, 3.0, 3.0)], now=START + 1)
+        assert window.value('mean') == pytest.approx(13 / 3)
+        assert window.value('max') == 6
+        assert window.value('min') == 3
+        assert window.value('last') == 3
+        assert window.value('count') == 3
+        assert window.value('rate') == pytest.approx(13 / 3)
+
+        # El bucket actual sigue acumulando: se reemplaza en lugar de sumarse dos veces
+        window.update([(START + 1, 12.0, 2.0, 3.0, 9.0)], now=START + 1)
+        assert window.value('sum') == 22
+        assert window.value('max') == 9
+
+        # Los buckets que salen de la ventana dejan de contar
+        window.update([(START + 3, 1.0, 1.0, 1.0, 1.0)], now=START + 3)
+        assert window.value('count') == 3
+        assert window.value('min') == 1
+        assert window.value('max') == 9
+        window.update([], now=START + 5)
+        assert window.value('max') == 1
+        window.update([], now=START + 10)
+        assert window.value('mean') is None
+        assert window.value('count') == 0
+
+    def test_invalid_rule(self):
+        with pytest.raises(ValueError):
+            AlertRule('x', 'cpu', 90, comparator='!=')
+        with pytest.raises(ValueError):
+            AlertRule('x', 'cpu', 90, aggregation='median')
+
+
+class TestAlertRuleEngine:
+    """Disparo, histéresis, resolución, inhibición e historial"""
+
+    def test_for_duration_and_hysteresis(self, engine):
+        engine.add_rule(AlertRule('cpu', 'cpu', 90, clear=80, aggregation='mean', window=10, for_seconds=5))
+
+        now = feed(engine, 'cpu', [95] * 3)
+        assert engine.evaluate(now=now) == []                  # Pendiente: no se sostuvo 5 segundos
+        now = feed(engine, 'cpu', [95] * 4, start=now + 1)
+        assert engine.evaluate(now=now) == []
+        now = feed(engine, 'cpu', [95], start=now + 1)
+        fired = engine.evaluate(now=now)
+        assert [(entry['id'], entry['state']) for entry in fired] == [('cpu', 'firing')]
+        assert engine.active()[0].value == pytest.approx(95)
+
+        # Entre el umbral de recuperación y el de disparo la alerta sigue activa
+        now = feed(engine, 'cpu', [85] * 10, start=now + 1)
+        assert engine.evaluate(now=now) == []
+        assert engine.active()[0].value == pytest.approx(85)
+
+        now = feed(engine, 'cpu', [70] * 10, start=now + 1)
+        resolved = engine.evaluate(now=now)
+        assert [(entry['id'], entry['state']) for entry in resolved] == [('cpu', 'resolved')]
+        assert engine.active() == []
+
+    def test_resolves_when_metric_stops_reporting(self, engine):
+        engine.add_rule(AlertRule('queue', 'queue_depth', 100, window=30))
+        now = feed(engine, 'queue', [0])
+        now = feed(engine, 'queue_depth', [150], start=now)
+        assert engine.evaluate(now=now)[0]['state'] == 'firing'
+        assert engine.evaluate(now=now + 31)[0]['state'] == 'resolved'
+
+    def test_reads_only_new_buckets(self, engine, monkeypatch):
+        """El costo de cada evaluación depende de los buckets nuevos, no del historial"""
+        engine.add_rule(AlertRule('latency', 'latency', 500, aggregation='max', window=3600))
+        now = feed(engine, 'latency', [100] * 3000)
+        engine.evaluate(now=now)
+
+        read = []
+        original = engine.store.buckets_since
+
+        def counting(name, seconds, moment):
+            resolution, rows = original(name, seconds, moment)
+            read.append(len(rows))
+            return resolution, rows
+
+        monkeypatch.setattr(engine.store, 'buckets_since', counting)
+        now = feed(engine, 'latency', [100, 900], start=now + 1)
+        assert engine.evaluate(now=now)[0]['id'] == 'latency'
+        assert read == [3]     # El último bucket leído antes (pudo seguir acumulando) y los dos nuevos
+
+    def test_inhibition_and_grouped_notifications(self, engine):
+        engine.add_rules([
+            AlertRule('cpu.warning', 'cpu', 80, inhibited_by=('cpu.critical',), window=10),
+            AlertRule('cpu.critical', 'cpu', 90, severity='critical', window=10),
+            AlertRule('disk.warning', 'disk', 80, group='storage', window=10)
+        ])
+        notifications = []
+        engine.subscribe(lambda group, entries: notifications.append((group, sorted(e['id'] for e in entries))))
+
+        engine.record('cpu', 95, timestamp=START)
+        engine.record('disk', 95, timestamp=START)
+        engine.evaluate(now=START)
+
+        assert notifications == [('system', ['cpu.critical']), ('storage', ['disk.warning'])]
+        warning = engine.alerts['cpu.warning']
+        assert warning.inhibited
+        assert [alert.id for alert in engine.active(include_inhibited=False, group='system')] == ['cpu.critical']
+        assert set(engine.groups()) == {'system', 'storage'}
+
+        # Al bajar de nivel la advertencia deja de estar inhibida
+        engine.record('cpu', 85, timestamp=START + 1)
+        engine.evaluate(now=START + 1)
+        assert not warning.inhibited
+        assert [alert.id for alert in engine.active(group='system')] == ['cpu.warning']
+
+    def test_event_alerts_expire(self, engine):
+        engine.trigger('anomaly', 'Anomalía', 'Valor inusual', ttl=60, now=START)
+        engine.trigger('anomaly', 'Anomalía', 'Sigue inusual', ttl=60, now=START + 50)
+        assert len(engine.recent_history()) == 1
+        assert engine.active()[0].message == 'Sigue inusual'
+
+        engine.evaluate(now=START + 100)
+        assert len(engine.active()) == 1                        # Repetida hace 50 segundos
+        engine.evaluate(now=START + 111)
+        assert engine.active() == []
+        assert [entry['state'] for entry in engine.recent_history()] == ['resolved', 'firing']
+
+    def test_manual_resolve_silences_until_recovery(self, engine):
+        engine.add_rule(AlertRule('cpu', 'cpu', 90, window=10))
+        engine.record('cpu', 95, timestamp=START)
+        engine.evaluate(now=START)
+        assert engine.resolve('cpu', now=START)
+        assert engine.active() == []
+
+        engine.record('cpu', 96, timestamp=START + 1)
+        assert engine.evaluate(now=START + 1) == []            # Sigue alta pero no vuelve a disparar
+        engine.record('cpu', 10, timestamp=START + 2)
+        engine.evaluate(now=START + 2)
+        engine.record('cpu', 99, timestamp=START + 3)
+        assert engine.evaluate(now=START + 3)[0]['state'] == 'firing'
+        assert not engine.resolve('desconocida')
+
+    def test_history_is_bounded(self, monkeypatch):
+        monkeypatch.setitem(ALERT_CONFIG, 'history_size', 3)
+        engine = AlertRuleEngine()
+        for index in range(5):
+            engine.trigger(f'event{index}', 'Evento', 'x', now=START)
+        assert [entry['id'] for entry in engine.recent_history()] == ['event4', 'event3', 'event2']
+
+
+class TestSharedAlertState:
+    """Evaluación en el líder y lectura del estado publicado desde los demás procesos"""
+
+    @pytest.fixture
+    def engines(self, app):
+        leader, follower = AlertRuleEngine(), AlertRuleEngine()
+        for engine in (leader, follower):
+            engine.add_rule(AlertRule('cpu', 'cpu', 90, window=10, group='system'))
+        return leader, follower
+
+    def test_follower_reads_published_state(self, engines):
+        leader, follower = engines
+        leader.record('cpu', 95, timestamp=START)
+        leader.evaluate_and_publish(now=START)
+
+        assert [alert.id for alert in follower.active()] == ['cpu']
+        assert follower.groups()['system'][0]['value'] == 95
+        assert follower.status()['active'] == 1
+        assert follower.recent_history()[0]['state'] == 'firing'
+        assert follower.rule_values()[0]['state'] == 'firing'
+        assert follower.alerts == {}
+
+    def test_resolve_from_follower_applies_on_leader(self, engines):
+        leader, follower = engines
+        leader.record('cpu', 95, timestamp=START)
+        leader.evaluate_and_publish(now=START)
+
+        assert follower.resolve('cpu', now=START + 1)
+        assert follower.active() == []                         # Pedido pendiente: ya no se muestra
+        assert not follower.resolve('desconocida')
+        assert [alert.id for alert in leader.active()] == ['cpu']
+
+        leader.record('cpu', 96, timestamp=START + 2)
+        assert leader.evaluate_and_publish(now=START + 2) == []   # Silenciada hasta recuperarse
+        assert leader.active() == []
+        assert leader.alerts['cpu'].silenced
+        assert follower.active() == []
+        assert leader.apply_requested_resolutions() == 0
+
+    def test_resolve_on_leader_republishes(self, engines):
+        leader, follower = engines
+        leader.trigger('intrusion', 'Intrusión', '...', severity='critical', now=START)
+        leader.evaluate_and_publish(now=START)
+        assert [alert.id for alert in follower.active()] == ['intrusion']
+
+        assert leader.resolve('intrusion', now=START + 1)
+        assert follower.active() == []
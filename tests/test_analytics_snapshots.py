@@ -0,0 +1,123 @@
+"""
+Tests para los snapshots analíticos en Parquet
+"""
+
+import pytest
+from datetime import datetime
+from models import db, User, Visit
+import analytics_snapshots
+from analytics_snapshots import SnapshotManager, SNAPSHOT_CONFIG
+from analytics_engine import AnalyticsManager
+
+NOW = datetime(2030, 4, 15)
+
+
+@pytest.fixture
+def app(app, tmp_path, monkeypatch):
+    """Visitas de enero, febrero y abril y directorio temporal para los archivos"""
+    monkeypatch.setitem(SNAPSHOT_CONFIG, 'directory', str(tmp_path))
+    monkeypatch.setitem(SNAPSHOT_CONFIG, 'chunk_size', 2)
+    db.session.add(User(username='vecino', email='vecino@test.com', name='Vecino', password_hash='x'))
+    for month, count in ((1, 3), (2, 1), (4, 2)):
+        for i in range(count):
+            db.session.add(Visit(visitor_name=f'Invitado {i}', resident_id=1, qr_code='QR',
+                                 status='completed' if i else 'pending', created_at=datetime(2030, month, 3 + i)))
+    db.session.commit()
+    return app
+
+
+class TestSnapshotPartitions:
+    """Tests para la detección de particiones pendientes"""
+
+    def test_only_complete_months(self, app):
+        """Test meses completos con filas (el mes en curso se excluye)"""
+        assert SnapshotManager().pending_partitions('visits', NOW) == {'2030-01': 3, '2030-02': 1}
+
+    def test_existing_partitions_skipped(self, app, tmp_path):
+        """Test particiones ya escritas omitidas y temporales ignoradas"""
+        (tmp_path / 'visits' / 'month=2030-01').mkdir(parents=True)
+        (tmp_path / 'visits' / '.month=2030-02.tmp').mkdir()
+
+        manager = SnapshotManager()
+        assert manager.existing_partitions('visits') == ['2030-01']
+        assert manager.pending_partitions('visits', NOW) == {'2030-02': 1}
+
+
+class TestLiveReport:
+    """Tests para el reporte mensual sobre la base de datos"""
+
+    def test_monthly_report_grouped(self, app):
+        """Test filas por mes y estado"""
+        report = AnalyticsManager().monthly_report('visits', 'status', months=['2030-01'])
+        assert report['rows'] == [{'month': '2030-01', 'status': 'completed', 'count': 2},
+                                  {'month': '2030-01', 'status': 'pending', 'count': 1}]
+
+    def test_unknown_column_rejected(self, app):
+        """Test columna inexistente"""
+        with pytest.raises(ValueError):
+            AnalyticsManager().monthly_report('visits', 'inexistente')
+
+    @pytest.mark.parametrize('column', ['visitor_document', 'visitor_name', 'visitor_phone', 'vehicle_plate',
+                                        'qr_code', 'id'])
+    def test_personal_columns_rejected(self, app, column):
+        """Test solo se agrupa por columnas de REPORT_GROUP_COLUMNS"""
+        with pytest.raises(ValueError):
+            AnalyticsManager().monthly_report('visits', column)
+
+
+class TestReportRoute:
+    """Tests para el endpoint /api/v1/analytics/reports/<tabla>"""
+
+    def test_requires_admin(self, analytics_app, login_client):
+        """Test sin sesión 401 y vecino 403"""
+        assert analytics_app.test_client().get('/api/v1/analytics/reports/visits').status_code == 401
+        assert login_client(analytics_app, 2).get('/api/v1/analytics/reports/visits').status_code == 403
+
+    def test_admin_report(self, analytics_app, login_client):
+        """Test reporte agrupado para el admin y columna personal rechazada"""
+        with analytics_app.app_context():
+            db.session.add(Visit(visitor_name='Invitado', visitor_document='30111222', resident_id=2,
+                                 qr_code='QR', status='pending', created_at=datetime(2030, 1, 3)))
+            db.session.commit()
+        client = login_client(analytics_app, 1)
+
+        response = client.get('/api/v1/analytics/reports/visits?group_by=status')
+        assert response.status_code == 200
+        assert response.get_json()['data']['rows'] == [{'month': '2030-01', 'status': 'pending', 'count': 1}]
+
+        response = client.get('/api/v1/analytics/reports/visits?group_by=visitor_document')
+        assert response.status_code == 400
+        assert '30111222' not in response.get_data(as_text=True)
+
+
+class TestParquetSnapshots:
+    """Tests para la escritura y lectura de Parquet (requiere pyarrow)"""
+
+    @pytest.fixture(autouse=True)
+    def require_pyarrow(self):
+        pytest.importorskip('pyarrow')
+
+    def test_run_appends_new_partitions(self, app):
+        """Test una ejecución escribe los meses nuevos y la siguiente no repite"""
+        manager = SnapshotManager()
+        results = manager.run(now=NOW, tables=['visits'])
+        assert results['visits']['partitions_added'] == ['2030-01', '2030-02']
+        assert results['visits']['rows'] == 4
+
+        again = manager.run(now=datetime(2030, 5, 2), tables=['visits'])
+        assert again['visits']['partitions_added'] == ['2030-04']
+
+    def test_scan_matches_live_report(self, app, monkeypatch):
+        """Test mismo reporte desde los archivos que desde la base"""
+        monkeypatch.setattr(analytics_snapshots, 'safe_import',
+                            lambda name: None if name == 'duckdb' else __import__(name))
+        SnapshotManager().run(now=NOW, tables=['visits'])
+
+        table = analytics_snapshots.snapshot_manager.scan('visits', columns=['visitor_name'], months=['2030-02'])
+        assert table.num_rows == 1
+        assert 'qr_code' not in analytics_snapshots.snapshot_manager.schema('visits').names
+
+        manager = AnalyticsManager()
+        live = manager.monthly_report('visits', 'status', months=['2030-01', '2030-02'])
+        snapshot = manager.monthly_report('visits', 'status', months=['2030-01', '2030-02'], source='snapshot')
+        assert snapshot['rows'] == live['rows']
@@ -0,0 +1,85 @@
+"""
+Tests para acciones en lote sobre usuarios
+"""
+
+import pytest
+from models import db, User, Notification
+from services import bulk_user_actions
+from services.bulk_user_actions import BulkUserActions, normalize_user_ids
+
+
+def create_user(username, role='resident', is_active=True):
+    user = User(username=username, email=f'{username}@test.com', name=username,
+                role=role, is_active=is_active, password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+class TestBulkUserActions:
+    """Tests para el ejecutor de acciones en lote"""
+
+    def test_normalize_user_ids(self):
+        """Test normalización de IDs recibidos"""
+        assert normalize_user_ids(['3', 1, '3', 'x', None, 2]) == [3, 1, 2]
+
+    def test_validate(self):
+        """Test validación de acción y rol"""
+        assert BulkUserActions.validate('activate') is None
+        assert 'desconocida' in BulkUserActions.validate('explode')
+        assert BulkUserActions.validate('change_role', 'superuser') == 'Rol inválido'
+
+    def test_deactivate_skips_current_user(self, app):
+        """Test desactivación en bloque sin afectar al usuario actual"""
+        admin = create_user('jefe', role='admin')
+        residents = [create_user(f'vecino{i}') for i in range(5)]
+        ids = [admin.id] + [user.id for user in residents]
+
+        summary = BulkUserActions.apply('deactivate', ids, admin.id)
+
+        assert summary['affected'] == 5
+        assert 'jefe: saltado (usuario actual)' in summary['results']
+        active = {user.username for user in User.query.filter_by(is_active=True)}
+        assert active == {'jefe'}
+
+    def test_chunked_processing_reports_progress(self, app, monkeypatch):
+        """Test procesamiento por bloques con progreso de la tarea"""
+        monkeypatch.setattr(bulk_user_actions, 'CHUNK_SIZE', 2)
+        users = [create_user(f'vecino{i}') for i in range(5)]
+
+        class FakeJob:
+            def __init__(self):
+                self.progress = []
+
+            def update_progress(self, processed, total=None):
+                self.progress.append((processed, total))
+
+        job = FakeJob()
+        summary = BulkUserActions.apply('verify_email', [user.id for user in users], 0, job=job)
+
+        assert summary['affected'] == 5
+        assert job.progress == [(0, 5), (2, 5), (4, 5), (5, 5)]
+        assert User.query.filter_by(email_verified=True).count() == 5
+
+    def test_delete_cascades_and_protects_users(self, app):
+        """Test eliminación en bloque con dependencias y usuarios protegidos"""
+        acting = create_user('jefe', role='admin')
+        protected = create_user('admin', role='admin')
+        target = create_user('vecino')
+        db.session.add(Notification(user_id=target.id, title='Aviso', message='Hola'))
+        db.session.commit()
+        target_id = target.id
+
+        summary = BulkUserActions.apply('delete', [acting.id, protected.id, target_id], acting.id)
+
+        assert summary['affected'] == 1
+        assert db.session.get(User, target_id) is None
+        assert Notification.query.count() == 0
+        assert User.query.count() == 2
+
+    def test_change_role_keeps_last_admin(self, app):
+        """Test que no se quite el rol al último administrador"""
+        admin = create_user('jefe', role='admin')
+
+        with pytest.raises(ValueError):
+            BulkUserActions.apply('change_role', [admin.id], 0, new_role='resident')
@@ -0,0 +1,93 @@
+"""
+Tests para el feed de calendario de reservas
+"""
+
+import pytest
+from datetime import datetime
+from models import db, User, Reservation
+from services.calendar_feed import calendar_feed, months_between
+
+
+@pytest.fixture
+def app_options():
+    return {'login': True}
+
+
+@pytest.fixture
+def app(app):
+    """Blueprint de reservas y un vecino con sesión"""
+    from routes.reservations import bp
+
+    app.register_blueprint(bp)
+    db.session.add(User(username='vecino', email='vecino@test.com', name='Ana Vecina', password_hash='x'))
+    db.session.commit()
+    calendar_feed.clear()
+    return app
+
+
+@pytest.fixture
+def client(app, login_client):
+    return login_client(app, 1)
+
+
+def reserve(start, end, space_type='sum', status='approved'):
+    reservation = Reservation(user_id=1, space_type=space_type, space_name=space_type.upper(),
+                              start_time=start, end_time=end, status=status)
+    db.session.add(reservation)
+    db.session.commit()
+    return reservation
+
+
+class TestCalendarFeed:
+    """Tests para eventos por mes y por rango"""
+
+    def test_months_between(self):
+        """Test meses que abarca un rango"""
+        assert months_between(datetime(2025, 12, 28), datetime(2026, 2, 1)) == ['2025-12', '2026-01']
+
+    def test_month_events_include_user(self, app):
+        """Test eventos del mes con nombre de usuario y filtro por espacio"""
+        reserve(datetime(2030, 3, 10, 10), datetime(2030, 3, 10, 12))
+        reserve(datetime(2030, 3, 11, 10), datetime(2030, 3, 11, 12), space_type='piscina')
+        reserve(datetime(2030, 3, 12, 10), datetime(2030, 3, 12, 12), status='pending')
+
+        data = calendar_feed.get_month('2030-03', '/reservations/')
+        assert [event['space_type'] for event in data['events']] == ['sum', 'piscina']
+        assert data['events'][0]['title'] == 'SUM - Ana Vecina'
+        assert data['events'][0]['url'] == f"/reservations/{data['events'][0]['id']}"
+
+        only_pool = calendar_feed.get_month('2030-03', '/reservations/', 'piscina')
+        assert len(only_pool['events']) == 1
+        assert only_pool['etag'] != data['etag']
+
+    def test_change_invalidates_only_affected_month(self, app):
+        """Test invalidación del mes modificado conservando los demás"""
+        reserve(datetime(2030, 3, 10, 10), datetime(2030, 3, 10, 12))
+        calendar_feed.get_month('2030-03', '/reservations/')
+        calendar_feed.get_month('2030-04', '/reservations/')
+
+        reserve(datetime(2030, 4, 2, 10), datetime(2030, 4, 2, 12))
+
+        assert '2030-03' in calendar_feed._months
+        assert '2030-04' not in calendar_feed._months
+        assert len(calendar_feed.get_month('2030-04', '/reservations/')['events']) == 1
+
+    def test_range_endpoint_with_etag(self, app, client):
+        """Test consulta por rango y respuesta 304 con ETag vigente"""
+        reserve(datetime(2030, 3, 31, 22), datetime(2030, 4, 1, 2))
+        reserve(datetime(2030, 4, 20, 10), datetime(2030, 4, 20, 12))
+
+        response = client.get('/reservations/api/calendar-events?start=2030-03-25&end=2030-04-10')
+        assert response.status_code == 200
+        assert len(response.get_json()) == 1
+        etag = response.headers['ETag']
+
+        cached = client.get('/reservations/api/calendar-events?start=2030-03-25&end=2030-04-10',
+                            headers={'If-None-Match': etag})
+        assert cached.status_code == 304
+
+        reserve(datetime(2030, 4, 5, 10), datetime(2030, 4, 5, 12))
+        refreshed = client.get('/reservations/api/calendar-events?start=2030-03-25&end=2030-04-10',
+                               headers={'If-None-Match': etag})
+        assert refreshed.status_code == 200
+        assert len(refreshed.get_json()) == 2
@@ -0,0 +1,228 @@
+"""
+Tests para el programador de tareas del cluster
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import pytest
+from flask import Flask, current_app
+import cluster_scheduler as scheduler_module
+from cluster_scheduler import (ClusterScheduler, CronTrigger, IntervalTrigger, DatabaseLease, FileLease, daily_at)
+from metrics_registry import metrics_registry
+
+
+@pytest.fixture(autouse=True)
+def metrics_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics_registry, 'directory', str(tmp_path / 'metrics'))
+    monkeypatch.setattr(metrics_registry, '_worker', None)
+
+
+@pytest.fixture
+def scheduler():
+    """Programador sin hilo propio: las pruebas llaman a tick() con tiempos controlados"""
+    scheduler = ClusterScheduler()
+    scheduler.node_id = 'test-node'
+    scheduler._executor = ThreadPoolExecutor(max_workers=2)
+    yield scheduler
+    scheduler._executor.shutdown(wait=True)
+
+
+def wait_idle(scheduler, name, timeout=2):
+    deadline = time.time() + timeout
+    while scheduler.jobs[name].running is not None and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestTriggers:
+    """Disparadores por intervalo y cron"""
+
+    def test_interval(self):
+        trigger = IntervalTrigger(60, delay=5)
+        assert trigger.first_run(1000) == 1005
+        assert trigger.next_run(1005) == 1065
+        assert IntervalTrigger(60).first_run(1000) == 1060
+        with pytest.raises(ValueError):
+            IntervalTrigger(0)
+
+    def test_daily(self):
+        trigger = daily_at('02:30')
+        assert trigger.next_after(datetime(2024, 5, 10, 1, 0)) == datetime(2024, 5, 10, 2, 30)
+        assert trigger.next_after(datetime(2024, 5, 10, 2, 30)) == datetime(2024, 5, 11, 2, 30)
+
+    def test_weekday_and_steps(self):
+        sunday = CronTrigger('0 3 * * 0')
+        # 2024-05-10 es viernes
+        assert sunday.next_after(datetime(2024, 5, 10, 12, 0)) == datetime(2024, 5, 12, 3, 0)
+        assert CronTrigger('0 3 * * 7').next_after(datetime(2024, 5, 10)) == datetime(2024, 5, 12, 3, 0)
+
+        quarter = CronTrigger('*/15 9-10 * * *')
+        assert quarter.next_after(datetime(2024, 5, 10, 9, 1)) == datetime(2024, 5, 10, 9, 15)
+        assert quarter.next_after(datetime(2024, 5, 10, 10, 45)) == datetime(2024, 5, 11, 9, 0)
+
+    def test_month_and_day_of_month_or_weekday(self):
+        assert CronTrigger('0 0 1 * *').next_after(datetime(2024, 1, 31, 10)) == datetime(2024, 2, 1)
+        assert CronTrigger('0 0 29 2 *').next_after(datetime(2024, 3, 1)) == datetime(2028, 2, 29)
+        # Con día del mes y día de semana restringidos basta con que coincida uno
+        assert CronTrigger('0 0 15 * 1').next_after(datetime(2024, 5, 10)) == datetime(2024, 5, 13)
+
+    def test_invalid_expressions(self):
+        for expression in ('* * *', '60 * * * *', '* 24 * * *', '*/0 * * * *'):
+            with pytest.raises(ValueError):
+                CronTrigger(expression)
+
+
+class TestFileLease:
+    """Elección de líder con lock de archivo"""
+
+    def test_single_leader(self, tmp_path):
+        path = str(tmp_path / 'scheduler.lock')
+        first, second = FileLease(path), FileLease(path)
+        assert first.acquire()
+        assert first.acquire()
+        assert not second.acquire()
+        first.release()
+        assert second.acquire()
+        second.release()
+
+
+class TestDatabaseLease:
+    """Lock consultivo en una conexión con autocommit"""
+
+    def test_lock_connection_is_not_left_in_transaction(self):
+        from sqlalchemy import create_engine, event
+
+        engine = create_engine('sqlite://')
+        statements = []
+
+        @event.listens_for(engine, 'connect')
+        def advisory_functions(dbapi_connection, record):
+            dbapi_connection.create_function('pg_try_advisory_lock', 1, lambda lock_id: 1)
+            dbapi_connection.create_function('pg_advisory_unlock', 1, lambda lock_id: 1)
+
+        @event.listens_for(engine, 'begin')
+        def began(connection):
+            statements.append(connection.get_execution_options().get('isolation_level'))
+
+        lease = DatabaseLease(engine, lock_id=7)
+        assert lease.acquire()
+        assert lease.acquire()         # Latido sobre la misma conexión
+        assert lease._connection.get_execution_options()['isolation_level'] == 'AUTOCOMMIT'
+        assert set(statements) == {'AUTOCOMMIT'}
+        lease.release()
+        assert lease._connection is None
+
+
+class TestClusterScheduler:
+    """Disparo, alcance, superposición, tiempo límite e historial"""
+
+    def test_cluster_jobs_run_only_on_leader(self, scheduler):
+        calls = []
+        scheduler.interval('cluster_job', 60, lambda: calls.append('cluster'), app_context=False)
+        scheduler.interval('local_job', 60, lambda: calls.append('local'), scope='local', app_context=False)
+        due = time.time() + 61
+
+        assert scheduler.tick(due) == ['local_job']
+        wait_idle(scheduler, 'local_job')
+
+        scheduler.is_leader = True
+        assert scheduler.tick(due + 61) == ['cluster_job', 'local_job']
+        wait_idle(scheduler, 'cluster_job')
+        wait_idle(scheduler, 'local_job')
+        assert sorted(calls) == ['cluster', 'local', 'local']
+        assert [run['status'] for run in scheduler.history('cluster_job')] == ['success']
+
+    def test_jitter_delays_next_run(self, scheduler):
+        job = scheduler.interval('jittered', 60, lambda: None, jitter=10, app_context=False)
+        now = time.time()
+        assert now + 60 <= job.next_run <= now + 71
+
+    def test_overlapping_run_is_skipped_and_timeout_recorded(self, scheduler):
+        release = threading.Event()
+        scheduler.is_leader = True
+        job = scheduler.interval('slow', 10, release.wait, timeout=5, app_context=False)
+        start = job.next_run
+
+        assert scheduler.tick(start) == ['slow']
+        scheduler.tick(start + 3)
+        assert scheduler.history('slow')[0]['status'] == 'running'
+
+        scheduler.tick(start + 6)   # Pasó el tiempo límite
+        assert scheduler.history('slow')[0]['status'] == 'timeout'
+        assert job.running is not None   # No se superpone mientras el hilo siga vivo
+
+        assert scheduler.tick(start + 10) == []
+        assert job.skipped == 1
+
+        release.set()
+        wait_idle(scheduler, 'slow')
+        assert job.running is None
+        assert scheduler.history('slow')[0]['status'] == 'timeout'
+
+    def test_errors_are_recorded(self, scheduler):
+        def failing():
+            raise RuntimeError('sin conexión')
+
+        scheduler.is_leader = True
+        job = scheduler.interval('failing', 60, failing, app_context=False)
+        scheduler.tick(job.next_run)
+        wait_idle(scheduler, 'failing')
+        run = scheduler.history('failing')[0]
+        assert run['status'] == 'error'
+        assert run['error'] == 'sin conexión'
+        assert job.next_run > time.time()
+
+    def test_run_now_uses_app_context(self, scheduler):
+        scheduler.app = Flask('scheduler_test')
+        scheduler.interval('needs_app', 3600, lambda: current_app.name)
+
+        run = scheduler.run_now('needs_app')
+        assert run['status'] == 'success'
+        assert run['trigger'] == 'manual'
+        with pytest.raises(KeyError):
+            scheduler.run_now('missing')
+
+    def test_register_replaces_and_keeps_history(self, scheduler):
+        scheduler.interval('job', 60, lambda: None, app_context=False)
+        scheduler.run_now('job')
+        scheduler.interval('job', 120, lambda: None, app_context=False)
+        assert scheduler.jobs['job'].trigger.seconds == 120
+        assert len(scheduler.history('job')) == 1
+        status = scheduler.status()
+        assert [job['name'] for job in status['jobs']] == ['job']
+        assert status['jobs'][0]['trigger'] == 'every 120s'
+
+
+class TestMonitoringJobs:
+    """Verificaciones del monitoreo inteligente una vez por cluster"""
+
+    @pytest.fixture
+    def monitoring(self, scheduler, monkeypatch):
+        import intelligent_monitoring
+        from alert_rules import AlertRuleEngine
+
+        monkeypatch.setattr(scheduler_module, 'cluster_scheduler', scheduler)
+        monkeypatch.setattr(intelligent_monitoring, 'alert_engine', AlertRuleEngine())
+        return intelligent_monitoring.IntelligentMonitoringSystem()
+
+    def test_checks_run_once_per_cluster(self, scheduler, monitoring):
+        monitoring.start_monitoring()
+        jobs = [job for name, job in scheduler.jobs.items() if name.startswith('monitoring.')]
+        assert len(jobs) == 5
+        assert {job.scope for job in jobs} == {'cluster'}
+
+    def test_security_automation_only_on_leader(self, scheduler, monitoring, monkeypatch):
+        import intelligent_monitoring
+
+        calls = []
+        monkeypatch.setattr(intelligent_monitoring.automation_manager, 'execute_automation',
+                            lambda kind, data: calls.append(data['alert_id']))
+        alert = {'id': 'intrusion', 'state': 'firing', 'severity': 'critical', 'title': 'Intrusión', 'message': '...'}
+
+        monitoring._on_alerts('security', [alert])
+        assert calls == []
+        scheduler.is_leader = True
+        monitoring._on_alerts('security', [alert])
+        assert calls == ['intrusion']
+
@@ -0,0 +1,92 @@
+"""
+Tests para el motor de cohortes
+"""
+
+import pytest
+from datetime import datetime
+from models import db, User, Visit, Maintenance, CohortRetention
+from services.cohort_engine import CohortEngine, shift_month, month_offset
+
+NOW = datetime(2030, 4, 15)
+
+
+@pytest.fixture
+def app(app):
+    """Usuarios de enero y febrero con su actividad"""
+    # Cohorte de enero: 2 usuarios; cohorte de febrero: 1 usuario
+    for i, created in enumerate((datetime(2030, 1, 5), datetime(2030, 1, 20), datetime(2030, 2, 3)), start=1):
+        db.session.add(User(username=f'vecino{i}', email=f'vecino{i}@test.com', name=f'Vecino {i}',
+                            password_hash='x', created_at=created))
+    db.session.add(Visit(visitor_name='Invitado', resident_id=1, created_at=datetime(2030, 1, 6)))
+    db.session.add(Visit(visitor_name='Invitado', resident_id=1, created_at=datetime(2030, 2, 6)))
+    db.session.add(Maintenance(user_id=2, title='Luz', description='...', created_at=datetime(2030, 2, 10)))
+    db.session.add(Maintenance(user_id=1, title='Agua', description='...', created_at=datetime(2030, 2, 11)))
+    db.session.add(Visit(visitor_name='Invitado', resident_id=3, created_at=datetime(2030, 3, 1)))
+    db.session.commit()
+    return app
+
+
+class TestMonthKeys:
+    """Tests para la aritmética de meses"""
+
+    def test_shift_and_offset(self):
+        """Test desplazamiento entre años"""
+        assert shift_month('2030-01', -1) == '2029-12'
+        assert shift_month('2030-11', 14) == '2032-01'
+        assert month_offset('2029-12', '2030-02') == 2
+
+
+class TestCohortEngine:
+    """Tests para la matriz, la materialización y el mapa de calor"""
+
+    def test_single_grouped_query(self, app, count_queries):
+        """Test matriz completa en una sola consulta"""
+        rows, statements = count_queries(CohortEngine().compute)
+
+        assert len(statements) == 1
+        cells = {(row['cohort_month'], row['period_index']): row['active_users'] for row in rows}
+        assert cells == {('2030-01', 0): 1, ('2030-01', 1): 2, ('2030-02', 1): 1}
+
+    def test_heatmap(self, app):
+        """Test retención por cohorte y mes desde el alta"""
+        heatmap = CohortEngine().heatmap(months=4, now=NOW)
+
+        assert heatmap['cohorts'] == ['2030-01', '2030-02', '2030-03', '2030-04']
+        assert heatmap['cohort_sizes'] == [2, 1, 0, 0]
+        assert heatmap['retention'][0] == [0.5, 1.0, 0.0, 0.0]
+        assert heatmap['retention'][1] == [0.0, 1.0, 0.0, None]
+        assert heatmap['retention'][3] == [None, None, None, None]
+
+    def test_incremental_refresh_only_latest_month(self, app):
+        """Test actualización que conserva los meses ya materializados"""
+        engine = CohortEngine()
+        engine.refresh(now=datetime(2030, 3, 20))
+
+        # Actividad antigua eliminada (p. ej. archivada): el mes ya materializado no cambia
+        Visit.query.filter(Visit.created_at < datetime(2030, 2, 1)).delete()
+        db.session.add(Visit(visitor_name='Invitado', resident_id=2, created_at=datetime(2030, 3, 25)))
+        db.session.commit()
+        result = engine.refresh(now=datetime(2030, 3, 28))
+
+        assert result['mode'] == 'incremental'
+        stored = {(row.cohort_month, row.activity_month): row.active_users for row in CohortRetention.query.all()}
+        assert stored[('2030-01', '2030-01')] == 1
+        assert stored[('2030-01', '2030-03')] == 1
+        assert stored[('2030-02', '2030-03')] == 1
+
+    def test_period_retention(self, app):
+        """Test retención al primer mes solo de cohortes completas"""
+        assert CohortEngine().period_retention(1, months=4, now=NOW) == {'2030-01': 1.0, '2030-02': 1.0}
+
+
+class TestCohortRoute:
+    """Tests para el endpoint /api/v1/analytics/cohorts"""
+
+    def test_requires_admin(self, analytics_app, login_client):
+        """Test sin sesión 401, vecino 403 y admin con el mapa de calor"""
+        assert analytics_app.test_client().get('/api/v1/analytics/cohorts').status_code == 401
+        assert login_client(analytics_app, 2).get('/api/v1/analytics/cohorts').status_code == 403
+
+        response = login_client(analytics_app, 1).get('/api/v1/analytics/cohorts?months=2')
+        assert response.status_code == 200
+        assert len(response.get_json()['data']['cohorts']) == 2
@@ -0,0 +1,110 @@
+"""
+Tests para retención y archivo de datos
+"""
+
+import json
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from models import db, User, Notification, ChatbotSession, Visit
+from data_retention import (RetentionManager, RETENTION_CONFIG, archive_table_for,
+                            compact_chatbot_context)
+
+OLD = datetime.utcnow() - timedelta(days=400)
+
+
+@pytest.fixture
+def app(app):
+    """Un vecino para las notificaciones"""
+    db.session.add(User(username='vecino', email='vecino@test.com', name='Vecino', password_hash='x'))
+    db.session.commit()
+    return app
+
+
+@pytest.fixture
+def manager(app, monkeypatch):
+    monkeypatch.setitem(RETENTION_CONFIG, 'batch_size', 3)
+    monkeypatch.setitem(RETENTION_CONFIG, 'batch_pause', 0)
+    manager = RetentionManager()
+    manager.init_app(app)
+    manager.ensure_archive_tables()
+    return manager
+
+
+def notify(count, created_at, is_read=True):
+    for i in range(count):
+        db.session.add(Notification(user_id=1, title=f'Aviso {i}', message='...', is_read=is_read,
+                                    created_at=created_at))
+    db.session.commit()
+
+
+class TestRetentionPolicies:
+    """Tests para archivo y compactación por bloques"""
+
+    def test_archive_in_batches(self, app, manager):
+        """Test archivo de notificaciones viejas en varios bloques"""
+        notify(7, OLD)
+        notify(2, datetime.utcnow())
+
+        result = manager.run(policy_names=['notifications_read'])
+
+        assert result['results']['notifications_read']['affected'] == 7
+        assert Notification.query.count() == 2
+        archived = db.session.execute(select(archive_table_for(Notification))).mappings().all()
+        assert len(archived) == 7
+        assert all(row['archived_at'] is not None for row in archived)
+
+    def test_unread_kept_longer(self, app, manager):
+        """Test política separada para notificaciones no leídas"""
+        notify(2, datetime.utcnow() - timedelta(days=120), is_read=False)
+
+        manager.run(policy_names=['notifications_read', 'notifications_unread'])
+
+        assert Notification.query.count() == 2
+
+    def test_compact_chatbot_sessions(self, app, manager):
+        """Test cierre de sesiones inactivas recortando el historial"""
+        history = [{'role': 'user', 'text': str(i)} for i in range(50)]
+        db.session.add(ChatbotSession(session_id='s1', user_id=1, context=json.dumps({'messages': history}),
+                                      is_active=True, updated_at=datetime.utcnow() - timedelta(days=2)))
+        db.session.commit()
+
+        manager.run(policy_names=['chatbot_sessions_compact'])
+
+        session = ChatbotSession.query.one()
+        assert session.is_active is False
+        assert len(json.loads(session.context)['messages']) == RETENTION_CONFIG['chatbot_history_keep']
+
+    def test_strip_visit_qr(self, app, manager):
+        """Test eliminación del QR de visitas finalizadas"""
+        for status in ('completed', 'pending'):
+            db.session.add(Visit(visitor_name='Invitado', resident_id=1, status=status, qr_code='base64...',
+                                 qr_code_id=status, created_at=datetime.utcnow() - timedelta(days=10)))
+        db.session.commit()
+
+        manager.run(policy_names=['visits_strip_qr'])
+
+        qr_codes = dict(db.session.execute(select(Visit.status, Visit.qr_code)).all())
+        assert qr_codes == {'completed': None, 'pending': 'base64...'}
+
+    def test_compact_context_invalid_json(self):
+        """Test contexto no JSON sin modificar"""
+        assert compact_chatbot_context('texto libre') == 'texto libre'
+
+
+class TestIncludeArchived:
+    """Tests para consultas que incluyen filas archivadas"""
+
+    def test_union_of_live_and_archived(self, app, manager):
+        """Test consulta combinada con filtros"""
+        notify(4, OLD)
+        manager.run(policy_names=['notifications_read'])
+        notify(1, datetime.utcnow())
+
+        records = manager.query_with_archived(Notification, filters={'user_id': 1}, order_by='created_at')
+
+        assert len(records) == 5
+        assert records[0]['archived'] is False
+        assert sum(1 for record in records if record['archived']) == 4
+        assert len(manager.query_with_archived(Notification, include_archived=False)) == 1
+        assert manager.query_with_archived(Notification, filters={'user_id': 2}) == []
@@ -0,0 +1,105 @@
+"""
+Tests para el motor de exportación
+"""
+
+import csv
+import gzip
+import io
+import json
+import pytest
+from models import db, User, Reservation
+from datetime import datetime, timedelta
+from export_engine import ExportEngine, EXPORT_DATASETS, normalize_format
+
+
+@pytest.fixture
+def app(app, tmp_path):
+    """25 usuarios (el primero admin) y carpeta temporal de exportaciones"""
+    app.config['EXPORT_FOLDER'] = str(tmp_path)
+    for i in range(25):
+        db.session.add(User(username=f'vecino{i}', email=f'vecino{i}@test.com', name=f'Vecino {i}',
+                            password_hash='x', role='admin' if i == 0 else 'resident'))
+    db.session.commit()
+    return app
+
+
+@pytest.fixture
+def engine(app):
+    engine = ExportEngine()
+    engine.init_app(app)
+    engine.chunk_size = 10
+    return engine
+
+
+def read_stream(response) -> bytes:
+    return b''.join(response.response)
+
+
+class TestExportEngine:
+    """Tests para exportaciones en streaming"""
+
+    def test_normalize_format(self):
+        """Test alias y formatos no soportados"""
+        assert normalize_format('json') == 'ndjson'
+        assert normalize_format(None) == 'csv'
+        with pytest.raises(ValueError):
+            normalize_format('pdf')
+
+    def test_csv_stream_in_chunks(self, app, engine):
+        """Test CSV generado por bloques con todas las filas"""
+        dataset = EXPORT_DATASETS['users']
+        chunks = list(engine.generate(dataset, 'csv'))
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode('utf-8'))))
+
+        assert len(chunks) == 3
+        assert rows[0][:3] == ['ID', 'Username', 'Email']
+        assert len(rows) == 26
+        assert rows[1][5] == 'Sí'
+
+    def test_ndjson_gzip_response(self, app, engine):
+        """Test respuesta NDJSON comprimida con filtros"""
+        with app.test_request_context():
+            response = engine.stream_response('users', 'json', {'role': 'resident'}, compress=True)
+            body = gzip.decompress(read_stream(response)).decode('utf-8')
+
+        lines = [json.loads(line) for line in body.splitlines()]
+        assert response.mimetype == 'application/gzip'
+        assert len(lines) == 24
+        assert all(line['Rol'] == 'resident' for line in lines)
+
+    def test_owner_scope(self, app, engine):
+        """Test exportación limitada a los registros del usuario"""
+        start = datetime(2025, 1, 1, 10, 0)
+        for offset, user_id in enumerate((1, 1, 2)):
+            slot_start = start + timedelta(days=offset)
+            db.session.add(Reservation(user_id=user_id, space_type='quincho', space_name='Quincho',
+                                       start_time=slot_start, end_time=slot_start + timedelta(hours=2)))
+        db.session.commit()
+
+        dataset = EXPORT_DATASETS['reservations']
+        assert engine.count_rows(dataset, owner_id=1) == 2
+        assert engine.count_rows(dataset) == 3
+
+    def test_invalid_filter_dates(self, app, engine):
+        """Test fechas de filtro inválidas"""
+        with pytest.raises(ValueError):
+            engine.build_statement(EXPORT_DATASETS['users'], {'date_from': 'ayer'})
+
+    def test_export_to_file_reports_progress(self, app, engine, tmp_path):
+        """Test exportación a archivo en segundo plano"""
+        class FakeJob:
+            id = 'abcdef123456'
+
+            def __init__(self):
+                self.progress = []
+
+            def update_progress(self, processed, total=None):
+                self.progress.append((processed, total))
+
+        job = FakeJob()
+        result = engine.export_to_file(job, 'users', 'xlsx')
+
+        assert result['rows'] == 25
+        assert (tmp_path / result['filename']).exists()
+        assert job.progress[0] == (0, 25)
+        assert job.progress[-1] == (25, None)
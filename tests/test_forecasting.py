@@ -0,0 +1,119 @@
+"""
+Tests para el módulo de pronósticos
+"""
+
+import numpy as np
+import pytest
+from datetime import datetime
+from models import db, User, Maintenance, Expense
+from services.forecasting import (fit_trend, seasonal_naive, ewma_bands, forecast_batch,
+                                  monthly_forecasts, ForecastCache)
+import services.forecasting as forecasting_module
+
+
+class TestForecastFunctions:
+    """Tests para tendencia, estacionalidad y bandas"""
+
+    def test_fit_trend_per_row(self):
+        """Test pendiente y ordenada de cada fila"""
+        matrix = np.array([[1, 3, 5, 7], [10, 10, 10, 10], [8, 6, 4, 2]], dtype=float)
+        trend = fit_trend(matrix)
+
+        assert trend['slope'] == pytest.approx([2, 0, -2])
+        assert trend['intercept'] == pytest.approx([1, 10, 8])
+        assert trend['r_squared'] == pytest.approx([1, 1, 1])
+
+    def test_seasonal_naive(self):
+        """Test repetición del período de la temporada anterior"""
+        matrix = np.array([[1, 2, 3, 4, 5, 6]], dtype=float)
+        assert seasonal_naive(matrix, season_length=3, horizon=4).tolist() == [[4, 5, 6, 4]]
+        # Sin temporada completa: último valor
+        assert seasonal_naive(matrix, season_length=12, horizon=2).tolist() == [[6, 6]]
+
+    def test_ewma_band_flags_spike(self):
+        """Test último valor fuera de la banda marcado como anomalía"""
+        matrix = np.array([[10, 11, 9, 10, 11, 9, 10, 40],
+                           [10, 11, 9, 10, 11, 9, 10, 11]], dtype=float)
+        bands = ewma_bands(matrix)
+
+        assert bands['anomaly'].tolist() == [True, False]
+        assert bands['lower'][1] < 11 < bands['upper'][1]
+
+    def test_forecast_batch(self):
+        """Test pronóstico por etiqueta sin valores negativos"""
+        forecasts = forecast_batch(['sube', 'baja'], [[1, 2, 3, 4], [3, 2, 1, 0]], horizon=2)
+
+        assert forecasts['sube']['forecast'] == pytest.approx([5, 6])
+        assert forecasts['sube']['trend'] == 'up'
+        assert forecasts['baja']['forecast'] == [0.0, 0.0]
+        assert forecasts['baja']['trend'] == 'down'
+
+
+@pytest.fixture
+def app(app, monkeypatch):
+    """Mantenimientos de electricidad (1, 2 y 3 por mes) y uno de plomería"""
+    monkeypatch.setattr(forecasting_module, 'forecast_cache', ForecastCache())
+    db.session.add(User(username='vecino', email='vecino@test.com', name='Vecino', password_hash='x'))
+    for month, count in ((1, 1), (2, 2), (3, 3)):
+        for _ in range(count):
+            db.session.add(Maintenance(user_id=1, title='Luz', description='...', category='electricidad',
+                                       created_at=datetime(2030, month, 10)))
+    db.session.add(Maintenance(user_id=1, title='Agua', description='...', category='plomeria',
+                               created_at=datetime(2030, 3, 5)))
+    db.session.commit()
+    return app
+
+
+class TestMonthlyForecasts:
+    """Tests para pronósticos sobre la base de datos con caché"""
+
+    def forecast(self):
+        return monthly_forecasts('maintenance', Maintenance.created_at, key=Maintenance.category,
+                                 months=3, now=datetime(2030, 4, 15))
+
+    def test_total_and_by_key(self, app):
+        """Test series del total y de cada categoría"""
+        result = self.forecast()
+
+        assert result['periods'] == ['2030-01', '2030-02', '2030-03']
+        assert result['total']['current'] == 4
+        assert result['by_key']['electricidad']['forecast'][0] == pytest.approx(4)
+        assert result['by_key']['plomeria']['current'] == 1
+
+    def test_cached_until_new_data(self, app, count_queries):
+        """Test recálculo solo cuando cambian los datos"""
+        first, _ = count_queries(self.forecast)
+        second, statements = count_queries(self.forecast)
+        assert second is first
+        assert len(statements) == 1   # Solo la firma de los datos
+
+        db.session.add(Maintenance(user_id=1, title='Gas', description='...', category='gas',
+                                   created_at=datetime(2030, 3, 20)))
+        db.session.commit()
+        assert 'gas' in self.forecast()['by_key']
+
+    def test_status_update_invalidates(self, app):
+        """Test un cambio de estado sin nuevas filas recalcula el pronóstico"""
+        for month in (1, 2, 3):
+            db.session.add(Expense(user_id=1, month=f'2030-{month:02d}', amount=100.0, status='pending',
+                                   created_at=datetime(2030, month, 5)))
+        db.session.commit()
+
+        def forecast():
+            return monthly_forecasts('expenses', Expense.created_at, key=Expense.status, value=Expense.amount,
+                                     agg='sum', months=3, now=datetime(2030, 4, 15))
+
+        assert set(forecast()['by_key']) == {'pending'}
+        expense = Expense.query.first()
+        expense.status = 'overdue'
+        db.session.commit()
+        assert set(forecast()['by_key']) == {'pending', 'overdue'}
+
+    def test_filters_are_part_of_signature(self, app):
+        """Test otro filtro sobre la misma serie no reutiliza el resultado"""
+        def forecast(category):
+            return monthly_forecasts('maintenance', Maintenance.created_at, months=3, now=datetime(2030, 4, 15),
+                                     filters=[Maintenance.category == category])
+
+        assert forecast('electricidad')['total']['current'] == 3
+        assert forecast('plomeria')['total']['current'] == 1
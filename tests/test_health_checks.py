@@ -0,0 +1,127 @@
+"""
+Tests para las verificaciones de salud en paralelo, con límite de tiempo y caché
+"""
+
+import threading
+import time
+import pytest
+from sqlalchemy import event
+import app_modules.core.monitoring_service as monitoring_module
+from app_modules.core.monitoring_service import HealthChecker, MonitoringService, init_health_checks
+from models import db
+
+
+def slow_check(seconds, healthy=True):
+    def check():
+        time.sleep(seconds)
+        return {'healthy': healthy, 'message': f'{seconds}s'}
+    return check
+
+
+class TestHealthChecker:
+    """Paralelismo, límites de tiempo y caché de la ronda"""
+
+    def test_checks_run_concurrently(self):
+        checker = HealthChecker(cache_ttl=0, workers=4)
+        for index in range(4):
+            checker.register_check(f'check{index}', slow_check(0.2))
+
+        started = time.monotonic()
+        results = checker.run_checks()
+        assert time.monotonic() - started < 0.6
+        assert results['overall_status'] == 'healthy'
+        assert all(check['duration_ms'] >= 200 for check in results['checks'].values())
+
+    def test_timeout_marks_check_and_keeps_others(self):
+        checker = HealthChecker(cache_ttl=0)
+        checker.register_check('database', slow_check(1.0), critical=True, timeout=0.1)
+        checker.register_check('disk', slow_check(0), critical=True)
+
+        started = time.monotonic()
+        results = checker.run_checks()
+        assert time.monotonic() - started < 0.5
+        assert results['overall_status'] == 'critical'
+        assert results['checks']['database']['status'] == 'timeout'
+        assert results['checks']['disk']['status'] == 'healthy'
+
+        # Mientras la verificación colgada siga corriendo no se encola otra
+        again = checker.run_checks()
+        assert again['checks']['database']['message'] == 'Check still running from a previous round'
+        assert checker.stats['timeouts'] == 2
+
+    def test_errors_and_degraded_status(self):
+        checker = HealthChecker(cache_ttl=0)
+
+        def broken():
+            raise RuntimeError('sin conexión')
+
+        checker.register_check('cache', broken)
+        checker.register_check('memory', lambda: {'healthy': False, 'message': 'alta'})
+        results = checker.run_checks()
+        assert results['overall_status'] == 'degraded'
+        assert results['checks']['cache']['status'] == 'error'
+        assert results['checks']['memory']['status'] == 'unhealthy'
+
+    def test_cached_round_and_single_flight(self):
+        calls = []
+        checker = HealthChecker(cache_ttl=30)
+
+        def counted():
+            calls.append(1)
+            time.sleep(0.1)
+            return {'healthy': True}
+
+        checker.register_check('database', counted)
+        threads = [threading.Thread(target=checker.run_checks) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert checker.stats['runs'] == 1
+        assert checker.stats['cache_hits'] == 7
+        checker.run_checks(use_cache=False)
+        assert len(calls) == 2
+
+
+class TestHealthEndpoints:
+    """Sondas de vida y disponibilidad"""
+
+    @pytest.fixture
+    def health_app(self, make_app, monkeypatch):
+        service = MonitoringService()
+        service.health_checker.cache_ttl = 0
+        monkeypatch.setattr(monitoring_module, 'monitoring_service', service)
+
+        app = make_app()
+        init_health_checks(app)
+        return app
+
+    def test_liveness_does_not_touch_database(self, health_app):
+        statements = []
+        with health_app.app_context():
+            engine = db.engine
+
+        def count(*args):
+            statements.append(args[2])
+
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            response = health_app.test_client().get('/health/live')
+            assert response.status_code == 200
+            assert response.get_json()['status'] == 'alive'
+            assert statements == []
+
+            response = health_app.test_client().get('/health/ready')
+            assert response.get_json()['checks']['database']['status'] == 'healthy'
+            assert statements == ['SELECT 1']
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+
+    def test_readiness_fails_on_critical_check(self, health_app):
+        monitoring_module.monitoring_service.register_health_check(
+            'database', lambda: {'healthy': False, 'message': 'caída'}, critical=True)
+        response = health_app.test_client().get('/health/ready')
+        assert response.status_code == 503
+        assert response.get_json()['ready'] is False
@@ -0,0 +1,262 @@
+"""
+Tests para la cola de trabajos, el rol de proceso del programador y la entrega de notificaciones
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, update
+import cluster_scheduler as scheduler_module
+from cluster_scheduler import ClusterScheduler
+from job_queue import JobQueue, JOB_QUEUE_CONFIG, init_job_queue, job_queue
+from metrics_registry import metrics_registry
+from models import db, Expense, QueuedJob
+from notification_service import notification_service
+
+
+@pytest.fixture(autouse=True)
+def metrics_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics_registry, 'directory', str(tmp_path / 'metrics'))
+    monkeypatch.setattr(metrics_registry, '_worker', None)
+
+
+@pytest.fixture
+def queue(app):
+    queue = JobQueue()
+    queue.calls = []
+
+    @queue.handler('echo')
+    def echo(text):
+        queue.calls.append(text)
+
+    @queue.handler('broken')
+    def broken():
+        raise RuntimeError('SMTP caído')
+
+    return queue
+
+
+class TestJobQueue:
+    """Encolado, consumo y reintentos"""
+
+    def test_enqueue_requires_handler(self, queue):
+        with pytest.raises(KeyError):
+            queue.enqueue('missing')
+
+    def test_drain_runs_pending_jobs(self, queue):
+        first = queue.enqueue('echo', {'text': 'hola'})
+        queue.enqueue('echo', {'text': 'chau'})
+        queue.enqueue('echo', {'text': 'después'}, delay=3600)
+
+        assert queue.drain() == 2
+        assert queue.calls == ['hola', 'chau']
+        job = db.session.get(QueuedJob, first)
+        assert job.status == 'done' and job.attempts == 1 and job.finished_at is not None
+        assert queue.counts() == {'pending': 1, 'running': 0, 'done': 2, 'failed': 0}
+
+    def test_claimed_job_is_not_taken_twice(self, queue):
+        """Un trabajo ya tomado por otro consumidor no vuelve a ejecutarse"""
+        job_id = queue.enqueue('echo', {'text': 'una vez'})
+        db.session.execute(update(QueuedJob).where(QueuedJob.id == job_id).values(status='running'))
+        db.session.commit()
+        assert queue._claim(datetime.utcnow()) == []
+        assert queue.calls == []
+
+    def test_failures_retry_with_backoff_then_fail(self, queue):
+        job_id = queue.enqueue('broken', max_attempts=2)
+
+        assert queue.drain() == 1
+        job = db.session.get(QueuedJob, job_id)
+        assert job.status == 'pending'
+        assert job.error == 'SMTP caído'
+        assert job.run_after > datetime.utcnow() + timedelta(seconds=JOB_QUEUE_CONFIG['retry_backoff_seconds'] - 5)
+
+        job.run_after = datetime.utcnow()
+        db.session.commit()
+        assert queue.drain() == 1
+        job = db.session.get(QueuedJob, job_id)
+        assert job.status == 'failed' and job.attempts == 2
+        assert queue.stats == {'processed': 0, 'failed': 1, 'retried': 1}
+
+    def test_stale_jobs_are_requeued(self, queue):
+        """Los trabajos de un consumidor que murió vuelven a la cola"""
+        job_id = queue.enqueue('echo', {'text': 'rescatado'})
+        stale = datetime.utcnow() - timedelta(seconds=JOB_QUEUE_CONFIG['stale_after_seconds'] + 1)
+        db.session.execute(update(QueuedJob).where(QueuedJob.id == job_id)
+                           .values(status='running', locked_at=stale, attempts=1))
+        db.session.commit()
+
+        assert queue.drain() == 1
+        assert queue.calls == ['rescatado']
+        assert db.session.get(QueuedJob, job_id).attempts == 2
+
+    def test_purge_old_finished_jobs(self, queue):
+        queue.enqueue('echo', {'text': 'viejo'})
+        queue.drain()
+        later = datetime.utcnow() + timedelta(hours=JOB_QUEUE_CONFIG['keep_finished_hours'] + 1)
+        assert queue.purge(now=later) == 1
+        assert sum(queue.counts().values()) == 0
+
+
+class TestProcessRole:
+    """Las tareas periódicas corren en el worker; los procesos web solo atienden requests"""
+
+    def test_web_never_leads(self, monkeypatch, tmp_path):
+        monkeypatch.setitem(scheduler_module.SCHEDULER_CONFIG, 'lock_path', str(tmp_path / 'scheduler.lock'))
+        monkeypatch.setitem(scheduler_module.SCHEDULER_CONFIG, 'lease_backend', 'file')
+
+        monkeypatch.setitem(scheduler_module.SCHEDULER_CONFIG, 'process_role', 'web')
+        web = ClusterScheduler()
+        web._refresh_leadership()
+        assert not web.is_leader and web.lease is None
+        assert web.status()['role'] == 'web'
+
+        monkeypatch.setitem(scheduler_module.SCHEDULER_CONFIG, 'process_role', 'worker')
+        worker = ClusterScheduler()
+        worker._refresh_leadership()
+        assert worker.is_leader
+        worker.lease.release()
+
+    def test_web_does_not_start_thread(self, app, monkeypatch):
+        monkeypatch.setitem(scheduler_module.SCHEDULER_CONFIG, 'process_role', 'web')
+        scheduler = ClusterScheduler()
+        scheduler.app = app
+        scheduler.start()
+        assert not scheduler.is_running and scheduler._executor is None
+
+    def test_jobs_run_only_in_their_roles(self, app, monkeypatch):
+        scheduler = ClusterScheduler()
+        scheduler.app = app
+        scheduler.start()
+        calls = []
+        try:
+            scheduler.interval('monitor', 60, lambda: calls.append('monitor'), scope='local', delay=0)
+            scheduler.interval('warm', 60, lambda: calls.append('warm'), scope='local', delay=0, roles=('all',))
+            for roles in (('cron',), ('web',), ('all', 'web')):
+                with pytest.raises(ValueError):
+                    scheduler.interval('otro', 60, lambda: None, roles=roles)
+
+            now = time.time() + 1
+            for role, expected in (('web', []), ('worker', ['monitor']), ('all', ['monitor', 'warm'])):
+                monkeypatch.setitem(scheduler_module.SCHEDULER_CONFIG, 'process_role', role)
+                assert scheduler.tick(now) == expected
+                now += 61
+                for job in scheduler.jobs.values():
+                    while job.running is not None:
+                        time.sleep(0.01)
+        finally:
+            scheduler.stop()
+
+    def test_init_registers_jobs_for_worker(self, app, monkeypatch):
+        scheduler = ClusterScheduler()
+        monkeypatch.setattr(scheduler_module, 'cluster_scheduler', scheduler)
+        init_job_queue(app)
+        assert scheduler.jobs['job_queue.drain'].roles == ('all', 'worker')
+        assert scheduler.jobs['job_queue.purge'].roles == ('all', 'worker')
+
+    def test_web_enqueues_manual_runs_and_reads_published_status(self, make_app, login_client, monkeypatch):
+        """Test en un proceso web la ejecución manual va a la cola y el estado es el que publicó el worker"""
+        scheduler = ClusterScheduler()
+        monkeypatch.setattr(scheduler_module, 'cluster_scheduler', scheduler)
+        app = make_app(login=True, users=True, SCHEDULER_ENABLED=False)
+        scheduler_module.init_cluster_scheduler(app)
+        calls = []
+        scheduler.interval('monitor', 60, lambda: calls.append('monitor'))
+
+        monkeypatch.setitem(scheduler_module.SCHEDULER_CONFIG, 'process_role', 'web')
+        client = login_client(app, 1)
+        response = client.post('/api/v1/scheduler/jobs/monitor/run')
+        assert response.status_code == 202
+        assert calls == []
+
+        # El worker entrega el trabajo y publica su estado
+        monkeypatch.setitem(scheduler_module.SCHEDULER_CONFIG, 'process_role', 'worker')
+        with app.app_context():
+            assert job_queue.drain() == 1
+            assert db.session.get(QueuedJob, response.get_json()['queued_job_id']).status == 'done'
+            scheduler.publish_status()
+        assert calls == ['monitor']
+
+        monkeypatch.setitem(scheduler_module.SCHEDULER_CONFIG, 'process_role', 'web')
+        data = client.get('/api/v1/scheduler/jobs?history=monitor').get_json()['data']
+        assert data['role'] == 'worker'
+        assert [run['trigger'] for run in data['history']] == ['manual']
+
+
+class TestNotificationDelivery:
+    """Las rutas encolan las notificaciones y el worker las entrega"""
+
+    @pytest.fixture
+    def notify_app(self, make_app):
+        from routes import broadcast_communications, expense_notifications
+        app = make_app(login=True, users=True)
+        app.register_blueprint(broadcast_communications.bp)
+        app.register_blueprint(expense_notifications.bp)
+        with app.app_context():
+            db.session.add(Expense(user_id=2, month='2025-08', period='Agosto 2025', amount=85000,
+                                   description='Expensa ordinaria', status='pending',
+                                   due_date=datetime(2025, 8, 10)))
+            db.session.commit()
+        return app
+
+    @pytest.fixture
+    def outbox(self, monkeypatch):
+        sent = []
+
+        def send_email(to_email, subject, body, html_body=None):
+            sent.append({'to': to_email, 'subject': subject, 'body': body})
+            return True
+
+        monkeypatch.setattr(notification_service, 'send_email', send_email)
+        return sent
+
+    def test_broadcast_is_queued_then_delivered(self, notify_app, login_client, outbox):
+        client = login_client(notify_app, 1)
+        response = client.post('/admin/broadcast/send', json={
+            'title': 'Corte de agua', 'message': 'Mañana de 9 a 12', 'methods': ['email']})
+        assert response.status_code == 200
+        result = response.get_json()
+        assert result['stats']['queued'] == 2 and result['stats']['email_queued'] == 2
+        assert outbox == []
+
+        with notify_app.app_context():
+            assert job_queue.counts()['pending'] == 2
+            assert job_queue.drain() == 2
+            assert job_queue.counts()['done'] == 2
+        assert sorted(mail['to'] for mail in outbox) == ['admin@test.com', 'vecino@test.com']
+        assert outbox[0]['subject'] == 'Corte de agua' and outbox[0]['body'] == 'Mañana de 9 a 12'
+
+    def test_expense_notifications_are_queued_then_delivered(self, notify_app, login_client, outbox):
+        client = login_client(notify_app, 1)
+        response = client.post('/admin/expense-notifications/send-bulk', json={'method': 'email'})
+        assert response.status_code == 200
+        job_ids = response.get_json()['job_ids']
+        assert len(job_ids) == 1 and outbox == []
+
+        with notify_app.app_context():
+            expense = db.session.execute(select(Expense)).scalar_one()
+            assert expense.notification_sent and expense.notification_method == 'email'
+            job = db.session.get(QueuedJob, job_ids[0])
+            assert job.name == 'notifications.deliver' and job.status == 'pending'
+
+            assert job_queue.drain() == 1
+            assert db.session.get(QueuedJob, job_ids[0]).status == 'done'
+        assert [mail['to'] for mail in outbox] == ['vecino@test.com']
+        assert 'Expensa ordinaria' in outbox[0]['body'] and '10/08/2025' in outbox[0]['body']
+
+    def test_single_expense_notification_is_queued(self, notify_app, login_client, outbox):
+        client = login_client(notify_app, 1)
+        response = client.post('/admin/expense-notifications/send-notification',
+                               json={'expense_id': 1, 'method': 'both'})
+        assert response.status_code == 200
+        with notify_app.app_context():
+            job = db.session.get(QueuedJob, response.get_json()['job_id'])
+            assert json.loads(job.payload)['channels'] == ['email', 'whatsapp']
+            assert job_queue.drain() == 1
+        assert len(outbox) == 1
+
+    def test_non_admin_cannot_queue(self, notify_app, login_client):
+        client = login_client(notify_app, 2)
+        response = client.post('/admin/broadcast/send', json={'title': 'x', 'message': 'y'})
+        assert response.status_code == 403
@@ -0,0 +1,155 @@
+"""
+Tests para el motor incremental de KPIs
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from models import db, User, Visit, Maintenance, Expense
+from services.kpi_engine import KPIEngine, KPI_CONFIG
+import services.kpi_engine as kpi_module
+
+
+@pytest.fixture
+def app(app):
+    """Usuarios, visitas, mantenimientos y expensas para los KPI"""
+    for i in range(4):
+        db.session.add(User(username=f'vecino{i}', email=f'vecino{i}@test.com', name=f'Vecino {i}',
+                            password_hash='x'))
+    db.session.flush()
+    db.session.add(Visit(visitor_name='Invitado', resident_id=1))
+    db.session.add(Visit(visitor_name='Invitado', resident_id=1))
+    db.session.add(Visit(visitor_name='Invitado', resident_id=2, created_at=datetime.utcnow() - timedelta(days=20)))
+    db.session.add(Maintenance(user_id=1, title='Luz', description='...', status='completed'))
+    db.session.add(Maintenance(user_id=2, title='Agua', description='...'))
+    db.session.add(Expense(user_id=1, month='2030-01', amount=60.0))
+    db.session.commit()
+    return app
+
+
+@pytest.fixture
+def engine(app, monkeypatch):
+    engine = KPIEngine()
+    monkeypatch.setattr(kpi_module, 'kpi_engine', engine)
+    engine.refresh()
+    return engine
+
+
+class TestKPIEngine:
+    """Tests para valores, deltas e historial"""
+
+    def test_full_refresh_values(self, app, engine):
+        """Test KPIs calculados desde la base de datos"""
+        values = engine.values()
+
+        assert values['user_growth']['current_value'] == 4
+        assert values['user_engagement']['current_value'] == 25.0
+        assert values['maintenance_efficiency']['current_value'] == 50.0
+        assert values['financial_health']['current_value'] == pytest.approx(70.0)
+        assert values['security_incidents']['status'] == 'on_track'
+
+    def test_reads_do_not_query(self, app, engine, count_queries):
+        """Test lectura de KPIs sin consultas"""
+        _, statements = count_queries(engine.values)
+        assert statements == []
+
+    def test_deltas_from_orm_events(self, app, engine):
+        """Test ajuste incremental al confirmar cambios"""
+        db.session.add(Visit(visitor_name='Invitado', resident_id=3))
+        maintenance = Maintenance.query.filter_by(status='pending').first()
+        maintenance.status = 'completed'
+        expense = Expense.query.first()
+        expense.amount = 100.0
+        db.session.commit()
+
+        values = engine.values()
+        assert values['user_engagement']['current_value'] == 50.0
+        assert values['maintenance_efficiency']['current_value'] == 100.0
+        assert values['financial_health']['current_value'] == pytest.approx(50.0)
+
+        db.session.delete(Visit.query.filter_by(resident_id=3).one())
+        db.session.commit()
+        assert engine.values()['user_engagement']['current_value'] == 25.0
+
+    def test_rollback_discards_deltas(self, app, engine):
+        """Test cambios revertidos sin efecto"""
+        db.session.add(User(username='temporal', email='temporal@test.com', name='Temporal', password_hash='x'))
+        db.session.flush()
+        db.session.rollback()
+
+        assert engine.values()['user_growth']['current_value'] == 4
+
+    def test_incremental_matches_full_refresh(self, app, engine):
+        """Test mismo resultado incremental que recalculando"""
+        db.session.add(User(username='nuevo', email='nuevo@test.com', name='Nuevo', password_hash='x'))
+        db.session.add(Maintenance(user_id=1, title='Poda', description='...'))
+        db.session.commit()
+        incremental = {key: kpi['current_value'] for key, kpi in engine.values().items()}
+
+        engine.refresh()
+        assert {key: kpi['current_value'] for key, kpi in engine.values().items()} == incremental
+
+    def test_history(self, app, engine, monkeypatch):
+        """Test historial de valores por KPI"""
+        monkeypatch.setitem(KPI_CONFIG, 'history_interval', 0)
+        engine._last_history_at = 0
+        db.session.add(User(username='nuevo', email='nuevo@test.com', name='Nuevo', password_hash='x'))
+        db.session.commit()
+
+        history = engine.get_history('user_growth')['user_growth']
+        assert history[-1]['value'] == 5
+        assert len(history) >= 1
+
+
+class TestPublishedRefresh:
+    """Tests para el recalculo publicado por el líder y adoptado por los demás procesos"""
+
+    def test_follower_adopts_published_refresh(self, app, engine, count_queries):
+        """Test otro proceso usa el recalculo publicado sin consultar la base de datos"""
+        follower = KPIEngine()
+        values, statements = count_queries(follower.values)
+
+        assert statements == []
+        assert follower.stats['full_refreshes'] == 0
+        assert follower.stats['snapshots_adopted'] == 1
+        assert values['user_engagement']['current_value'] == 25.0
+        assert follower.get_history('user_growth')['user_growth'][-1]['value'] == 4
+
+    def test_own_changes_reapplied_over_published_refresh(self, app, engine, monkeypatch):
+        """Test los cambios confirmados tras iniciar el recalculo se vuelven a aplicar al adoptarlo"""
+        follower = KPIEngine()
+        follower.values()
+        monkeypatch.setattr(kpi_module, 'kpi_engine', follower)
+        db.session.add(User(username='nuevo', email='nuevo@test.com', name='Nuevo', password_hash='x'))
+        db.session.commit()
+        assert follower.values()['user_growth']['current_value'] == 5
+
+        # Un recalculo anterior al cambio no lo incluye: se reaplica sobre él
+        follower.last_full_refresh = None
+        assert follower.values()['user_growth']['current_value'] == 5
+
+        # Uno posterior ya lo incluye: no se cuenta dos veces
+        monkeypatch.setattr(kpi_module, 'kpi_engine', engine)
+        engine.refresh()
+        follower.last_full_refresh = None
+        assert follower.values()['user_growth']['current_value'] == 5
+
+    def test_mark_stale_recomputes(self, app, engine):
+        """Test marcar como desactualizado recalcula en lugar de adoptar lo publicado"""
+        follower = KPIEngine()
+        follower.mark_stale()
+        follower.values()
+        assert follower.stats['full_refreshes'] == 1
+        assert follower.stats['snapshots_adopted'] == 0
+
+
+class TestKPIHistoryRoute:
+    """Tests para el endpoint /api/v1/analytics/kpis/history"""
+
+    def test_requires_admin(self, analytics_app, login_client, monkeypatch):
+        """Test sin sesión 401, vecino 403 y admin con el historial"""
+        monkeypatch.setattr(kpi_module.kpi_engine, 'ensure_loaded', lambda: None)
+        assert analytics_app.test_client().get('/api/v1/analytics/kpis/history').status_code == 401
+        assert login_client(analytics_app, 2).get('/api/v1/analytics/kpis/history').status_code == 403
+
+        response = login_client(analytics_app, 1).get('/api/v1/analytics/kpis/history')
+        assert response.status_code == 200 and response.get_json()['success']
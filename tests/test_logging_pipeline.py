@@ -0,0 +1,171 @@
+"""
+Tests para el pipeline de logging con cola acotada y escritura por lotes
+"""
+
+import io
+import json
+import logging
+import queue
+import sys
+import time
+import pytest
+from flask import Flask
+from app_modules.core.logging_service import (BatchedStreamHandler, BatchingQueueListener, DropOldestQueueHandler,
+                                              LoggingService, StructuredFormatter)
+
+
+def make_record(message, level=logging.INFO, **extra):
+    record = logging.LogRecord('test', level, __file__, 1, message, None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class CountingStream(io.StringIO):
+    """Stream que cuenta los flush"""
+
+    def __init__(self):
+        super().__init__()
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+        super().flush()
+
+
+class SlowHandler(logging.Handler):
+    """Handler que simula un disco lento"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        time.sleep(0.05)
+        self.records.append(record)
+
+
+class TestQueueHandler:
+    """Cola acotada con descarte de los registros más antiguos"""
+
+    def test_drops_oldest_when_full(self):
+        handler = DropOldestQueueHandler(queue.Queue(maxsize=3))
+        for index in range(5):
+            handler.handle(make_record(f'registro {index}'))
+
+        assert handler.dropped == 2
+        assert [handler.queue.get_nowait().msg for _ in range(3)] == ['registro 2', 'registro 3', 'registro 4']
+
+    def test_keeps_stop_signal(self):
+        handler = DropOldestQueueHandler(queue.Queue(maxsize=1))
+        handler.queue.put(BatchingQueueListener._sentinel)
+        handler.handle(make_record('tarde'))
+        assert handler.dropped == 1
+        assert handler.queue.get_nowait() is BatchingQueueListener._sentinel
+
+    def test_prepare_snapshots_record(self):
+        handler = DropOldestQueueHandler(queue.Queue())
+        details = {'status': 'started'}
+        try:
+            raise ValueError('falla')
+        except ValueError:
+            record = logging.LogRecord('test', logging.ERROR, __file__, 1, 'Usuario %s', ('ana',), None)
+            record.exc_info = sys.exc_info()
+        record.extra_data = details
+        handler.handle(record)
+        details['status'] = 'completed'
+
+        queued = handler.queue.get_nowait()
+        assert queued.exc_info is None
+        assert queued.extra_data == {'status': 'started'}
+
+        data = json.loads(StructuredFormatter().format(queued))
+        assert data['message'] == 'Usuario ana'
+        assert data['exception']['type'] == 'ValueError'
+        assert data['exception']['message'] == 'falla'
+        assert 'ValueError: falla' in logging.Formatter().format(queued)
+
+
+class TestBatchingListener:
+    """Escritura por lotes en el hilo del listener"""
+
+    def test_one_flush_per_batch(self):
+        stream = CountingStream()
+        handler = BatchedStreamHandler(stream)
+        handler.setFormatter(StructuredFormatter())
+        log_queue = queue.Queue()
+        queue_handler = DropOldestQueueHandler(log_queue)
+        for index in range(10):
+            queue_handler.handle(make_record(f'registro {index}'))
+
+        listener = BatchingQueueListener(log_queue, handler, batch_size=4)
+        listener.start()
+        listener.stop()
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [line['message'] for line in lines] == [f'registro {index}' for index in range(10)]
+        assert listener.stats == {'batches': 3, 'records': 10}
+        assert stream.flushes == 3
+
+    def test_respects_handler_level(self):
+        stream = io.StringIO()
+        handler = BatchedStreamHandler(stream)
+        handler.setLevel(logging.ERROR)
+        log_queue = queue.Queue()
+        listener = BatchingQueueListener(log_queue, handler)
+        DropOldestQueueHandler(log_queue).handle(make_record('info'))
+        DropOldestQueueHandler(log_queue).handle(make_record('error', level=logging.ERROR))
+        listener.start()
+        listener.stop()
+        assert stream.getvalue().splitlines() == ['error']
+
+
+class TestLoggingService:
+    """Integración con la aplicación Flask"""
+
+    @pytest.fixture
+    def log_app(self, tmp_path):
+        root = logging.getLogger()
+        saved = (list(root.handlers), root.level)
+
+        app = Flask(__name__)
+        app.config.update(LOG_DIR=str(tmp_path), LOG_QUEUE_SIZE=50, LOG_BATCH_SIZE=10)
+        service = LoggingService(app)
+
+        @app.route('/ping')
+        def ping():
+            return 'pong'
+
+        app.logging_service = service
+        yield app
+        service.shutdown()
+        root.handlers[:] = saved[0]
+        root.setLevel(saved[1])
+
+    def test_requests_only_enqueue(self, log_app, tmp_path):
+        service = log_app.logging_service
+        assert service.queue_handler in log_app.logger.handlers
+        assert not log_app.logger.propagate
+
+        slow = SlowHandler()
+        service.listener.handlers = service.listener.handlers + (slow,)
+        started = time.monotonic()
+        for _ in range(5):
+            assert log_app.test_client().get('/ping', headers={'User-Agent': 'pytest'}).data == b'pong'
+        assert time.monotonic() - started < 0.25     # Diez registros lentos escritos fuera de la request
+
+        service.shutdown()
+        assert len(slow.records) == 10
+        lines = [json.loads(line) for line in (tmp_path / 'app.log').read_text(encoding='utf-8').splitlines()]
+        completed = [line for line in lines if line['message'].startswith('Request completed')]
+        assert len(completed) == 5
+        assert completed[0]['status_code'] == 200
+        assert completed[0]['endpoint'] == 'ping'
+        assert completed[0]['user_agent'] == 'pytest'
+        assert completed[0]['request_id']
+
+    def test_queue_stats(self, log_app):
+        service = log_app.logging_service
+        stats = service.queue_stats()
+        assert stats['enabled'] and stats['capacity'] == 50 and stats['dropped'] == 0
+        service.shutdown()
+        assert service.queue_stats() == {'enabled': False}
@@ -0,0 +1,136 @@
+"""
+Tests para el registro de métricas multiproceso y el endpoint /metrics
+"""
+
+import multiprocessing
+import os
+import pytest
+from flask import Flask
+import metrics_registry as registry_module
+from metrics_registry import MetricsRegistry, MmapStore, read_store, init_metrics_endpoint
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = MetricsRegistry(directory=str(tmp_path))
+    monkeypatch.setattr(registry_module, 'metrics_registry', registry)
+    return registry
+
+
+def _worker_observations(directory, count):
+    registry = MetricsRegistry(directory=directory)
+    calls = registry.counter('jobs_processed', 'Tareas procesadas', ['queue'])
+    duration = registry.histogram('job_duration_seconds', 'Duración de tareas', buckets=(0.1, 1.0))
+    for _ in range(count):
+        calls.inc(queue='default')
+        duration.observe(0.5)
+    registry.gauge('worker_ready', 'Worker listo', mode='all').set(1)
+    registry.gauge('queue_depth', 'Profundidad', mode='max').set(count)
+
+
+class TestMmapStore:
+    """Archivo de valores por proceso"""
+
+    def test_values_persist_and_grow(self, tmp_path):
+        path = str(tmp_path / 'store.db')
+        store = MmapStore(path, size=64)
+        for index in range(50):
+            store.add(f'clave-{index}', index)
+        store.add('clave-3', 1.5)
+        store.set('gauge', 7)
+        store.close()
+
+        values = read_store(path)
+        assert len(values) == 51
+        assert values['clave-3'] == 4.5
+        assert values['gauge'] == 7
+
+        reopened = MmapStore(path)
+        reopened.add('clave-0', 2)
+        reopened.close()
+        assert read_store(path)['clave-0'] == 2
+
+
+class TestMetricsRegistry:
+    """Registro, combinación entre procesos y exposición"""
+
+    def test_register_once(self, registry):
+        counter = registry.counter('http.requests', 'Requests', ['method'])
+        assert registry.counter('http.requests', 'Requests', ['method']) is counter
+        assert counter.name == 'http_requests'
+        with pytest.raises(ValueError):
+            registry.gauge('http.requests', 'Requests', ['method'])
+        with pytest.raises(ValueError):
+            counter.inc(status='200')
+
+    def test_merges_worker_processes(self, registry):
+        """Los contadores e histogramas de cada worker se suman al exponer"""
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_worker_observations, args=(registry.directory, count)) for count in (3, 5)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        registry.counter('jobs_processed', 'Tareas procesadas', ['queue'])
+
+        text = registry.exposition()
+        assert '# HELP jobs_processed Tareas procesadas' in text
+        assert 'jobs_processed_total{queue="default"} 8' in text
+        assert 'job_duration_seconds_bucket{le="0.1"} 0' in text
+        assert 'job_duration_seconds_bucket{le="1"} 8' in text
+        assert 'job_duration_seconds_bucket{le="+Inf"} 8' in text
+        assert 'job_duration_seconds_count 8' in text
+        assert 'job_duration_seconds_sum 4' in text
+        assert text.endswith('# EOF\n')
+
+    def test_dead_workers_are_retired(self, registry):
+        """Los contadores de workers terminados se conservan y sus gauges se descartan"""
+        context = multiprocessing.get_context('fork')
+        worker = context.Process(target=_worker_observations, args=(registry.directory, 2))
+        worker.start()
+        worker.join()
+
+        text = registry.exposition()
+        assert 'jobs_processed_total{queue="default"} 2' in text
+        assert 'worker_ready' not in text
+        assert 'queue_depth' not in text
+        assert os.listdir(registry.directory).count('retired.db') == 1
+        assert not [name for name in os.listdir(registry.directory) if name.startswith('metrics_')]
+
+    def test_gauge_modes(self, registry):
+        registry.gauge('temperature', 'Temperatura', mode='max').set(21.5)
+        registry.gauge('ready', 'Listo').set(1)
+        registry.gauge('in_progress', 'En curso', mode='sum').inc(2)
+
+        text = registry.exposition()
+        assert 'temperature 21.5' in text
+        assert f'ready{{pid="{os.getpid()}"}} 1' in text
+        assert 'in_progress 2' in text
+
+    def test_label_values_are_escaped(self, registry):
+        registry.counter('errors', 'Errores', ['message']).inc(message='dijo "hola"\nadiós')
+        assert 'errors_total{message="dijo \\"hola\\"\\nadiós"} 1' in registry.exposition()
+
+
+class TestMetricsEndpoint:
+    """Endpoint /metrics"""
+
+    @pytest.fixture
+    def app(self, registry, monkeypatch):
+        monkeypatch.setattr(registry_module, 'request_metrics_collector', lambda: [])
+        app = Flask(__name__)
+        init_metrics_endpoint(app)
+        return app
+
+    def test_openmetrics_response(self, app, registry):
+        registry.counter('logins', 'Logins').inc()
+        response = app.test_client().get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('application/openmetrics-text')
+        assert 'logins_total 1' in response.get_data(as_text=True)
+
+    def test_token_required_when_configured(self, app):
+        app.config['METRICS_TOKEN'] = 'secreto'
+        client = app.test_client()
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer secreto'}).status_code == 200
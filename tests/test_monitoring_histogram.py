@@ -0,0 +1,140 @@
+"""
+Tests para los histogramas por buckets del recolector de métricas
+"""
+
+import random
+import threading
+import pytest
+from app_modules.core.monitoring_service import MetricsCollector, StreamingHistogram, WindowedHistogram
+from metrics_registry import metrics_registry
+
+
+@pytest.fixture(autouse=True)
+def metrics_directory(tmp_path, monkeypatch):
+    """Los valores que el recolector replica en /metrics van a un directorio temporal"""
+    monkeypatch.setattr(metrics_registry, 'directory', str(tmp_path))
+    monkeypatch.setattr(metrics_registry, '_worker', None)
+
+
+def exact_percentile(values, percentile):
+    ordered = sorted(values)
+    return ordered[round(percentile / 100 * (len(ordered) - 1))]
+
+
+class TestStreamingHistogram:
+    """Precisión y combinación del histograma log-lineal"""
+
+    def test_percentiles_within_relative_accuracy(self):
+        """Los percentiles respetan el error relativo configurado"""
+        rng = random.Random(7)
+        values = [rng.lognormvariate(3, 1.5) for _ in range(20000)]
+        histogram = StreamingHistogram(relative_accuracy=0.01)
+        for value in values:
+            histogram.record(value)
+
+        for percentile in (50, 95, 99):
+            expected = exact_percentile(values, percentile)
+            assert histogram.percentile(percentile) == pytest.approx(expected, rel=0.011)
+        assert histogram.count == len(values)
+        assert histogram.min == min(values)
+        assert histogram.max == max(values)
+
+    def test_bucket_count_is_bounded(self):
+        """La memoria depende del rango de valores, no de la cantidad"""
+        histogram = StreamingHistogram()
+        for _ in range(10):
+            for value in range(1, 1001):
+                histogram.record(value)
+        assert histogram.count == 10000
+        assert len(histogram.positive) < 400
+
+    def test_merge_equals_single_histogram(self):
+        """Combinar histogramas parciales da el mismo resultado que registrar todo junto"""
+        values = [float(value) for value in range(-50, 500)]
+        single, left, right = StreamingHistogram(), StreamingHistogram(), StreamingHistogram()
+        for position, value in enumerate(values):
+            single.record(value)
+            (left if position % 2 else right).record(value)
+
+        merged = left.merge(right)
+        assert merged.summary() == single.summary()
+
+    def test_zero_and_negative_values(self):
+        histogram = StreamingHistogram()
+        for value in (-10, 0, 0, 5):
+            histogram.record(value)
+        assert histogram.percentile(0) == -10
+        assert histogram.percentile(50) == 0
+        assert histogram.percentile(100) == 5
+
+    def test_merge_requires_same_accuracy(self):
+        with pytest.raises(ValueError):
+            StreamingHistogram(0.01).merge(StreamingHistogram(0.05))
+
+
+class TestWindowedHistogram:
+    """Ventana por tramos de tiempo"""
+
+    def test_old_slices_leave_the_window(self):
+        window = WindowedHistogram(slice_seconds=30, slices=10)
+        window.record(1000, now=0)
+        window.record(10, now=200)
+
+        recent = StreamingHistogram()
+        assert window.merge_into(recent, now=250) == 2
+        later = StreamingHistogram()
+        assert window.merge_into(later, now=310) == 1
+        assert later.max == 10
+
+    def test_reused_slot_is_reset(self):
+        """Un tramo que vuelve a usar la posición del anillo no arrastra valores viejos"""
+        window = WindowedHistogram(slice_seconds=30, slices=10)
+        window.record(1000, now=0)
+        window.record(10, now=300)
+
+        histogram = StreamingHistogram()
+        window.merge_into(histogram, now=300)
+        assert histogram.count == 1
+
+
+class TestMetricsCollector:
+    """Resumen del recolector"""
+
+    def test_summary_format(self):
+        collector = MetricsCollector()
+        for value in range(1, 101):
+            collector.record_timing('http.request', value, tags={'endpoint': 'index'})
+        collector.increment_counter('http.requests')
+
+        summary = collector.get_metrics_summary()
+        stats = summary['histograms']['http.request.duration[endpoint=index]']
+        assert set(stats) == {'count', 'min', 'max', 'avg', 'p50', 'p95', 'p99'}
+        assert stats['count'] == 100
+        assert stats['avg'] == pytest.approx(50.5)
+        assert stats['p95'] == pytest.approx(95, rel=0.02)
+        assert summary['counters']['http.requests'] == 1
+
+    def test_expired_histograms_are_omitted(self):
+        collector = MetricsCollector()
+        collector.record_histogram('jobs.duration', 5, now=0)
+        assert collector.get_metrics_summary(now=10)['histograms']['jobs.duration']['count'] == 1
+        assert 'jobs.duration' not in collector.get_metrics_summary(now=1000)['histograms']
+
+    def test_threads_record_into_shards_and_merge(self):
+        """Los valores de varios hilos se combinan en un único resumen"""
+        collector = MetricsCollector(shards=4)
+
+        def record():
+            for value in range(1, 1001):
+                collector.record_histogram('work', value)
+
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = collector.get_metrics_summary()['histograms']['work']
+        assert stats['count'] == 8000
+        assert stats['min'] == 1 and stats['max'] == 1000
+        assert stats['p50'] == pytest.approx(500, rel=0.02)
@@ -0,0 +1,130 @@
+"""
+Tests para el seguimiento de presencia
+"""
+
+import pytest
+from flask_login import login_user
+from models import db, User
+import presence_tracker as presence_module
+from presence_tracker import PresenceTracker, MemoryPresenceStore, PRESENCE_CONFIG
+
+NOW = 1_900_000_000.0
+
+
+class TestMemoryPresenceStore:
+    """Tests para el respaldo en memoria"""
+
+    def test_counts_per_window(self):
+        """Test usuarios activos por ventana"""
+        store = MemoryPresenceStore()
+        store.touch(1, NOW - 60)
+        store.touch(2, NOW - 1800)
+        store.touch(3, NOW - 7200)
+
+        assert store.count_since(NOW - 300) == 1
+        assert store.count_since(NOW - 3600) == 2
+        assert store.count_since(NOW - 86400) == 3
+
+    def test_touch_moves_user(self):
+        """Test una sola entrada por usuario con la última actividad"""
+        store = MemoryPresenceStore()
+        store.touch(1, NOW - 7200)
+        store.touch(1, NOW - 10)
+        store.touch(1, NOW - 500)
+
+        assert store.count_since(NOW - 86400) == 1
+        assert store.last_seen(1) == NOW - 10
+
+    def test_prune(self):
+        """Test eliminación de actividad antigua"""
+        store = MemoryPresenceStore()
+        store.touch(1, NOW - 90000)
+        store.touch(2, NOW - 10)
+        store.prune(NOW - 86400)
+
+        assert store.last_seen(1) is None
+        assert store.count_since(0) == 1
+
+
+class TestPresenceTracker:
+    """Tests para escrituras limitadas y conexiones WebSocket"""
+
+    def test_touch_throttled(self):
+        """Test a lo sumo una escritura por intervalo y usuario"""
+        tracker = PresenceTracker()
+        tracker.touch(1, NOW)
+        tracker.touch(1, NOW + 5)
+        assert tracker.last_seen(1) == NOW
+
+        tracker.touch(1, NOW + PRESENCE_CONFIG['touch_interval'])
+        assert tracker.last_seen(1) == NOW + PRESENCE_CONFIG['touch_interval']
+
+    def test_connections(self):
+        """Test conexiones WebSocket contadas y usuario registrado activo"""
+        tracker = PresenceTracker()
+        tracker.connect('sid-1', 7)
+        tracker.connect('sid-2', 7)
+        assert tracker.summary()['websocket_connections'] == 2
+        assert tracker.count_active(300) == 1
+
+        tracker.disconnect('sid-1')
+        tracker.disconnect('desconocido')
+        assert tracker.summary()['websocket_connections'] == 1
+
+    def test_redis_failure_falls_back_to_memory(self):
+        """Test respaldo en memoria si Redis falla"""
+        class BrokenStore:
+            def __getattr__(self, name):
+                def fail(*args):
+                    raise ConnectionError('sin conexión')
+                return fail
+
+        tracker = PresenceTracker()
+        tracker.store = BrokenStore()
+        tracker.touch(1, NOW)
+        assert tracker.count_active(300, now=NOW) == 1
+
+
+@pytest.fixture
+def app_options():
+    return {'login': True, 'users': True, 'TESTING': True}
+
+
+@pytest.fixture
+def app(app, monkeypatch):
+    """Aplicación con sesión de usuario y el registro de presencia"""
+    tracker = PresenceTracker()
+    monkeypatch.setattr(presence_module, 'presence_tracker', tracker)
+
+    @app.route('/login/<int:user_id>')
+    def login(user_id):
+        login_user(db.session.get(User, user_id))
+        return 'ok'
+
+    presence_module.init_presence_tracker(app)
+    return app
+
+
+class TestPresenceEndpoint:
+    """Tests para el registro por request y el endpoint"""
+
+    def test_requests_mark_users_active(self, app):
+        """Test usuarios autenticados registrados sin consultar la tabla"""
+        for user_id in (1, 2):
+            with app.test_client() as client:
+                client.get(f'/login/{user_id}')
+                client.get(f'/login/{user_id}')
+
+        assert presence_module.presence_tracker.count_active(300) == 2
+
+    def test_endpoint_requires_admin(self, app):
+        """Test resumen solo para administradores"""
+        with app.test_client() as client:
+            client.get('/login/2')
+            assert client.get('/api/v1/presence').status_code == 403
+
+        with app.test_client() as client:
+            client.get('/login/1')
+            response = client.get('/api/v1/presence')
+            assert response.status_code == 200
+            assert response.get_json()['data']['active_5m'] == 2
@@ -0,0 +1,191 @@
+"""
+Tests para las métricas de requests compartidas entre workers
+"""
+
+import multiprocessing
+import os
+import time
+import pytest
+from flask import Flask, abort
+import request_metrics as metrics_module
+from request_metrics import RequestMetrics, percentile_from_histogram, init_request_metrics
+
+
+@pytest.fixture
+def metrics(tmp_path, monkeypatch):
+    metrics = RequestMetrics(directory=str(tmp_path))
+    monkeypatch.setattr(metrics_module, 'request_metrics', metrics)
+    return metrics
+
+
+@pytest.fixture
+def app(metrics):
+    """Aplicación mínima con el middleware"""
+    app = Flask(__name__)
+
+    @app.route('/ok')
+    def ok():
+        return 'ok'
+
+    @app.route('/missing')
+    def missing():
+        abort(404)
+
+    @app.route('/boom')
+    def boom():
+        raise RuntimeError('falla')
+
+    init_request_metrics(app)
+    return app
+
+
+def record_in_child(directory, count):
+    child = RequestMetrics(directory=directory)
+    for _ in range(count):
+        child.request_started()
+        child.request_finished(0.2, 503)
+
+
+class TestPercentiles:
+    """Tests para la estimación de percentiles desde el histograma"""
+
+    def test_interpolation(self):
+        """Test interpolación lineal dentro del bucket"""
+        buckets = (0.1, 0.2, 0.5)
+        assert percentile_from_histogram(buckets, [0, 10, 0, 0], 50) == pytest.approx(0.15)
+        assert percentile_from_histogram(buckets, [5, 0, 5, 0], 95) == pytest.approx(0.47)
+        assert percentile_from_histogram(buckets, [0, 0, 0, 0], 95) is None
+
+
+class TestMiddleware:
+    """Tests para el registro por request"""
+
+    def test_status_classes_and_gauge(self, app, metrics):
+        """Test respuestas por clase de estado y requests en curso"""
+        app.config['PROPAGATE_EXCEPTIONS'] = False
+        client = app.test_client()
+        for path in ('/ok', '/ok', '/missing', '/boom', '/static/app.css'):
+            client.get(path)
+
+        summary = metrics.summary()
+        assert summary['requests'] == 4
+        assert summary['status'] == {'1xx': 0, '2xx': 2, '3xx': 0, '4xx': 1, '5xx': 1}
+        assert summary['error_rate'] == 0.25
+        assert summary['in_flight'] == 0
+        assert sum(summary['histogram']['counts']) == 4
+
+    def test_window_returns_deltas(self, metrics):
+        """Test estadísticas desde la lectura anterior del consumidor"""
+        for _ in range(3):
+            metrics.request_started()
+            metrics.request_finished(0.01, 200)
+        assert metrics.window('monitor')['requests'] == 3
+
+        metrics.request_started()
+        metrics.request_finished(3.0, 500)
+        metrics.request_started()
+        window = metrics.window('monitor')
+
+        assert window['requests'] == 1
+        assert window['error_rate'] == 1.0
+        assert window['latency_p95'] > 2.5
+        assert window['in_flight'] == 1
+
+
+class TestCrossWorker:
+    """Tests para la agregación entre procesos"""
+
+    def test_merges_and_retires_finished_workers(self, metrics, tmp_path):
+        """Test contadores de un worker terminado conservados tras retirarlo"""
+        metrics.request_started()
+        metrics.request_finished(0.05, 200)
+
+        context = multiprocessing.get_context('fork')
+        child = context.Process(target=record_in_child, args=(str(tmp_path), 5))
+        child.start()
+        child.join()
+
+        summary = metrics.summary()
+        assert summary['requests'] == 6
+        assert summary['status']['5xx'] == 5
+        assert not (tmp_path / f'worker_{child.pid}.bin').exists()
+        assert (tmp_path / 'retired.bin').exists()
+        assert (tmp_path / f'worker_{os.getpid()}.bin').exists()
+
+        # Una segunda lectura no duplica los retirados
+        assert metrics.summary()['requests'] == 6
+
+
+class TestConsumers:
+    """Tests para las métricas de rendimiento que publican los analytics"""
+
+    def test_success_rate_and_uptime(self, metrics, monkeypatch):
+        """Test porcentaje de respuestas sin 5xx y tiempo desde el inicio del proceso"""
+        from analytics_engine import analytics_manager
+        for status in (200, 200, 404, 500):
+            metrics.request_started()
+            metrics.request_finished(0.05, status)
+        monkeypatch.setattr(metrics, 'started_at', metrics.started_at - 120)
+
+        for performance in (analytics_manager.real_time_analytics._get_performance_metrics(0),
+                            analytics_manager._get_performance_metrics()):
+            assert performance['success_rate'] == 75.0
+            assert performance['uptime_seconds'] >= 120
+            assert 'uptime' not in performance and 'system_uptime' not in performance
+
+
+class TestClusterWindow:
+    """Tests para la suma de los totales publicados por cada contenedor"""
+
+    def test_sums_hosts_and_forgets_stale_ones(self, metrics, make_app, monkeypatch):
+        """Test deltas por contenedor, reinicios y contenedores que dejaron de publicar"""
+        db_app = make_app()
+        reader = RequestMetrics(directory=str(metrics.directory) + '_reader')
+        monkeypatch.setitem(metrics_module.REQUEST_METRICS_CONFIG, 'publish_seconds', 0)
+        monkeypatch.setitem(metrics_module.REQUEST_METRICS_CONFIG, 'host_ttl_seconds', 3600)
+        from shared_state import SHARED_STATE_CONFIG, shared_state
+        monkeypatch.setitem(SHARED_STATE_CONFIG, 'cache_seconds', 0)
+
+        def record(host, count, status=200):
+            monkeypatch.setattr(metrics_module.socket, 'gethostname', lambda: host)
+            for _ in range(count):
+                metrics.request_started()
+                metrics.request_finished(0.05, status)
+            metrics.publish()
+
+        with db_app.app_context():
+            record('web-1', 3)
+            record('web-2', 0)    # Mismos archivos: web-2 publica los mismos totales
+            assert reader.cluster_window('monitor')['requests'] == 6
+
+            record('web-1', 2, status=500)
+            window = reader.cluster_window('monitor')
+            assert window['requests'] == 2
+            assert window['error_rate'] == 1.0
+
+            # web-2 se reinicia con contadores en cero y otro contenedor dejó de publicar hace días
+            shared_state.publish('request_metrics.web-2', {'totals': [0.0] * metrics.layout.size, 'at': time.time()})
+            shared_state.publish('request_metrics.old', {'totals': metrics.totals(), 'at': time.time() - 7200})
+            assert reader.cluster_window('monitor')['requests'] == 0
+            assert set(shared_state.read_prefix('request_metrics.')) == {'request_metrics.web-1',
+                                                                         'request_metrics.web-2'}
+
+    def test_middleware_publishes_at_most_every_interval(self, metrics, make_app):
+        """Test el teardown publica los totales del contenedor sin hacerlo en cada request"""
+        db_app = make_app()
+        init_request_metrics(db_app)
+
+        @db_app.route('/ok')
+        def ok():
+            return 'ok'
+
+        client = db_app.test_client()
+        for _ in range(3):
+            client.get('/ok')
+
+        from shared_state import shared_state
+        with db_app.app_context():
+            shared_state.invalidate()
+            published = shared_state.read_prefix('request_metrics.')
+        assert len(published) == 1
+        assert next(iter(published.values()))['totals'][metrics.layout.requests] == 1
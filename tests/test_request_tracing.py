@@ -0,0 +1,181 @@
+"""
+Tests para las trazas por request
+"""
+
+import pytest
+import requests
+from flask import render_template_string
+from sqlalchemy import text
+import request_tracing as tracing_module
+from models import db
+from request_tracing import (Trace, TraceStore, TRACING_CONFIG, init_request_tracing, span, to_otlp, traced,
+                             _trace_id)
+from slo_tracker import init_slo_tracker
+
+
+@traced('cache.get', key_arg=0)
+def cached_lookup(key):
+    with span('cache.redis'):
+        return key
+
+
+class TestTrace:
+    """Spans, anidamiento y formatos de salida"""
+
+    def make_trace(self):
+        trace = Trace(_trace_id('abc'), 'abc')
+        root = trace.start_span('GET /reports', 'server')
+        query = trace.start_span('db.query', 'client', {'db.statement': 'SELECT 1'})
+        trace.end_span(query)
+        template = trace.start_span('template.render', attributes={'template.name': 'reports.html'})
+        inner = trace.start_span('template.render', attributes={'template.name': 'base.html'})
+        trace.end_span(inner)
+        trace.end_span(template, ValueError('falla'))
+        trace.end_span(root)
+        return trace
+
+    def test_parents_and_waterfall(self):
+        trace = self.make_trace()
+        rows = trace.waterfall()['waterfall']
+        assert [row['depth'] for row in rows] == [0, 1, 1, 2]
+        assert rows[1]['parent_id'] == rows[0]['span_id']
+        assert rows[3]['parent_id'] == rows[2]['span_id']
+        assert rows[2]['error'] == 'ValueError: falla'
+        assert all(row['offset_ms'] >= 0 for row in rows)
+
+    def test_breakdown_does_not_double_count_nesting(self):
+        trace = self.make_trace()
+        breakdown = trace.breakdown()
+        assert set(breakdown) == {'db', 'template'}
+        assert breakdown['template'] == round(trace.spans[2].duration_ms, 3)
+
+    def test_unclosed_children_close_with_parent(self):
+        trace = Trace('0' * 32, 'r')
+        root = trace.start_span('GET /', 'server')
+        child = trace.start_span('template.render')
+        trace.end_span(root)
+        assert child.end == root.end
+        assert trace.stack == []
+
+    def test_span_limit(self, monkeypatch):
+        monkeypatch.setitem(TRACING_CONFIG, 'max_spans', 2)
+        trace = Trace('0' * 32, 'r')
+        trace.start_span('GET /', 'server')
+        trace.start_span('db.query')
+        assert trace.start_span('db.query') is None
+        assert trace.dropped == 1
+
+    def test_otlp_document(self):
+        trace = self.make_trace()
+        document = to_otlp([trace])
+        spans = document['resourceSpans'][0]['scopeSpans'][0]['spans']
+        assert len(spans) == 4
+        assert spans[0]['traceId'] == trace.trace_id and len(trace.trace_id) == 32
+        assert spans[0]['kind'] == 2 and 'parentSpanId' not in spans[0]
+        assert spans[1]['kind'] == 3 and spans[1]['parentSpanId'] == spans[0]['spanId']
+        assert spans[1]['attributes'] == [{'key': 'db.statement', 'value': {'stringValue': 'SELECT 1'}}]
+        assert spans[2]['status'] == {'code': 2, 'message': 'ValueError: falla'}
+        assert int(spans[0]['endTimeUnixNano']) >= int(spans[0]['startTimeUnixNano'])
+
+    def test_trace_id_keeps_hex_request_ids(self):
+        assert _trace_id('a' * 32) == 'a' * 32
+        assert len(_trace_id('otro-id')) == 32
+
+    def test_ring_is_bounded(self):
+        store = TraceStore(size=2)
+        for index in range(3):
+            trace = Trace(f'{index:032x}', f'r{index}')
+            trace.end_span(trace.start_span('GET /', 'server'))
+            store.add(trace)
+        assert [trace.request_id for trace in store.recent()] == ['r2', 'r1']
+        assert store.get('r0') is None
+
+
+class TestTracingMiddleware:
+    """Span raíz, dependencias instrumentadas y rutas de consulta"""
+
+    @pytest.fixture
+    def tracing_app(self, make_app, monkeypatch):
+        """Aplicación propia por request (sin el contexto compartido de pytest-flask)"""
+        store = TraceStore()
+        monkeypatch.setattr(tracing_module, 'trace_store', store)
+        monkeypatch.setitem(TRACING_CONFIG, 'sample_rate', 0.0)
+
+        app = make_app(login=True, users=True)
+
+        @app.route('/remote')
+        def remote():
+            return str(requests.get('https://api.example.com/pagos?token=secreto').status_code)
+
+        @app.route('/reports')
+        def reports():
+            db.session.execute(text('SELECT 1'))
+            cached_lookup('reportes:2024')
+            return render_template_string('{{ value }}', value='ok')
+
+        init_slo_tracker(app)
+        init_request_tracing(app)
+        app.trace_store = store
+        return app
+
+    def test_unsampled_requests_are_not_traced(self, tracing_app):
+        response = tracing_app.test_client().get('/reports')
+        assert response.get_data(as_text=True) == 'ok'
+        assert 'X-Trace-Id' not in response.headers
+        assert tracing_app.trace_store.recent() == []
+
+    def test_forced_trace_spans(self, tracing_app, login_client):
+        response = login_client(tracing_app, 1).get('/reports', headers={'X-Trace': '1', 'X-Request-ID': 'b' * 32})
+        assert response.headers['X-Trace-Id'] == 'b' * 32
+
+        trace = tracing_app.trace_store.get('b' * 32)
+        names = [span.name for span in trace.spans]
+        assert names[0] == 'GET /reports'
+        assert trace.root.attributes['http.status_code'] == 200
+        assert 'db.query' in names
+        assert 'template.render' in names
+        cache = trace.spans[names.index('cache.get')]
+        assert cache.attributes['cache.key'] == 'reportes:2024'
+        assert trace.spans[names.index('cache.redis')].parent_id == cache.span_id
+        assert all(span.end is not None for span in trace.spans)
+        assert set(trace.breakdown()) >= {'db', 'cache', 'template'}
+
+    def test_outbound_http_span(self, tracing_app, login_client, monkeypatch):
+        def fake_send(adapter, prepared, **kwargs):
+            response = requests.Response()
+            response.status_code = 201
+            return response
+
+        monkeypatch.setattr(requests.adapters.HTTPAdapter, 'send', fake_send)
+        response = login_client(tracing_app, 1).get('/remote', headers={'X-Trace': '1', 'X-Request-ID': 'remoto'})
+        assert response.get_data(as_text=True) == '201'
+
+        http = [span for span in tracing_app.trace_store.get('remoto').spans if span.name == 'http.client'][0]
+        assert http.kind == 'client'
+        assert http.attributes == {'http.method': 'GET', 'http.url': 'https://api.example.com/pagos',
+                                   'http.status_code': 201}
+
+    def test_force_header_requires_admin_or_token(self, tracing_app, login_client):
+        anonymous = tracing_app.test_client()
+        anonymous.get('/reports', headers={'X-Trace': '1', 'X-Request-ID': 'anonimo'})
+        login_client(tracing_app, 2).get('/reports', headers={'X-Trace': '1', 'X-Request-ID': 'vecino'})
+        assert tracing_app.trace_store.recent() == []
+
+        tracing_app.config['TRACING_TOKEN'] = 'secreto-trazas'
+        anonymous.get('/reports', headers={'X-Trace': 'otro', 'X-Request-ID': 'incorrecto'})
+        anonymous.get('/reports', headers={'X-Trace': 'secreto-trazas', 'X-Request-ID': 'con-token'})
+        assert [trace.request_id for trace in tracing_app.trace_store.recent()] == ['con-token']
+
+    def test_admin_views(self, tracing_app, login_client):
+        login_client(tracing_app, 1).get('/reports', headers={'X-Trace': '1', 'X-Request-ID': 'c' * 32})
+        assert login_client(tracing_app, 2).get('/api/v1/traces').status_code == 403
+
+        client = login_client(tracing_app, 1)
+        data = client.get('/api/v1/traces').get_json()['data']
+        assert data['traces'][0]['trace_id'] == 'c' * 32
+
+        detail = client.get(f"/api/v1/traces/{'c' * 32}").get_json()['data']
+        assert detail['waterfall'][0]['depth'] == 0
+        otlp = client.get('/api/v1/traces?format=otlp').get_json()
+        assert otlp['resourceSpans'][0]['scopeSpans'][0]['spans']
+        assert client.get('/api/v1/traces/desconocida').status_code == 404
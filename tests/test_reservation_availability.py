@@ -0,0 +1,128 @@
+"""
+Tests para el motor de disponibilidad de reservas
+"""
+
+import pytest
+from datetime import datetime, date, timedelta
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Reservation, ReservationSlot
+from services.reservation_availability import (availability_engine, split_by_day, slot_mask,
+                                               bitmap_runs, backfill_reservation_slots)
+
+DAY = date.today() + timedelta(days=3)
+
+
+def at(hour, minute=0, day=DAY):
+    return datetime(day.year, day.month, day.day, hour, minute)
+
+
+@pytest.fixture
+def app(app):
+    """Un vecino y el SUM con dos días de anticipación"""
+    app.config['COMMON_SPACES'] = {'sum': {'name': 'SUM', 'advance_booking_days': 2}}
+    db.session.add(User(username='vecino', email='vecino@test.com', name='Vecino', password_hash='x'))
+    db.session.commit()
+    availability_engine.clear()
+    return app
+
+
+def reserve(start, end, space_type='sum', status='pending'):
+    reservation = Reservation(user_id=1, space_type=space_type, space_name=space_type,
+                              start_time=start, end_time=end, status=status)
+    db.session.add(reservation)
+    db.session.commit()
+    return reservation
+
+
+class TestSlotHelpers:
+    """Tests para las funciones de franjas horarias"""
+
+    def test_split_by_day_rounds_outwards(self):
+        """Test redondeo de franjas parciales"""
+        assert split_by_day(at(10, 10), at(11, 20)) == [(DAY, 40, 46)]
+
+    def test_split_across_midnight(self):
+        """Test intervalo que cruza la medianoche"""
+        parts = split_by_day(at(23), at(1, day=DAY + timedelta(days=1)))
+        assert parts == [(DAY, 92, 96), (DAY + timedelta(days=1), 0, 4)]
+
+    def test_bitmap_runs(self):
+        """Test intervalos ocupados y libres"""
+        bitmap = slot_mask(40, 48)
+        assert bitmap_runs(bitmap) == [{'start': '10:00', 'end': '12:00'}]
+        assert bitmap_runs(bitmap, 32, 56, busy=False) == [
+            {'start': '08:00', 'end': '10:00'}, {'start': '12:00', 'end': '14:00'}
+        ]
+
+
+class TestAvailabilityEngine:
+    """Tests para conflictos y horarios libres"""
+
+    def test_conflict_detection(self, app):
+        """Test detección de superposición"""
+        reserve(at(10), at(12))
+
+        assert not availability_engine.is_available('sum', at(11), at(13))
+        assert availability_engine.is_available('sum', at(12), at(14))
+        assert availability_engine.is_available('quincho', at(10), at(12))
+
+    def test_edit_ignores_own_reservation(self, app):
+        """Test edición sin conflicto consigo misma"""
+        reservation = reserve(at(10), at(12))
+
+        assert availability_engine.is_available('sum', at(11), at(13), ignore=reservation)
+
+    def test_database_guard_against_double_booking(self, app):
+        """Test restricción única ante reservas simultáneas"""
+        reserve(at(10), at(12))
+
+        with pytest.raises(IntegrityError):
+            reserve(at(11), at(13))
+        db.session.rollback()
+        assert Reservation.query.count() == 1
+
+    def test_cancel_releases_slots(self, app):
+        """Test liberación de franjas al cancelar"""
+        reservation = reserve(at(10), at(12))
+        assert ReservationSlot.query.count() == 8
+
+        reservation.status = 'cancelled'
+        db.session.commit()
+
+        assert ReservationSlot.query.count() == 0
+        assert availability_engine.is_available('sum', at(10), at(12))
+
+    def test_move_reservation(self, app):
+        """Test cambio de horario reclamando solo las franjas nuevas"""
+        reservation = reserve(at(10), at(12))
+        reservation.start_time = at(11)
+        reservation.end_time = at(13)
+        db.session.commit()
+
+        assert availability_engine.is_available('sum', at(10), at(11))
+        assert not availability_engine.is_available('sum', at(12), at(13))
+
+    def test_free_slots_bulk(self, app):
+        """Test horarios libres de varios días respetando anticipación máxima"""
+        start_day = date.today() + timedelta(days=1)
+        reserve(at(8, day=start_day), at(20, day=start_day))
+
+        result = availability_engine.free_slots(days=5, start_day=start_day)
+
+        assert list(result['spaces']['sum']['days']) == [start_day.isoformat(),
+                                                         (start_day + timedelta(days=1)).isoformat()]
+        assert result['spaces']['sum']['days'][start_day.isoformat()] == [{'start': '20:00', 'end': '24:00'}]
+
+    def test_backfill_skips_overlapping(self, app):
+        """Test reclamo de franjas para reservas previas"""
+        # Inserción directa, como las reservas creadas antes de reservation_slots
+        db.session.execute(insert(Reservation), [
+            {'user_id': 1, 'space_type': 'sum', 'space_name': 'sum', 'status': 'pending',
+             'start_time': start, 'end_time': start + timedelta(hours=2), 'created_at': start}
+            for start in (at(10), at(11))
+        ])
+        db.session.commit()
+
+        assert backfill_reservation_slots() == 1
+        assert ReservationSlot.query.count() == 8
@@ -0,0 +1,115 @@
+"""
+Tests para la caché de resultados por intervalo
+"""
+
+import pytest
+from flask import Flask, request
+import services.result_cache as cache_module
+from services.result_cache import ResultCache, cached_endpoint
+
+START = 1_900_000_200.0   # Inicio de un intervalo de 300 s
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj controlado para el módulo"""
+    current = {'now': START + 10}
+
+    class FakeTime:
+        @staticmethod
+        def time():
+            return current['now']
+
+    monkeypatch.setattr(cache_module, 'time', FakeTime)
+    return current
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """Aplicación mínima con un endpoint cacheado"""
+    cache = ResultCache()
+    monkeypatch.setattr(cache_module, 'result_cache', cache)
+    app = Flask(__name__)
+    app.calls = []
+
+    @app.route('/report')
+    @cached_endpoint('report', seconds=300)
+    def report():
+        app.calls.append(request.args.get('month'))
+        if request.args.get('fail'):
+            return {'success': False}, 500
+        return {'success': True, 'calls': len(app.calls)}
+
+    app.cache = cache
+    return app
+
+
+class TestCachedEndpoint:
+    """Tests para el decorador de vistas"""
+
+    def test_reused_within_bucket(self, app, clock):
+        """Test una sola ejecución por intervalo y parámetros"""
+        client = app.test_client()
+        first = client.get('/report?month=1')
+        clock['now'] += 100
+        second = client.get('/report?month=1')
+
+        assert second.get_json() == first.get_json()
+        assert len(app.calls) == 1
+        assert second.headers['Cache-Control'] == 'public, max-age=190'
+        assert second.headers['ETag'] == first.headers['ETag']
+
+        client.get('/report?month=2')
+        assert len(app.calls) == 2
+
+    def test_new_bucket_recomputes(self, app, clock):
+        """Test recálculo y ETag nuevo al cambiar de intervalo"""
+        client = app.test_client()
+        first = client.get('/report')
+        clock['now'] += 300
+        second = client.get('/report')
+
+        assert len(app.calls) == 2
+        assert second.headers['ETag'] != first.headers['ETag']
+
+    def test_not_modified(self, app, clock):
+        """Test 304 con If-None-Match"""
+        client = app.test_client()
+        etag = client.get('/report').headers['ETag']
+        response = client.get('/report', headers={'If-None-Match': etag})
+
+        assert response.status_code == 304
+        assert app.cache.stats['not_modified'] == 1
+
+    def test_errors_not_cached(self, app, clock):
+        """Test respuestas con error recalculadas"""
+        client = app.test_client()
+        client.get('/report?fail=1')
+        response = client.get('/report?fail=1')
+
+        assert response.status_code == 500
+        assert len(app.calls) == 2
+
+
+class TestPrecompute:
+    """Tests para el precálculo del próximo intervalo"""
+
+    def test_next_bucket_precomputed(self, app, clock):
+        """Test el próximo intervalo queda listo antes del cambio"""
+        client = app.test_client()
+        client.get('/report?month=3')
+
+        assert app.cache.precompute(app, now=START + 100) == 0   # Lejos del cambio
+        assert app.cache.precompute(app, now=START + 280) == 1
+        assert app.calls == ['3', '3']
+
+        clock['now'] = START + 305
+        response = client.get('/report?month=3')
+        assert len(app.calls) == 2
+        assert response.get_json()['calls'] == 2
+
+    def test_idle_keys_dropped(self, app, clock):
+        """Test claves sin consultas recientes no se precalculan"""
+        app.test_client().get('/report')
+        assert app.cache.precompute(app, now=START + 300 * 3 - 10) == 0
+        assert not app.cache._hot
@@ -0,0 +1,154 @@
+"""
+Tests para el profiler por muestreo
+"""
+
+import threading
+import time
+import pytest
+import sampling_profiler as profiler_module
+from sampling_profiler import SamplingProfiler, StackProfile, PROFILER_CONFIG, init_sampling_profiler
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,), name='busy')
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    monkeypatch.setitem(PROFILER_CONFIG, 'continuous_hz', 0)
+    profiler = SamplingProfiler()
+    monkeypatch.setattr(profiler_module, 'sampling_profiler', profiler)
+    yield profiler
+    profiler.stop()
+
+
+class TestSampling:
+    """Muestreo de pilas de todos los hilos"""
+
+    def test_profile_finds_busy_thread(self, profiler, busy_thread):
+        profile = profiler.profile(0.3, hz=200)
+        assert 0.3 <= profile.duration < 1.0
+        assert profile.samples > 20
+
+        busy = [stack for stack in profile.stacks if stack[0] == 'busy']
+        assert busy
+        assert any('busy_loop (tests/test_sampling_profiler.py' in label for label in busy[0])
+        # El hilo que muestrea no aparece en sus propias muestras
+        assert not any(stack[0] == threading.current_thread().name for stack in profile.stacks)
+
+    def test_idle_threads_are_skipped(self, profiler):
+        event = threading.Event()
+        thread = threading.Thread(target=event.wait, name='idle')
+        thread.start()
+        try:
+            time.sleep(0.05)
+            assert not [stack for stack in profiler.sample() if stack[0] == 'idle']
+            assert [stack for stack in profiler.sample(include_idle=True) if stack[0] == 'idle']
+        finally:
+            event.set()
+            thread.join()
+
+    def test_one_profile_at_a_time(self, profiler):
+        profiler._profile_lock.acquire()
+        try:
+            with pytest.raises(RuntimeError):
+                profiler.profile(0.1)
+        finally:
+            profiler._profile_lock.release()
+
+
+class TestStackProfile:
+    """Formatos de salida"""
+
+    def make_profile(self):
+        profile = StackProfile(hz=10)
+        profile.add([('MainThread', 'main (app.py:1)', 'handler (views.py:20)')] * 3)
+        profile.add([('MainThread', 'main (app.py:1)', 'query (db.py:5)')])
+        return profile
+
+    def test_collapsed(self):
+        assert self.make_profile().collapsed() == (
+            'MainThread;main (app.py:1);handler (views.py:20) 3\n'
+            'MainThread;main (app.py:1);query (db.py:5) 1\n')
+
+    def test_speedscope(self):
+        document = self.make_profile().speedscope('prueba')
+        frames = document['shared']['frames']
+        profile = document['profiles'][0]
+        assert document['$schema'].startswith('https://www.speedscope.app')
+        assert frames[0] == {'name': 'MainThread'}
+        assert frames[2] == {'name': 'handler', 'file': 'views.py', 'line': 20}
+        assert profile['type'] == 'sampled'
+        assert profile['samples'] == [[0, 1, 2], [0, 1, 3]]
+        assert profile['weights'] == [0.3, 0.1]
+        assert profile['endValue'] == pytest.approx(0.4)
+
+
+class TestContinuous:
+    """Agregado continuo y control de overhead"""
+
+    def test_rolling_window(self, profiler):
+        slice_seconds = PROFILER_CONFIG['slice_seconds']
+        profiler._record([('MainThread', 'old (a.py:1)')], 2, now=0)
+        profiler._record([('MainThread', 'new (a.py:1)')], 2, now=slice_seconds * 5)
+
+        recent = profiler.continuous(now=slice_seconds * 5)
+        assert recent.samples == 2
+        assert profiler.continuous(minutes=1, now=slice_seconds * 5).samples == 1
+        window = slice_seconds * PROFILER_CONFIG['window_slices']
+        assert profiler.continuous(now=window + 1).stacks == {('MainThread', 'new (a.py:1)'): 1}
+
+    def test_rate_backs_off_when_over_budget(self, profiler):
+        profiler.continuous_hz = 8
+        profiler.sampling_seconds, profiler.elapsed_seconds = 0.05, 1.0
+        profiler._adjust_rate(target_hz=8)
+        assert profiler.continuous_hz == 4
+
+        profiler.sampling_seconds = 0.001
+        profiler._adjust_rate(target_hz=8)
+        assert profiler.continuous_hz == 8
+
+    def test_continuous_overhead_under_budget(self, profiler, monkeypatch, busy_thread):
+        monkeypatch.setitem(PROFILER_CONFIG, 'continuous_hz', 20)
+        profiler.ensure_continuous()
+        time.sleep(1.0)
+        assert profiler.continuous().samples >= 10
+        assert profiler.overhead < PROFILER_CONFIG['max_overhead']
+
+
+class TestProfilerEndpoints:
+    """Rutas de administración"""
+
+    @pytest.fixture
+    def profiler_app(self, make_app, profiler):
+        app = make_app(login=True, users=True)
+        init_sampling_profiler(app)
+        return app
+
+    def test_admin_only(self, profiler_app, login_client):
+        assert login_client(profiler_app, 2).post('/api/v1/profiler/profile?seconds=0.1').status_code == 403
+
+    def test_profile_formats(self, profiler_app, busy_thread, login_client):
+        client = login_client(profiler_app, 1)
+        response = client.post('/api/v1/profiler/profile?seconds=0.2&hz=100')
+        assert response.status_code == 200
+        assert response.get_json()['profiles'][0]['type'] == 'sampled'
+
+        response = client.post('/api/v1/profiler/profile?seconds=0.2&hz=100&format=collapsed')
+        assert response.mimetype == 'text/plain'
+        assert 'busy;' in response.get_data(as_text=True)
+
+        assert client.post('/api/v1/profiler/profile?seconds=0').status_code == 400
+        assert client.get('/api/v1/profiler/continuous?format=svg').status_code == 400
+        assert client.get('/api/v1/profiler').get_json()['data']['continuous'] is False
@@ -0,0 +1,103 @@
+"""
+Tests para el estado compartido entre procesos y los resúmenes publicados por el líder
+"""
+
+import pytest
+from models import db, SharedState
+from shared_state import SharedStateStore, SHARED_STATE_CONFIG
+
+
+@pytest.fixture
+def store(app):
+    return SharedStateStore()
+
+
+class TestSharedStateStore:
+    """Tests para publicar, leer y borrar valores"""
+
+    def test_publish_and_read(self, store):
+        """Test publicar inserta y volver a publicar reemplaza"""
+        assert store.read('demo') is None
+        assert store.read('demo', {}) == {}
+
+        store.publish('demo', {'value': 1})
+        store.publish('demo', {'value': 2})
+
+        assert store.read('demo') == {'value': 2}
+        assert SharedState.query.count() == 1
+
+    def test_other_process_sees_publication(self, store, monkeypatch):
+        """Test otro proceso lee lo publicado cuando vence su caché"""
+        reader = SharedStateStore()
+        assert reader.read('demo') is None
+
+        store.publish('demo', [1, 2, 3])
+        assert reader.read('demo') is None   # Todavía en caché
+
+        monkeypatch.setitem(SHARED_STATE_CONFIG, 'cache_seconds', 0)
+        assert reader.read('demo') == [1, 2, 3]
+
+    def test_read_prefix_and_delete(self, store):
+        """Test lectura por prefijo y borrado"""
+        store.publish('alerts.a', 1)
+        store.publish('alerts.b', 2)
+        store.publish('other', 3)
+
+        assert store.read_prefix('alerts.') == {'alerts.a': 1, 'alerts.b': 2}
+
+        store.delete('alerts.a')
+        assert store.read_prefix('alerts.') == {'alerts.b': 2}
+        assert db.session.get(SharedState, 'alerts.a') is None
+
+    def test_read_outside_app_context(self):
+        """Test sin contexto de aplicación se devuelve el valor por defecto"""
+        assert SharedStateStore().read('demo', 'default') == 'default'
+
+
+class TestPublishedSummaries:
+    """Tests para los resúmenes calculados una vez por cluster y leídos por los demás procesos"""
+
+    @pytest.fixture(autouse=True)
+    def isolated_alerts(self, monkeypatch):
+        """Las instancias de prueba registran sus reglas en un motor propio"""
+        import analytics_engine
+        import intelligent_monitoring
+        from alert_rules import AlertRuleEngine
+
+        engine = AlertRuleEngine()
+        monkeypatch.setattr(intelligent_monitoring, 'alert_engine', engine)
+        monkeypatch.setattr(analytics_engine, 'alert_engine', engine)
+
+    def test_monitoring_checks_publish_summary(self, app, monkeypatch):
+        """Test una verificación publica el resumen que lee otro proceso"""
+        from intelligent_monitoring import IntelligentMonitoringSystem
+
+        leader = IntelligentMonitoringSystem()
+        monkeypatch.setattr(leader, '_get_pending_maintenance_count', lambda: 7)
+        monkeypatch.setattr(leader, '_get_high_priority_maintenance_count', lambda: 1)
+        monkeypatch.setattr(leader, '_get_maintenance_response_time', lambda: 4.0)
+        leader._run_check(leader._check_maintenance_trends)
+
+        follower = IntelligentMonitoringSystem()
+        assert len(follower.metrics_history) == 0
+        summary = follower.get_metrics_summary('maintenance')
+        assert summary['pending_maintenance']['current_value'] == 7
+        assert follower.get_metrics_summary('financial') == {}
+        assert follower.get_monitoring_status()['metrics_tracked'] == len(summary)
+
+    def test_real_time_dashboard_reads_published_snapshot(self, app, count_queries, monkeypatch):
+        """Test el dashboard en tiempo real no consulta la base de datos en cada request"""
+        from analytics_engine import RealTimeAnalytics
+
+        leader = RealTimeAnalytics()
+        monkeypatch.setattr(leader, '_get_active_sessions', lambda: 3)
+        monkeypatch.setattr(leader, '_get_recent_activity', lambda: 12)
+        leader._update_real_time_metrics()
+
+        follower = RealTimeAnalytics()
+        follower.get_real_time_dashboard()   # Las lecturas de shared_state quedan en caché
+        dashboard, statements = count_queries(follower.get_real_time_dashboard)
+        assert statements == []
+        assert dashboard['active_sessions'] == 3
+        assert dashboard['recent_activity'] == 12
+        assert dashboard['performance_metrics']['concurrent_users'] == 3
@@ -0,0 +1,110 @@
+"""
+Tests para los SLO por endpoint y sus ejemplares
+"""
+
+import pytest
+from flask import g
+from sqlalchemy import text
+import slo_tracker as slo_module
+from models import db
+from slo_tracker import SLOTracker, SLO_CONFIG, init_slo_tracker, note_cache_miss
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = SLOTracker()
+    monkeypatch.setattr(slo_module, 'slo_tracker', tracker)
+    monkeypatch.setitem(SLO_CONFIG, 'objectives', {'reports': {'p95_ms': 100, 'p99_ms': 400}})
+    return tracker
+
+
+class TestSLOTracker:
+    """Consumo del presupuesto, ventanas y ejemplares"""
+
+    def test_burn_rate_per_objective(self, tracker):
+        now = 10000.0
+        for index in range(100):
+            duration = 200 if index < 10 else 50    # 10% por encima del p95 objetivo
+            tracker.observe('reports', duration, 500 if index == 0 else 200, now=now)
+
+        report = tracker.ranking(now=now)[0]
+        assert report['objective'] == {'p95_ms': 100, 'p99_ms': 400, 'availability': 0.995}
+        assert report['requests'] == 100
+        assert report['burn_rate']['long']['p95'] == pytest.approx(2.0)
+        assert report['burn_rate']['long']['p99'] == 0
+        assert report['burn_rate']['long']['availability'] == pytest.approx(2.0)
+        assert report['budget_remaining'] == pytest.approx(-1.0)
+
+    def test_few_requests_have_no_burn_rate(self, tracker):
+        tracker.observe('reports', 900, 200, now=0)
+        assert tracker.ranking(now=0)[0]['burn_rate'] == {'long': None, 'short': None}
+
+    def test_short_and_long_windows(self, tracker):
+        """Los tramos viejos solo cuentan en la ventana larga y luego salen de ambas"""
+        slice_seconds = SLO_CONFIG['slice_seconds']
+        for _ in range(30):
+            tracker.observe('reports', 500, 200, now=0)
+        later = slice_seconds * 10
+        for _ in range(30):
+            tracker.observe('reports', 10, 200, now=later)
+
+        report = tracker.ranking(now=later)[0]
+        assert report['requests'] == 60
+        assert report['burn_rate']['long']['p95'] == pytest.approx(10.0)
+        assert report['burn_rate']['short']['p95'] == 0
+
+        expired = tracker.ranking(now=later + slice_seconds * SLO_CONFIG['window_slices'])
+        assert expired == []
+
+    def test_keeps_slowest_exemplars(self, tracker):
+        for index in range(50):
+            tracker.observe('reports', index, 200, {'request_id': f'r{index}'}, now=0)
+        exemplars = tracker.ranking(now=0, exemplars=3)[0]['exemplars']
+        assert [exemplar['request_id'] for exemplar in exemplars] == ['r49', 'r48', 'r47']
+        assert exemplars[0]['duration_ms'] == 49
+        assert len(tracker.windows['reports']._ring[0].exemplars) == SLO_CONFIG['exemplars_per_slice']
+
+    def test_ranking_by_budget_burn(self, tracker):
+        for _ in range(40):
+            tracker.observe('fast', 10, 200, now=0)
+            tracker.observe('reports', 150, 200, now=0)
+        assert [report['endpoint'] for report in tracker.ranking(now=0)] == ['reports', 'fast']
+
+
+class TestSLOMiddleware:
+    """Middleware, contadores del request y vista de administración"""
+
+    @pytest.fixture
+    def slo_app(self, make_app, tracker):
+        """Aplicación propia por request (sin el contexto compartido de pytest-flask)"""
+        app = make_app(login=True, users=True)
+
+        @app.route('/reports')
+        def reports():
+            db.session.execute(text('SELECT 1'))
+            db.session.execute(text('SELECT 2'))
+            note_cache_miss()
+            return g.request_id
+
+        init_slo_tracker(app)
+        return app
+
+    def test_request_exemplar(self, slo_app, tracker, login_client):
+        client = login_client(slo_app, 2)
+        response = client.get('/reports', headers={'X-Request-ID': 'abc123'})
+        assert response.get_data(as_text=True) == 'abc123'
+
+        exemplar = tracker.ranking()[0]['exemplars'][0]
+        assert exemplar['request_id'] == 'abc123'
+        assert exemplar['user_id'] == '2'
+        assert exemplar['sql_count'] >= 2
+        assert exemplar['cache_misses'] == 1
+        assert exemplar['status'] == 200
+
+    def test_admin_view(self, slo_app, login_client):
+        login_client(slo_app, 2).get('/reports')
+        assert login_client(slo_app, 2).get('/api/v1/slo').status_code == 403
+
+        data = login_client(slo_app, 1).get('/api/v1/slo').get_json()['data']
+        assert data['window_minutes'] == 60
+        assert data['endpoints'][0]['endpoint'] == 'reports'
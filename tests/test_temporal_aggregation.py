@@ -0,0 +1,80 @@
+"""
+Tests para la agregación temporal en base de datos
+"""
+
+import pytest
+from datetime import datetime
+from sqlalchemy.dialects import postgresql
+from models import db, User, Visit, Expense
+from services.temporal_aggregation import (time_series, cyclic_profile, weekday_hour_heatmap, heatmap_summary,
+                                           bucket_expression, period_starts)
+
+
+@pytest.fixture
+def app(app):
+    """Visitas y expensas en fechas conocidas"""
+    db.session.add(User(username='vecino', email='vecino@test.com', name='Vecino', password_hash='x'))
+    db.session.flush()
+    # Lunes 3 y domingo 9 de junio de 2030
+    for moment in (datetime(2030, 6, 3, 10, 15), datetime(2030, 6, 3, 10, 45), datetime(2030, 6, 9, 22, 5)):
+        db.session.add(Visit(visitor_name='Invitado', resident_id=1, created_at=moment))
+    for month, amount in ((4, 100.0), (4, 50.0), (6, 300.0)):
+        db.session.add(Expense(user_id=1, month=f'2030-{month:02d}', amount=amount,
+                               created_at=datetime(2030, month, 10)))
+    db.session.commit()
+    return app
+
+
+class TestTemporalAggregation:
+    """Tests para series, perfiles y mapa de calor"""
+
+    def test_heatmap(self, app):
+        """Test mapa de calor 7×24 con lunes en la fila 0"""
+        heatmap = weekday_hour_heatmap(Visit.created_at)
+
+        assert heatmap.shape == (7, 24)
+        assert heatmap[0][10] == 2
+        assert heatmap[6][22] == 1
+        assert heatmap.sum() == 3
+
+        summary = heatmap_summary(heatmap)
+        assert summary['by_day'] == {'Monday': 2, 'Sunday': 1}
+        assert summary['peak_hours'][0] == {'hour': 10, 'count': 2}
+
+    def test_dense_monthly_sum(self, app):
+        """Test serie mensual densa con ceros en meses sin datos"""
+        periods, values = time_series(Expense.created_at, 'month', datetime(2030, 3, 15), datetime(2030, 7, 1),
+                                      value=Expense.amount, agg='sum')
+
+        assert [period.month for period in periods] == [3, 4, 5, 6]
+        assert list(values) == [0, 150.0, 0, 300.0]
+
+    def test_weekly_and_daily_buckets(self, app):
+        """Test semanas ISO y días"""
+        periods, values = time_series(Visit.created_at, 'week', datetime(2030, 6, 1), datetime(2030, 6, 15))
+        assert periods[0] == datetime(2030, 5, 27)
+        assert list(values) == [0, 3, 0]
+
+        _, daily = time_series(Visit.created_at, 'day', datetime(2030, 6, 3), datetime(2030, 6, 10))
+        assert list(daily) == [2, 0, 0, 0, 0, 0, 1]
+
+    def test_hour_of_day_profile(self, app):
+        """Test perfil por hora del día"""
+        profile = cyclic_profile(Visit.created_at, 'hour_of_day')
+        assert len(profile) == 24
+        assert profile[10] == 2
+
+    def test_postgres_expressions(self):
+        """Test expresiones date_trunc/extract para PostgreSQL"""
+        compiled = str(bucket_expression(Visit.created_at, 'month', 'postgresql').compile(
+            dialect=postgresql.dialect()))
+        assert 'date_trunc' in compiled
+        weekday = str(bucket_expression(Visit.created_at, 'weekday', 'postgresql').compile(
+            dialect=postgresql.dialect()))
+        assert 'EXTRACT(isodow FROM visits.created_at)' in weekday
+
+    def test_period_starts(self):
+        """Test meses que cruzan el fin de año"""
+        assert period_starts(datetime(2030, 11, 20), datetime(2031, 2, 1), 'month') == [
+            datetime(2030, 11, 1), datetime(2030, 12, 1), datetime(2031, 1, 1)
+        ]
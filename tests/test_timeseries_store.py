@@ -0,0 +1,132 @@
+"""
+Tests para el almacén de series temporales
+"""
+
+import pytest
+import timeseries_store
+from timeseries_store import TimeSeriesStore, RingTier
+
+START = 1_900_000_800.0   # Múltiplo de 3600
+
+
+class TestRingTier:
+    """Tests para el búfer circular"""
+
+    def test_wraps_in_chronological_order(self):
+        """Test sobrescritura de los buckets más antiguos"""
+        tier = RingTier('1s', 1, 4)
+        for offset in range(6):
+            tier.append(START + offset, offset)
+
+        assert tier.size == 4
+        assert list(tier.ordered('times')) == [START + 2, START + 3, START + 4, START + 5]
+
+    def test_same_bucket_accumulates(self):
+        """Test muestras del mismo bucket acumuladas"""
+        tier = RingTier('1m', 60, 10)
+        for offset, value in ((0, 1), (10, 5), (59, 3), (60, 7)):
+            tier.append(START + offset, value)
+
+        assert tier.size == 2
+        assert list(tier.ordered('sums')) == [9, 7]
+        assert list(tier.ordered('counts')) == [3, 1]
+        assert tier.maxs[0] == 5
+
+    def test_since_reads_only_new_buckets(self):
+        """Test lectura desde el final sin recorrer el búfer completo"""
+        tier = RingTier('1s', 1, 4)
+        for offset in range(6):
+            tier.append(START + offset, offset)
+
+        assert tier.since(START + 4) == [(START + 4, 4.0, 1.0, 4.0, 4.0), (START + 5, 5.0, 1.0, 5.0, 5.0)]
+        assert tier.since(START + 6) == []
+        assert [row[0] for row in tier.since(0)] == [START + 2, START + 3, START + 4, START + 5]
+
+    def test_out_of_order_dropped(self):
+        """Test muestras anteriores al último bucket descartadas"""
+        tier = RingTier('1s', 1, 10)
+        tier.append(START + 5, 1)
+        tier.append(START + 1, 1)
+        assert tier.size == 1
+        assert tier.dropped == 1
+
+
+class TestTimeSeriesStore:
+    """Tests para estadísticas por ventana y niveles de retención"""
+
+    @pytest.fixture
+    def store(self):
+        store = TimeSeriesStore()
+        for offset in range(7200):
+            store.record('latency', offset % 100, timestamp=START + offset, unit='ms', category='system')
+        return store
+
+    def test_window_stats(self, store):
+        """Test promedio, tasa y percentiles en la última hora"""
+        stats = store.stats('latency', 600, now=START + 7199)
+
+        assert stats['tier'] == '1s'
+        assert stats['count'] == 600
+        assert stats['mean'] == pytest.approx(49.5)
+        assert stats['rate'] == pytest.approx(49.5)
+        assert stats['max'] == 99
+        assert stats['percentiles']['p50'] == pytest.approx(49.5)
+
+    def test_downsampled_tier(self, store):
+        """Test ventanas largas con nivel de 1 minuto"""
+        stats = store.stats('latency', 7200, now=START + 7199)
+
+        assert stats['tier'] == '1m'
+        assert stats['count'] == 7200
+        assert stats['min'] == 0 and stats['max'] == 99
+
+    def test_first_tier_keeps_one_hour(self, store):
+        """Test retención acotada del nivel de 1 segundo"""
+        series = store.get('latency')
+        assert len(series) == 3600
+        assert series.total_samples == 7200
+
+    def test_slope(self):
+        """Test pendiente de una serie creciente"""
+        store = TimeSeriesStore()
+        for offset in range(60):
+            store.record('users', 2 * offset, timestamp=START + offset)
+
+        assert store.stats('users', 60, now=START + 59)['slope'] == pytest.approx(2.0)
+        assert store.last_values('users', 2) == [116.0, 118.0]
+
+    def test_python_fallback(self, monkeypatch):
+        """Test mismos resultados sin NumPy"""
+        with_numpy = TimeSeriesStore()
+        monkeypatch.setattr(timeseries_store, 'np', None)
+        without_numpy = TimeSeriesStore()
+        monkeypatch.undo()
+
+        for store in (with_numpy, without_numpy):
+            for offset in range(300):
+                store.record('load', (offset * 7) % 13, timestamp=START + offset)
+
+        expected = with_numpy.stats('load', 300, now=START + 299)
+        monkeypatch.setattr(timeseries_store, 'np', None)
+        result = without_numpy.stats('load', 300, now=START + 299)
+
+        assert result['mean'] == pytest.approx(expected['mean'])
+        assert result['slope'] == pytest.approx(expected['slope'])
+        assert result['percentiles'] == pytest.approx(expected['percentiles'])
+
+
+class TestAnalyticsDashboard:
+    """Integración con el dashboard de analytics"""
+
+    def test_comprehensive_dashboard(self, app):
+        """Test el dashboard completo incluye la ventana de actividad del almacén"""
+        from analytics_engine import AnalyticsManager
+
+        manager = AnalyticsManager()
+        manager.real_time_analytics._update_real_time_metrics()
+        dashboard = manager.get_comprehensive_dashboard()
+
+        window = dashboard['real_time']['activity_window']
+        assert window['last_hour']['count'] == 1
+        assert {'user_behavior', 'predictive_insights', 'business_intelligence',
+                'performance_metrics'} <= set(dashboard)
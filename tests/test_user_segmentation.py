@@ -0,0 +1,87 @@
+"""
+Tests para la segmentación vectorizada de usuarios
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from models import db, User, Visit, Reservation, Expense, Maintenance
+import services.user_segmentation as user_segmentation
+from services.user_segmentation import load_user_features, summarize_segments, activity_summary
+
+NOW = datetime(2030, 6, 1, 12, 0)
+
+
+@pytest.fixture
+def app(app):
+    """Usuarios de distinta actividad"""
+    created = NOW - timedelta(days=200)
+    for name in ('muy_activo', 'activo', 'en_riesgo', 'inactivo', 'mantenimiento'):
+        db.session.add(User(username=name, email=f'{name}@test.com', name=name, password_hash='x',
+                            created_at=created))
+    db.session.add(User(username='nuevo', email='nuevo@test.com', name='nuevo', password_hash='x',
+                        created_at=NOW - timedelta(days=5)))
+    db.session.flush()
+
+    for i in range(10):
+        db.session.add(Visit(visitor_name='Invitado', resident_id=1, created_at=NOW - timedelta(days=1, hours=i)))
+    db.session.add(Reservation(user_id=2, space_type='sum', space_name='SUM', start_time=NOW, status='cancelled',
+                               end_time=NOW + timedelta(hours=1), created_at=NOW - timedelta(days=20)))
+    db.session.add(Visit(visitor_name='Invitado', resident_id=3, created_at=NOW - timedelta(days=60)))
+    db.session.add(Visit(visitor_name='Invitado', resident_id=4, created_at=NOW - timedelta(days=150)))
+    for i in range(3):
+        db.session.add(Maintenance(user_id=5, title='Pérdida', description='...',
+                                   created_at=NOW - timedelta(days=40 + i)))
+    db.session.add(Expense(user_id=1, month='2030-05', amount=1000.0, status='paid',
+                           created_at=NOW - timedelta(days=10)))
+    db.session.add(Expense(user_id=2, month='2030-05', amount=500.0, status='pending',
+                           created_at=NOW - timedelta(days=10)))
+    db.session.commit()
+    return app
+
+
+def segments_by_name():
+    return {segment['name']: segment for segment in summarize_segments(load_user_features(NOW))}
+
+
+class TestUserSegmentation:
+    """Tests para características y segmentos"""
+
+    def test_features_from_grouped_queries(self, app, count_queries):
+        """Test una consulta por métrica, sin consultas por usuario"""
+        features, statements = count_queries(lambda: load_user_features(NOW))
+
+        assert len(statements) == 5
+        assert list(features.frequency) == [10, 1, 0, 0, 0, 0]
+        assert list(features.spending) == [1000.0, 0, 0, 0, 0, 0]
+        assert list(features.maintenance_requests) == [0, 0, 0, 0, 3, 0]
+        assert round(features.recency_days[2]) == 60
+
+    def test_segments(self, app):
+        """Test asignación de cada usuario a su segmento"""
+        segments = segments_by_name()
+
+        assert {name: segment['user_count'] for name, segment in segments.items()} == {
+            'Usuarios Nuevos': 1, 'Muy Activos': 1, 'Activos': 1, 'En Riesgo': 2, 'Inactivos': 1,
+            'Alta Demanda de Mantenimiento': 1
+        }
+        assert segments['Muy Activos']['avg_spending'] == 1000.0
+        assert segments['Muy Activos']['engagement_score'] > segments['En Riesgo']['engagement_score']
+
+    def test_python_fallback_matches_numpy(self, app, monkeypatch):
+        """Test mismo resultado sin NumPy"""
+        expected = segments_by_name()
+        expected_summary = activity_summary(load_user_features(NOW), NOW)
+
+        monkeypatch.setattr(user_segmentation, 'np', None)
+
+        assert segments_by_name() == expected
+        assert activity_summary(load_user_features(NOW), NOW) == expected_summary
+
+    def test_activity_summary(self, app):
+        """Test usuarios activos y retención por cohorte"""
+        summary = activity_summary(load_user_features(NOW), NOW)
+
+        assert summary['active_users_7d'] == 1
+        assert summary['active_users_30d'] == 2
+        assert summary['total_visits'] == 12
+        assert summary['cohort_retention'] == {'month_1': 0.0}
@@ -0,0 +1,267 @@
+"""
+Almacén de Series Temporales
+Búferes circulares preasignados de (época, valor) por serie con agregación en
+niveles de retención (1 s, 1 min, 1 h), inserción O(1) y estadísticas de ventana
+vectorizadas (promedio, tasa, pendiente y percentiles).
+"""
+
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from optional_dependencies import get_numpy
+
+np = get_numpy()
+
+# Niveles de retención: (nombre, resolución en segundos, cantidad de buckets)
+TIMESERIES_CONFIG = {
+    'tiers': (
+        ('1s', 1, 3600),       # Última hora
+        ('1m', 60, 1440),      # Último día
+        ('1h', 3600, 720)      # Últimos 30 días
+    ),
+    'percentiles': (50, 95, 99)
+}
+
+
+class RingTier:
+    """Nivel de retención: buckets de resolución fija en un búfer circular"""
+
+    FIELDS = ('times', 'sums', 'counts', 'mins', 'maxs')
+
+    def __init__(self, name: str, resolution: int, capacity: int):
+        self.name = name
+        self.resolution = resolution
+        self.capacity = capacity
+        self.head = 0      # Próxima posición a escribir
+        self.size = 0
+        self.dropped = 0   # Muestras anteriores al último bucket (fuera de orden)
+        if np is not None:
+            for field_name in self.FIELDS:
+                setattr(self, field_name, np.zeros(capacity, dtype=np.float64))
+        else:
+            for field_name in self.FIELDS:
+                setattr(self, field_name, [0.0] * capacity)
+
+    @property
+    def retention(self) -> int:
+        return self.resolution * self.capacity
+
+    def append(self, timestamp: float, value: float):
+        """Agregar una muestra en O(1), acumulando en el bucket actual"""
+        bucket = timestamp - timestamp % self.resolution
+        last = (self.head - 1) % self.capacity
+
+        if self.size and self.times[last] == bucket:
+            self.sums[last] += value
+            self.counts[last] += 1
+            self.mins[last] = min(self.mins[last], value)
+            self.maxs[last] = max(self.maxs[last], value)
+            return
+
+        if self.size and bucket < self.times[last]:
+            self.dropped += 1
+            return
+
+        position = self.head
+        self.times[position] = bucket
+        self.sums[position] = value
+        self.counts[position] = 1
+        self.mins[position] = value
+        self.maxs[position] = value
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def ordered(self, field_name: str):
+        """Valores de un campo en orden cronológico"""
+        values = getattr(self, field_name)
+        if self.size < self.capacity:
+            return values[:self.size]
+        if np is not None:
+            return np.concatenate((values[self.head:], values[:self.head]))
+        return values[self.head:] + values[:self.head]
+
+    def since(self, moment: float) -> List[Tuple[float, float, float, float, float]]:
+        """Buckets (inicio, suma, cantidad, mínimo, máximo) con inicio >= moment, recorriendo desde
+        el final: el costo depende de los buckets nuevos y no del tamaño del nivel"""
+        rows = []
+        for offset in range(1, self.size + 1):
+            position = (self.head - offset) % self.capacity
+            if self.times[position] < moment:
+                break
+            rows.append(tuple(float(getattr(self, field_name)[position]) for field_name in self.FIELDS))
+        rows.reverse()
+        return rows
+
+    def window(self, since: float) -> Dict[str, Any]:
+        """Campos de los buckets con inicio > since"""
+        times = self.ordered('times')
+        if np is not None:
+            start = int(np.searchsorted(times, since, side='right'))
+        else:
+            start = next((index for index, moment in enumerate(times) if moment > since), len(times))
+        return {field_name: self.ordered(field_name)[start:] for field_name in self.FIELDS}
+
+
+class Series:
+    """Serie temporal con varios niveles de retención"""
+
+    def __init__(self, name: str, unit: str = '', category: str = '', tiers: Sequence[Tuple[str, int, int]] = None):
+        self.name = name
+        self.unit = unit
+        self.category = category
+        self.trend = None
+        self.tiers = [RingTier(*tier) for tier in (tiers or TIMESERIES_CONFIG['tiers'])]
+        self.last_value = None
+        self.last_timestamp = None
+        self.total_samples = 0
+
+    def __len__(self):
+        return self.tiers[0].size
+
+    def append(self, value: float, timestamp: float = None):
+        timestamp = time.time() if timestamp is None else timestamp
+        value = float(value)
+        for tier in self.tiers:
+            tier.append(timestamp, value)
+        self.last_value = value
+        self.last_timestamp = timestamp
+        self.total_samples += 1
+
+    def tier_for(self, seconds: float) -> RingTier:
+        """Nivel más fino cuya retención cubre la ventana"""
+        for tier in self.tiers:
+            if tier.retention >= seconds:
+                return tier
+        return self.tiers[-1]
+
+    def last_values(self, count: int) -> List[float]:
+        """Promedios de los últimos buckets del nivel más fino (una muestra por bucket en general)"""
+        tier = self.tiers[0]
+        sums, counts = tier.ordered('sums')[-count:], tier.ordered('counts')[-count:]
+        return [float(total / samples) for total, samples in zip(sums, counts)]
+
+    def stats(self, seconds: float, now: float = None, percentiles: Sequence[float] = None) -> Dict[str, Any]:
+        """Estadísticas de la ventana (now - seconds, now]"""
+        now = time.time() if now is None else now
+        tier = self.tier_for(seconds)
+        data = tier.window(now - seconds)
+        percentiles = percentiles or TIMESERIES_CONFIG['percentiles']
+        result = _window_stats(data, seconds, percentiles)
+        result.update({'tier': tier.name, 'window_seconds': seconds, 'last': self.last_value})
+        return result
+
+
+def _window_stats(data: Dict[str, Any], seconds: float, percentiles: Sequence[float]) -> Dict[str, Any]:
+    empty = {'count': 0, 'mean': None, 'min': None, 'max': None, 'sum': 0.0, 'rate': 0.0, 'slope': 0.0,
+             'percentiles': {f'p{int(q)}': None for q in percentiles}}
+    if not len(data['times']):
+        return empty
+
+    if np is not None:
+        counts = data['counts']
+        total = float(data['sums'].sum())
+        samples = float(counts.sum())
+        means = data['sums'] / counts
+        slope = _slope(data['times'], means)
+        return {
+            'count': int(samples),
+            'mean': total / samples,
+            'min': float(data['mins'].min()),
+            'max': float(data['maxs'].max()),
+            'sum': total,
+            'rate': total / seconds,
+            'slope': slope,
+            'percentiles': {f'p{int(q)}': float(value)
+                            for q, value in zip(percentiles, np.percentile(means, percentiles))}
+        }
+
+    counts = list(data['counts'])
+    total = float(sum(data['sums']))
+    samples = float(sum(counts))
+    means = [bucket_sum / count for bucket_sum, count in zip(data['sums'], counts)]
+    return {
+        'count': int(samples),
+        'mean': total / samples,
+        'min': float(min(data['mins'])),
+        'max': float(max(data['maxs'])),
+        'sum': total,
+        'rate': total / seconds,
+        'slope': _slope(list(data['times']), means),
+        'percentiles': {f'p{int(q)}': _percentile(sorted(means), q) for q in percentiles}
+    }
+
+
+def _slope(times, values) -> float:
+    """Pendiente por mínimos cuadrados (unidades por segundo)"""
+    if len(values) < 2:
+        return 0.0
+    if np is not None:
+        x = times - times.mean()
+        denominator = float((x * x).sum())
+        return float((x * (values - values.mean())).sum() / denominator) if denominator else 0.0
+    mean_x = sum(times) / len(times)
+    mean_y = sum(values) / len(values)
+    denominator = sum((x - mean_x) ** 2 for x in times)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(times, values)) / denominator if denominator else 0.0
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Percentil con interpolación lineal (mismo criterio que numpy.percentile)"""
+    position = (len(sorted_values) - 1) * q / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class TimeSeriesStore:
+    """Conjunto de series con registro y consulta seguros entre hilos"""
+
+    def __init__(self, tiers: Sequence[Tuple[str, int, int]] = None):
+        self.tiers = tiers
+        self._series: Dict[str, Series] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._series)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._series
+
+    def get(self, name: str) -> Optional[Series]:
+        return self._series.get(name)
+
+    def items(self):
+        return list(self._series.items())
+
+    def record(self, name: str, value: float, timestamp: float = None, unit: str = '', category: str = '') -> Series:
+        """Registrar una muestra creando la serie si no existe"""
+        with self.lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = Series(name, unit, category, self.tiers)
+            series.append(value, timestamp)
+            return series
+
+    def stats(self, name: str, seconds: float, now: float = None) -> Optional[Dict[str, Any]]:
+        series = self._series.get(name)
+        if series is None:
+            return None
+        with self.lock:
+            return series.stats(seconds, now)
+
+    def buckets_since(self, name: str, seconds: float, moment: float) -> Tuple[int, List[Tuple[float, ...]]]:
+        """Resolución del nivel que cubre `seconds` y sus buckets con inicio >= moment"""
+        series = self._series.get(name)
+        if series is None:
+            return 0, []
+        with self.lock:
+            tier = series.tier_for(seconds)
+            return tier.resolution, tier.since(moment)
+
+    def last_values(self, name: str, count: int) -> List[float]:
+        series = self._series.get(name)
+        if series is None:
+            return []
+        with self.lock:
+            return series.last_values(count)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Proceso worker
+Ejecuta todas las tareas periódicas del programador (monitoreo, automatización,
+refrescos de analytics, alertas, backups, retención, snapshots) y entrega los
+trabajos encolados por los procesos web (notificaciones, ejecuciones manuales).
+Los procesos web no inician hilos de fondo: leen lo que el worker publica en
+shared_state. Ver "Procesos web y worker" en README_DEPLOYMENT.md.
+
+Uso: python worker.py
+"""
+
+import os
+import signal
+import sys
+import threading
+
+# El rol se fija antes de importar la aplicación: lo leen los módulos al cargarse
+os.environ['PROCESS_ROLE'] = 'worker'
+os.environ['SCHEDULER_DEFER_START'] = '0'
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    stop = threading.Event()
+
+    def shutdown(signum, frame):
+        print(f"🛑 Señal {signum} recibida, deteniendo worker...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    from main import app
+    from cluster_scheduler import cluster_scheduler
+
+    # create_app ya inició el programador; start() es idempotente dentro del proceso
+    cluster_scheduler.start()
+    jobs = [job.name for job in cluster_scheduler.jobs.values() if 'worker' in job.roles]
+    print(f"✅ Worker iniciado (tareas: {', '.join(jobs) or 'ninguna'}, nodo {cluster_scheduler.node_id})")
+
+    stop.wait()
+    cluster_scheduler.stop()
+
+    from metrics_registry import metrics_registry
+    metrics_registry.retire(os.getpid())
+    print("✅ Worker detenido")
+
+
+if __name__ == '__main__':
+    main()